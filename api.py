@@ -7,12 +7,13 @@ any existing code. Reutilizes src/ modules directly.
 import os
 import re
 import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
 
-from fastapi import FastAPI, HTTPException, Depends
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Depends, Header, status
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 
@@ -20,7 +21,18 @@ from src.models import (
     ContratoData, ContratoResult, ValidationError as VError,
     parsear_texto_contrato
 )
-from src.autotramite import crear_contrato_autotramite
+from src.autotramite import crear_contrato_autotramite, crear_contratos_autotramite_batch
+from src.browser_pool import get_browser_pool, cerrar_browser_pool
+from src.config import settings
+from src.executors import PDF, SMTP, cerrar_executors, en_executor, get_process_pool, procesos_pdf
+from src.smtp_pool import cerrar_pool_smtp
+from src.idempotency import IdempotenciaConflictoError, idempotente
+from src.jobs import ColaLlenaError, JobQueue, JobStore
+from src.parsers import mapping_tag, parsear_correo_raw
+from src.stage_events import StageCallback
+from src.tag_lote import FORMATO_ZIP, FORMATOS, nombre_pdf_tag, stream_lote, validar_lote
+from src.tag_cache import etag_pdf_tag, obtener_cache_tag, pdf_tag
+from src.tag_pdf import guardar_pdf
 from src.mail_utils import (
     generar_email_desde_plantilla, enviar_email_smtp,
     validar_datos_mail, validar_smtp_config
@@ -30,12 +42,47 @@ from src.logging_utils import get_logger
 # ---------------------------------------------------------------------------
 # App & Logger
 # ---------------------------------------------------------------------------
+logger = get_logger(__name__)
+
+
+# Cola de trabajos asincronos (se crea en el lifespan)
+cola_jobs: Optional[JobQueue] = None
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Precalienta el pool de navegadores (opcional), levanta la cola de trabajos y cierra todo al apagar."""
+    global cola_jobs
+    if settings.browser_pool_warmup:
+        try:
+            await get_browser_pool().iniciar(precalentar=True)
+        except Exception as e:
+            logger.warning(f"No se pudo precalentar pool de navegadores: {e}")
+    store = JobStore()
+    cola_jobs = JobQueue(store, {"autotramite": _ejecutar_job_autotramite})
+    await cola_jobs.iniciar()
+    try:
+        yield
+    finally:
+        await cola_jobs.detener()
+        store.cerrar()
+        cola_jobs = None
+        cerrar_executors()
+        cerrar_pool_smtp()
+        await cerrar_browser_pool()
+
+
 app = FastAPI(
     title="AutoTramite API",
     version="1.0.0",
-    description="Backend REST para integracion n8n/Telegram"
+    description="Backend REST para integracion n8n/Telegram",
+    lifespan=lifespan
 )
-logger = get_logger(__name__)
+
+@app.exception_handler(IdempotenciaConflictoError)
+async def conflicto_idempotencia(_request, exc: IdempotenciaConflictoError):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
 
 # ---------------------------------------------------------------------------
 # Auth
@@ -82,11 +129,59 @@ class EjecutarResponse(BaseModel):
     metadata: Optional[dict] = None
 
 
+class EjecutarLoteRequest(BaseModel):
+    contratos: list[dict]
+    modo: str = "preview"  # "registro" | "preview"
+    correlation_id: str
+
+
+class JobCreadoResponse(BaseModel):
+    job_id: str
+    estado: str
+    duplicado: bool = False
+    status_url: str
+    correlation_id: str
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    tipo: str
+    estado: str  # "en_cola" | "ejecutando" | "completado" | "error"
+    etapa: Optional[str] = None
+    timings: Optional[dict] = None
+    resultado: Optional[dict] = None
+    error: Optional[str] = None
+    correlation_id: Optional[str] = None
+    creado: float
+    iniciado: Optional[float] = None
+    terminado: Optional[float] = None
+
+
+class EjecutarLoteResponse(BaseModel):
+    exito: bool
+    total: int
+    exitosos: int
+    resultados: list[EjecutarResponse]
+    correlation_id: str
+
+
 class TagRequest(BaseModel):
     datos_raw: str
     correlation_id: str
 
 
+class TagPdfRequest(BaseModel):
+    datos_raw: str
+    correlation_id: str
+    persistir: bool = False  # Guardar ademas en docs/tag/output (descargable por /api/download)
+
+
+class TagLoteRequest(BaseModel):
+    datos_raw: list[str]  # Un texto por documento (mismo formato que TagRequest)
+    formato: str = "zip"  # "zip" | "pdf" (un PDF con todos los documentos)
+    correlation_id: str
+
+
 class MailRequest(BaseModel):
     datos_propietario: str
     vehiculo: str
@@ -103,124 +198,12 @@ class MailRequest(BaseModel):
 TAG_DIR = Path(__file__).parent / 'docs' / 'tag'
 TAG_TEMPLATE_PDF = TAG_DIR / 'PDF-EJEMPLO.pdf'
 TAG_OUTPUT_DIR = TAG_DIR / 'output'
-TAG_MONTHS = {
-    1: 'ENERO', 2: 'FEBRERO', 3: 'MARZO', 4: 'ABRIL',
-    5: 'MAYO', 6: 'JUNIO', 7: 'JULIO', 8: 'AGOSTO',
-    9: 'SEPTIEMBRE', 10: 'OCTUBRE', 11: 'NOVIEMBRE', 12: 'DICIEMBRE'
-}
-TAG_FIELD_NAME_MAP = {
-    'CAMPO1': 'En Santiago  a', 'CAMPO2': 'de', 'CAMPO3': 'de_2',
-    'CAMPO4': 'Sres  Administradora de TAG', 'CAMPO5': 'RUT',
-    'CAMPO6': 'Representante Legal', 'CAMPO7': 'Domicilio',
-    'CAMPO8': 'comuna', 'CAMPO9': 'Ciudad', 'CAMPO10': 'Fono',
-    'CAMPO11': 'Email', 'CAMPO12': 'Email2', 'CAMPO13': 'TAG Nundefined',
-    'CAMPO14': 'PPU', 'CAMPO15': 'PPU2', 'CAMPO16': 'Obs',
-}
-
-
-def _tag_normalize_rut(value: str) -> str:
-    if not value:
-        return ''
-    cleaned = re.sub(r'[^0-9Kk]', '', value).upper()
-    if len(cleaned) < 2:
-        return cleaned
-    return f"{cleaned[:-1]}-{cleaned[-1]}"
-
-
-def _tag_normalize_phone(value: str) -> str:
-    if not value:
-        return ''
-    digits = re.sub(r'\D', '', value)
-    if len(digits) > 9:
-        digits = digits[-9:]
-    return digits
-
-
-def _tag_normalize_patente(value: str) -> str:
-    if not value:
-        return ''
-    cleaned = re.sub(r'[^A-Za-z0-9]', '', value).upper()
-    return cleaned
-
-
-def _tag_split_email(email: str) -> tuple[str, str]:
-    if '@' in email:
-        parts = email.split('@', 1)
-        return parts[0], parts[1]
-    return email, ''
-
-
 def _tag_parse_text(text: str) -> dict:
-    def find(pattern):
-        match = re.search(pattern, text, flags=re.IGNORECASE | re.MULTILINE)
-        return match.group(1).strip() if match else ''
-
-    nombre = find(r'^\s*Nombre\s*:\s*(.+)$').upper()
-    rut = _tag_normalize_rut(find(r'^\s*RUT\s*:\s*(.+)$'))
-    direccion_raw = find(r'^\s*Direccion\s*:\s*(.+)$')
-    telefono = _tag_normalize_phone(find(r'^\s*Telefono\s*:\s*(.+)$'))
-    correo = find(r'^\s*Correo\s*:\s*(.+)$')
-    patente = _tag_normalize_patente(find(r'^\s*PATENTE\s*:\s*(.+)$'))
-    tag = find(r'^\s*TAG\s*[:\-]?\s*(.+)$')
-
-    direccion_raw = direccion_raw.rstrip('.')
-    if ',' in direccion_raw:
-        direccion_1, comuna = [p.strip() for p in direccion_raw.split(',', 1)]
-    else:
-        parts = direccion_raw.split()
-        direccion_1 = ' '.join(parts[:-1]).strip()
-        comuna = parts[-1].strip() if parts else ''
-
-    email_user, email_domain = _tag_split_email(correo)
-
-    today = datetime.now()
-    dia = f"{today.day:02d}"
-    mes = TAG_MONTHS[today.month]
-    ano = f"{today.year}"
-
-    return {
-        'CAMPO1': dia, 'CAMPO2': mes, 'CAMPO3': ano,
-        'CAMPO4': nombre, 'CAMPO5': rut, 'CAMPO6': '',
-        'CAMPO7': direccion_1, 'CAMPO8': comuna.upper(),
-        'CAMPO9': comuna.upper(), 'CAMPO10': telefono,
-        'CAMPO11': email_user, 'CAMPO12': email_domain,
-        'CAMPO13': tag, 'CAMPO14': patente,
-        'CAMPO15': patente, 'CAMPO16': '',
-    }
+    return mapping_tag(text)
 
 
 def _tag_fill_pdf(mapping: dict, template_path: Path, output_path: Path) -> None:
-    from pypdf import PdfReader, PdfWriter
-    from pypdf.generic import NameObject, BooleanObject
-
-    reader = PdfReader(str(template_path))
-    writer = PdfWriter()
-    if hasattr(writer, 'clone_document_from_reader'):
-        writer.clone_document_from_reader(reader)
-    else:
-        writer.append_pages_from_reader(reader)
-        acroform = reader.trailer.get('/Root', {}).get('/AcroForm')
-        if acroform:
-            writer._root_object.update({NameObject('/AcroForm'): acroform})
-
-    fields = reader.get_fields() or {}
-    target_fields = list(TAG_FIELD_NAME_MAP.values())
-    missing_fields = [name for name in target_fields if name not in fields]
-    if missing_fields:
-        raise RuntimeError(f"Campos no encontrados en PDF: {missing_fields}")
-
-    pdf_mapping = {TAG_FIELD_NAME_MAP[key]: value for key, value in mapping.items()}
-
-    for page in writer.pages:
-        writer.update_page_form_field_values(page, pdf_mapping)
-
-    if writer._root_object.get('/AcroForm'):
-        writer._root_object['/AcroForm'].update({
-            NameObject('/NeedAppearances'): BooleanObject(True)
-        })
-
-    with open(output_path, 'wb') as f:
-        writer.write(f)
+    guardar_pdf(pdf_tag(mapping, template_path).datos, output_path)
 
 
 # ===========================================================================
@@ -301,92 +284,225 @@ async def validar_datos(
 
 def _parse_mail_from_raw(text: str) -> dict:
     """Parse mail fields from Telegram raw text format."""
-    def find(pattern):
-        match = re.search(pattern, text, flags=re.IGNORECASE | re.MULTILINE)
-        return match.group(1).strip() if match else ''
-
-    datos_prop = find(r'DATOS_PROPIETARIO\s*:\s*(.+?)(?=\n[A-Z]|\Z)')
-    if not datos_prop:
-        # Try multiline: everything before VEHICULO line
-        match = re.search(
-            r'DATOS_PROPIETARIO\s*:\s*(.+?)(?=\nVEHICULO)',
-            text, re.IGNORECASE | re.DOTALL
-        )
-        datos_prop = match.group(1).strip() if match else text
-
-    vehiculo = find(r'VEHICULO\s*:\s*(.+)$')
-    precio = find(r'PRECIO\s*:\s*(.+)$')
-    fecha = find(r'FECHA_PAGO\s*:\s*(.+)$')
-    email_to = find(r'EMAIL\s*:\s*(.+)$')
-    cc_raw = find(r'CC\s*:\s*(.+)$')
-
-    cc_list = [e.strip() for e in re.split(r'[,;\s]+', cc_raw) if e.strip() and '@' in e]
-
-    if not email_to:
-        raise ValueError("Campo EMAIL es requerido")
-
-    return {
-        'datos_propietario': datos_prop,
-        'vehiculo': vehiculo,
-        'precio_acordado': precio,
-        'fecha_pago': fecha,
-        'email_to': email_to,
-        'cc': cc_list,
-    }
+    return parsear_correo_raw(text)
 
 
 # ---------------------------------------------------------------------------
 # /api/autotramite/ejecutar
 # ---------------------------------------------------------------------------
+def _nombre_screenshot(correlation_id: str) -> str:
+    """Nombre de archivo seguro para screenshots/ (el correlation_id lo elige el cliente)"""
+    return re.sub(r'[^A-Za-z0-9-]', '', correlation_id) or 'sin-id'
+
+
+async def _ejecutar_contrato(
+    contrato: ContratoData,
+    modo: str,
+    correlation_id: str,
+    screenshot_path: str,
+    on_stage: Optional[StageCallback] = None
+) -> EjecutarResponse:
+    """Corre el motor AutoTramite y arma la respuesta de la API."""
+    resultado: ContratoResult = await crear_contrato_autotramite(
+        datos=contrato,
+        dry_run=modo != "registro",
+        screenshot_path=screenshot_path,
+        on_stage=on_stage
+    )
+
+    if resultado.success:
+        return EjecutarResponse(
+            exito=True,
+            pdf_path=resultado.pdf_url,
+            mensaje=resultado.mensaje,
+            correlation_id=correlation_id,
+            metadata={
+                "patente": contrato.vehiculo.patente,
+                "operacion_id": resultado.operacion_id,
+                "timestamp": datetime.now().isoformat(),
+                "timings": resultado.timings,
+                "registro_enviado": resultado.registro_enviado
+            }
+        )
+    return EjecutarResponse(
+        exito=False,
+        mensaje=resultado.error or resultado.mensaje,
+        correlation_id=correlation_id,
+        metadata={"timings": resultado.timings, "registro_enviado": resultado.registro_enviado}
+    )
+
+
 @app.post("/api/autotramite/ejecutar", response_model=EjecutarResponse)
+@idempotente("/api/autotramite/ejecutar")
 async def ejecutar_autotramite(
     request: EjecutarAutoTramiteRequest,
     _auth: bool = Depends(verificar_token)
 ):
-    """Ejecuta el flujo AutoTramite (registro o preview)."""
+    """Ejecuta el flujo AutoTramite (registro o preview) y espera el resultado."""
 
     logger.info(f"[{request.correlation_id}] Ejecutando AutoTramite modo={request.modo}")
 
     try:
         contrato = ContratoData(**request.datos)
 
-        dry_run = request.modo != "registro"
         screenshot_dir = Path("screenshots")
         screenshot_dir.mkdir(exist_ok=True)
 
-        resultado: ContratoResult = await crear_contrato_autotramite(
-            datos=contrato,
-            dry_run=dry_run,
-            screenshot_path=str(screenshot_dir)
-        )
+        return await _ejecutar_contrato(contrato, request.modo, request.correlation_id, str(screenshot_dir))
 
-        if resultado.success:
-            return EjecutarResponse(
-                exito=True,
-                pdf_path=resultado.pdf_url,
-                mensaje=resultado.mensaje,
-                correlation_id=request.correlation_id,
-                metadata={
-                    "patente": contrato.vehiculo.patente,
-                    "timestamp": datetime.now().isoformat()
-                }
-            )
-        else:
-            return EjecutarResponse(
+    except Exception as e:
+        logger.error(f"[{request.correlation_id}] Error ejecutando AutoTramite: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ---------------------------------------------------------------------------
+# /api/autotramite/jobs + /api/jobs/{job_id}
+# ---------------------------------------------------------------------------
+async def _ejecutar_job_autotramite(payload: dict, on_stage: StageCallback) -> dict:
+    """Ejecutor de la cola: mismo flujo que /api/autotramite/ejecutar."""
+    contrato = ContratoData(**payload["datos"])
+    screenshot_dir = Path("screenshots")
+    screenshot_dir.mkdir(exist_ok=True)
+    respuesta = await _ejecutar_contrato(
+        contrato,
+        payload["modo"],
+        payload["correlation_id"],
+        str(screenshot_dir / f"{_nombre_screenshot(payload['correlation_id'])}.pdf"),
+        on_stage=on_stage
+    )
+    return respuesta.model_dump()
+
+
+def _job_a_respuesta(job: dict) -> JobResponse:
+    return JobResponse(job_id=job["id"], **{k: v for k, v in job.items() if k in JobResponse.model_fields})
+
+
+@app.post(
+    "/api/autotramite/jobs",
+    response_model=JobCreadoResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def encolar_autotramite(
+    request: EjecutarAutoTramiteRequest,
+    _auth: bool = Depends(verificar_token)
+):
+    """Encola el flujo AutoTramite y responde de inmediato con el job id."""
+
+    try:
+        ContratoData(**request.datos)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if cola_jobs is None:
+        raise HTTPException(status_code=503, detail="Cola de trabajos no disponible")
+    try:
+        job = cola_jobs.encolar("autotramite", request.model_dump(), request.correlation_id)
+    except ColaLlenaError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return JobCreadoResponse(
+        job_id=job["id"],
+        estado=job["estado"],
+        duplicado=job.get("duplicado", False),
+        status_url=f"/api/jobs/{job['id']}",
+        correlation_id=request.correlation_id
+    )
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobResponse)
+async def estado_job(
+    job_id: str,
+    _auth: bool = Depends(verificar_token)
+):
+    """Estado, etapa actual, tiempos por etapa y resultado de un trabajo."""
+
+    if cola_jobs is None:
+        raise HTTPException(status_code=503, detail="Cola de trabajos no disponible")
+    job = cola_jobs.store.obtener(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return _job_a_respuesta(job)
+
+
+# ---------------------------------------------------------------------------
+# /api/autotramite/ejecutar-lote
+# ---------------------------------------------------------------------------
+@app.post("/api/autotramite/ejecutar-lote", response_model=EjecutarLoteResponse)
+@idempotente(
+    "/api/autotramite/ejecutar-lote",
+    # Si algún contrato registró (exitoso o no) un reintento lo registraría de nuevo
+    cachear=lambda respuesta: respuesta.exito or any(
+        r.exito or (r.metadata or {}).get("registro_enviado") for r in respuesta.resultados
+    )
+)
+async def ejecutar_autotramite_lote(
+    request: EjecutarLoteRequest,
+    _auth: bool = Depends(verificar_token)
+):
+    """Ejecuta varios contratos AutoTramite sobre una sola sesion (resultados en orden)."""
+
+    logger.info(f"[{request.correlation_id}] Ejecutando lote AutoTramite: {len(request.contratos)} contratos modo={request.modo}")
+
+    dry_run = request.modo != "registro"
+    screenshot_dir = Path("screenshots")
+    screenshot_dir.mkdir(exist_ok=True)
+
+    # Contratos invalidos se reportan por item sin abortar el lote
+    respuestas: list[Optional[EjecutarResponse]] = [None] * len(request.contratos)
+    validos: list[tuple[int, ContratoData]] = []
+    for indice, datos in enumerate(request.contratos):
+        try:
+            validos.append((indice, ContratoData(**datos)))
+        except Exception as e:
+            respuestas[indice] = EjecutarResponse(
                 exito=False,
-                mensaje=resultado.error or resultado.mensaje,
-                correlation_id=request.correlation_id
+                mensaje=f"Datos invalidos: {e}",
+                correlation_id=f"{request.correlation_id}-{indice + 1}"
             )
 
+    try:
+        resultados = await crear_contratos_autotramite_batch(
+            [contrato for _, contrato in validos],
+            dry_run=dry_run,
+            screenshot_paths=[
+                str(screenshot_dir / f"{_nombre_screenshot(request.correlation_id)}-{indice + 1}.pdf")
+                for indice, _ in validos
+            ]
+        )
     except Exception as e:
-        logger.error(f"[{request.correlation_id}] Error ejecutando AutoTramite: {e}", exc_info=True)
+        logger.error(f"[{request.correlation_id}] Error ejecutando lote AutoTramite: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+    for (indice, contrato), resultado in zip(validos, resultados):
+        respuestas[indice] = EjecutarResponse(
+            exito=resultado.success,
+            pdf_path=resultado.pdf_url if resultado.success else None,
+            mensaje=resultado.mensaje if resultado.success else (resultado.error or resultado.mensaje),
+            correlation_id=f"{request.correlation_id}-{indice + 1}",
+            metadata={
+                "patente": contrato.vehiculo.patente,
+                "duracion_segundos": resultado.duracion_segundos,
+                "timings": resultado.timings,
+                "registro_enviado": resultado.registro_enviado,
+            }
+        )
+
+    finales = [r for r in respuestas if r is not None]
+    exitosos = sum(1 for r in finales if r.exito)
+    return EjecutarLoteResponse(
+        exito=exitosos == len(finales),
+        total=len(finales),
+        exitosos=exitosos,
+        resultados=finales,
+        correlation_id=request.correlation_id
+    )
+
 
 # ---------------------------------------------------------------------------
 # /api/tag/generar
 # ---------------------------------------------------------------------------
 @app.post("/api/tag/generar", response_model=EjecutarResponse)
+@idempotente("/api/tag/generar")
 async def generar_tag(
     request: TagRequest,
     _auth: bool = Depends(verificar_token)
@@ -400,10 +516,9 @@ async def generar_tag(
         patente = mapping.get('CAMPO14', 'UNKNOWN')
 
         TAG_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-        safe_patente = re.sub(r'[^A-Za-z0-9\-]', '', patente)
-        output_path = TAG_OUTPUT_DIR / f"Solicitud-Tag-{safe_patente}.pdf"
+        output_path = TAG_OUTPUT_DIR / nombre_pdf_tag(mapping)
 
-        _tag_fill_pdf(mapping, TAG_TEMPLATE_PDF, output_path)
+        await en_executor(PDF, _tag_fill_pdf, mapping, TAG_TEMPLATE_PDF, output_path)
 
         return EjecutarResponse(
             exito=True,
@@ -418,10 +533,112 @@ async def generar_tag(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ---------------------------------------------------------------------------
+# /api/tag/pdf
+# ---------------------------------------------------------------------------
+def _trozos(datos: bytes, tamano: int = 64 * 1024):
+    vista = memoryview(datos)
+    for inicio in range(0, len(vista), tamano):
+        yield bytes(vista[inicio:inicio + tamano])
+
+
+@app.post("/api/tag/pdf")
+async def generar_tag_pdf(
+    request: TagPdfRequest,
+    _auth: bool = Depends(verificar_token),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Genera el PDF TAG en memoria (o lo toma del cache) y lo devuelve en la misma respuesta."""
+
+    logger.info(f"[{request.correlation_id}] Generando PDF TAG (respuesta directa)")
+
+    try:
+        mapping = _tag_parse_text(request.datos_raw)
+        nombre = nombre_pdf_tag(mapping)
+        if if_none_match and not request.persistir:
+            etag = await en_executor(PDF, etag_pdf_tag, mapping, TAG_TEMPLATE_PDF)
+            if etag in [e.strip() for e in if_none_match.split(',')]:
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        pdf = await en_executor(PDF, pdf_tag, mapping, TAG_TEMPLATE_PDF)
+        if request.persistir:
+            TAG_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+            await en_executor(PDF, guardar_pdf, pdf.datos, TAG_OUTPUT_DIR / nombre)
+    except Exception as e:
+        logger.error(f"[{request.correlation_id}] Error generando TAG: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(
+        _trozos(pdf.datos),
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f'attachment; filename="{nombre}"',
+            "Content-Length": str(len(pdf.datos)),
+            "ETag": pdf.etag,
+            "X-Cache": "HIT" if pdf.hit else "MISS",
+        }
+    )
+
+
+@app.get("/api/tag/cache")
+async def metricas_cache_tag(_auth: bool = Depends(verificar_token)):
+    """Metricas del cache de PDFs TAG (hits, misses, ocupacion)."""
+    cache = obtener_cache_tag()
+    if cache is None:
+        return {"habilitado": False}
+    return {"habilitado": True, **cache.metricas()}
+
+
+# ---------------------------------------------------------------------------
+# /api/tag/generar-lote
+# ---------------------------------------------------------------------------
+@app.post("/api/tag/generar-lote")
+async def generar_tag_lote(
+    request: TagLoteRequest,
+    _auth: bool = Depends(verificar_token)
+):
+    """Genera varios PDF TAG y los entrega en streaming como ZIP o PDF unico."""
+
+    total = len(request.datos_raw)
+    if not total:
+        raise HTTPException(status_code=400, detail="datos_raw no puede estar vacio")
+    if total > settings.tag_lote_max_documentos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximo {settings.tag_lote_max_documentos} documentos por lote (recibidos: {total})"
+        )
+    if request.formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"formato debe ser uno de: {', '.join(FORMATOS)}")
+
+    logger.info(f"[{request.correlation_id}] Generando lote TAG: {total} documentos formato={request.formato}")
+
+    mappings = [_tag_parse_text(texto) for texto in request.datos_raw]
+    # Una vez enviado el 200 ya no se puede informar un error: lo previsible se valida antes
+    try:
+        errores = await en_executor(PDF, validar_lote, mappings, TAG_TEMPLATE_PDF)
+    except Exception as e:
+        logger.error(f"[{request.correlation_id}] Error preparando lote TAG: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if errores:
+        raise HTTPException(status_code=400, detail=errores)
+
+    nombre = f"Solicitudes-Tag-{datetime.now().strftime('%Y%m%d_%H%M%S')}.{request.formato}"
+    return StreamingResponse(
+        stream_lote(
+            mappings, request.formato, TAG_TEMPLATE_PDF,
+            executor=get_process_pool(), ventana=2 * procesos_pdf()
+        ),
+        media_type="application/zip" if request.formato == FORMATO_ZIP else "application/pdf",
+        headers={
+            "Content-Disposition": f'attachment; filename="{nombre}"',
+        }
+    )
+
+
 # ---------------------------------------------------------------------------
 # /api/mail/enviar
 # ---------------------------------------------------------------------------
 @app.post("/api/mail/enviar", response_model=EjecutarResponse)
+@idempotente("/api/mail/enviar")
 async def enviar_mail(
     request: MailRequest,
     _auth: bool = Depends(verificar_token)
@@ -456,16 +673,20 @@ async def enviar_mail(
                 correlation_id=request.correlation_id
             )
 
-        # Generate email content
-        asunto, cuerpo = generar_email_desde_plantilla(
+        # Generate email content (lee plantilla/config desde disco)
+        asunto, cuerpo = await en_executor(
+            SMTP,
+            generar_email_desde_plantilla,
             datos_propietario=request.datos_propietario,
             vehiculo=request.vehiculo,
             precio_acordado=request.precio_acordado,
             fecha_pago=request.fecha_pago
         )
 
-        # Send
-        exito, msg = enviar_email_smtp(
+        # Send (smtplib es bloqueante: fuera del event loop)
+        exito, msg = await en_executor(
+            SMTP,
+            enviar_email_smtp,
             destinatario=request.email_to,
             asunto=asunto,
             cuerpo=cuerpo,
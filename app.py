@@ -14,9 +14,13 @@ from pathlib import Path
 
 from src.config import settings, validar_credenciales
 from src.models import parsear_texto_contrato, ContratoData
-from src.autotramite import crear_contrato_autotramite, LoginFailedError
+from src.stage_events import linea_a_evento
+from src.worker import WorkerNoDisponibleError, WorkerResultadoDesconocidoError, asegurar_worker
 from src.logging_utils import get_logger
 from src.auth_utils import verify_password
+from src.parsers import mapping_tag
+from src.tag_cache import pdf_tag
+from src.tag_pdf import guardar_pdf
 
 logger = get_logger(__name__, level=settings.log_level)
 
@@ -24,36 +28,12 @@ TAG_DIR = Path(__file__).parent / 'docs' / 'tag'
 TAG_TEMPLATE_PDF = TAG_DIR / 'PDF-EJEMPLO.pdf'
 TAG_OUTPUT_DIR = TAG_DIR / 'output'
 
-TAG_MONTHS = {
-    1: 'ENERO', 2: 'FEBRERO', 3: 'MARZO', 4: 'ABRIL', 5: 'MAYO', 6: 'JUNIO',
-    7: 'JULIO', 8: 'AGOSTO', 9: 'SEPTIEMBRE', 10: 'OCTUBRE', 11: 'NOVIEMBRE', 12: 'DICIEMBRE'
-}
-
 TAG_REQUIRED_FIELDS = [
     'CAMPO1', 'CAMPO2', 'CAMPO3', 'CAMPO4', 'CAMPO5',
     'CAMPO7', 'CAMPO8', 'CAMPO9', 'CAMPO10',
     'CAMPO11', 'CAMPO12', 'CAMPO13', 'CAMPO14', 'CAMPO15'
 ]
 
-TAG_FIELD_NAME_MAP = {
-    'CAMPO1': 'En Santiago  a',
-    'CAMPO2': 'de',
-    'CAMPO3': 'de_2',
-    'CAMPO4': 'dondo\u00f1a',
-    'CAMPO5': 'RUT',
-    'CAMPO6': 'Giro',
-    'CAMPO7': 'domiciliado a en',
-    'CAMPO8': 'comuna',
-    'CAMPO9': 'ciudad',
-    'CAMPO10': 'fono',
-    'CAMPO11': 'mail',
-    'CAMPO12': 'undefined',
-    'CAMPO13': 'Tag asignado',
-    'CAMPO14': '1 Que es propietario mero tenedor yo responsable del veh\u00edculo Placa Patente \u00danica',
-    'CAMPO15': 'Patente \u00danica',
-    'CAMPO16': 'undefined_2',
-}
-
 
 def _upload_pdf_s3(local_path: Path) -> str:
     try:
@@ -136,137 +116,17 @@ def _upload_pdf_if_configured(local_path: Path) -> str | None:
     raise RuntimeError("PDF_STORAGE_BACKEND debe ser 's3' o 'gcs'.")
 
 
-def _tag_normalize_rut(value: str) -> str:
-    if not value:
-        return ''
-    cleaned = re.sub(r'[^0-9Kk]', '', value).upper()
-    if len(cleaned) < 2:
-        return cleaned
-    return f"{cleaned[:-1]}-{cleaned[-1]}"
-
-
-def _tag_normalize_phone(value: str) -> str:
-    if not value:
-        return ''
-    digits = re.sub(r'\D', '', value)
-    if digits.startswith('56'):
-        digits = digits[2:]
-    if len(digits) > 9:
-        digits = digits[-9:]
-    return digits
-
-
-def _tag_normalize_patente(value: str) -> str:
-    if not value:
-        return ''
-    cleaned = re.sub(r'[^A-Za-z0-9]', '', value).upper()
-    if len(cleaned) < 2:
-        return cleaned
-    return f"{cleaned[:-1]}-{cleaned[-1]}"
-
-
-def _tag_split_email(value: str):
-    if not value or '@' not in value:
-        return '', ''
-    user, domain = value.split('@', 1)
-    return user.strip().upper(), domain.strip().upper()
-
-
 def _tag_parse_text(
     text: str,
     patente_override: str = '',
     tag_override: str = '',
     fecha_override=None,
 ) -> dict:
-    def find(pattern):
-        match = re.search(pattern, text, flags=re.IGNORECASE | re.MULTILINE)
-        return match.group(1).strip() if match else ''
-
-    nombre = find(r'^\s*Nombre\s*:\s*(.+)$').upper()
-    rut = _tag_normalize_rut(find(r'^\s*RUT\s*:\s*(.+)$'))
-    direccion_raw = find(r'^\s*Direccion\s*:\s*(.+)$')
-    telefono = _tag_normalize_phone(find(r'^\s*Telefono\s*:\s*(.+)$'))
-    correo = find(r'^\s*Correo\s*:\s*(.+)$')
-    patente_texto = find(r'^\s*PATENTE\s*:\s*(.+)$')
-    tag_texto = find(r'^\s*TAG\s*[:\-]?\s*(.+)$')
-    patente = _tag_normalize_patente((patente_override or patente_texto).upper())
-    tag = (tag_override or tag_texto).upper()
-
-    direccion_raw = direccion_raw.rstrip('.')
-    if ',' in direccion_raw:
-        direccion_1, comuna = [p.strip() for p in direccion_raw.split(',', 1)]
-    else:
-        parts = direccion_raw.split()
-        direccion_1 = ' '.join(parts[:-1]).strip()
-        comuna = parts[-1].strip() if parts else ''
-
-    email_user, email_domain = _tag_split_email(correo)
-
-    fecha_base = fecha_override or datetime.now().date()
-    dia = f"{fecha_base.day:02d}"
-    mes = TAG_MONTHS[fecha_base.month]
-    ano = f"{fecha_base.year}"
-
-    mapping = {
-        'CAMPO1': dia,
-        'CAMPO2': mes,
-        'CAMPO3': ano,
-        'CAMPO4': nombre,
-        'CAMPO5': rut,
-        'CAMPO6': '',
-        'CAMPO7': direccion_1,
-        'CAMPO8': comuna.upper(),
-        'CAMPO9': comuna.upper(),
-        'CAMPO10': telefono,
-        'CAMPO11': email_user,
-        'CAMPO12': email_domain,
-        'CAMPO13': tag,
-        'CAMPO14': patente,
-        'CAMPO15': patente,
-        'CAMPO16': '',
-    }
-
-    return {k: (v.upper() if isinstance(v, str) else v) for k, v in mapping.items()}
+    return mapping_tag(text, patente=patente_override, tag=tag_override, fecha=fecha_override)
 
 
 def _tag_fill_pdf(mapping: dict, template_path: Path, output_path: Path) -> None:
-    try:
-        from pypdf import PdfReader, PdfWriter
-        from pypdf.generic import NameObject, BooleanObject
-    except Exception:
-        raise RuntimeError('pypdf no esta instalado. Instala con: pip install pypdf')
-
-    reader = PdfReader(str(template_path))
-    writer = PdfWriter()
-    if hasattr(writer, 'clone_document_from_reader'):
-        writer.clone_document_from_reader(reader)
-    else:
-        writer.append_pages_from_reader(reader)
-        acroform = reader.trailer.get('/Root', {}).get('/AcroForm')
-        if acroform:
-            writer._root_object.update({NameObject('/AcroForm'): acroform})
-
-    fields = reader.get_fields() or {}
-    target_fields = list(TAG_FIELD_NAME_MAP.values())
-    missing_fields = [name for name in target_fields if name not in fields]
-    if missing_fields:
-        raise RuntimeError(
-            f"Campos no encontrados en PDF: {missing_fields}. "
-            "Revisa nombres reales con get_fields()."
-        )
-
-    pdf_mapping = {TAG_FIELD_NAME_MAP[key]: value for key, value in mapping.items()}
-
-    for page in writer.pages:
-        writer.update_page_form_field_values(page, pdf_mapping)
-
-    if writer._root_object.get('/AcroForm'):
-        writer._root_object['/AcroForm'].update({
-            NameObject('/NeedAppearances'): BooleanObject(True)
-        })
-
-    with open(output_path, 'wb') as f:
-        writer.write(f)
+    guardar_pdf(pdf_tag(mapping, template_path).datos, output_path)
 
 
 # Configuración de página
@@ -988,6 +848,67 @@ if st.session_state.view == 'mail':
         st.info('Revisa el archivo docs/correo-cierre/mail_config.yaml')
         st.stop()
 
+    # Envío masivo: CSV -> outbox persistente -> worker con rate limit
+    with st.expander('📦 Envío masivo (CSV)', expanded=bool(st.session_state.get('mail_lote_id'))):
+        from src.mail_outbox import (
+            ENVIADO, ENVIANDO, FALLIDO, PENDIENTE,
+            encolar_lote,
+            leer_csv_cierres,
+            obtener_worker_outbox,
+        )
+        from src.rate_limit import mensajes_por_minuto_smtp
+
+        st.caption(
+            'Columnas: email_destino, precio_acordado, fecha_pago y ficha_registro '
+            '(o datos_propietario + vehiculo); cc opcional. '
+            f'Límite de envío: {mensajes_por_minuto_smtp():.0f} correos/minuto.'
+        )
+        archivo_csv = st.file_uploader('Archivo CSV de cierres', type=['csv'], key='mail_csv')
+        if archivo_csv is not None:
+            filas_csv, errores_csv = leer_csv_cierres(archivo_csv.getvalue())
+            for error in errores_csv:
+                st.warning(error)
+            if filas_csv and st.button(f'📤 Encolar {len(filas_csv)} correo(s)', use_container_width=True):
+                worker_outbox = obtener_worker_outbox()
+                lote_id, errores_lote = encolar_lote(worker_outbox.outbox, filas_csv)
+                worker_outbox.despertar()
+                st.session_state.mail_lote_id = lote_id
+                for error in errores_lote:
+                    st.error(error)
+
+        lote_id = st.session_state.get('mail_lote_id')
+        if lote_id:
+            worker_outbox = obtener_worker_outbox()
+            resumen_lote = worker_outbox.outbox.resumen(lote_id)
+            col_p, col_e, col_ok, col_f = st.columns(4)
+            col_p.metric('⏳ Pendientes', resumen_lote[PENDIENTE])
+            col_e.metric('📤 Enviando', resumen_lote[ENVIANDO])
+            col_ok.metric('✅ Enviados', resumen_lote[ENVIADO])
+            col_f.metric('❌ Fallidos', resumen_lote[FALLIDO])
+            st.dataframe(
+                [
+                    {
+                        'Destinatario': m['destinatario'],
+                        'Vehículo': m['vehiculo'],
+                        'Estado': m['estado'],
+                        'Intentos': m['intentos'],
+                        'Detalle': m['mensaje'] or '',
+                    }
+                    for m in worker_outbox.outbox.listar(lote_id)
+                ],
+                use_container_width=True,
+                hide_index=True,
+            )
+            col_actualizar, col_reintentar = st.columns(2)
+            with col_actualizar:
+                if st.button('🔄 Actualizar estado', use_container_width=True):
+                    st.rerun()
+            with col_reintentar:
+                if resumen_lote[FALLIDO] and st.button('↩️ Reintentar fallidos', use_container_width=True):
+                    worker_outbox.outbox.reintentar_fallidos(lote_id)
+                    worker_outbox.despertar()
+                    st.rerun()
+
     # Cargar ejemplo
     example_mail_text = ''
     example_path = Path('docs/autotramite/test.md')
@@ -1345,21 +1266,115 @@ AUTOTRAMITE_STAGES = [
 ]
 
 
+# Etapas del motor (src/stage_events.py) -> etapa mostrada en la UI
+_STAGE_POR_EVENTO = {
+    ('browser_launch', 'inicio'): 'boot',
+    ('login', 'inicio'): 'login',
+    ('login', 'fin'): 'login_ok',
+    ('form_goto', 'inicio'): 'form',
+    ('fill_vehiculo', 'inicio'): 'form',
+    ('fill_vendedor', 'inicio'): 'form',
+    ('fill_comprador', 'inicio'): 'form',
+    ('fill_configuracion', 'inicio'): 'form',
+    ('preview', 'inicio'): 'preview',
+    ('pdf_capture', 'inicio'): 'preview',
+    ('register', 'inicio'): 'register',
+}
+
+
+def _stage_de_evento(evento: dict) -> str | None:
+    """Etapa de la UI para un evento de etapa del motor (None si no cambia la etapa)"""
+    return _STAGE_POR_EVENTO.get((evento.get('etapa'), evento.get('estado')))
+
+
 def _detectar_stage_autotramite(linea: str) -> str | None:
-    texto = linea.lower()
-    if 'iniciando login en autotramite' in texto:
-        return 'login'
-    if 'login exitoso' in texto:
-        return 'login_ok'
-    if 'llenando formulario de contrato' in texto:
-        return 'form'
-    if 'previsualizando contrato' in texto:
-        return 'preview'
-    if 'registrando operacion' in texto:
-        return 'register'
-    if 'operación completada exitosamente' in texto or 'operacion completada exitosamente' in texto:
-        return 'done'
-    return None
+    """Etapa de la UI a partir de una línea STAGE_EVENT del CLI (None si no es evento)"""
+    evento = linea_a_evento(linea)
+    if evento is None:
+        return None
+    return _stage_de_evento(evento)
+
+
+def _ejecutar_autotramite_cli(cmd: list[str], result_path: Path, on_stage) -> tuple[dict, str | None]:
+    """
+    Ejecuta run_autotramite_cli.py en un proceso aparte (sin worker)
+
+    Args:
+        cmd: Comando completo del CLI
+        result_path: Archivo JSON donde el CLI deja el resultado
+        on_stage: Callback con la etapa de la UI detectada en cada línea
+
+    Returns:
+        tuple: (resultado, líneas de error del CLI o None)
+    """
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding='utf-8',
+        errors='replace',
+        bufsize=1,
+    )
+
+    stdout_lines: list[str] = []
+    assert proc.stdout is not None
+    for raw_line in iter(proc.stdout.readline, ''):
+        line = raw_line.strip()
+        if not line:
+            continue
+        stdout_lines.append(line)
+
+        stage_detectada = _detectar_stage_autotramite(line)
+        if stage_detectada:
+            on_stage(stage_detectada)
+
+    proc.wait()
+    stdout_text = '\n'.join(stdout_lines).strip()
+
+    error_lines = [
+        line for line in stdout_lines
+        if ' - ERROR - ' in line or line.startswith('Traceback')
+    ]
+    stderr_text = '\n'.join(error_lines[-8:]).strip()
+
+    if result_path.exists():
+        try:
+            resultado = json.loads(result_path.read_text(encoding='utf-8').strip())
+        except Exception:
+            resultado = {
+                'success': False,
+                'error': 'Failed to parse CLI result file',
+                'raw_output': stdout_text,
+            }
+    elif stdout_text:
+        # Fallback: try parse last JSON line
+        json_line = None
+        for line in stdout_text.splitlines()[::-1]:
+            if line.strip().startswith('{') and line.strip().endswith('}'):
+                json_line = line.strip()
+                break
+        if json_line:
+            try:
+                resultado = json.loads(json_line)
+            except Exception:
+                resultado = {
+                    'success': False,
+                    'error': 'Failed to parse CLI output',
+                    'raw_output': stdout_text,
+                }
+        else:
+            resultado = {
+                'success': False,
+                'error': 'CLI returned no JSON',
+                'raw_output': stdout_text,
+            }
+    else:
+        resultado = {
+            'success': False,
+            'error': 'CLI returned no output',
+        }
+    return resultado, stderr_text or None
 
 
 def _stage_info(stage_key: str) -> tuple[str, int]:
@@ -1636,104 +1651,64 @@ if st.session_state.contrato_parsed and not st.session_state.errores_validacion:
                 pdf_path = output_dir / f'preview_{contrato.vehiculo.patente}_{timestamp}.pdf'
                 st.session_state.pdf_path = str(pdf_path)
 
-                # Guardar input para el CLI
-                input_path = output_dir / f'input_{contrato.vehiculo.patente}_{timestamp}.txt'
-                input_path.write_text(texto_input, encoding='utf-8')
-                result_path = output_dir / f'result_{contrato.vehiculo.patente}_{timestamp}.json'
-
-                cmd = [
-                    sys.executable,
-                    str(Path(__file__).parent / 'run_autotramite_cli.py'),
-                    '--input', str(input_path),
-                    '--output', str(pdf_path),
-                    '--result', str(result_path),
-                ]
-                if dry_run:
-                    cmd.append('--dry-run')
-                if st.session_state.autotramite_tasacion_override:
-                    cmd.extend(['--tasacion', st.session_state.autotramite_tasacion_override])
-                if st.session_state.autotramite_venta_override:
-                    cmd.extend(['--venta', st.session_state.autotramite_venta_override])
-
                 stage_index = {stage[0]: idx for idx, stage in enumerate(AUTOTRAMITE_STAGES)}
-                stage_actual = 'boot'
-                stage_label, stage_pct = _stage_info(stage_actual)
+                stage_actual = {'key': 'boot'}
+                stage_label, stage_pct = _stage_info(stage_actual['key'])
                 status = st.status(stage_label, expanded=True)
                 progress = st.progress(stage_pct)
                 etapa_placeholder = st.empty()
                 etapa_placeholder.caption(f'Etapa actual: {stage_label}')
 
-                proc = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    encoding='utf-8',
-                    errors='replace',
-                    bufsize=1,
-                )
-
-                stdout_lines: list[str] = []
-                assert proc.stdout is not None
-                for raw_line in iter(proc.stdout.readline, ''):
-                    line = raw_line.strip()
-                    if not line:
-                        continue
-                    stdout_lines.append(line)
-
-                    stage_detectada = _detectar_stage_autotramite(line)
-                    if stage_detectada and stage_index[stage_detectada] >= stage_index[stage_actual]:
-                        stage_actual = stage_detectada
-                        stage_label, stage_pct = _stage_info(stage_actual)
-                        status.update(label=stage_label, state='running', expanded=True)
-                        progress.progress(stage_pct)
-                        etapa_placeholder.caption(f'Etapa actual: {stage_label}')
-
-                proc.wait()
-                stdout_text = '\n'.join(stdout_lines).strip()
-
-                error_lines = [
-                    line for line in stdout_lines
-                    if ' - ERROR - ' in line or line.startswith('Traceback')
-                ]
-                stderr_text = '\n'.join(error_lines[-8:]).strip()
-
-                if result_path.exists():
+                def _avanzar_stage(stage_detectada: str | None) -> None:
+                    if stage_detectada and stage_index[stage_detectada] >= stage_index[stage_actual['key']]:
+                        stage_actual['key'] = stage_detectada
+                        label, pct = _stage_info(stage_detectada)
+                        status.update(label=label, state='running', expanded=True)
+                        progress.progress(pct)
+                        etapa_placeholder.caption(f'Etapa actual: {label}')
+
+                resultado = None
+                stderr_text = None
+                if settings.worker_enabled:
+                    # Worker persistente: Chromium ya lanzado y sesión en cache
                     try:
-                        resultado = json.loads(result_path.read_text(encoding='utf-8').strip())
-                    except Exception:
-                        resultado = {
-                            'success': False,
-                            'error': 'Failed to parse CLI result file',
-                            'raw_output': stdout_text,
-                        }
-                elif stdout_text:
-                    # Fallback: try parse last JSON line
-                    json_line = None
-                    for line in stdout_text.splitlines()[::-1]:
-                        if line.strip().startswith('{') and line.strip().endswith('}'):
-                            json_line = line.strip()
-                            break
-                    if json_line:
-                        try:
-                            resultado = json.loads(json_line)
-                        except Exception:
-                            resultado = {
-                                'success': False,
-                                'error': 'Failed to parse CLI output',
-                                'raw_output': stdout_text,
-                            }
-                    else:
-                        resultado = {
-                            'success': False,
-                            'error': 'CLI returned no JSON',
-                            'raw_output': stdout_text,
-                        }
-                else:
-                    resultado = {
-                        'success': False,
-                        'error': 'CLI returned no output',
-                    }
+                        resultado = asegurar_worker().ejecutar(
+                            texto_input,
+                            str(pdf_path),
+                            dry_run=dry_run,
+                            tasacion=st.session_state.autotramite_tasacion_override or None,
+                            venta=st.session_state.autotramite_venta_override or None,
+                            on_evento=lambda evento: _avanzar_stage(_stage_de_evento(evento)),
+                        )
+                    except WorkerNoDisponibleError as e:
+                        logger.warning(f'Worker no disponible, se usa el CLI: {str(e)}')
+                    except WorkerResultadoDesconocidoError as e:
+                        # El worker ya tenía el trabajo: reintentar podría registrar el contrato dos veces
+                        logger.error(f'Resultado desconocido del worker (correlation_id={e.correlation_id}): {str(e)}')
+                        resultado = e.a_resultado()
+
+                if resultado is None:
+                    # Guardar input para el CLI
+                    input_path = output_dir / f'input_{contrato.vehiculo.patente}_{timestamp}.txt'
+                    input_path.write_text(texto_input, encoding='utf-8')
+                    result_path = output_dir / f'result_{contrato.vehiculo.patente}_{timestamp}.json'
+
+                    cmd = [
+                        sys.executable,
+                        str(Path(__file__).parent / 'run_autotramite_cli.py'),
+                        '--local',
+                        '--input', str(input_path),
+                        '--output', str(pdf_path),
+                        '--result', str(result_path),
+                    ]
+                    if dry_run:
+                        cmd.append('--dry-run')
+                    if st.session_state.autotramite_tasacion_override:
+                        cmd.extend(['--tasacion', st.session_state.autotramite_tasacion_override])
+                    if st.session_state.autotramite_venta_override:
+                        cmd.extend(['--venta', st.session_state.autotramite_venta_override])
+
+                    resultado, stderr_text = _ejecutar_autotramite_cli(cmd, result_path, _avanzar_stage)
 
                 if resultado.get('success'):
                     final_label, final_pct = _stage_info('done')
@@ -1742,10 +1717,10 @@ if st.session_state.contrato_parsed and not st.session_state.errores_validacion:
                     etapa_placeholder.caption(f'Etapa final: {final_label}')
                 else:
                     status.update(label='❌ Error durante la ejecucion', state='error', expanded=True)
-                    etapa_placeholder.caption(f'Ultima etapa alcanzada: {_stage_info(stage_actual)[0]}')
+                    etapa_placeholder.caption(f'Ultima etapa alcanzada: {_stage_info(stage_actual["key"])[0]}')
 
                 st.session_state.resultado = resultado
-                st.session_state.cli_error = stderr_text or None
+                st.session_state.cli_error = stderr_text
                 st.rerun()
 
             except Exception as e:
@@ -1778,6 +1753,13 @@ if st.session_state.resultado:
             if resultado.get('duracion_segundos') is not None:
                 st.metric('Duración', f"{resultado.get('duracion_segundos')}s")
 
+        if resultado.get('timings'):
+            with st.expander('⏱️ Tiempos por etapa'):
+                st.table([
+                    {'Etapa': etapa, 'Segundos': segundos}
+                    for etapa, segundos in resultado['timings'].items()
+                ])
+
         if resultado.get('mensaje'):
             st.info(f"ℹ️ {resultado.get('mensaje')}")
 
@@ -1818,6 +1800,17 @@ if st.session_state.resultado:
             st.session_state.autotramite_upload_error = None
             st.rerun()
     
+    elif resultado.get('resultado_desconocido'):
+        st.warning('⚠️ Resultado desconocido')
+        st.markdown(
+            f"Se perdió la conexión con el worker después de enviar el contrato "
+            f"(correlation_id `{resultado.get('correlation_id')}`). Puede haber quedado registrado: "
+            "revisar en el portal AutoTramite antes de volver a ejecutarlo."
+        )
+        if st.button('🔄 Volver', use_container_width=True):
+            st.session_state.resultado = None
+            st.rerun()
+
     else:
         st.error('❌ Error en la Operación')
 
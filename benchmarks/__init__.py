@@ -0,0 +1,3 @@
+"""
+Benchmarks y servidores de prueba locales (no se despliegan)
+"""
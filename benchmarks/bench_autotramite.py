@@ -0,0 +1,289 @@
+"""
+Benchmark end-to-end del motor AutoTramite contra el portal simulado
+
+Levanta benchmarks.mock_portal en un thread, apunta `settings` al mock y
+procesa N contratos por nivel de concurrencia. Reporta contratos/minuto,
+latencia p50/p95 por contrato y memoria (RSS del proceso + Chromium).
+
+Uso:
+    python -m benchmarks.bench_autotramite --contracts 20 --concurrency 1,2,4 --latency-ms 150
+
+Modos:
+    batch        crear_contratos_autotramite_batch con K páginas (un login)
+    independent  K llamadas concurrentes a crear_contrato_autotramite (pool de K navegadores)
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+from benchmarks.mock_portal import MockPortal, MockPortalConfig
+from src.config import settings
+from src.models import ContratoData, ContratoResult, parsear_texto_contrato
+from src.session_cache import login_lock, session_cache
+
+TEXTO_CONTRATO = """Inscripcion : BCDF.12-3
+DATOS DEL VEHICULO
+Tipo Vehiculo : AUTOMOVIL Ano : 2018
+Marca : TOYOTA
+Modelo : YARIS 1.5
+Nro. Motor : 1NZ1234567
+Nro. Chasis : JTDBT123456789012
+Color : BLANCO
+
+DATOS DEL VENDEDOR
+Nombre : JUAN ANDRES PEREZ SOTO
+R.U.N. : 12.345.678-5
+Direccion: AV PROVIDENCIA 1234, PROVIDENCIA. SANTIAGO
+Telefono: 912345678
+Correo: vendedor@ejemplo.cl
+
+DATOS COMPRADOR
+Nombre: MARIA JOSE GONZALEZ ROJAS
+RUT: 11.111.111-1
+Direccion: LOS LEONES 456, PROVIDENCIA. SANTIAGO
+Telefono: 987654321
+Correo: comprador@ejemplo.cl
+
+TASACION 8.000.000
+VENTA 7.500.000"""
+
+
+def contratos_de_prueba(cantidad: int) -> list[ContratoData]:
+    """Genera `cantidad` contratos válidos con patentes distintas"""
+    base, errores = parsear_texto_contrato(TEXTO_CONTRATO)
+    if errores or base is None:
+        raise RuntimeError(f'Contrato de prueba inválido: {errores}')
+    contratos = []
+    for i in range(cantidad):
+        contrato = base.model_copy(deep=True)
+        contrato.vehiculo.patente = f'BC{i // 100:02d}{i % 100:02d}'
+        contratos.append(contrato)
+    return contratos
+
+
+def _rss_proceso_mb(pid: int) -> float:
+    try:
+        with open(f'/proc/{pid}/status', encoding='ascii', errors='ignore') as f:
+            for linea in f:
+                if linea.startswith('VmRSS:'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def rss_arbol_mb() -> float:
+    """
+    RSS del proceso actual y sus descendientes (driver de Playwright y Chromium)
+
+    Usa psutil si está instalado; si no, recorre /proc (Linux). En otros
+    sistemas retorna el pico de RSS del proceso propio.
+    """
+    try:
+        import psutil  # Opcional
+        proceso = psutil.Process()
+        procesos = [proceso] + proceso.children(recursive=True)
+        total = 0
+        for p in procesos:
+            try:
+                total += p.memory_info().rss
+            except psutil.Error:
+                continue
+        return total / (1024 * 1024)
+    except ImportError:
+        pass
+
+    if os.path.isdir('/proc'):
+        hijos: dict[int, list[int]] = {}
+        for entrada in os.listdir('/proc'):
+            if not entrada.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entrada}/stat', encoding='ascii', errors='ignore') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+                hijos.setdefault(ppid, []).append(int(entrada))
+            except (OSError, IndexError, ValueError):
+                continue
+        pendientes, total = [os.getpid()], 0.0
+        while pendientes:
+            pid = pendientes.pop()
+            total += _rss_proceso_mb(pid)
+            pendientes.extend(hijos.get(pid, []))
+        return total
+
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentil(valores: list[float], p: float) -> float:
+    """Percentil por interpolación lineal (p en 0..100)"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    if len(ordenados) == 1:
+        return ordenados[0]
+    k = (len(ordenados) - 1) * p / 100
+    inferior = int(k)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (k - inferior)
+
+
+async def _ejecutar_nivel(
+    contratos: list[ContratoData],
+    concurrencia: int,
+    modo: str,
+    dry_run: bool,
+    salida: Path
+) -> tuple[list[ContratoResult], float, float]:
+    """Corre un nivel de concurrencia; retorna resultados, segundos y pico de RSS (MB)"""
+    from src.autotramite import crear_contrato_autotramite, crear_contratos_autotramite_batch
+    from src.browser_pool import cerrar_browser_pool
+
+    pico_rss = 0.0
+    terminado = asyncio.Event()
+
+    async def muestrear_memoria() -> None:
+        nonlocal pico_rss
+        while not terminado.is_set():
+            pico_rss = max(pico_rss, rss_arbol_mb())
+            try:
+                await asyncio.wait_for(terminado.wait(), timeout=0.5)
+            except asyncio.TimeoutError:
+                pass
+
+    muestreo = asyncio.create_task(muestrear_memoria())
+    inicio = time.perf_counter()
+    try:
+        paths = [str(salida / f'c{concurrencia}_{i:03d}.pdf') for i in range(len(contratos))]
+        if modo == 'batch':
+            resultados = await crear_contratos_autotramite_batch(
+                contratos, dry_run=dry_run, screenshot_paths=paths, paralelismo=concurrencia
+            )
+        else:
+            semaforo = asyncio.Semaphore(concurrencia)
+
+            async def uno(contrato: ContratoData, path: str) -> ContratoResult:
+                async with semaforo:
+                    return await crear_contrato_autotramite(contrato, dry_run=dry_run, screenshot_path=path)
+
+            resultados = list(await asyncio.gather(*(uno(c, p) for c, p in zip(contratos, paths))))
+        segundos = time.perf_counter() - inicio
+    finally:
+        terminado.set()
+        await muestreo
+        await cerrar_browser_pool()
+    return resultados, segundos, pico_rss
+
+
+def ejecutar_benchmark(
+    cantidad: int,
+    niveles: list[int],
+    modo: str = 'batch',
+    dry_run: bool = False,
+    config_portal: Optional[MockPortalConfig] = None
+) -> list[dict]:
+    """
+    Ejecuta el benchmark para cada nivel de concurrencia
+
+    Returns:
+        list[dict]: Una fila de métricas por nivel
+    """
+    filas = []
+    with tempfile.TemporaryDirectory(prefix='bench_autotramite_') as tmp, \
+            MockPortal(config_portal or MockPortalConfig()) as portal:
+        anteriores = portal.configurar_settings()
+        # Sin rate limit del portal real (el limitador se crea por host, y el
+        # host del mock es nuevo en cada corrida)
+        anteriores['portal_rate_limit_per_second'] = settings.portal_rate_limit_per_second
+        settings.portal_rate_limit_per_second = 0.0
+        # Cache de sesión aislado para no pisar la sesión real
+        paths_cache = (session_cache.path, login_lock.path)
+        session_cache.path = Path(tmp) / 'sesion.enc'
+        login_lock.path = Path(tmp) / 'sesion.lock'
+        try:
+            for concurrencia in niveles:
+                if modo == 'independent':
+                    anteriores.setdefault('browser_pool_size', settings.browser_pool_size)
+                    settings.browser_pool_size = concurrencia
+                contratos = contratos_de_prueba(cantidad)
+                salida = Path(tmp) / f'nivel_{concurrencia}'
+                salida.mkdir()
+                resultados, segundos, pico_rss = asyncio.run(
+                    _ejecutar_nivel(contratos, concurrencia, modo, dry_run, salida)
+                )
+                latencias = [r.duracion_segundos or 0.0 for r in resultados if r.success]
+                exitosos = len(latencias)
+                filas.append({
+                    'concurrencia': concurrencia,
+                    'modo': modo,
+                    'contratos': cantidad,
+                    'exitosos': exitosos,
+                    'fallidos': cantidad - exitosos,
+                    'segundos': round(segundos, 2),
+                    'contratos_por_minuto': round(exitosos / segundos * 60, 1) if segundos > 0 else 0.0,
+                    'p50_s': round(percentil(latencias, 50), 2),
+                    'p95_s': round(percentil(latencias, 95), 2),
+                    'media_s': round(statistics.fmean(latencias), 2) if latencias else 0.0,
+                    'rss_pico_mb': round(pico_rss, 1),
+                    'requests_portal': dict(portal.estado.requests),
+                    'fallas_inyectadas': portal.estado.fallas,
+                })
+                portal.estado.requests.clear()
+                portal.estado.fallas = 0
+        finally:
+            MockPortal.restaurar_settings(anteriores)
+            session_cache.path, login_lock.path = paths_cache
+    return filas
+
+
+def _imprimir_tabla(filas: list[dict]) -> None:
+    columnas = ['concurrencia', 'exitosos', 'fallidos', 'segundos', 'contratos_por_minuto', 'p50_s', 'p95_s', 'rss_pico_mb']
+    anchos = {c: max(len(c), *(len(str(f[c])) for f in filas)) for c in columnas}
+    print('  '.join(c.rjust(anchos[c]) for c in columnas))
+    for fila in filas:
+        print('  '.join(str(fila[c]).rjust(anchos[c]) for c in columnas))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark AutoTramite contra el portal simulado.')
+    parser.add_argument('--contracts', type=int, default=10, help='Contratos por nivel')
+    parser.add_argument('--concurrency', default='1,2,4', help='Niveles de concurrencia (coma)')
+    parser.add_argument('--mode', choices=['batch', 'independent'], default='batch')
+    parser.add_argument('--dry-run', action='store_true', help='Solo previsualizar (no registrar)')
+    parser.add_argument('--latency-ms', type=float, default=100.0)
+    parser.add_argument('--jitter-ms', type=float, default=50.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', dest='json_path', help='Guardar resultados en JSON')
+    args = parser.parse_args()
+
+    niveles = [int(n) for n in args.concurrency.split(',') if n.strip()]
+    filas = ejecutar_benchmark(
+        args.contracts,
+        niveles,
+        modo=args.mode,
+        dry_run=args.dry_run,
+        config_portal=MockPortalConfig(
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            fail_rate=args.fail_rate,
+            seed=args.seed,
+        ),
+    )
+    _imprimir_tabla(filas)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(filas, indent=2), encoding='utf-8')
+    return 0 if all(f['fallidos'] == 0 for f in filas) or args.fail_rate > 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
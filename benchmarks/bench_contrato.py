@@ -0,0 +1,209 @@
+"""
+Benchmark del parseo de contratos pegados (CAV + nota de venta)
+
+'antes' reproduce la extracción original: _extraer_bloque recompila la
+alternancia de encabezados en cada llamada, busca cada encabezado y el
+siguiente por separado y corta texto[inicio:] en strings nuevos; cada
+campo se extrae con re.search y el patrón en línea. 'tokenizer' usa
+src.models (una pasada sobre los encabezados, bloques por offsets y
+patrones precompilados). Los textos se agrandan con líneas de relleno en
+cada bloque para simular pegados largos.
+
+Uso:
+    python -m benchmarks.bench_contrato --docs 500 --relleno 0,200,2000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from src.models import (
+    _CAMPOS_PERSONA, _CAMPOS_VEHICULO, _MONTO_TASACION, _MONTO_VENTA, _PATRON_INSCRIPCION,
+    _extraer_monto, _tokenizar_bloques, parsear_texto_contrato,
+)
+
+BLOQUE_VEHICULO = """DATOS DEL VEHICULO
+Tipo Vehiculo : STATION WAGON Ano : 2012
+Marca : HYUNDAI
+Modelo : ELANTRA GLS 1.6
+Nro. Motor : G4FGBU380448
+Nro. Chasis : KMHDH41CACU327103
+Color : ROJO
+"""
+
+BLOQUE_VENDEDOR = """DATOS DEL VENDEDOR
+Nombre : DENNYS EDUARDO PARRA GRANADILLO
+R.U.N. : 26.002.284-9
+Direccion: AV LAS CONDES 12461, LAS CONDES. SANTIAGO
+Telefono: 975400946
+Correo: dparra@queirolo.cl
+"""
+
+BLOQUE_COMPRADOR = """DATOS COMPRADOR
+Nombre: CAROLINA CECILIA CALLES CALLES
+RUT: 26033082-9
+Direccion: SERRANO 266, SANTIAGO CENTRO. SANTIAGO
+Telefono: 975400946
+Correo: comprador@ejemplo.cl
+"""
+
+
+def texto_contrato(relleno: int) -> str:
+    """Contrato de ejemplo con `relleno` líneas extra en cada bloque"""
+    extra = ''.join(f'Anotacion {i} : registro sin datos del formulario\n' for i in range(relleno))
+    return (
+        'Inscripcion : DRLZ.16-3\n'
+        + BLOQUE_VEHICULO + extra + '\n'
+        + BLOQUE_VENDEDOR + extra + '\n'
+        + BLOQUE_COMPRADOR + extra + '\n'
+        + 'TASACION 10.000.000\nVENTA 9.500.000'
+    )
+
+
+# ============================================================================
+# IMPLEMENTACIÓN ORIGINAL
+# ============================================================================
+
+def _extraer(texto: str, regex: str, flags: int = re.IGNORECASE) -> Optional[str]:
+    match = re.search(regex, texto, flags)
+    return match.group(1).strip() if match else None
+
+
+def _extraer_bloque(texto: str, encabezados: list[str], todos_encabezados: list[str]) -> Optional[str]:
+    union_encabezados = '|'.join(f'(?:{h})' for h in todos_encabezados)
+    for encabezado in encabezados:
+        match = re.search(fr'(?im)^\s*(?:{encabezado})\b', texto)
+        if not match:
+            continue
+        resto = texto[match.end():]
+        siguiente = re.search(fr'(?im)^\s*(?:{union_encabezados})\b', resto)
+        if siguiente:
+            return resto[:siguiente.start()].strip()
+        return resto.strip()
+    return None
+
+
+def _extraer_monto_antes(texto: str, etiqueta: str) -> Optional[str]:
+    valor = _extraer(texto, fr'(?im)^\s*{etiqueta}\s*:?\s*\$?\s*([0-9.]+)\s*$')
+    if valor is None:
+        valor = _extraer(texto, fr'\b{etiqueta}\b\s*:?\s*\$?\s*([0-9.]+)')
+    return valor
+
+
+def _persona_antes(bloque: str) -> list:
+    return [
+        _extraer(bloque, r'Nombre\s*:\s*(.+?)(?:\n|R\.?U\.?(?:T|N)\.?)'),
+        _extraer(bloque, r'R\.?U\.?(?:T|N)\.?\s*:\s*([0-9Kk.-]+)'),
+        _extraer(bloque, r'Direcci[oó]n\s*:\s*(.+?)(?:\n|Tel[eé]fono|Correo|Email|$)'),
+        _extraer(bloque, r'Tel[eé]fono\s*:\s*(\d+)'),
+        _extraer(bloque, r'(?:Correo|Email)\s*:\s*(\S+@\S+)'),
+    ]
+
+
+def extraccion_antes(texto: str) -> list:
+    """Patente, bloques y campos como los extraía la versión original"""
+    inscripcion = re.search(
+        r'(?:Inscripci(?:o|ó)n|Inscripcion|Patente)\s*:\s*([A-Z0-9.]+)\s*-\s*([0-9K])', texto, re.IGNORECASE
+    )
+    vehiculo = [r'DATOS\s+(?:DEL\s+)?VEH[IÍ]CULO']
+    vendedor = [r'DATOS\s+(?:DEL\s+)?VENDEDOR', r'DATOS\s+PROPIETARIO']
+    comprador = [r'DATOS\s+(?:DEL\s+)?COMPRADOR', r'DATOS\s+COMPRADOR']
+    todos = vehiculo + vendedor + comprador
+    bloque_vehiculo = _extraer_bloque(texto, vehiculo, todos)
+    bloque_vendedor = _extraer_bloque(texto, vendedor, todos)
+    bloque_comprador = _extraer_bloque(texto, comprador, todos)
+    return [
+        inscripcion.groups(),
+        _extraer(bloque_vehiculo, r'Tipo\s+Veh[ií]culo\s*:\s*(.+?)(?=\s+A[ñn]o\s*:|\n|$)'),
+        _extraer(bloque_vehiculo, r'A[ñn]o\s*:\s*(\d{4})'),
+        _extraer(bloque_vehiculo, r'Marca\s*:\s*(.+?)(?:\n|$)'),
+        _extraer(bloque_vehiculo, r'Modelo\s*:\s*(.+?)(?:\n|$)'),
+        _extraer(bloque_vehiculo, r'Nro\.\s*Motor\s*:\s*([^\n\r]+)'),
+        _extraer(bloque_vehiculo, r'Nro\.\s*(?:Chasis|Vin)\s*:\s*([^\n\r]+)'),
+        _extraer(bloque_vehiculo, r'Color\s*:\s*(.+?)(?:\n|$)'),
+        _extraer_monto_antes(texto, r'TASACI(?:O|Ó)N'),
+        _extraer_monto_antes(texto, r'VENTA'),
+        *_persona_antes(bloque_vendedor),
+        *_persona_antes(bloque_comprador),
+    ]
+
+
+def extraccion_tokenizer(texto: str) -> list:
+    """Los mismos valores con el tokenizer de src.models"""
+    bloques = _tokenizar_bloques(texto)
+    return [
+        _PATRON_INSCRIPCION.search(texto).groups(),
+        *(bloques['vehiculo'].extraer(patron) for patron in _CAMPOS_VEHICULO.values()),
+        _extraer_monto(texto, _MONTO_TASACION),
+        _extraer_monto(texto, _MONTO_VENTA),
+        *(bloques['vendedor'].extraer(patron) for patron in _CAMPOS_PERSONA.values()),
+        *(bloques['comprador'].extraer(patron) for patron in _CAMPOS_PERSONA.values()),
+    ]
+
+
+def _latencia_us(funcion, texto: str, docs: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(docs):
+        funcion(texto)
+    return (time.perf_counter() - inicio) / docs * 1_000_000
+
+
+def ejecutar_benchmark(docs: int, rellenos: list[int]) -> list[dict]:
+    """
+    Mide la extracción y el parseo completo para cada tamaño de texto
+
+    Args:
+        docs: Documentos por medición
+        rellenos: Líneas extra por bloque
+
+    Returns:
+        list[dict]: Una fila por relleno con µs/documento
+    """
+    filas = []
+    for relleno in rellenos:
+        texto = texto_contrato(relleno)
+        contrato, errores = parsear_texto_contrato(texto)
+        if errores:
+            raise RuntimeError(f'El texto de ejemplo no parsea: {errores}')
+        us_antes = _latencia_us(extraccion_antes, texto, docs)
+        us_tokenizer = _latencia_us(extraccion_tokenizer, texto, docs)
+        filas.append({
+            'relleno': relleno,
+            'kb': round(len(texto.encode('utf-8')) / 1024, 1),
+            'us_antes': round(us_antes, 1),
+            'us_tokenizer': round(us_tokenizer, 1),
+            'speedup': round(us_antes / us_tokenizer, 2) if us_tokenizer else 0.0,
+            'us_parseo_completo': round(_latencia_us(parsear_texto_contrato, texto, docs), 1),
+        })
+    return filas
+
+
+def _imprimir_tabla(filas: list[dict]) -> None:
+    columnas = ['relleno', 'kb', 'us_antes', 'us_tokenizer', 'speedup', 'us_parseo_completo']
+    anchos = {c: max(len(c), *(len(str(f[c])) for f in filas)) for c in columnas}
+    print('  '.join(c.rjust(anchos[c]) for c in columnas))
+    for fila in filas:
+        print('  '.join(str(fila[c]).rjust(anchos[c]) for c in columnas))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark del parseo de contratos pegados (original vs tokenizer).')
+    parser.add_argument('--docs', type=int, default=500, help='Documentos por medicion')
+    parser.add_argument('--relleno', default='0,200,2000', help='Lineas extra por bloque (lista)')
+    parser.add_argument('--json', dest='json_path', help='Guardar resultados en JSON')
+    args = parser.parse_args()
+
+    filas = ejecutar_benchmark(args.docs, [int(x) for x in args.relleno.split(',') if x.strip()])
+    _imprimir_tabla(filas)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(filas, indent=2), encoding='utf-8')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Benchmark de parseo de texto pegado: latencia por documento antes y después
+
+'antes' reproduce los parsers originales (un re.search con el patrón en
+línea por campo, sobre todo el texto); 'registro' usa src/parsers.py (una
+regex compilada por formato, una pasada). Se mide cada formato con textos
+de ejemplo y, opcionalmente, con relleno para simular pegados largos.
+
+Uso:
+    python -m benchmarks.bench_parsers --docs 2000 --relleno 0,40
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+from src.parsers import FICHA_REGISTRO, PROPIETARIO, TAG, parsear_correo_raw
+
+TEXTO_TAG = """Nombre: Camilo Ignacio Mena Maldonado
+RUT: 19.001.667-6
+Direccion: Av. Los Leones 1234, Providencia.
+Telefono: +56 9 1234 5678
+Correo: cliente@ejemplo.cl
+PATENTE: KYTR.55-5
+TAG 147258369"""
+
+TEXTO_CORREO = """DATOS_PROPIETARIO:
+Nombre : CAMILO IGNACIO MENA MALDONADO
+R.U.N. : 19.001.667-6
+Fec. adquisición: 07-05-2018
+VEHICULO: CHEVROLET SAIL II 1.4 2013 FPYK.18-2
+PRECIO: LIQUIDO A RECIBIR $5.000.000
+FECHA_PAGO: 01-02-2026 AL 05-02-2026
+EMAIL: cliente@ejemplo.cl
+CC: a@ejemplo.cl, b@ejemplo.cl"""
+
+TEXTO_FICHA = """Inscripción : FPYK.18-2
+DATOS DEL VEHICULO
+Tipo Vehículo : AUTOMOVIL Año : 2013
+Marca : CHEVROLET
+Modelo : SAIL II 1.4
+Nro. Motor : F14D4123456
+Color : GRIS PLATA
+DATOS DEL PROPIETARIO
+Nombre : CAMILO IGNACIO MENA MALDONADO
+R.U.N. : 19.001.667-6
+Fec. adquisición: 07-05-2018
+Repertorio : RVM CATEDRAL"""
+
+
+def _buscar(pattern: str, texto: str) -> str | None:
+    match = re.search(pattern, texto, flags=re.IGNORECASE | re.MULTILINE)
+    return match.group(1).strip() if match else None
+
+
+def tag_antes(texto: str) -> list:
+    return [_buscar(p, texto) for p in (
+        r'^\s*Nombre\s*:\s*(.+)$', r'^\s*RUT\s*:\s*(.+)$', r'^\s*Direccion\s*:\s*(.+)$',
+        r'^\s*Telefono\s*:\s*(.+)$', r'^\s*Correo\s*:\s*(.+)$', r'^\s*PATENTE\s*:\s*(.+)$',
+        r'^\s*TAG\s*[:\-]?\s*(.+)$',
+    )]
+
+
+def correo_antes(texto: str) -> list:
+    datos = _buscar(r'DATOS_PROPIETARIO\s*:\s*(.+?)(?=\n[A-Z]|\Z)', texto)
+    if not datos:
+        match = re.search(r'DATOS_PROPIETARIO\s*:\s*(.+?)(?=\nVEHICULO)', texto, re.IGNORECASE | re.DOTALL)
+        datos = match.group(1).strip() if match else texto
+    return [datos] + [_buscar(p, texto) for p in (
+        r'VEHICULO\s*:\s*(.+)$', r'PRECIO\s*:\s*(.+)$', r'FECHA_PAGO\s*:\s*(.+)$',
+        r'EMAIL\s*:\s*(.+)$', r'CC\s*:\s*(.+)$',
+    )]
+
+
+def ficha_antes(texto: str) -> list:
+    return [_buscar(p, texto) for p in (
+        r'Inscripci[oó]n\s*:\s*(.+?)(?:\r?\n|$)', r'Marca\s*:\s*(.+?)(?:\r?\n|$)',
+        r'Modelo\s*:\s*(.+?)(?:\r?\n|$)', r'A[ñn]o\s*:\s*(\d{4})', r'Nombre\s*:\s*(.+?)(?:\r?\n|$)',
+        r'R\.?U\.?(?:N|T)\.?\s*:\s*(.+?)(?:\r?\n|$)', r'Fec\.?\s*adquisici[oó]n\s*:?\s*(.+?)(?:\r?\n|$)',
+    )]
+
+
+def nombre_antes(texto: str) -> str | None:
+    return _buscar(r'^\s*Nombre\s*:\s*(.+)$', texto)
+
+
+CASOS = [
+    ('tag', TEXTO_TAG, tag_antes, TAG.parsear),
+    ('correo_raw', TEXTO_CORREO, correo_antes, parsear_correo_raw),
+    ('ficha_registro', TEXTO_FICHA, ficha_antes, FICHA_REGISTRO.parsear),
+    ('propietario', TEXTO_FICHA, nombre_antes, PROPIETARIO.parsear),
+]
+
+
+def _relleno(lineas: int) -> str:
+    return ''.join(f'Observacion {i} : sin datos relevantes para el formulario\n' for i in range(lineas))
+
+
+def _latencia_us(parsear, texto: str, docs: int) -> float:
+    inicio = time.perf_counter()
+    for _ in range(docs):
+        parsear(texto)
+    return (time.perf_counter() - inicio) / docs * 1_000_000
+
+
+def ejecutar_benchmark(docs: int, rellenos: list[int]) -> list[dict]:
+    """
+    Parsea `docs` veces cada formato con cada implementación
+
+    Args:
+        docs: Documentos por medición
+        rellenos: Líneas sin campos que se anteponen al texto (0 = texto tal cual)
+
+    Returns:
+        list[dict]: Una fila por formato y relleno con µs/documento
+    """
+    filas = []
+    for lineas in rellenos:
+        for formato, texto, antes, registro in CASOS:
+            texto = _relleno(lineas) + texto
+            us_antes = _latencia_us(antes, texto, docs)
+            us_registro = _latencia_us(registro, texto, docs)
+            filas.append({
+                'formato': formato,
+                'relleno': lineas,
+                'us_antes': round(us_antes, 2),
+                'us_registro': round(us_registro, 2),
+                'speedup': round(us_antes / us_registro, 2) if us_registro else 0.0,
+            })
+    return filas
+
+
+def _imprimir_tabla(filas: list[dict]) -> None:
+    columnas = ['formato', 'relleno', 'us_antes', 'us_registro', 'speedup']
+    anchos = {c: max(len(c), *(len(str(f[c])) for f in filas)) for c in columnas}
+    print('  '.join(c.rjust(anchos[c]) for c in columnas))
+    for fila in filas:
+        print('  '.join(str(fila[c]).rjust(anchos[c]) for c in columnas))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark de parseo de texto pegado (regex por campo vs registro).')
+    parser.add_argument('--docs', type=int, default=2000, help='Documentos por medicion')
+    parser.add_argument('--relleno', default='0,40', help='Lineas de relleno antes del texto (lista)')
+    parser.add_argument('--json', dest='json_path', help='Guardar resultados en JSON')
+    args = parser.parse_args()
+
+    filas = ejecutar_benchmark(args.docs, [int(x) for x in args.relleno.split(',') if x.strip()])
+    _imprimir_tabla(filas)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(filas, indent=2), encoding='utf-8')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,283 @@
+"""
+Servidor SMTP local (stand-in) y benchmark de envío con/sin pool de conexiones
+
+El stand-in habla lo justo de SMTP para smtplib (EHLO, AUTH PLAIN/LOGIN,
+MAIL, RCPT, DATA, NOOP, RSET, QUIT) y simula el costo del handshake
+(conexión + TLS + login) con una latencia configurable.
+
+Uso:
+    python -m benchmarks.bench_smtp --messages 50 --handshake-ms 150 --concurrency 1,4
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from src.config import settings
+
+USUARIO = 'bench@smtp.local'
+PASSWORD = 'bench'
+
+
+@dataclass
+class SMTPStandInConfig:
+    handshake_ms: float = 100.0  # Costo de conexión + TLS simulado (antes del banner)
+    login_ms: float = 20.0  # Costo de AUTH
+    mensaje_ms: float = 5.0  # Costo de aceptar un mensaje (DATA)
+    cortar_despues: int = 0  # Cerrar la conexión tras N mensajes (0 = nunca)
+
+
+@dataclass
+class SMTPStandInEstado:
+    config: SMTPStandInConfig
+    conexiones: int = 0
+    logins: int = 0
+    noops: int = 0
+    mensajes: list[dict] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: '_Servidor'
+
+    def _responder(self, linea: str) -> None:
+        self.wfile.write((linea + '\r\n').encode('ascii'))
+        self.wfile.flush()
+
+    def _leer(self) -> Optional[str]:
+        linea = self.rfile.readline()
+        if not linea:
+            return None
+        return linea.decode('utf-8', errors='replace').rstrip('\r\n')
+
+    def _auth_ok(self, usuario: str, password: str) -> bool:
+        ok = usuario == USUARIO and password == PASSWORD
+        if ok:
+            time.sleep(self.server.estado.config.login_ms / 1000)
+            with self.server.estado.lock:
+                self.server.estado.logins += 1
+        return ok
+
+    def handle(self) -> None:
+        estado = self.server.estado
+        with estado.lock:
+            estado.conexiones += 1
+        time.sleep(estado.config.handshake_ms / 1000)
+        self._responder('220 smtp.local ESMTP stand-in')
+
+        remitente, destinatarios, enviados = None, [], 0
+        while True:
+            linea = self._leer()
+            if linea is None:
+                return
+            comando = linea.split(' ', 1)[0].upper()
+            argumento = linea[len(comando):].strip()
+
+            if comando == 'EHLO':
+                self.wfile.write(b'250-smtp.local\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n')
+                self.wfile.flush()
+            elif comando == 'HELO':
+                self._responder('250 smtp.local')
+            elif comando == 'AUTH':
+                partes = argumento.split()
+                mecanismo = partes[0].upper() if partes else ''
+                if mecanismo == 'PLAIN':
+                    credencial = partes[1] if len(partes) > 1 else None
+                    if credencial is None:
+                        self._responder('334 ')
+                        credencial = self._leer() or ''
+                    _, usuario, password = base64.b64decode(credencial).decode().split('\0')
+                elif mecanismo == 'LOGIN':
+                    self._responder('334 VXNlcm5hbWU6')
+                    usuario = base64.b64decode(self._leer() or '').decode()
+                    self._responder('334 UGFzc3dvcmQ6')
+                    password = base64.b64decode(self._leer() or '').decode()
+                else:
+                    self._responder('504 Mecanismo no soportado')
+                    continue
+                if self._auth_ok(usuario, password):
+                    self._responder('235 Autenticado')
+                else:
+                    self._responder('535 Credenciales invalidas')
+            elif comando == 'MAIL':
+                remitente, destinatarios = argumento.split(':', 1)[1].strip(' <>'), []
+                self._responder('250 OK')
+            elif comando == 'RCPT':
+                destinatarios.append(argumento.split(':', 1)[1].strip(' <>'))
+                self._responder('250 OK')
+            elif comando == 'DATA':
+                self._responder('354 Fin con <CRLF>.<CRLF>')
+                lineas = []
+                while True:
+                    dato = self._leer()
+                    if dato is None or dato == '.':
+                        break
+                    lineas.append(dato)
+                time.sleep(estado.config.mensaje_ms / 1000)
+                with estado.lock:
+                    estado.mensajes.append({'de': remitente, 'para': destinatarios, 'bytes': sum(map(len, lineas))})
+                enviados += 1
+                self._responder('250 Mensaje aceptado')
+                if estado.config.cortar_despues and enviados >= estado.config.cortar_despues:
+                    return  # Corte del servidor (sin 421), como hacen algunos proveedores
+            elif comando == 'NOOP':
+                with estado.lock:
+                    estado.noops += 1
+                self._responder('250 OK')
+            elif comando == 'RSET':
+                remitente, destinatarios = None, []
+                self._responder('250 OK')
+            elif comando == 'QUIT':
+                self._responder('221 Bye')
+                return
+            else:
+                self._responder('502 Comando no implementado')
+
+
+class _Servidor(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    estado: SMTPStandInEstado
+
+
+class SMTPStandIn:
+    """Servidor SMTP local en un thread (context manager)"""
+
+    def __init__(self, config: Optional[SMTPStandInConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.estado = SMTPStandInEstado(config or SMTPStandInConfig())
+        self._servidor = _Servidor((host, port), _Handler)
+        self._servidor.estado = self.estado
+        self._thread = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+
+    @property
+    def host(self) -> str:
+        return self._servidor.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self._servidor.server_address[1]
+
+    def __enter__(self) -> 'SMTPStandIn':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def configurar_settings(self) -> dict:
+        """Apunta settings SMTP al stand-in; retorna los valores anteriores"""
+        nuevos = {
+            'smtp_host': self.host,
+            'smtp_port': self.port,
+            'smtp_user': USUARIO,
+            'smtp_pass': PASSWORD,
+            'smtp_secure': 'none',
+        }
+        anteriores = {k: getattr(settings, k) for k in nuevos}
+        for k, v in nuevos.items():
+            setattr(settings, k, v)
+        return anteriores
+
+    @staticmethod
+    def restaurar_settings(anteriores: dict) -> None:
+        for k, v in anteriores.items():
+            setattr(settings, k, v)
+
+
+def _enviar_lote(cantidad: int, concurrencia: int) -> tuple[int, float]:
+    from src.mail_utils import enviar_email_smtp
+
+    def uno(i: int) -> bool:
+        exito, _ = enviar_email_smtp(f'cliente{i}@ejemplo.cl', f'Cierre {i}', f'Mensaje de prueba {i}')
+        return exito
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        exitosos = sum(pool.map(uno, range(cantidad)))
+    return exitosos, time.perf_counter() - inicio
+
+
+def ejecutar_benchmark(
+    cantidad: int,
+    niveles: list[int],
+    config: Optional[SMTPStandInConfig] = None
+) -> list[dict]:
+    """
+    Envía `cantidad` correos por nivel de concurrencia, con y sin pool
+
+    Returns:
+        list[dict]: Una fila de métricas por (pool, concurrencia)
+    """
+    from src.smtp_pool import SMTPPool
+    import src.mail_utils as mail_utils
+
+    filas = []
+    with SMTPStandIn(config) as servidor:
+        anteriores = servidor.configurar_settings()
+        anteriores['smtp_pool_enabled'] = settings.smtp_pool_enabled
+        pool_original = mail_utils.smtp_pool
+        try:
+            for con_pool in (False, True):
+                settings.smtp_pool_enabled = con_pool
+                for concurrencia in niveles:
+                    mail_utils.smtp_pool = SMTPPool(max_ociosas=concurrencia)
+                    conexiones_antes = servidor.estado.conexiones
+                    exitosos, segundos = _enviar_lote(cantidad, concurrencia)
+                    mail_utils.smtp_pool.cerrar()
+                    filas.append({
+                        'pool': con_pool,
+                        'concurrencia': concurrencia,
+                        'mensajes': cantidad,
+                        'exitosos': exitosos,
+                        'segundos': round(segundos, 3),
+                        'mensajes_por_segundo': round(exitosos / segundos, 1) if segundos > 0 else 0.0,
+                        'conexiones': servidor.estado.conexiones - conexiones_antes,
+                    })
+        finally:
+            mail_utils.smtp_pool = pool_original
+            SMTPStandIn.restaurar_settings(anteriores)
+    return filas
+
+
+def _imprimir_tabla(filas: list[dict]) -> None:
+    columnas = ['pool', 'concurrencia', 'exitosos', 'segundos', 'mensajes_por_segundo', 'conexiones']
+    anchos = {c: max(len(c), *(len(str(f[c])) for f in filas)) for c in columnas}
+    print('  '.join(c.rjust(anchos[c]) for c in columnas))
+    for fila in filas:
+        print('  '.join(str(fila[c]).rjust(anchos[c]) for c in columnas))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark de envio SMTP con/sin pool de conexiones.')
+    parser.add_argument('--messages', type=int, default=50, help='Correos por corrida')
+    parser.add_argument('--concurrency', default='1,4', help='Niveles de concurrencia (coma)')
+    parser.add_argument('--handshake-ms', type=float, default=100.0, help='Costo simulado de conexion + TLS')
+    parser.add_argument('--login-ms', type=float, default=20.0)
+    parser.add_argument('--message-ms', type=float, default=5.0)
+    parser.add_argument('--json', dest='json_path', help='Guardar resultados en JSON')
+    args = parser.parse_args()
+
+    niveles = [int(n) for n in args.concurrency.split(',') if n.strip()]
+    filas = ejecutar_benchmark(
+        args.messages,
+        niveles,
+        SMTPStandInConfig(handshake_ms=args.handshake_ms, login_ms=args.login_ms, mensaje_ms=args.message_ms),
+    )
+    _imprimir_tabla(filas)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(filas, indent=2), encoding='utf-8')
+    return 0 if all(f['exitosos'] == f['mensajes'] for f in filas) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
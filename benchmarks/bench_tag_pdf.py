@@ -0,0 +1,125 @@
+"""
+Benchmark de generación de PDFs TAG: PDFs/segundo antes y después del cache
+
+'antes' reproduce el _tag_fill_pdf original (PdfReader + clon + get_fields
++ write completo por PDF); 'clon_cacheado' clona el reader ya parseado
+(TAG_PDF_RENDERER=pypdf); 'cacheado' usa el renderer por defecto de
+src.tag_pdf (actualización incremental). Todos escriben a memoria para
+medir solo la generación.
+
+Uso:
+    python -m benchmarks.bench_tag_pdf --pdfs 50
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from io import BytesIO
+from pathlib import Path
+
+from src.tag_pdf import RENDERER_PYPDF, TAG_FIELD_NAME_MAP, limpiar_cache, obtener_plantilla_tag, render_pdf_tag
+
+PLANTILLA = Path(__file__).resolve().parent.parent / 'docs' / 'tag' / 'PDF-EJEMPLO.pdf'
+
+
+def mapping_ejemplo(i: int) -> dict:
+    return {
+        'CAMPO1': '17', 'CAMPO2': 'OCTUBRE', 'CAMPO3': '2026',
+        'CAMPO4': f'CAMILO IGNACIO MEÑA {i}', 'CAMPO5': '19001667-6', 'CAMPO6': '',
+        'CAMPO7': 'AV. LOS LEONES 1234', 'CAMPO8': 'PROVIDENCIA', 'CAMPO9': 'PROVIDENCIA',
+        'CAMPO10': '912345678', 'CAMPO11': 'cliente', 'CAMPO12': 'ejemplo.cl',
+        'CAMPO13': f'{147258369 + i}', 'CAMPO14': 'FPYK18', 'CAMPO15': 'FPYK18', 'CAMPO16': '',
+    }
+
+
+def render_sin_cache(mapping: dict, template_path: Path) -> bytes:
+    """Implementación previa de _tag_fill_pdf (a memoria)"""
+    from pypdf import PdfReader, PdfWriter
+    from pypdf.generic import BooleanObject, NameObject
+
+    reader = PdfReader(str(template_path))
+    writer = PdfWriter()
+    writer.clone_document_from_reader(reader)
+
+    fields = reader.get_fields() or {}
+    missing_fields = [name for name in TAG_FIELD_NAME_MAP.values() if name not in fields]
+    if missing_fields:
+        raise RuntimeError(f'Campos no encontrados en PDF: {missing_fields}')
+
+    pdf_mapping = {TAG_FIELD_NAME_MAP[key]: value for key, value in mapping.items()}
+    for page in writer.pages:
+        writer.update_page_form_field_values(page, pdf_mapping)
+    writer._root_object['/AcroForm'].update({
+        NameObject('/NeedAppearances'): BooleanObject(True)
+    })
+
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def render_clon_cacheado(mapping: dict, template_path: Path) -> bytes:
+    """PdfWriter(clone_from=reader cacheado) por PDF"""
+    return obtener_plantilla_tag(template_path).render(mapping, renderer=RENDERER_PYPDF)
+
+
+def _medir(nombre: str, render, cantidad: int, template_path: Path) -> dict:
+    bytes_totales = 0
+    inicio = time.perf_counter()
+    for i in range(cantidad):
+        bytes_totales += len(render(mapping_ejemplo(i), template_path))
+    segundos = time.perf_counter() - inicio
+    return {
+        'modo': nombre,
+        'pdfs': cantidad,
+        'segundos': round(segundos, 3),
+        'pdfs_por_segundo': round(cantidad / segundos, 1) if segundos > 0 else 0.0,
+        'kb_por_pdf': round(bytes_totales / cantidad / 1024, 1),
+    }
+
+
+def ejecutar_benchmark(cantidad: int, template_path: Path = PLANTILLA) -> list[dict]:
+    """
+    Genera `cantidad` PDFs con cada implementación
+
+    La primera corrida cacheada incluye el parseo de la plantilla.
+
+    Returns:
+        list[dict]: Una fila de métricas por modo
+    """
+    limpiar_cache()
+    return [
+        _medir('antes', render_sin_cache, cantidad, template_path),
+        _medir('clon_cacheado', render_clon_cacheado, cantidad, template_path),
+        _medir('cacheado', render_pdf_tag, cantidad, template_path),
+    ]
+
+
+def _imprimir_tabla(filas: list[dict]) -> None:
+    columnas = ['modo', 'pdfs', 'segundos', 'pdfs_por_segundo', 'kb_por_pdf']
+    anchos = {c: max(len(c), *(len(str(f[c])) for f in filas)) for c in columnas}
+    print('  '.join(c.rjust(anchos[c]) for c in columnas))
+    for fila in filas:
+        print('  '.join(str(fila[c]).rjust(anchos[c]) for c in columnas))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark de generacion de PDFs TAG con/sin plantilla cacheada.')
+    parser.add_argument('--pdfs', type=int, default=50, help='PDFs por modo')
+    parser.add_argument('--template', type=Path, default=PLANTILLA, help='Plantilla AcroForm')
+    parser.add_argument('--json', dest='json_path', help='Guardar resultados en JSON')
+    args = parser.parse_args()
+
+    filas = ejecutar_benchmark(args.pdfs, args.template)
+    _imprimir_tabla(filas)
+    if filas[0]['pdfs_por_segundo']:
+        print(f"\nSpeedup: {filas[-1]['pdfs_por_segundo'] / filas[0]['pdfs_por_segundo']:.1f}x")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(filas, indent=2), encoding='utf-8')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
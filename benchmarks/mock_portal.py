@@ -0,0 +1,440 @@
+"""
+Portal AutoTramite simulado para benchmarks end-to-end
+
+Servidor HTTP local (solo stdlib) que imita el flujo real:
+login.php -> vista_personas_empresas.php (todos los ids de SELECTORS) ->
+popup de previsualización con PDF real -> botón "Registrar Operacion".
+
+Permite inyectar latencia y fallas para medir el motor sin tocar autotramite.cl.
+
+Uso:
+    python -m benchmarks.mock_portal --port 8765 --latency-ms 200 --fail-rate 0.05
+
+Luego apuntar el motor al mock:
+    AUTOTRAMITE_BASE_URL=http://127.0.0.1:8765
+    AUTOTRAMITE_LOGIN_URL=http://127.0.0.1:8765/secciones/login.php
+    AUTOTRAMITE_FORM_URL=http://127.0.0.1:8765/secciones/vista_personas_empresas.php
+"""
+from __future__ import annotations
+
+import argparse
+import html
+import io
+import itertools
+import random
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+from http import cookies
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from pypdf import PdfWriter
+
+from src.config import SELECTORS
+
+LOGIN_PATH = '/secciones/login.php'
+FORM_PATH = '/secciones/vista_personas_empresas.php'
+PREVIEW_PATH = '/secciones/generaContrato.php'
+PDF_PATH = '/secciones/pdf_autotramite.php'
+
+# Etapas donde se puede inyectar fallas (--fail-on)
+ETAPAS = ('login', 'form', 'preview', 'pdf', 'register', 'static')
+
+# PNG 1x1 (recurso estático que el ruteo debería bloquear)
+_PNG_1X1 = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082'
+)
+
+
+def _generar_pdf() -> bytes:
+    writer = PdfWriter()
+    writer.add_blank_page(612, 792)
+    writer.add_metadata({'/Title': 'Contrato de compraventa (mock)'})
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def _id(selector_key: str) -> str:
+    return SELECTORS[selector_key].lstrip('#')
+
+
+@dataclass
+class MockPortalConfig:
+    """Parámetros del portal simulado"""
+    email: str = 'bench@autotramite.local'
+    password: str = 'bench'
+    latency_ms: float = 0.0  # Latencia base por request
+    jitter_ms: float = 0.0  # Variación aleatoria adicional (0..jitter)
+    fail_rate: float = 0.0  # Probabilidad de responder 500
+    fail_on: tuple[str, ...] = ('form', 'preview', 'register')
+    operadores: tuple[str, ...] = ('AUTORECENTE SPA (QUEIROLO)',)
+    seed: Optional[int] = None
+
+
+@dataclass
+class MockPortalEstado:
+    """Estado compartido entre threads del servidor"""
+    config: MockPortalConfig
+    sesiones: set[str] = field(default_factory=set)
+    borradores: dict[str, dict[str, str]] = field(default_factory=dict)
+    registros: dict[str, dict[str, str]] = field(default_factory=dict)
+    requests: dict[str, int] = field(default_factory=dict)
+    fallas: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    pdf: bytes = field(default_factory=_generar_pdf)
+    _folios: itertools.count = field(default_factory=lambda: itertools.count(100001))
+    _random: random.Random = field(default_factory=random.Random)
+
+    def __post_init__(self) -> None:
+        if self.config.seed is not None:
+            self._random.seed(self.config.seed)
+
+    def contar(self, etapa: str) -> None:
+        with self.lock:
+            self.requests[etapa] = self.requests.get(etapa, 0) + 1
+
+    def debe_fallar(self, etapa: str) -> bool:
+        if etapa not in self.config.fail_on or self.config.fail_rate <= 0:
+            return False
+        with self.lock:
+            falla = self._random.random() < self.config.fail_rate
+            if falla:
+                self.fallas += 1
+        return falla
+
+    def latencia(self) -> float:
+        jitter = self._random.uniform(0, self.config.jitter_ms) if self.config.jitter_ms > 0 else 0.0
+        return (self.config.latency_ms + jitter) / 1000
+
+    def nuevo_folio(self) -> str:
+        with self.lock:
+            return str(next(self._folios))
+
+
+def _pagina(titulo: str, cuerpo: str) -> bytes:
+    return f"""<!DOCTYPE html>
+<html lang="es"><head><meta charset="utf-8"><title>{titulo}</title>
+<link rel="stylesheet" href="/static/app.css">
+<script async src="https://www.googletagmanager.com/gtag/js?id=G-MOCK"></script>
+</head><body>
+<img src="/static/logo.png" alt="AutoTramite">
+{cuerpo}
+</body></html>""".encode('utf-8')
+
+
+def _html_login(error: str = '') -> bytes:
+    return _pagina('Login', f"""
+<form method="post" action="{LOGIN_PATH}">
+  {f'<p class="error">{html.escape(error)}</p>' if error else ''}
+  <input id="{_id('login_email')}" name="correo" type="email">
+  <input id="{_id('login_password')}" name="clave" type="password">
+  <button type="submit">Iniciar sesión</button>
+</form>""")
+
+
+_CAMPOS_TEXTO = [clave for clave in SELECTORS if clave.startswith(('vehiculo_', 'vendedor_', 'comprador_'))]
+
+
+def _html_formulario(operadores: tuple[str, ...]) -> bytes:
+    inputs = '\n'.join(
+        f'  <label>{clave}<input id="{_id(clave)}" name="{_id(clave)}" type="text"></label>'
+        for clave in _CAMPOS_TEXTO
+    )
+    opciones = '\n'.join(f'    <option>{html.escape(op)}</option>' for op in operadores)
+    return _pagina('Contrato', f"""
+<form id="formulario_contrato" onsubmit="return false">
+{inputs}
+  <input id="{_id('config_pago_contado')}" name="pago" type="radio" value="contado" checked>
+  <input id="{_id('config_pago_credito')}" name="pago" type="radio" value="credito">
+  <input id="{_id('config_firma_electronica')}" name="firma" type="checkbox" value="fea">
+  <select id="{_id('config_operador')}" name="operador">
+    <option value="">Seleccione</option>
+{opciones}
+  </select>
+  <button type="button" onclick="previsualizar()">Previsualizar PDF</button>
+  <button type="button">Solicitar Información</button>
+</form>
+<script>
+function previsualizar() {{
+  const datos = new URLSearchParams(new FormData(document.getElementById('formulario_contrato')));
+  window.open('{PREVIEW_PATH}?' + datos.toString(), '_blank');
+}}
+</script>""")
+
+
+def _html_preview(borrador_id: str) -> bytes:
+    return _pagina('Previsualización', f"""
+<embed type="application/pdf" src="{PDF_PATH}?borrador={borrador_id}" width="100%" height="600">
+<form id="formulario_guardar_contrato" method="post" action="{PREVIEW_PATH}">
+  <input type="hidden" name="borrador" value="{borrador_id}">
+  <button type="submit" name="accion" value="guardar_contrato">Registrar Operacion</button>
+</form>""")
+
+
+def _html_registrado(folio: str) -> bytes:
+    return _pagina('Operación registrada', f"""
+<p>Operación registrada. <span id="numero-operacion">Folio {folio}</span></p>
+<a href="{PDF_PATH}?folio={folio}&archivo=contrato_{folio}.pdf" download>Descargar contrato</a>""")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: '_MockServer'
+
+    # Silenciar el log por request de http.server
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    @property
+    def estado(self) -> MockPortalEstado:
+        return self.server.estado
+
+    def _responder(self, status: int, cuerpo: bytes = b'', content_type: str = 'text/html; charset=utf-8',
+                   headers: Optional[dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        for clave, valor in (headers or {}).items():
+            self.send_header(clave, valor)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(cuerpo)
+
+    def _redirigir(self, destino: str, headers: Optional[dict[str, str]] = None) -> None:
+        self._responder(302, b'', headers={'Location': destino, **(headers or {})})
+
+    def _sesion(self) -> Optional[str]:
+        jar = cookies.SimpleCookie(self.headers.get('Cookie', ''))
+        morsel = jar.get('PHPSESSID')
+        if morsel and morsel.value in self.estado.sesiones:
+            return morsel.value
+        return None
+
+    def _leer_form(self) -> dict[str, str]:
+        largo = int(self.headers.get('Content-Length') or 0)
+        datos = parse_qs(self.rfile.read(largo).decode('utf-8'), keep_blank_values=True)
+        return {k: v[0] for k, v in datos.items()}
+
+    def _etapa(self, ruta: str) -> str:
+        if ruta == LOGIN_PATH:
+            return 'login'
+        if ruta == FORM_PATH:
+            return 'form'
+        if ruta == PREVIEW_PATH:
+            return 'register' if self.command == 'POST' else 'preview'
+        if ruta == PDF_PATH:
+            return 'pdf'
+        return 'static'
+
+    def _preparar(self) -> Optional[str]:
+        """Aplica latencia y fallas; retorna la etapa o None si ya respondió"""
+        ruta = urlparse(self.path).path
+        etapa = self._etapa(ruta)
+        self.estado.contar(etapa)
+        espera = self.estado.latencia()
+        if espera > 0:
+            time.sleep(espera)
+        if self.estado.debe_fallar(etapa):
+            self._responder(500, _pagina('Error', '<p>Error interno (inyectado)</p>'))
+            return None
+        return etapa
+
+    def do_GET(self) -> None:
+        etapa = self._preparar()
+        if etapa is None:
+            return
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+
+        if etapa == 'static':
+            if url.path.endswith('.png'):
+                self._responder(200, _PNG_1X1, 'image/png')
+            elif url.path.endswith('.css'):
+                self._responder(200, b'body{font-family:sans-serif}', 'text/css')
+            else:
+                self._redirigir(FORM_PATH)
+            return
+
+        if etapa == 'login':
+            self._responder(200, _html_login())
+            return
+
+        if self._sesion() is None:
+            self._redirigir(LOGIN_PATH)
+            return
+
+        if etapa == 'form':
+            self._responder(200, _html_formulario(self.estado.config.operadores))
+        elif etapa == 'preview':
+            borrador_id = secrets.token_hex(8)
+            with self.estado.lock:
+                self.estado.borradores[borrador_id] = query
+            self._responder(200, _html_preview(borrador_id))
+        elif etapa == 'pdf':
+            if query.get('borrador') not in self.estado.borradores and query.get('folio') not in self.estado.registros:
+                self._responder(404, _pagina('No encontrado', '<p>Documento no existe</p>'))
+                return
+            self._responder(200, self.estado.pdf, 'application/pdf')
+
+    def do_POST(self) -> None:
+        etapa = self._preparar()
+        if etapa is None:
+            return
+        datos = self._leer_form()
+
+        if etapa == 'login':
+            config = self.estado.config
+            if datos.get('correo') == config.email and datos.get('clave') == config.password:
+                sesion = secrets.token_hex(16)
+                with self.estado.lock:
+                    self.estado.sesiones.add(sesion)
+                self._redirigir(FORM_PATH, {'Set-Cookie': f'PHPSESSID={sesion}; Path=/; HttpOnly'})
+            else:
+                self._responder(200, _html_login('Credenciales inválidas'))
+            return
+
+        if self._sesion() is None:
+            self._redirigir(LOGIN_PATH)
+            return
+
+        if etapa == 'register':
+            with self.estado.lock:
+                borrador = self.estado.borradores.pop(datos.get('borrador', ''), None)
+            if borrador is None or not borrador.get(_id('vehiculo_patente')):
+                self._responder(400, _pagina('Error', '<p>Borrador inválido</p>'))
+                return
+            folio = self.estado.nuevo_folio()
+            with self.estado.lock:
+                self.estado.registros[folio] = borrador
+            self._responder(200, _html_registrado(folio))
+        else:
+            self._responder(405, b'')
+
+
+class _MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, direccion: tuple[str, int], estado: MockPortalEstado):
+        super().__init__(direccion, _Handler)
+        self.estado = estado
+
+
+class MockPortal:
+    """
+    Portal simulado corriendo en un thread de fondo
+
+    Se usa como context manager desde benchmarks y tests:
+
+        with MockPortal(MockPortalConfig(latency_ms=100)) as portal:
+            portal.configurar_settings()
+            ...
+    """
+
+    def __init__(self, config: Optional[MockPortalConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.estado = MockPortalEstado(config or MockPortalConfig())
+        self._server = _MockServer((host, port), self.estado)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def login_url(self) -> str:
+        return self.base_url + LOGIN_PATH
+
+    @property
+    def form_url(self) -> str:
+        return self.base_url + FORM_PATH
+
+    def iniciar(self) -> 'MockPortal':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-portal', daemon=True)
+        self._thread.start()
+        return self
+
+    def detener(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def configurar_settings(self) -> dict[str, object]:
+        """
+        Apunta `settings` al portal simulado
+
+        Returns:
+            dict: Valores anteriores (para restaurar con `restaurar_settings`)
+        """
+        from src.config import settings
+
+        nuevos = {
+            'autotramite_base_url': self.base_url,
+            'autotramite_login_url': self.login_url,
+            'autotramite_form_url': self.form_url,
+            'autotramite_email': self.estado.config.email,
+            'autotramite_password': self.estado.config.password,
+        }
+        anteriores = {clave: getattr(settings, clave) for clave in nuevos}
+        for clave, valor in nuevos.items():
+            setattr(settings, clave, valor)
+        return anteriores
+
+    @staticmethod
+    def restaurar_settings(anteriores: dict[str, object]) -> None:
+        from src.config import settings
+
+        for clave, valor in anteriores.items():
+            setattr(settings, clave, valor)
+
+    def __enter__(self) -> 'MockPortal':
+        return self.iniciar()
+
+    def __exit__(self, *exc) -> None:
+        self.detener()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Portal AutoTramite simulado para benchmarks.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Latencia base por request (ms)')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Variación aleatoria adicional (ms)')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='Probabilidad de error 500 (0..1)')
+    parser.add_argument('--fail-on', default='form,preview,register',
+                        help=f'Etapas con fallas inyectadas (de: {",".join(ETAPAS)})')
+    parser.add_argument('--email', default=MockPortalConfig.email)
+    parser.add_argument('--password', default=MockPortalConfig.password)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockPortalConfig(
+        email=args.email,
+        password=args.password,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        fail_rate=args.fail_rate,
+        fail_on=tuple(e.strip() for e in args.fail_on.split(',') if e.strip()),
+        seed=args.seed,
+    )
+    portal = MockPortal(config, host=args.host, port=args.port)
+    print(f'Mock AutoTramite en {portal.base_url}')
+    print(f'  AUTOTRAMITE_BASE_URL={portal.base_url}')
+    print(f'  AUTOTRAMITE_LOGIN_URL={portal.login_url}')
+    print(f'  AUTOTRAMITE_FORM_URL={portal.form_url}')
+    print(f'  AUTOTRAMITE_EMAIL={config.email}  AUTOTRAMITE_PASSWORD={config.password}')
+    try:
+        portal._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        portal._server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,6 +1,7 @@
 """
-CLI wrapper to run AutoTramite automation in a separate process.
-This avoids Streamlit event-loop limitations on Windows.
+CLI wrapper to run AutoTramite automation.
+By default it is a thin client of the persistent worker (src/worker.py), which
+keeps Chromium warm between runs. --local runs in this process instead.
 """
 from __future__ import annotations
 
@@ -10,9 +11,12 @@ import json
 import sys
 from pathlib import Path
 
-from src.config import validar_credenciales
-from src.models import parsear_texto_contrato
-from src.autotramite import crear_contrato_autotramite
+from src.config import settings, validar_credenciales
+from src.browser_pool import cerrar_browser_pool
+from src.stage_events import PREFIJO_EVENTO, EventoEtapa
+from src.worker import (
+    WorkerNoDisponibleError, WorkerResultadoDesconocidoError, asegurar_worker, ejecutar_texto,
+)
 
 
 def _emit_result(payload: dict, result_path: Path | None) -> None:
@@ -27,6 +31,50 @@ def _emit_result(payload: dict, result_path: Path | None) -> None:
     sys.stdout.write("\n")
 
 
+def _emit_stage(evento: EventoEtapa | dict) -> None:
+    # One line per stage event so the UI can show real progress.
+    data = evento.to_dict() if isinstance(evento, EventoEtapa) else evento
+    sys.stdout.write(PREFIJO_EVENTO + json.dumps(data, ensure_ascii=True))
+    sys.stdout.write("\n")
+    sys.stdout.flush()
+
+
+async def _ejecutar_local(texto: str, args, output_path: Path, emit_events: bool) -> dict:
+    try:
+        return await ejecutar_texto(
+            texto,
+            str(output_path),
+            dry_run=args.dry_run,
+            tasacion=args.tasacion,
+            venta=args.venta,
+            on_stage=_emit_stage if emit_events else None,
+        )
+    finally:
+        await cerrar_browser_pool()
+
+
+def _ejecutar(texto: str, args, output_path: Path) -> dict:
+    emit_events = not args.no_events
+    if settings.worker_enabled and not args.local:
+        try:
+            cliente = asegurar_worker()
+            return cliente.ejecutar(
+                texto,
+                str(output_path.resolve()),
+                dry_run=args.dry_run,
+                tasacion=args.tasacion,
+                venta=args.venta,
+                on_evento=_emit_stage if emit_events else None,
+            )
+        except WorkerNoDisponibleError as e:
+            sys.stderr.write(f"Worker unavailable, running locally: {e}\n")
+        except WorkerResultadoDesconocidoError as e:
+            # The worker already accepted the job: re-running could register the contract twice.
+            sys.stderr.write(f"Worker result unknown (correlation_id={e.correlation_id}), not re-running: {e}\n")
+            return e.a_resultado()
+    return asyncio.run(_ejecutar_local(texto, args, output_path, emit_events))
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Run AutoTramite automation.")
     parser.add_argument("--input", required=True, help="Path to input text file.")
@@ -35,6 +83,8 @@ def main() -> int:
     parser.add_argument("--result", help="Path to write JSON result.")
     parser.add_argument("--tasacion", help="Tasacion override (optional).")
     parser.add_argument("--venta", help="Venta override (optional).")
+    parser.add_argument("--no-events", action="store_true", help="Do not emit STAGE_EVENT lines.")
+    parser.add_argument("--local", action="store_true", help="Run in this process instead of the worker.")
     args = parser.parse_args()
 
     input_path = Path(args.input)
@@ -65,34 +115,8 @@ def main() -> int:
         }, result_path)
         return 2
 
-    contrato, errores = parsear_texto_contrato(
-        texto,
-        tasacion_override=args.tasacion,
-        venta_override=args.venta,
-    )
-    if errores:
-        _emit_result({
-            "success": False,
-            "error": "Validation errors",
-            "validation_errors": [{"campo": e.campo, "mensaje": e.mensaje} for e in errores],
-        }, result_path)
-        return 1
-
-    if not contrato:
-        _emit_result({
-            "success": False,
-            "error": "Failed to parse contract",
-        }, result_path)
-        return 1
-
     try:
-        resultado = asyncio.run(
-            crear_contrato_autotramite(
-                contrato,
-                dry_run=args.dry_run,
-                screenshot_path=str(output_path),
-            )
-        )
+        payload = _ejecutar(texto, args, output_path)
     except Exception as e:
         _emit_result({
             "success": False,
@@ -100,17 +124,8 @@ def main() -> int:
         }, result_path)
         return 1
 
-    payload = {
-        "success": bool(resultado.success),
-        "operacion_id": resultado.operacion_id,
-        "pdf_url": resultado.pdf_url,
-        "mensaje": resultado.mensaje,
-        "error": resultado.error,
-        "duracion_segundos": resultado.duracion_segundos,
-        "pdf_path": str(output_path),
-    }
     _emit_result(payload, result_path)
-    return 0 if resultado.success else 1
+    return 0 if payload.get("success") else 1
 
 
 if __name__ == "__main__":
@@ -3,14 +3,22 @@ Automatización de AutoTramite con Playwright
 Basado en: Sección 5 del plan (selectores validados + estrategia de waits)
 """
 import asyncio
+import base64
 import re
 import time
-from typing import Optional
-from playwright.async_api import async_playwright, Page, Browser, TimeoutError as PlaywrightTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Optional
+from urllib.parse import parse_qs, unquote, urljoin, urlparse
+from playwright.async_api import Page, TimeoutError as PlaywrightTimeoutError
 
 from .config import settings, SELECTORS
 from .models import ContratoData, ContratoResult
 from .logging_utils import get_logger
+from .browser_pool import get_browser_pool
+from .session_cache import session_cache, login_lock
+from .request_routing import aplicar_ruteo
+from .rate_limit import limitador_portal
+from .stage_events import StageCallback, etapa, iniciar_registro
 
 logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
 
@@ -35,7 +43,66 @@ class RecoverableError(AutoTramiteError):
     pass
 
 
-async def fill_field(page: Page, selector: str, value: Optional[str], required: bool = True) -> None:
+ESTRATEGIAS_LLENADO = ('type', 'fill', 'batch')
+
+# Overhead aproximado por campo del modo 'type' (wait + triple click + backspace)
+_OVERHEAD_TYPE_POR_CAMPO_S = 0.15
+
+# Acumulado por estrategia: {'llenados', 'campos', 'segundos', 'ahorro_estimado_segundos'}
+ESTADISTICAS_LLENADO: dict[str, dict[str, float]] = {}
+
+_JS_LLENAR_BATCH = """
+(campos) => {
+    const faltantes = [];
+    for (const [selector, valor] of campos) {
+        const el = document.querySelector(selector);
+        if (!el) { faltantes.push(selector); continue; }
+        const proto = el instanceof HTMLTextAreaElement ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+        const setter = Object.getOwnPropertyDescriptor(proto, 'value');
+        if (setter && setter.set && (el instanceof HTMLInputElement || el instanceof HTMLTextAreaElement)) {
+            setter.set.call(el, valor);
+        } else {
+            el.value = valor;
+        }
+        el.dispatchEvent(new Event('input', { bubbles: true }));
+        el.dispatchEvent(new Event('change', { bubbles: true }));
+    }
+    return faltantes;
+}
+"""
+
+
+def estrategia_llenado() -> str:
+    """
+    Estrategia de llenado configurada (FILL_STRATEGY), con fallback a 'type'
+    
+    Returns:
+        str: 'type', 'fill' o 'batch'
+    """
+    estrategia = (settings.fill_strategy or 'type').strip().lower()
+    if estrategia not in ESTRATEGIAS_LLENADO:
+        logger.warning(f'FILL_STRATEGY inválida ({estrategia}), se usa "type"')
+        return 'type'
+    return estrategia
+
+
+def campos_con_tecleo() -> set[str]:
+    """
+    Claves de SELECTORS que siempre se tipean tecla a tecla (FILL_KEYSTROKE_FIELDS)
+    
+    Returns:
+        set[str]: Claves de campos con override a 'type'
+    """
+    return {c.strip() for c in (settings.fill_keystroke_fields or '').split(',') if c.strip()}
+
+
+async def fill_field(
+    page: Page,
+    selector: str,
+    value: Optional[str],
+    required: bool = True,
+    estrategia: Optional[str] = None
+) -> None:
     """
     Llena un campo del formulario con espera inteligente
     
@@ -44,6 +111,8 @@ async def fill_field(page: Page, selector: str, value: Optional[str], required:
         selector: Selector CSS/ID del campo
         value: Valor a ingresar
         required: Si es requerido (lanzar error si falla)
+        estrategia: 'type' (tecla a tecla) o 'fill'/'batch' (valor directo).
+            Usa FILL_STRATEGY si None
     
     Raises:
         RecoverableError: Si el campo requerido no se puede llenar
@@ -53,16 +122,22 @@ async def fill_field(page: Page, selector: str, value: Optional[str], required:
             raise RecoverableError(f'Valor requerido vacío para: {selector}')
         return
     
+    estrategia = estrategia or estrategia_llenado()
+    
     try:
         # Esperar que el elemento esté visible
         await page.wait_for_selector(selector, state='visible', timeout=settings.timeout_element)
         
-        # Limpiar campo (triple click + backspace)
-        await page.click(selector, click_count=3)
-        await page.keyboard.press('Backspace')
-        
-        # Ingresar valor
-        await page.type(selector, str(value), delay=50)  # 50ms entre teclas para simular humano
+        if estrategia == 'type':
+            # Limpiar campo (triple click + backspace)
+            await page.click(selector, click_count=3)
+            await page.keyboard.press('Backspace')
+            
+            # Ingresar valor (delay entre teclas para simular humano)
+            await page.type(selector, str(value), delay=settings.fill_type_delay_ms)
+        else:
+            # fill reemplaza el contenido y dispara input/change
+            await page.fill(selector, str(value))
         
         logger.debug(f'Campo llenado: {selector[:30]}... = {str(value)[:30]}...')
     
@@ -79,6 +154,87 @@ async def fill_field(page: Page, selector: str, value: Optional[str], required:
             raise RecoverableError(msg)
 
 
+async def llenar_campos_batch(page: Page, campos: list[tuple[str, Optional[str], bool]]) -> None:
+    """
+    Llena varios campos en un solo round trip (page.evaluate)
+    
+    Asigna los valores y dispara eventos input/change, igual que un usuario.
+    
+    Args:
+        page: Página de Playwright
+        campos: Lista de (selector, valor, requerido)
+    
+    Raises:
+        RecoverableError: Si falta un valor o un elemento requerido
+    """
+    pendientes: list[list[str]] = []
+    requeridos: set[str] = set()
+    for selector, value, required in campos:
+        if value is None or value == '':
+            if required:
+                raise RecoverableError(f'Valor requerido vacío para: {selector}')
+            continue
+        pendientes.append([selector, str(value)])
+        if required:
+            requeridos.add(selector)
+    
+    if not pendientes:
+        return
+    
+    try:
+        # Esperar a que el formulario esté renderizado
+        await page.wait_for_selector(pendientes[0][0], state='visible', timeout=settings.timeout_element)
+        faltantes = await page.evaluate(_JS_LLENAR_BATCH, pendientes)
+    except PlaywrightTimeoutError:
+        raise RecoverableError(f'Timeout esperando campo: {pendientes[0][0]}')
+    except Exception as e:
+        raise RecoverableError(f'Error en llenado batch: {str(e)}')
+    
+    faltantes_requeridos = [sel for sel in faltantes if sel in requeridos]
+    if faltantes_requeridos:
+        raise RecoverableError(f'Campos no encontrados en formulario: {faltantes_requeridos}')
+    
+    logger.debug(f'Llenado batch: {len(pendientes)} campos en un round trip')
+
+
+def _registrar_tiempo_llenado(estrategia: str, segundos: float, campos: list[tuple[str, Optional[str], bool]]) -> dict:
+    """
+    Calcula y acumula el tiempo de llenado vs. el estimado del modo 'type'
+    
+    Returns:
+        dict: Resumen del llenado (estrategia, campos, segundos, ahorro estimado)
+    """
+    llenados = [(k, v) for k, v, _ in campos if v not in (None, '')]
+    caracteres = sum(len(str(v)) for _, v in llenados)
+    estimado_type = (
+        caracteres * settings.fill_type_delay_ms / 1000
+        + len(llenados) * _OVERHEAD_TYPE_POR_CAMPO_S
+    )
+    ahorro = max(0.0, estimado_type - segundos) if estrategia != 'type' else 0.0
+    
+    acumulado = ESTADISTICAS_LLENADO.setdefault(
+        estrategia, {'llenados': 0, 'campos': 0, 'segundos': 0.0, 'ahorro_estimado_segundos': 0.0}
+    )
+    acumulado['llenados'] += 1
+    acumulado['campos'] += len(llenados)
+    acumulado['segundos'] += segundos
+    acumulado['ahorro_estimado_segundos'] += ahorro
+    
+    resumen = {
+        'estrategia': estrategia,
+        'campos': len(llenados),
+        'caracteres': caracteres,
+        'segundos': round(segundos, 3),
+        'estimado_type_segundos': round(estimado_type, 3),
+        'ahorro_estimado_segundos': round(ahorro, 3),
+    }
+    logger.info(
+        f'Llenado ({estrategia}): {segundos:.2f}s para {len(llenados)} campos '
+        f'(estimado tecla a tecla: {estimado_type:.2f}s, ahorro ~{ahorro:.2f}s)'
+    )
+    return resumen
+
+
 async def click_button(page: Page, selector: str, wait_navigation: bool = False) -> None:
     """
     Click en botón con espera inteligente
@@ -160,13 +316,222 @@ async def login_autotramite(page: Page) -> None:
         raise RecoverableError(f'Error inesperado durante login: {str(e)}')
 
 
-async def llenar_formulario(page: Page, datos: ContratoData) -> None:
+async def sesion_vigente(page: Page) -> bool:
+    """
+    Probe barato de sesión: abre el formulario y verifica que no redirija a login.php
+    
+    Args:
+        page: Página de Playwright (con cookies de sesión cargadas)
+    
+    Returns:
+        bool: True si la sesión es válida (la página queda en el formulario)
+    """
+    try:
+        await page.goto(settings.autotramite_form_url, wait_until='domcontentloaded', timeout=settings.timeout_navigation)
+    except Exception as e:
+        logger.warning(f'Probe de sesión fallido: {str(e)}')
+        return False
+    return 'login.php' not in page.url
+
+
+async def asegurar_sesion(page: Page, usa_cache: bool, version_cache: Optional[float] = None) -> bool:
+    """
+    Garantiza una sesión autenticada, reutilizando el storage state en cache
+    
+    Solo hace login completo si el probe falla. El login es single-flight:
+    un trabajo inicia sesión y los demás reutilizan las cookies que guardó.
+    
+    Args:
+        page: Página de Playwright
+        usa_cache: Si el contexto se creó con el storage state del cache
+        version_cache: Versión del cache usada al crear el contexto
+    
+    Returns:
+        bool: True si la página quedó en el formulario (login omitido)
+    
+    Raises:
+        LoginFailedError: Si las credenciales son inválidas
+        RecoverableError: Si el login falla tras los reintentos
+    """
+    with etapa('login') as detalle:
+        detalle['omitido'] = await _asegurar_sesion(page, usa_cache, version_cache)
+        return detalle['omitido']
+
+
+async def _asegurar_sesion(page: Page, usa_cache: bool, version_cache: Optional[float]) -> bool:
+    if usa_cache and await sesion_vigente(page):
+        logger.info('Sesión en cache válida, se omite login')
+        return True
+
+    async with login_lock:
+        # Otro trabajo pudo haber iniciado sesión mientras esperábamos el lock
+        if session_cache.version() not in (None, version_cache):
+            state = session_cache.cargar()
+            if state and state.get('cookies'):
+                await page.context.add_cookies(state['cookies'])
+                if await sesion_vigente(page):
+                    logger.info('Sesión renovada por otro trabajo, se omite login')
+                    return True
+
+        try:
+            await ejecutar_con_reintentos(lambda: login_autotramite(page))
+        except LoginFailedError:
+            session_cache.invalidar()
+            raise
+        session_cache.guardar(await page.context.storage_state())
+
+    return False
+
+
+@dataclass
+class VistaPrevia:
+    """Vista previa generada (página donde quedó el botón de registro y PDF guardado)"""
+    page: Page
+    pdf_url: Optional[str] = None
+    archivo_guardado: Optional[str] = None
+    tiempos: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class ProgresoContrato:
+    """
+    Checkpoint de un contrato entre reintentos
+    
+    Permite retomar desde el primer campo o etapa sin verificar: los campos
+    verificados no se vuelven a llenar, una vista previa vigente no se vuelve
+    a generar y el botón de registro nunca se presiona dos veces.
+    """
+    campos_verificados: set[str] = field(default_factory=set)
+    formulario_completo: bool = False
+    vista_previa: Optional[VistaPrevia] = None
+    registro_clickado: bool = False
+    
+    def reiniciar_formulario(self) -> None:
+        """Olvida el llenado (la página volvió a cargar el formulario vacío)"""
+        self.campos_verificados.clear()
+        self.formulario_completo = False
+        self.vista_previa = None
+
+
+def campos_formulario(datos: ContratoData) -> list[tuple[str, Optional[str], bool]]:
+    """
+    Campos de texto del formulario en orden de llenado
+    
+    Args:
+        datos: Datos del contrato
+    
+    Returns:
+        list: Tuplas (clave en SELECTORS, valor, requerido)
+    """
+    campos: list[tuple[str, Optional[str], bool]] = [
+        # VEHICULO
+        ('vehiculo_patente', datos.vehiculo.patente, True),
+        ('vehiculo_dv', datos.vehiculo.patente_dv, True),
+        ('vehiculo_marca', datos.vehiculo.marca, True),
+        ('vehiculo_modelo', datos.vehiculo.modelo, True),
+        ('vehiculo_ano', str(datos.vehiculo.ano), True),
+        ('vehiculo_color', datos.vehiculo.color, True),
+        ('vehiculo_chasis', datos.vehiculo.chasis, True),
+        ('vehiculo_motor', datos.vehiculo.motor, True),
+        ('vehiculo_tipo', datos.vehiculo.tipo_vehiculo, True),
+    ]
+    
+    # Tasación y Valor Venta
+    if datos.tasacion:
+        campos.append(('vehiculo_tasacion', str(datos.tasacion), False))
+    campos.append(('vehiculo_valor_venta', str(datos.valor_venta), True))
+    
+    # VENDEDOR y COMPRADOR
+    for rol, persona in (('vendedor', datos.vendedor), ('comprador', datos.comprador)):
+        campos.extend([
+            (f'{rol}_rut', persona.rut, True),
+            (f'{rol}_nombres', persona.nombres, True),
+            (f'{rol}_ap_paterno', persona.apellido_paterno, True),
+            (f'{rol}_ap_materno', persona.apellido_materno, False),
+            (f'{rol}_direccion', persona.direccion, True),
+            (f'{rol}_comuna', persona.comuna, True),
+            (f'{rol}_ciudad', persona.ciudad, True),
+            (f'{rol}_telefono', persona.telefono, True),
+            (f'{rol}_email', persona.email, True),
+        ])
+    
+    return campos
+
+
+_JS_VERIFICAR_CAMPOS = """
+(campos) => {
+    // Normaliza formato (puntos de RUT/montos, guiones, espacios, mayúsculas)
+    const norm = (v) => String(v ?? '').toLowerCase().replace(/[\\s.,\\-$]/g, '');
+    return campos
+        .filter(([clave, selector, valor]) => {
+            const el = document.querySelector(selector);
+            return el && norm(el.value) === norm(valor);
+        })
+        .map(([clave]) => clave);
+}
+"""
+
+
+async def verificar_campos(page: Page, campos: list[tuple[str, Optional[str], bool]]) -> set[str]:
+    """
+    Verifica en un solo round trip qué campos ya tienen el valor esperado
+    
+    Args:
+        page: Página de Playwright
+        campos: Lista de (clave en SELECTORS, valor, requerido)
+    
+    Returns:
+        set[str]: Claves cuyo valor en el DOM coincide con el esperado
+    """
+    pendientes = [[clave, SELECTORS[clave], str(valor)] for clave, valor, _ in campos if valor not in (None, '')]
+    if not pendientes:
+        return set()
+    try:
+        return set(await page.evaluate(_JS_VERIFICAR_CAMPOS, pendientes))
+    except Exception as e:
+        logger.warning(f'No se pudo verificar campos: {str(e)}')
+        return set()
+
+
+async def pagina_en_formulario(page: Page) -> bool:
+    """
+    Indica si la página sigue sana y mostrando el formulario (sin navegar)
+    
+    Args:
+        page: Página de Playwright
+    
+    Returns:
+        bool: True si se puede retomar el llenado en esta página
+    """
+    try:
+        if page.is_closed() or 'login.php' in page.url:
+            return False
+        return await page.query_selector(SELECTORS['vehiculo_patente']) is not None
+    except Exception:
+        return False
+
+
+async def llenar_formulario(
+    page: Page,
+    datos: ContratoData,
+    navegar: bool = True,
+    progreso: Optional[ProgresoContrato] = None
+) -> dict:
     """
     Llena formulario de contrato en AutoTramite
     
+    Con `progreso`, los campos ya verificados no se vuelven a llenar y al
+    terminar se verifica todo el formulario en un solo round trip; un
+    reintento solo completa los campos que no quedaron con su valor.
+    
     Args:
         page: Página de Playwright
         datos: Datos del contrato
+        navegar: Si False, asume que la página ya está en el formulario
+        progreso: Checkpoint del contrato entre reintentos
+    
+    Returns:
+        dict: Resumen de tiempos del llenado (ver _registrar_tiempo_llenado)
     
     Raises:
         RecoverableError: Si hay problemas llenando el formulario
@@ -179,57 +544,80 @@ async def llenar_formulario(page: Page, datos: ContratoData) -> None:
     
     try:
         # Navegar al formulario
-        logger.info(f'Navegando al formulario: {settings.autotramite_form_url}...')
-        await page.goto(settings.autotramite_form_url, wait_until='domcontentloaded', timeout=settings.timeout_navigation)
+        if navegar:
+            logger.info(f'Navegando al formulario: {settings.autotramite_form_url}...')
+            with etapa('form_goto'):
+                await page.goto(settings.autotramite_form_url, wait_until='domcontentloaded', timeout=settings.timeout_navigation)
+            if progreso is not None:
+                progreso.reiniciar_formulario()
         logger.info(f'Formulario cargado. URL: {page.url}')
         
-        # VEHICULO
-        await fill_field(page, SELECTORS['vehiculo_patente'], datos.vehiculo.patente)
-        await fill_field(page, SELECTORS['vehiculo_dv'], datos.vehiculo.patente_dv)
-        await fill_field(page, SELECTORS['vehiculo_marca'], datos.vehiculo.marca)
-        await fill_field(page, SELECTORS['vehiculo_modelo'], datos.vehiculo.modelo)
-        await fill_field(page, SELECTORS['vehiculo_ano'], str(datos.vehiculo.ano))
-        await fill_field(page, SELECTORS['vehiculo_color'], datos.vehiculo.color)
-        await fill_field(page, SELECTORS['vehiculo_chasis'], datos.vehiculo.chasis)
-        await fill_field(page, SELECTORS['vehiculo_motor'], datos.vehiculo.motor)
-        await fill_field(page, SELECTORS['vehiculo_tipo'], datos.vehiculo.tipo_vehiculo)
+        todos = campos_formulario(datos)
+        campos = todos
+        if progreso is not None and not navegar:
+            # Retomar: solo los campos que aún no tienen su valor
+            progreso.campos_verificados |= await verificar_campos(page, todos)
+            campos = [c for c in todos if c[0] not in progreso.campos_verificados]
+            if len(campos) < len(todos):
+                logger.info(f'Retomando llenado: {len(todos) - len(campos)} campos ya verificados, {len(campos)} pendientes')
+        
+        estrategia = estrategia_llenado()
+        teclear = campos_con_tecleo()
+        inicio = time.monotonic()
+        
+        # Llenado por sección (vehiculo, vendedor, comprador) para medir cada una
+        secciones: dict[str, list[tuple[str, Optional[str], bool]]] = {}
+        for campo in campos:
+            secciones.setdefault(campo[0].split('_', 1)[0], []).append(campo)
         
-        # Tasación y Valor Venta
-        if datos.tasacion:
-            await fill_field(page, SELECTORS['vehiculo_tasacion'], str(datos.tasacion), required=False)
-        await fill_field(page, SELECTORS['vehiculo_valor_venta'], str(datos.valor_venta))
+        for seccion, campos_seccion in secciones.items():
+            with etapa(f'fill_{seccion}', campos=len(campos_seccion)):
+                if estrategia == 'batch':
+                    # Primero los campos que requieren teclas (pueden disparar autocompletado),
+                    # luego el resto en un solo round trip
+                    for clave, valor, requerido in campos_seccion:
+                        if clave in teclear:
+                            await fill_field(page, SELECTORS[clave], valor, required=requerido, estrategia='type')
+                    await llenar_campos_batch(page, [
+                        (SELECTORS[clave], valor, requerido)
+                        for clave, valor, requerido in campos_seccion
+                        if clave not in teclear
+                    ])
+                else:
+                    for clave, valor, requerido in campos_seccion:
+                        await fill_field(
+                            page, SELECTORS[clave], valor, required=requerido,
+                            estrategia='type' if clave in teclear else estrategia
+                        )
         
-        # VENDEDOR
-        await fill_field(page, SELECTORS['vendedor_rut'], datos.vendedor.rut)
-        await fill_field(page, SELECTORS['vendedor_nombres'], datos.vendedor.nombres)
-        await fill_field(page, SELECTORS['vendedor_ap_paterno'], datos.vendedor.apellido_paterno)
-        await fill_field(page, SELECTORS['vendedor_ap_materno'], datos.vendedor.apellido_materno, required=False)
-        await fill_field(page, SELECTORS['vendedor_direccion'], datos.vendedor.direccion)
-        await fill_field(page, SELECTORS['vendedor_comuna'], datos.vendedor.comuna)
-        await fill_field(page, SELECTORS['vendedor_ciudad'], datos.vendedor.ciudad)
-        await fill_field(page, SELECTORS['vendedor_telefono'], datos.vendedor.telefono)
-        await fill_field(page, SELECTORS['vendedor_email'], datos.vendedor.email)
+        resumen = _registrar_tiempo_llenado(estrategia, time.monotonic() - inicio, campos)
         
-        # COMPRADOR
-        await fill_field(page, SELECTORS['comprador_rut'], datos.comprador.rut)
-        await fill_field(page, SELECTORS['comprador_nombres'], datos.comprador.nombres)
-        await fill_field(page, SELECTORS['comprador_ap_paterno'], datos.comprador.apellido_paterno)
-        await fill_field(page, SELECTORS['comprador_ap_materno'], datos.comprador.apellido_materno, required=False)
-        await fill_field(page, SELECTORS['comprador_direccion'], datos.comprador.direccion)
-        await fill_field(page, SELECTORS['comprador_comuna'], datos.comprador.comuna)
-        await fill_field(page, SELECTORS['comprador_ciudad'], datos.comprador.ciudad)
-        await fill_field(page, SELECTORS['comprador_telefono'], datos.comprador.telefono)
-        await fill_field(page, SELECTORS['comprador_email'], datos.comprador.email)
+        if progreso is not None:
+            # Checkpoint: verificar todo el formulario en un solo round trip
+            progreso.campos_verificados |= await verificar_campos(page, campos)
+            faltantes = [
+                clave for clave, valor, requerido in todos
+                if requerido and valor not in (None, '') and clave not in progreso.campos_verificados
+            ]
+            if faltantes:
+                # El portal puede reformatear valores (RUT, montos): no es un error,
+                # pero un reintento volverá a llenar solo estos campos
+                logger.warning(f'Campos sin verificar tras el llenado: {faltantes}')
         
         # CONFIGURACION
-        # Pago contado (ya viene marcado por defecto según plan)
-        # Firma electrónica
-        await page.check(SELECTORS['config_firma_electronica'])
+        with etapa('fill_configuracion'):
+            # Pago contado (ya viene marcado por defecto según plan)
+            # Firma electrónica
+            await page.check(SELECTORS['config_firma_electronica'])
+            
+            # Seleccionar operador/generado por
+            await page.select_option(SELECTORS['config_operador'], label=datos.generado_por)
         
-        # Seleccionar operador/generado por
-        await page.select_option(SELECTORS['config_operador'], label=datos.generado_por)
+        if progreso is not None:
+            progreso.formulario_completo = True
         
         logger.info('Formulario llenado completamente')
+        return resumen
     
     except RecoverableError:
         raise
@@ -238,95 +626,430 @@ async def llenar_formulario(page: Page, datos: ContratoData) -> None:
         raise RecoverableError(f'Error inesperado llenando formulario: {str(e)}')
 
 
-async def previsualizar_y_registrar(page: Page, dry_run: bool = False, screenshot_path: Optional[str] = None) -> ContratoResult:
+# ============================================================================
+# ESPERAS POR EVENTOS (en vez de sleeps fijos)
+# ============================================================================
+
+# Marcadores de que la vista previa está lista (página principal o popup)
+MARCADORES_PREVIEW = ', '.join([
+    SELECTORS['btn_registrar_operacion'],
+    'form#formulario_guardar_contrato',
+    "embed[type='application/pdf']",
+    "iframe[src*='pdf']",
+    "input[name='pdfbase64']",
+])
+
+# Marcadores de que el PDF está embebido en la vista previa
+MARCADORES_PDF = ', '.join([
+    "embed[type='application/pdf']",
+    "iframe[src*='pdf']",
+    'object[data]',
+    "input[name='pdfbase64']",
+])
+
+# Marcadores de confirmación tras registrar la operación
+MARCADORES_CONFIRMACION = ', '.join([
+    '.operacion-id',
+    '#numero-operacion',
+    'span:has-text("Folio")',
+])
+
+# Acumulado por espera: {'esperas', 'segundos', 'max_segundos', 'ganador:<nombre>'}
+ESTADISTICAS_ESPERAS: dict[str, dict[str, float]] = {}
+
+
+def _registrar_espera(nombre: str, ganador: str, segundos: float) -> None:
+    acumulado = ESTADISTICAS_ESPERAS.setdefault(nombre, {'esperas': 0, 'segundos': 0.0, 'max_segundos': 0.0})
+    acumulado['esperas'] += 1
+    acumulado['segundos'] += segundos
+    acumulado['max_segundos'] = max(acumulado['max_segundos'], segundos)
+    clave = f'ganador:{ganador}'
+    acumulado[clave] = acumulado.get(clave, 0) + 1
+    logger.info(f'Espera "{nombre}" resuelta por {ganador} en {segundos:.2f}s')
+
+
+async def _esperar_primera(
+    nombre: str,
+    esperas: dict[str, Awaitable[Any]],
+    timeout_ms: float
+) -> tuple[Optional[str], Any, float]:
     """
-    Previsualiza PDF y opcionalmente registra el contrato
+    Espera la primera señal exitosa entre varias, con un plazo máximo
+    
+    Las esperas que fallan (timeout propio, error) se ignoran mientras quede
+    alguna pendiente. Al resolver, las demás se cancelan; los futures
+    compartidos (ej: respuesta PDF) se protegen con shield para poder
+    reutilizarlos después.
+    
+    Args:
+        nombre: Nombre de la espera (para logs y estadísticas)
+        esperas: Mapa nombre -> awaitable
+        timeout_ms: Plazo máximo (deadline duro)
+    
+    Returns:
+        tuple: (nombre del ganador o None si venció el plazo, valor, segundos)
+    """
+    inicio = time.monotonic()
+    plazo = inicio + max(0.0, timeout_ms) / 1000
+    tareas: dict[asyncio.Future, str] = {}
+    for clave, espera in esperas.items():
+        if isinstance(espera, asyncio.Future):
+            espera = asyncio.shield(espera)
+        tareas[asyncio.ensure_future(espera)] = clave
+    
+    ganador: Optional[str] = None
+    valor: Any = None
+    pendientes = set(tareas)
+    try:
+        while pendientes and ganador is None:
+            restante = plazo - time.monotonic()
+            if restante <= 0:
+                break
+            hechas, pendientes = await asyncio.wait(
+                pendientes, timeout=restante, return_when=asyncio.FIRST_COMPLETED
+            )
+            for tarea in hechas:
+                if not tarea.cancelled() and tarea.exception() is None:
+                    ganador, valor = tareas[tarea], tarea.result()
+                    break
+    finally:
+        for tarea in pendientes:
+            tarea.cancel()
+        if pendientes:
+            await asyncio.gather(*pendientes, return_exceptions=True)
+    
+    segundos = time.monotonic() - inicio
+    _registrar_espera(nombre, ganador or 'deadline', segundos)
+    return ganador, valor, segundos
+
+
+def _restante_ms(plazo: float) -> float:
+    return max(0.0, (plazo - time.monotonic()) * 1000)
+
+
+# ============================================================================
+# BÚSQUEDA Y DESCARGA DEL PDF DE VISTA PREVIA
+# ============================================================================
+
+# Fragmentos de URL que delatan un PDF o su generador en el portal
+TOKENS_URL_PDF = ('.pdf', 'generacontrato.php', 'contrato.php', 'pdf_autotramite', 'descargar', 'download')
+
+# Reglas de prioridad (en orden) para elegir entre candidatos
+_PRIORIDADES_URL_PDF = ('.pdf', 'generacontrato.php', 'pdf_autotramite', 'contrato.php')
+
+# Tope de descargas por vista previa (candidatos + URLs halladas en respuestas HTML)
+MAX_CANDIDATOS_PDF = 8
+
+_RE_FILE_PARAM = re.compile(r'file=([^"\'\s]+)', re.IGNORECASE)
+_RE_URL_HTML = re.compile(r'(https?://[^"\s]+|/[^"\s]+|\.{1,2}/[^"\s]+)', re.IGNORECASE)
+
+# Un solo round trip: atributos de embeds/iframes/objects/anchors, file=... y
+# URLs del HTML, y el PDF base64 embebido (si lo hay)
+_JS_CANDIDATOS_PDF = r"""
+(tokens) => {
+    const selectores = [
+        ["embed[type='application/pdf']", 'src'],
+        ['embed[src]', 'src'],
+        ['iframe[src]', 'src'],
+        ['object[data]', 'data'],
+        ["a[href*='.pdf']", 'href'],
+        ["a[href*='download']", 'href'],
+        ["a[href*='descargar']", 'href'],
+        ['a[download]', 'href'],
+    ];
+    const candidatos = [];
+    for (const [selector, attr] of selectores) {
+        for (const el of document.querySelectorAll(selector)) {
+            const valor = el.getAttribute(attr);
+            if (valor) candidatos.push(valor);
+        }
+    }
+    const html = document.documentElement ? document.documentElement.outerHTML : '';
+    for (const m of html.matchAll(/file=([^"'\s]+)/gi)) candidatos.push(m[1]);
+    for (const m of html.matchAll(/(https?:\/\/[^"\s]+|\/[^"\s]+|\.{1,2}\/[^"\s]+)/gi)) {
+        const lower = m[1].toLowerCase();
+        if (tokens.some((t) => lower.includes(t))) candidatos.push(m[1]);
+    }
+
+    let base64 = null;
+    const embed = document.querySelector("embed[type='application/pdf']");
+    const src = embed ? (embed.getAttribute('src') || '') : '';
+    if (src.startsWith('data:application/pdf;base64,')) {
+        base64 = src.split(',', 2)[1];
+    }
+    if (!base64) {
+        const hidden = document.querySelector("input[name='pdfbase64']");
+        if (hidden && hidden.value) base64 = hidden.value;
+    }
+    if (!base64) {
+        const m = html.match(/data:application\/pdf;base64,([^"\s>]+)/i);
+        if (m) base64 = m[1];
+    }
+    return {candidatos, base64};
+}
+"""
+
+
+def es_pdf_bytes(data: Optional[bytes]) -> bool:
+    if not data:
+        return False
+    return data.lstrip().startswith(b'%PDF')
+
+
+def normalizar_url_pdf(url: Optional[str], base_url: str) -> Optional[str]:
+    """
+    Normaliza un candidato a URL absoluta (extrae file=... de visores PDF)
+
+    Returns:
+        str | None: URL absoluta, o None si no es descargable (about:, blob:, data:...)
+    """
+    if not url:
+        return None
+    url = url.strip()
+    if not url:
+        return None
+    lower = url.lower()
+    if lower.startswith(('about:', 'blob:', 'data:', 'javascript:', 'chrome-extension:', 'devtools:')):
+        return None
+    # Extraer file=... desde visor PDF
+    try:
+        query = parse_qs(urlparse(url).query)
+        if 'file' in query and query['file']:
+            return normalizar_url_pdf(unquote(query['file'][0]), base_url)
+    except Exception:
+        pass
+    if lower.startswith('//'):
+        url = 'https:' + url
+    if lower.startswith(('http://', 'https://')):
+        return url
+    # Relative URL
+    return urljoin(base_url, url)
+
+
+def priorizar_candidatos_pdf(candidatos: list[str], base_url: str) -> list[str]:
+    """
+    Normaliza, deduplica y ordena candidatos según las reglas de prioridad
+
+    Dentro de cada regla se respeta el orden de aparición. Los candidatos que
+    no cumplen ninguna regla se descartan.
+
+    Returns:
+        list[str]: URLs en orden de preferencia
+    """
+    normalizados: list[str] = []
+    for candidato in candidatos:
+        url = normalizar_url_pdf(candidato, base_url)
+        if url and url not in normalizados:
+            normalizados.append(url)
+
+    ordenados: list[str] = []
+    for token in _PRIORIDADES_URL_PDF:
+        for url in normalizados:
+            if token in url.lower() and url not in ordenados:
+                ordenados.append(url)
+    return ordenados
+
+
+def candidatos_pdf_en_html(html: str) -> list[str]:
+    """Candidatos (sin normalizar) en un HTML ya descargado"""
+    candidatos = _RE_FILE_PARAM.findall(html)
+    for match in _RE_URL_HTML.findall(html):
+        if any(token in match.lower() for token in TOKENS_URL_PDF):
+            candidatos.append(match)
+    return candidatos
+
+
+async def buscar_candidatos_pdf(target_page: Page) -> tuple[list[str], Optional[str]]:
+    """
+    Recolecta en un solo evaluate todas las URLs candidatas a PDF de la página
 
     Args:
-        page: Pagina de Playwright
-        dry_run: Si True, solo previsualiza sin registrar
-        screenshot_path: Path opcional para guardar screenshot o PDF
+        target_page: Página de la vista previa
 
     Returns:
-        ContratoResult: Resultado de la operacion
+        tuple: (URLs ordenadas por prioridad, PDF base64 embebido o None)
+    """
+    candidatos: list[str] = []
+    base64_pdf: Optional[str] = None
+    try:
+        data = await target_page.evaluate(_JS_CANDIDATOS_PDF, list(TOKENS_URL_PDF))
+        candidatos.extend(data.get('candidatos') or [])
+        base64_pdf = data.get('base64') or None
+    except Exception as e:
+        logger.warning(f'No se pudieron leer candidatos PDF del DOM: {str(e)}')
 
-    Raises:
-        RecoverableError: Si hay problemas en la operacion
+    # Frame URLs (estado local de Playwright, sin round trip)
+    try:
+        for frame in target_page.frames:
+            if frame.url:
+                candidatos.append(frame.url)
+    except Exception:
+        pass
+
+    if target_page.url:
+        candidatos.append(target_page.url)
+    return priorizar_candidatos_pdf(candidatos, target_page.url), base64_pdf
+
+
+async def _descargar_candidato_pdf(
+    request: Any,
+    url: str,
+    headers: dict[str, str],
+    buscar_en_html: bool
+) -> tuple[Optional[bytes], list[str]]:
+    """
+    Descarga un candidato
+
+    Returns:
+        tuple: (bytes si es un PDF válido, URLs halladas si la respuesta era HTML)
+    """
+    resp = await request.get(url, headers=headers)
+    if not resp.ok:
+        logger.warning(f'No se pudo descargar PDF (status {resp.status}): {url}')
+        return None, []
+    body = await resp.body()
+    if es_pdf_bytes(body):
+        return body, []
+    content_type = resp.headers.get('content-type', '').lower()
+    logger.warning(f"Respuesta no es PDF (content-type={content_type or 'n/a'}): {url}")
+    if not buscar_en_html:
+        return None, []
+    html = body.decode('utf-8', errors='ignore')
+    return None, priorizar_candidatos_pdf(candidatos_pdf_en_html(html), url)
+
+
+async def descargar_primer_pdf(
+    request: Any,
+    urls: list[str],
+    referer: str,
+    max_candidatos: int = MAX_CANDIDATOS_PDF
+) -> Optional[tuple[str, bytes]]:
     """
-    logger.info(f'Previsualizando contrato (dry_run={dry_run})')
+    Descarga los candidatos en paralelo; gana la primera respuesta %PDF válida
+
+    Si un candidato responde HTML (ej: generaContrato.php), las URLs que
+    contiene se suman como nuevos candidatos (un nivel). Al haber ganador,
+    las descargas restantes se cancelan.
 
+    Args:
+        request: APIRequestContext del contexto (comparte cookies de sesión)
+        urls: Candidatos ordenados por prioridad
+        referer: Referer a enviar
+        max_candidatos: Tope de descargas totales
+
+    Returns:
+        tuple | None: (url, bytes del PDF) o None si ningún candidato sirvió
+    """
+    headers = {'Accept': 'application/pdf', 'Referer': referer}
+    vistos: set[str] = set()
+    tareas: dict[asyncio.Future, tuple[int, str]] = {}
+
+    def lanzar(url: str, buscar_en_html: bool) -> None:
+        if url in vistos or len(vistos) >= max_candidatos:
+            return
+        vistos.add(url)
+        tarea = asyncio.ensure_future(_descargar_candidato_pdf(request, url, headers, buscar_en_html))
+        tareas[tarea] = (len(vistos), url)
+
+    for url in urls:
+        lanzar(url, True)
+
+    pendientes = set(tareas)
     try:
-        pdf_response = None
-        pdf_url: Optional[str] = None
-        archivo_guardado: Optional[str] = None
-        pdf_guardado = False
+        while pendientes:
+            hechas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+            # Si terminan varias a la vez, preferir la de mayor prioridad
+            for tarea in sorted(hechas, key=lambda t: tareas[t][0]):
+                url = tareas[tarea][1]
+                if tarea.cancelled():
+                    continue
+                if tarea.exception() is not None:
+                    logger.warning(f'Error descargando PDF {url}: {str(tarea.exception())}')
+                    continue
+                body, siguientes = tarea.result()
+                if body is not None:
+                    return url, body
+                for siguiente in siguientes:
+                    lanzar(siguiente, False)
+            pendientes |= {t for t in tareas if not t.done()}
+    finally:
+        restantes = [t for t in tareas if not t.done()]
+        for tarea in restantes:
+            tarea.cancel()
+        if restantes:
+            await asyncio.gather(*restantes, return_exceptions=True)
+    return None
+
+
+class _EscuchaPdf:
+    """
+    Resuelve `pdf` con la primera respuesta PDF de una página o sus popups
 
-        def normalizar_url(url: Optional[str], base_url: str) -> Optional[str]:
-            if not url:
-                return None
-            url = url.strip()
-            if not url:
-                return None
-            lower = url.lower()
-            if lower.startswith(('about:', 'blob:', 'data:', 'javascript:', 'chrome-extension:', 'devtools:')):
-                return None
-            # Extraer file=... desde visor PDF
-            try:
-                from urllib.parse import urlparse, parse_qs, unquote
-                parsed = urlparse(url)
-                query = parse_qs(parsed.query)
-                if 'file' in query and query['file']:
-                    file_url = unquote(query['file'][0])
-                    return normalizar_url(file_url, base_url)
-            except Exception:
-                pass
-            if lower.startswith('//'):
-                url = 'https:' + url
-            if lower.startswith(('http://', 'https://')):
-                return url
-            # Relative URL
-            from urllib.parse import urljoin
-            return urljoin(base_url, url)
-
-        def es_pdf_bytes(data: Optional[bytes]) -> bool:
-            if not data:
-                return False
-            return data.lstrip().startswith(b'%PDF')
-
-        async def extraer_pdf_base64(target_page: Page) -> Optional[str]:
-            # 1) Embed src data:application/pdf;base64,...
-            try:
-                embed = await target_page.query_selector("embed[type='application/pdf']")
-                if embed:
-                    src = await embed.get_attribute('src')
-                    if src and src.startswith('data:application/pdf;base64,'):
-                        return src.split(',', 1)[1]
-            except Exception:
-                pass
+    El listener va en el contexto (el PDF puede venir de un popup), pero en
+    un lote varias páginas comparten el contexto: las respuestas de otras
+    páginas se ignoran. Las de páginas aún desconocidas se guardan, porque
+    el documento de un popup puede llegar antes que el evento 'popup'.
+    """
 
-            # 2) Hidden input with base64
-            try:
-                hidden = await target_page.query_selector("input[name='pdfbase64']")
-                if hidden:
-                    value = await hidden.get_attribute('value')
-                    if value:
-                        return value
-            except Exception:
-                pass
+    def __init__(self, page: Page, loop: asyncio.AbstractEventLoop):
+        self.pdf: asyncio.Future = loop.create_future()
+        self._paginas = {page}
+        self._sin_pagina: list = []
+
+    @staticmethod
+    def _es_pdf(response) -> bool:
+        content_type = response.headers.get('content-type', '').lower()
+        url = response.url.lower()
+        if url.startswith('chrome-extension://'):
+            return False
+        return 'application/pdf' in content_type or url.endswith('.pdf') or 'pdf_' in url
+
+    def respuesta(self, response) -> None:
+        if self.pdf.done():
+            return
+        try:
+            if not self._es_pdf(response):
+                return
+            if response.frame.page in self._paginas:
+                self.pdf.set_result(response)
+            else:
+                self._sin_pagina.append(response)
+        except Exception:
+            pass
 
-            # 3) HTML fallback
+    def agregar_pagina(self, popup: Page) -> None:
+        self._paginas.add(popup)
+        for response in self._sin_pagina:
+            if self.pdf.done():
+                break
             try:
-                html = await target_page.content()
-                match = re.search(r'data:application/pdf;base64,([^"\\s>]+)', html, re.IGNORECASE)
-                if match:
-                    return match.group(1)
-                match = re.search(r'name=[\"\\\']pdfbase64[\"\\\']\\s+value=[\"\\\']([^\"\\\']+)[\"\\\']', html, re.IGNORECASE)
-                if match:
-                    return match.group(1)
+                if response.frame.page is popup:
+                    self.pdf.set_result(response)
             except Exception:
                 pass
 
-            return None
+
+async def _previsualizar(page: Page, screenshot_path: Optional[str] = None) -> VistaPrevia:
+    """
+    Genera la vista previa del contrato y guarda el PDF si se pide
+
+    Args:
+        page: Pagina de Playwright (con el formulario lleno)
+        screenshot_path: Path opcional para guardar screenshot o PDF
+
+    Returns:
+        VistaPrevia: Página de la vista previa, PDF y tiempos de espera
+
+    Raises:
+        RecoverableError: Si hay problemas generando la vista previa
+    """
+    logger.info('Previsualizando contrato')
+
+    try:
+        pdf_response = None
+        pdf_url: Optional[str] = None
+        archivo_guardado: Optional[str] = None
+        pdf_guardado = False
 
         async def dump_preview_debug(target_page: Page, pdf_path, candidatos: Optional[list[str]] = None) -> None:
             try:
@@ -353,233 +1076,114 @@ async def previsualizar_y_registrar(page: Page, dry_run: bool = False, screensho
             except Exception as e:
                 logger.warning(f'No se pudo guardar debug preview: {str(e)}')
 
-        async def buscar_url_pdf_en_pagina(target_page: Page) -> Optional[str]:
-            candidatos: list[str] = []
-
-            # Elements in DOM
-            selectores = [
-                ("embed[type='application/pdf']", 'src'),
-                ("embed[src]", 'src'),
-                ("iframe[src]", 'src'),
-                ("object[data]", 'data'),
-                ("a[href*='.pdf']", 'href'),
-                ("a[href*='download']", 'href'),
-                ("a[href*='descargar']", 'href'),
-                ("a[download]", 'href'),
-            ]
-            for selector, attr in selectores:
-                try:
-                    elementos = await target_page.query_selector_all(selector)
-                    for elemento in elementos:
-                        valor = await elemento.get_attribute(attr)
-                        if valor:
-                            candidatos.append(valor)
-                except Exception:
-                    continue
-
-            # Frame URLs
-            try:
-                for frame in target_page.frames:
-                    if frame.url:
-                        candidatos.append(frame.url)
-            except Exception:
-                pass
-
-            # HTML fallback
-            try:
-                html = await target_page.content()
-                # file=... en visor (pdf.js / chrome viewer)
-                for match in re.findall(r'file=([^"\'\\s]+)', html, re.IGNORECASE):
-                    candidatos.append(match)
-                for match in re.findall(r'(https?://[^"\\s]+|/[^"\\s]+|\\.{1,2}/[^"\\s]+)', html, re.IGNORECASE):
-                    if any(token in match.lower() for token in ['.pdf', 'generacontrato.php', 'contrato.php', 'pdf_autotramite', 'descargar', 'download']):
-                        candidatos.append(match)
-            except Exception:
-                pass
-
-            if target_page.url:
-                candidatos.append(target_page.url)
-
-            base_url = target_page.url
-            normalizados: list[str] = []
-            for candidato in candidatos:
-                url = normalizar_url(candidato, base_url)
-                if url:
-                    normalizados.append(url)
-
-            prioridades = [
-                lambda u: '.pdf' in u,
-                lambda u: 'generacontrato.php' in u,
-                lambda u: 'pdf_autotramite' in u,
-                lambda u: 'contrato.php' in u,
-            ]
-
-            for criterio in prioridades:
-                for url in normalizados:
-                    if criterio(url.lower()):
-                        return url
-            return None
-
-        def es_respuesta_pdf(response) -> bool:
-            try:
-                content_type = response.headers.get('content-type', '').lower()
-                url = response.url.lower()
-                if url.startswith('chrome-extension://'):
-                    return False
-                return 'application/pdf' in content_type or url.endswith('.pdf')
-            except Exception:
-                return False
-
-        # Preparar listener global para respuestas PDF (incluye popups)
+        # Preparar listener de respuestas PDF en el contexto (incluye popups).
+        # En un lote varias páginas comparten el contexto: solo cuentan las
+        # respuestas de esta página o de un popup abierto por ella.
         loop = asyncio.get_running_loop()
-        pdf_future = loop.create_future()
+        escucha_pdf = _EscuchaPdf(page, loop)
+        pdf_future = escucha_pdf.pdf
+        manejar_respuesta = escucha_pdf.respuesta
+        page.context.on('response', manejar_respuesta)
 
-        def manejar_respuesta(response) -> None:
-            if pdf_future.done():
-                return
-            try:
-                content_type = response.headers.get('content-type', '').lower()
-                url = response.url.lower()
-                if url.startswith('chrome-extension://'):
-                    return
-                if 'application/pdf' in content_type or url.endswith('.pdf') or 'pdf_' in url:
-                    pdf_future.set_result(response)
-            except Exception:
-                pass
+        # Popup de la vista previa (si el portal abre una pestaña nueva)
+        popup_future = loop.create_future()
 
-        page.context.on('response', manejar_respuesta)
+        def manejar_popup(popup) -> None:
+            escucha_pdf.agregar_pagina(popup)
+            if not popup_future.done():
+                popup_future.set_result(popup)
 
-        # Click en previsualizar PDF
+        page.on('popup', manejar_popup)
+
+        # Click en previsualizar PDF y esperar la primera señal de que está lista
         preview_page = page
-        if screenshot_path:
+        tiempos: dict[str, float] = {}
+        plazo = time.monotonic() + settings.timeout_preview / 1000
+        with etapa('preview') as detalle_preview:
             try:
-                async with page.expect_popup(timeout=5000) as popup_info:
+                await click_button(page, SELECTORS['btn_previsualizar'])
+            
+                logger.info('Esperando previsualizacion del PDF...')
+                ganador, valor, tiempos['preview'] = await _esperar_primera('preview', {
+                    'popup': popup_future,
+                    'pdf': pdf_future,
+                    'dom': page.wait_for_selector(MARCADORES_PREVIEW, state='attached', timeout=settings.timeout_preview),
+                }, settings.timeout_preview)
+            
+                if ganador == 'pdf':
+                    pdf_response = valor
+                    # La respuesta PDF no indica dónde quedó la vista previa
+                    ganador, valor, tiempos['preview_pagina'] = await _esperar_primera('preview_pagina', {
+                        'popup': popup_future,
+                        'dom': page.wait_for_selector(MARCADORES_PREVIEW, state='attached', timeout=settings.timeout_preview),
+                    }, _restante_ms(plazo))
+            
+                if ganador == 'popup':
+                    preview_page = valor
+                detalle_preview['popup'] = preview_page is not page
+            
+                # Para guardar el PDF, esperar la respuesta o su embed en la vista previa
+                if screenshot_path and pdf_response is None and not pdf_future.done():
+                    ganador, valor, tiempos['pdf'] = await _esperar_primera('pdf', {
+                        'pdf': pdf_future,
+                        'dom': preview_page.wait_for_selector(MARCADORES_PDF, state='attached', timeout=settings.timeout_preview),
+                    }, _restante_ms(plazo))
+                    if ganador == 'pdf':
+                        pdf_response = valor
+            
+                if pdf_response is None and pdf_future.done() and not pdf_future.cancelled():
+                    pdf_response = pdf_future.result()
+            finally:
+                # Liberar listeners
+                for evento, manejador, origen in (
+                    ('response', manejar_respuesta, page.context),
+                    ('popup', manejar_popup, page),
+                ):
                     try:
-                        async with page.expect_response(
-                            es_respuesta_pdf,
-                            timeout=settings.timeout_navigation
-                        ) as response_info:
-                            await click_button(page, SELECTORS['btn_previsualizar'])
-                        pdf_response = await response_info.value
-                    except PlaywrightTimeoutError:
-                        logger.warning('No se detecto respuesta PDF en la previsualizacion')
-                preview_page = await popup_info.value
-            except PlaywrightTimeoutError:
-                # No popup; el click ya fue ejecutado
-                pass
-            except Exception:
-                raise
-        else:
-            await click_button(page, SELECTORS['btn_previsualizar'])
-
-        # Esperar que cargue la previsualizacion (mas tiempo para asegurar que el PDF se genera)
-        logger.info('Esperando generacion del PDF...')
-        await asyncio.sleep(5)
-
-        # Intentar capturar respuesta PDF global si no se obtuvo antes
-        if pdf_response is None:
-            try:
-                pdf_response = await asyncio.wait_for(pdf_future, timeout=5)
-            except Exception:
-                pass
-
-        # Liberar listener
-        try:
-            page.context.off('response', manejar_respuesta)
-        except Exception:
-            pass
+                        origen.remove_listener(evento, manejador)
+                    except Exception:
+                        pass
 
         # Guardar PDF o screenshot si se especifica
         if screenshot_path:
-            from pathlib import Path
-            output_path = Path(screenshot_path)
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-
-            pdf_path = output_path if output_path.suffix.lower() == '.pdf' else output_path.with_suffix('.pdf')
-
-            if pdf_response:
-                try:
-                    pdf_bytes = await pdf_response.body()
-                    if es_pdf_bytes(pdf_bytes):
-                        pdf_path.write_bytes(pdf_bytes)
-                        pdf_url = pdf_response.url
-                        archivo_guardado = str(pdf_path)
-                        pdf_guardado = True
-                        logger.info(f'PDF guardado: {pdf_path}')
-                    else:
-                        logger.warning('Respuesta PDF no valida (no inicia con %PDF)')
-                except Exception as e:
-                    logger.warning(f'No se pudo guardar PDF desde respuesta: {str(e)}')
+            with etapa('pdf_capture') as detalle_pdf:
+                from pathlib import Path
+                output_path = Path(screenshot_path)
+                output_path.parent.mkdir(parents=True, exist_ok=True)
 
-            if not pdf_path.exists():
-                # Usar la misma lógica de búsqueda y dejar trazas si falla
-                pdf_url_dom = await buscar_url_pdf_en_pagina(preview_page)
+                pdf_path = output_path if output_path.suffix.lower() == '.pdf' else output_path.with_suffix('.pdf')
 
-                if pdf_url_dom:
+                if pdf_response:
                     try:
-                        resp = await page.context.request.get(
-                            pdf_url_dom,
-                            headers={
-                                'Accept': 'application/pdf',
-                                'Referer': preview_page.url or page.url,
-                            },
-                        )
-                        if resp.ok:
-                            body = await resp.body()
-                            content_type = resp.headers.get('content-type', '').lower()
-                            if es_pdf_bytes(body) or ('application/pdf' in content_type and body):
-                                pdf_path.write_bytes(body)
-                                pdf_url = pdf_url_dom
-                                archivo_guardado = str(pdf_path)
-                                pdf_guardado = True
-                                logger.info(f'PDF guardado: {pdf_path}')
-                            else:
-                                logger.warning(f"Respuesta no es PDF (content-type={content_type or 'n/a'})")
-
-                                # Intentar extraer otra URL desde HTML
-                                try:
-                                    html_text = body.decode('utf-8', errors='ignore')
-                                    matches: list[str] = []
-                                    for match in re.findall(r'file=([^"\'\\s]+)', html_text, re.IGNORECASE):
-                                        matches.append(match)
-                                    for match in re.findall(r'(https?://[^\"\\s]+|/[^\"\\s]+|\\.{1,2}/[^\"\\s]+)', html_text, re.IGNORECASE):
-                                        if any(token in match.lower() for token in ['.pdf', 'generacontrato.php', 'pdf_autotramite', 'contrato.php']):
-                                            matches.append(match)
-
-                                    for match in matches:
-                                        url2 = normalizar_url(match, pdf_url_dom)
-                                        if not url2:
-                                            continue
-                                        resp2 = await page.context.request.get(
-                                            url2,
-                                            headers={
-                                                'Accept': 'application/pdf',
-                                                'Referer': preview_page.url or page.url,
-                                            },
-                                        )
-                                        if resp2.ok:
-                                            body2 = await resp2.body()
-                                            content_type2 = resp2.headers.get('content-type', '').lower()
-                                            if es_pdf_bytes(body2) or ('application/pdf' in content_type2 and body2):
-                                                pdf_path.write_bytes(body2)
-                                                pdf_url = url2
-                                                archivo_guardado = str(pdf_path)
-                                                pdf_guardado = True
-                                                logger.info(f'PDF guardado: {pdf_path}')
-                                                break
-                                except Exception:
-                                    pass
+                        pdf_bytes = await pdf_response.body()
+                        if es_pdf_bytes(pdf_bytes):
+                            pdf_path.write_bytes(pdf_bytes)
+                            pdf_url = pdf_response.url
+                            archivo_guardado = str(pdf_path)
+                            pdf_guardado = True
+                            logger.info(f'PDF guardado: {pdf_path}')
                         else:
-                            logger.warning(f'No se pudo descargar PDF (status {resp.status})')
+                            logger.warning('Respuesta PDF no valida (no inicia con %PDF)')
                     except Exception as e:
-                        logger.warning(f'Error descargando PDF: {str(e)}')
-                # Si no se pudo guardar, dejar debug
-                if not pdf_guardado:
-                    # Intentar extraer PDF base64 embebido en el HTML
-                    try:
-                        import base64
-                        pdf_b64 = await extraer_pdf_base64(preview_page)
-                        if pdf_b64:
+                        logger.warning(f'No se pudo guardar PDF desde respuesta: {str(e)}')
+
+                if not pdf_path.exists():
+                    # Un evaluate para todos los candidatos y descargas en paralelo
+                    candidatos, pdf_b64 = await buscar_candidatos_pdf(preview_page)
+                    if candidatos:
+                        descargado = await descargar_primer_pdf(
+                            page.context.request, candidatos, preview_page.url or page.url
+                        )
+                        if descargado:
+                            pdf_url, pdf_bytes = descargado
+                            pdf_path.write_bytes(pdf_bytes)
+                            archivo_guardado = str(pdf_path)
+                            pdf_guardado = True
+                            logger.info(f'PDF guardado: {pdf_path}')
+
+                    # Si no se pudo descargar, usar el PDF base64 embebido en el HTML
+                    if not pdf_guardado and pdf_b64:
+                        try:
                             pdf_bytes = base64.b64decode(pdf_b64, validate=False)
                             if es_pdf_bytes(pdf_bytes):
                                 pdf_path.write_bytes(pdf_bytes)
@@ -587,77 +1191,139 @@ async def previsualizar_y_registrar(page: Page, dry_run: bool = False, screensho
                                 archivo_guardado = str(pdf_path)
                                 pdf_guardado = True
                                 logger.info(f'PDF guardado desde base64: {pdf_path}')
-                    except Exception as e:
-                        logger.warning(f'Error guardando PDF base64: {str(e)}')
-
-                if not pdf_guardado:
-                    await dump_preview_debug(preview_page, pdf_path)
-
-            if output_path.suffix.lower() in {'.png', '.jpg', '.jpeg', '.webp'}:
-                await page.screenshot(path=str(output_path), full_page=True)
-                archivo_guardado = archivo_guardado or str(output_path)
-                logger.info(f'Screenshot guardado: {output_path}')
-            elif pdf_path.exists() and pdf_path.stat().st_size < 10240:
-                logger.warning(f'PDF muy pequeno ({pdf_path.stat().st_size} bytes). Revisa el contenido.')
-
-        if dry_run:
-            logger.info('Modo dry-run: NO se registrara el contrato')
-            return ContratoResult(
-                success=True,
-                operacion_id=None,
-                pdf_url=pdf_url,
-                mensaje=f'Previsualizacion exitosa (modo dry-run, no se registro){f" - Archivo: {archivo_guardado}" if archivo_guardado else ""}',
-                error=None,
-                duracion_segundos=0.0
-            )
+                        except Exception as e:
+                            logger.warning(f'Error guardando PDF base64: {str(e)}')
+
+                    if not pdf_guardado:
+                        await dump_preview_debug(preview_page, pdf_path, candidatos)
+
+                if output_path.suffix.lower() in {'.png', '.jpg', '.jpeg', '.webp'}:
+                    await page.screenshot(path=str(output_path), full_page=True)
+                    archivo_guardado = archivo_guardado or str(output_path)
+                    logger.info(f'Screenshot guardado: {output_path}')
+                elif pdf_path.exists() and pdf_path.stat().st_size < 10240:
+                    logger.warning(f'PDF muy pequeno ({pdf_path.stat().st_size} bytes). Revisa el contenido.')
+                detalle_pdf['guardado'] = pdf_guardado
+
+        logger.info('Tiempos de espera del portal', extra={k: round(v, 3) for k, v in tiempos.items()})
+        return VistaPrevia(page=preview_page, pdf_url=pdf_url, archivo_guardado=archivo_guardado, tiempos=tiempos)
+
+    except RecoverableError:
+        raise
+
+    except Exception as e:
+        raise RecoverableError(f'Error en previsualizacion: {str(e)}')
+
+
+async def _clickear_registro(
+    preview_page: Page,
+    progreso: ProgresoContrato,
+    tiempos: dict[str, float],
+    loop: asyncio.AbstractEventLoop
+) -> None:
+    """
+    Presiona "Registrar Operacion" y espera la confirmación del portal
 
-        # Registrar operacion (clic en boton)
-        logger.info('Registrando operacion...')
-        registro_clickado = False
-        selectores_registro = [
-            SELECTORS.get('btn_registrar_operacion'),
-            'button:has-text("Registrar Operación")',
-            'button:has-text("Registrar Operacion")',
-            "button[name='accion'][value='guardar_contrato']",
-            "form#formulario_guardar_contrato button[type='submit']",
-            "form#formulario_guardar_contrato button",
-        ]
+    Raises:
+        RecoverableError: Si no se encuentra el botón de registro
+    """
+    # Registrar operacion (clic en boton)
+    logger.info('Registrando operacion...')
+    navegacion_future = loop.create_future()
+
+    def manejar_carga(*_args) -> None:
+        if not navegacion_future.done():
+            navegacion_future.set_result(True)
+
+    preview_page.on('load', manejar_carga)
+
+    selector_clickado: Optional[str] = None
+    selectores_registro = [
+        SELECTORS.get('btn_registrar_operacion'),
+        'button:has-text("Registrar Operación")',
+        'button:has-text("Registrar Operacion")',
+        "button[name='accion'][value='guardar_contrato']",
+        "form#formulario_guardar_contrato button[type='submit']",
+        "form#formulario_guardar_contrato button",
+    ]
+    try:
         for selector in selectores_registro:
             if not selector:
                 continue
             try:
                 await preview_page.wait_for_selector(selector, state='visible', timeout=settings.timeout_element)
-                locator = preview_page.locator(selector).first
-                try:
-                    await locator.scroll_into_view_if_needed()
-                except Exception:
-                    pass
-                await locator.click()
-                registro_clickado = True
-                break
-            except PlaywrightTimeoutError:
-                continue
             except Exception:
                 continue
+            selector_clickado = selector
+            break
 
-        if not registro_clickado:
+        if selector_clickado is None:
             raise RecoverableError('No se encontro boton "Registrar Operacion" en la vista previa')
 
-        # Esperar posible navegacion o procesamiento
+        locator = preview_page.locator(selector_clickado).first
         try:
-            await preview_page.wait_for_load_state('networkidle', timeout=settings.timeout_navigation)
+            await locator.scroll_into_view_if_needed()
         except Exception:
             pass
-        await asyncio.sleep(2)
+        # Checkpoint antes del click: si click() lanza, el registro pudo haberse
+        # enviado igual, así que ni otro selector ni un reintento vuelven a clickear
+        progreso.registro_clickado = True
+        await locator.click()
+
+        # Esperar navegacion, confirmacion en el DOM o que el boton desaparezca
+        _, _, tiempos['registro'] = await _esperar_primera('registro', {
+            'navegacion': navegacion_future,
+            'confirmacion': preview_page.wait_for_selector(
+                MARCADORES_CONFIRMACION, state='visible', timeout=settings.timeout_registro
+            ),
+            'boton_retirado': preview_page.wait_for_selector(
+                selector_clickado, state='detached', timeout=settings.timeout_registro
+            ),
+        }, settings.timeout_registro)
+    finally:
+        try:
+            preview_page.remove_listener('load', manejar_carga)
+        except Exception:
+            pass
+
+
+async def _registrar(vista: VistaPrevia, progreso: ProgresoContrato) -> ContratoResult:
+    """
+    Registra la operación desde la vista previa (una sola vez por contrato)
+
+    Args:
+        vista: Vista previa generada
+        progreso: Checkpoint del contrato (marca el click de registro)
+
+    Returns:
+        ContratoResult: Resultado de la operacion
 
+    Raises:
+        RecoverableError: Si no se encuentra el botón de registro
+    """
+    preview_page = vista.page
+    pdf_url = vista.pdf_url
+    tiempos = vista.tiempos
+    loop = asyncio.get_running_loop()
+
+    try:
+        if progreso.registro_clickado:
+            # Reintento tras un error posterior al click: nunca registrar dos veces
+            logger.warning('Registro ya enviado en un intento anterior, se omite el click')
+        else:
+            await _clickear_registro(preview_page, progreso, tiempos, loop)
+
+        # La página ya está lista: consultar el DOM sin esperas adicionales
         # Buscar link de PDF en la pagina (solo si no se capturo antes)
         if not pdf_url:
             try:
-                pdf_link = await preview_page.wait_for_selector('a[href*=".pdf"], a[download]', timeout=5000, state='visible')
+                pdf_link = await preview_page.query_selector('a[href*=".pdf"], a[download]')
                 if pdf_link:
                     pdf_url = await pdf_link.get_attribute('href')
                     if pdf_url and not pdf_url.startswith('http'):
                         pdf_url = settings.autotramite_base_url + pdf_url
+                else:
+                    logger.warning('No se encontro link de PDF en la pagina')
             except Exception:
                 logger.warning('No se encontro link de PDF en la pagina')
 
@@ -667,7 +1333,7 @@ async def previsualizar_y_registrar(page: Page, dry_run: bool = False, screensho
             # Intentar varios selectores posibles
             for selector in ['.operacion-id', '#numero-operacion', 'span:has-text("Folio")', 'td:has-text("ID")']:
                 try:
-                    elemento = await preview_page.wait_for_selector(selector, timeout=2000, state='visible')
+                    elemento = await preview_page.query_selector(selector)
                     if elemento:
                         texto = await elemento.text_content()
                         if texto:
@@ -680,6 +1346,8 @@ async def previsualizar_y_registrar(page: Page, dry_run: bool = False, screensho
         except Exception:
             logger.warning('No se encontro ID de operacion en la pagina')
 
+        logger.info('Tiempos de espera del portal', extra={k: round(v, 3) for k, v in tiempos.items()})
+
         logger.info('Contrato procesado exitosamente', extra={
             'operacion_id': operacion_id,
             'pdf_url': pdf_url[:50] if pdf_url else None
@@ -698,7 +1366,62 @@ async def previsualizar_y_registrar(page: Page, dry_run: bool = False, screensho
         raise
 
     except Exception as e:
-        raise RecoverableError(f'Error en previsualizacion/registro: {str(e)}')
+        raise RecoverableError(f'Error en registro: {str(e)}')
+
+
+async def previsualizar_y_registrar(
+    page: Page,
+    dry_run: bool = False,
+    screenshot_path: Optional[str] = None,
+    progreso: Optional[ProgresoContrato] = None
+) -> ContratoResult:
+    """
+    Previsualiza PDF y opcionalmente registra el contrato
+
+    Con `progreso`, un reintento reutiliza la vista previa vigente y nunca
+    vuelve a presionar el botón de registro.
+
+    Args:
+        page: Pagina de Playwright
+        dry_run: Si True, solo previsualiza sin registrar
+        screenshot_path: Path opcional para guardar screenshot o PDF
+        progreso: Checkpoint del contrato entre reintentos
+
+    Returns:
+        ContratoResult: Resultado de la operacion
+
+    Raises:
+        RecoverableError: Si hay problemas en la operacion
+    """
+    progreso = progreso or ProgresoContrato()
+
+    vista = progreso.vista_previa
+    if progreso.registro_clickado and vista is not None:
+        logger.info('Reintento posterior al registro: se retoma la lectura del resultado')
+    elif vista is None or vista.page.is_closed():
+        progreso.vista_previa = vista = await _previsualizar(page, screenshot_path)
+    else:
+        logger.info('Reutilizando vista previa del intento anterior')
+
+    if dry_run:
+        logger.info('Modo dry-run: NO se registrara el contrato')
+        return ContratoResult(
+            success=True,
+            operacion_id=None,
+            pdf_url=vista.pdf_url,
+            mensaje=f'Previsualizacion exitosa (modo dry-run, no se registro){f" - Archivo: {vista.archivo_guardado}" if vista.archivo_guardado else ""}',
+            error=None,
+            duracion_segundos=0.0
+        )
+
+    try:
+        with etapa('register'):
+            return await _registrar(vista, progreso)
+    except RecoverableError:
+        if not progreso.registro_clickado:
+            # Sin click de registro la vista previa pudo quedar inservible: regenerarla
+            progreso.vista_previa = None
+        raise
 
 
 async def ejecutar_con_reintentos(
@@ -754,7 +1477,87 @@ async def ejecutar_con_reintentos(
     raise Exception('Error desconocido en reintentos')
 
 
-async def crear_contrato_autotramite(datos: ContratoData, dry_run: bool = False, screenshot_path: Optional[str] = None) -> ContratoResult:
+async def _procesar_en_pagina(
+    page: Page,
+    datos: ContratoData,
+    dry_run: bool,
+    screenshot_path: Optional[str],
+    en_formulario: bool,
+    progreso: Optional[ProgresoContrato] = None
+) -> ContratoResult:
+    """
+    Llena, previsualiza y (opcionalmente) registra un contrato en una página autenticada
+    
+    Args:
+        page: Página con sesión válida
+        datos: Datos del contrato
+        dry_run: Si True, solo previsualiza
+        screenshot_path: Path opcional para guardar el PDF
+        en_formulario: Si la página ya está en el formulario (omite la primera navegación)
+        progreso: Checkpoint del contrato; el llamador lo consulta si esto lanza
+            (registro_clickado dice si el portal ya recibió el registro)
+    
+    Returns:
+        ContratoResult: Resultado de la operación (duración sin calcular)
+    """
+    limitador = limitador_portal()
+    progreso = progreso if progreso is not None else ProgresoContrato()
+    primer_intento = True
+
+    async def paso_formulario() -> None:
+        nonlocal primer_intento
+        # Retomar en la misma página si sigue en el formulario; si no, navegar de nuevo
+        if primer_intento:
+            navegar = not en_formulario
+            primer_intento = False
+        else:
+            navegar = not await pagina_en_formulario(page)
+        if navegar:
+            await limitador.adquirir()
+        await llenar_formulario(page, datos, navegar=navegar, progreso=progreso)
+
+    await ejecutar_con_reintentos(paso_formulario)
+
+    # Previsualizar y registrar (retoma desde la última etapa completada)
+    async def paso_registro() -> ContratoResult:
+        if progreso.vista_previa is None and not progreso.registro_clickado:
+            if not await pagina_en_formulario(page):
+                # Un intento anterior dejó la página a medio navegar: rehacer el formulario
+                logger.warning('La pagina ya no muestra el formulario, se vuelve a llenar')
+                progreso.reiniciar_formulario()
+                await paso_formulario()
+            await limitador.adquirir()
+        return await previsualizar_y_registrar(page, dry_run, screenshot_path, progreso=progreso)
+
+    resultado = await ejecutar_con_reintentos(paso_registro)
+    resultado.registro_enviado = progreso.registro_clickado
+    return resultado
+
+
+def _resultado_error(
+    error: Exception,
+    duracion: float,
+    timings: Optional[dict[str, float]] = None,
+    registro_enviado: bool = False
+) -> ContratoResult:
+    return ContratoResult(
+        success=False,
+        operacion_id=None,
+        pdf_url=None,
+        mensaje='Error al registrar contrato',
+        error=str(error),
+        duracion_segundos=round(duracion, 2),
+        timings=dict(timings or {}),
+        registro_enviado=registro_enviado
+    )
+
+
+async def crear_contrato_autotramite(
+    datos: ContratoData,
+    dry_run: bool = False,
+    screenshot_path: Optional[str] = None,
+    on_stage: Optional[StageCallback] = None
+) -> ContratoResult:
     """
     Función principal: crea contrato en AutoTramite
     
@@ -762,6 +1565,7 @@ async def crear_contrato_autotramite(datos: ContratoData, dry_run: bool = False,
         datos: Datos del contrato
         dry_run: Si True, solo valida sin registrar
         screenshot_path: Path opcional para guardar screenshot del PDF
+        on_stage: Callback opcional que recibe cada EventoEtapa (progreso en vivo)
     
     Returns:
         ContratoResult: Resultado de la operación
@@ -772,59 +1576,175 @@ async def crear_contrato_autotramite(datos: ContratoData, dry_run: bool = False,
         AutoTramiteError: Otros errores
     """
     inicio = time.time()
+    registro = iniciar_registro(on_stage, {'patente': datos.vehiculo.patente})
     
     logger.info('Iniciando creación de contrato', extra={
         'patente': datos.vehiculo.patente,
         'dry_run': dry_run
     })
     
-    async with async_playwright() as p:
-        logger.info('Lanzando Chromium...', extra={
-            'headless': settings.playwright_headless,
-            'slow_mo': settings.playwright_slow_mo
+    pool = get_browser_pool()
+    progreso = ProgresoContrato()
+
+    try:
+        # Reutilizar sesión autenticada en cache (si existe y no expiró)
+        version_cache = session_cache.version()
+        storage_state = session_cache.cargar()
+
+        # Contexto nuevo sobre un Chromium caliente del pool
+        async with pool.contexto(storage_state=storage_state) as context:
+            # Bloquear imágenes, fuentes y analytics (el PDF y el formulario siempre pasan)
+            ruteo = await aplicar_ruteo(context)
+            page: Page = await context.new_page()
+            logger.info('Nueva pagina creada')
+
+            # Login (omitido si la sesión en cache sigue vigente)
+            en_formulario = await asegurar_sesion(page, storage_state is not None, version_cache)
+
+            resultado = await _procesar_en_pagina(
+                page, datos, dry_run, screenshot_path, en_formulario, progreso=progreso
+            )
+
+            if ruteo is not None:
+                logger.info('Trafico del trabajo', extra=await ruteo.resumen())
+
+        duracion = time.time() - inicio
+        resultado.duracion_segundos = round(duracion, 2)
+        resultado.timings = {**registro.timings, 'total': round(registro.total(), 3)}
+
+        logger.info('Operación completada exitosamente', extra={
+            'duracion_segundos': resultado.duracion_segundos,
+            'operacion_id': resultado.operacion_id
         })
-        browser: Browser = await p.chromium.launch(
-            headless=settings.playwright_headless,
-            slow_mo=settings.playwright_slow_mo,
-            args=['--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu']
+
+        return resultado
+
+    except Exception as e:
+        duracion = time.time() - inicio
+        logger.error(f'Error en operación: {str(e)}', extra={'duracion_segundos': round(duracion, 2)})
+
+        return _resultado_error(
+            e, duracion, {**registro.timings, 'total': round(registro.total(), 3)},
+            registro_enviado=progreso.registro_clickado
         )
-        logger.info('Chromium lanzado exitosamente')
 
-        try:
-            page: Page = await browser.new_page()
-            logger.info('Nueva pagina creada')
-            
-            # Login
-            await ejecutar_con_reintentos(lambda: login_autotramite(page))
-            
-            # Llenar formulario
-            await ejecutar_con_reintentos(lambda: llenar_formulario(page, datos))
+
+async def crear_contratos_autotramite_batch(
+    contratos: list[ContratoData],
+    dry_run: bool = False,
+    screenshot_paths: Optional[list[Optional[str]]] = None,
+    paralelismo: Optional[int] = None,
+    on_stage: Optional[StageCallback] = None
+) -> list[ContratoResult]:
+    """
+    Crea varios contratos sobre un mismo navegador logueado con K páginas en paralelo
+    
+    El login se hace una sola vez por lote; las páginas comparten las cookies
+    del contexto. Las operaciones contra el portal pasan por el rate limiter
+    compartido (PORTAL_RATE_LIMIT_*). Un contrato fallido no aborta el lote.
+    
+    Args:
+        contratos: Contratos a procesar
+        dry_run: Si True, solo previsualiza
+        screenshot_paths: Path de salida por contrato (misma longitud que contratos)
+        paralelismo: Páginas en paralelo (usa BATCH_PARALLEL_PAGES si None)
+        on_stage: Callback de etapas; los eventos de cada contrato llevan `indice` en el detalle
+    
+    Returns:
+        list[ContratoResult]: Resultados en el mismo orden que `contratos`
+    """
+    if not contratos:
+        return []
+    if screenshot_paths is not None and len(screenshot_paths) != len(contratos):
+        raise ValueError('screenshot_paths debe tener un elemento por contrato')
+    
+    inicio_lote = time.time()
+    # Etapas compartidas del lote (navegador y login) van sin índice
+    registro_lote = iniciar_registro(on_stage, {'lote': len(contratos)})
+    paralelismo = max(1, min(paralelismo or settings.batch_parallel_pages, len(contratos)))
+    paths = screenshot_paths or [None] * len(contratos)
+    resultados: list[Optional[ContratoResult]] = [None] * len(contratos)
+    
+    logger.info('Iniciando lote de contratos', extra={
+        'contratos': len(contratos),
+        'paralelismo': paralelismo,
+        'dry_run': dry_run
+    })
+    
+    pool = get_browser_pool()
+    
+    try:
+        version_cache = session_cache.version()
+        storage_state = session_cache.cargar()
+        
+        async with pool.contexto(storage_state=storage_state) as context:
+            ruteo = await aplicar_ruteo(context)
             
-            # Previsualizar y registrar
-            resultado = await ejecutar_con_reintentos(lambda: previsualizar_y_registrar(page, dry_run, screenshot_path))
+            # Login único para todo el lote
+            primera = await context.new_page()
+            primera_en_formulario = await asegurar_sesion(primera, storage_state is not None, version_cache)
             
-            duracion = time.time() - inicio
-            resultado.duracion_segundos = round(duracion, 2)
+            paginas: asyncio.Queue = asyncio.Queue()
+            paginas.put_nowait((primera, primera_en_formulario))
+            for _ in range(paralelismo - 1):
+                paginas.put_nowait((await context.new_page(), False))
             
-            logger.info('Operación completada exitosamente', extra={
-                'duracion_segundos': resultado.duracion_segundos,
-                'operacion_id': resultado.operacion_id
-            })
+            async def procesar(indice: int, datos: ContratoData) -> None:
+                page, en_formulario = await paginas.get()
+                # Popups de la vista previa de este contrato (se cierran al terminar)
+                popups: list[Page] = []
+
+                def guardar_popup(popup: Page) -> None:
+                    popups.append(popup)
+
+                page.on('popup', guardar_popup)
+                inicio = time.time()
+                # Cada contrato corre en su propia tarea: registro de etapas propio
+                registro = iniciar_registro(on_stage, {'indice': indice, 'patente': datos.vehiculo.patente})
+                progreso = ProgresoContrato()
+                try:
+                    if not en_formulario:
+                        # Probe + re-login single-flight si la sesión expiró a mitad del lote
+                        en_formulario = await asegurar_sesion(page, True, session_cache.version())
+                    resultado = await _procesar_en_pagina(
+                        page, datos, dry_run, paths[indice], en_formulario, progreso=progreso
+                    )
+                    resultado.duracion_segundos = round(time.time() - inicio, 2)
+                    resultado.timings = {**registro.timings, 'total': round(registro.total(), 3)}
+                except Exception as e:
+                    logger.error(f'Error en contrato {indice + 1}/{len(contratos)}: {str(e)}', extra={
+                        'patente': datos.vehiculo.patente
+                    })
+                    resultado = _resultado_error(
+                        e, time.time() - inicio, registro.timings, registro_enviado=progreso.registro_clickado
+                    )
+                finally:
+                    page.remove_listener('popup', guardar_popup)
+                    for popup in popups:
+                        try:
+                            await popup.close()
+                        except Exception:
+                            pass
+                    paginas.put_nowait((page, False))
+                resultados[indice] = resultado
             
-            return resultado
-        
-        except Exception as e:
-            duracion = time.time() - inicio
-            logger.error(f'Error en operación: {str(e)}', extra={'duracion_segundos': round(duracion, 2)})
+            await asyncio.gather(*(procesar(i, datos) for i, datos in enumerate(contratos)))
             
-            return ContratoResult(
-                success=False,
-                operacion_id=None,
-                pdf_url=None,
-                mensaje='Error al registrar contrato',
-                error=str(e),
-                duracion_segundos=round(duracion, 2)
-            )
-        
-        finally:
-            await browser.close()
+            if ruteo is not None:
+                logger.info('Trafico del lote', extra=await ruteo.resumen())
+    
+    except Exception as e:
+        # Fallo antes de procesar (login, navegador): todos los pendientes fallan
+        logger.error(f'Error en lote de contratos: {str(e)}')
+        duracion = time.time() - inicio_lote
+        resultados = [r if r is not None else _resultado_error(e, duracion, registro_lote.timings) for r in resultados]
+    
+    exitosos = sum(1 for r in resultados if r is not None and r.success)
+    logger.info('Lote completado', extra={
+        'contratos': len(contratos),
+        'exitosos': exitosos,
+        'fallidos': len(contratos) - exitosos,
+        'duracion_segundos': round(time.time() - inicio_lote, 2),
+        'timings_lote': registro_lote.timings
+    })
+    return [r for r in resultados if r is not None]
@@ -0,0 +1,300 @@
+"""
+Pool persistente de navegadores Chromium para AutoTramite
+Mantiene instancias calientes y entrega un BrowserContext nuevo por trabajo
+"""
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Optional
+from playwright.async_api import async_playwright, Browser, BrowserContext, Playwright
+
+from .config import settings
+from .logging_utils import get_logger
+from .stage_events import etapa
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+CHROMIUM_ARGS = ['--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu']
+
+
+@dataclass(eq=False)
+class _NavegadorPool:
+    """Instancia de Chromium administrada por el pool"""
+    browser: Browser
+    creado_en: float
+    trabajos: int = 0
+
+    def edad_segundos(self) -> float:
+        return time.monotonic() - self.creado_en
+
+    def debe_reciclarse(self, max_trabajos: int, max_edad_segundos: float) -> bool:
+        if max_trabajos > 0 and self.trabajos >= max_trabajos:
+            return True
+        if max_edad_segundos > 0 and self.edad_segundos() >= max_edad_segundos:
+            return True
+        return False
+
+
+class BrowserPool:
+    """
+    Pool de navegadores Chromium reutilizables
+
+    Cada slot del pool es un Chromium que se lanza de forma perezosa (o al
+    precalentar). Cada trabajo recibe un BrowserContext nuevo y aislado, que se
+    cierra al terminar; el navegador vuelve al pool y se recicla tras N trabajos
+    o M minutos, o si deja de responder.
+    """
+
+    def __init__(
+        self,
+        tamano: Optional[int] = None,
+        max_trabajos: Optional[int] = None,
+        max_edad_minutos: Optional[float] = None,
+    ):
+        """
+        Args:
+            tamano: Cantidad de navegadores (usa config si None)
+            max_trabajos: Reciclar navegador tras N trabajos (0 = sin límite)
+            max_edad_minutos: Reciclar navegador tras M minutos (0 = sin límite)
+        """
+        self.tamano = max(1, tamano if tamano is not None else settings.browser_pool_size)
+        self.max_trabajos = max_trabajos if max_trabajos is not None else settings.browser_pool_max_jobs
+        edad = max_edad_minutos if max_edad_minutos is not None else settings.browser_pool_max_age_minutes
+        self.max_edad_segundos = edad * 60
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.cerrado = False
+        self._playwright: Optional[Playwright] = None
+        self._libres: Optional[asyncio.Queue] = None
+        self._navegadores: set[_NavegadorPool] = set()
+        self._lock_inicio: Optional[asyncio.Lock] = None
+        self._centinela: Optional[AsyncIterator[None]] = None
+        self._trabajos_totales = 0
+        self._reciclados = 0
+
+    async def iniciar(self, precalentar: bool = False) -> None:
+        """
+        Inicia Playwright y prepara los slots del pool
+
+        Args:
+            precalentar: Si True, lanza todos los navegadores de inmediato
+        """
+        if self.cerrado:
+            raise RuntimeError('El pool de navegadores ya fue cerrado')
+
+        if self._libres is None:
+            self.loop = asyncio.get_running_loop()
+            self._lock_inicio = asyncio.Lock()
+            self._libres = asyncio.Queue()
+            # Slots vacíos: el navegador se lanza al primer uso
+            for _ in range(self.tamano):
+                self._libres.put_nowait(None)
+            # El loop guarda sus async generators con referencia débil
+            self._centinela = _cerrar_con_el_loop(self)
+            await self._centinela.__anext__()
+
+        assert self._lock_inicio is not None
+        async with self._lock_inicio:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+
+        if precalentar:
+            slots = [await self._libres.get() for _ in range(self.tamano)]
+            try:
+                for i, slot in enumerate(slots):
+                    if slot is None:
+                        slots[i] = await self._lanzar()
+            finally:
+                for slot in slots:
+                    self._libres.put_nowait(slot)
+            logger.info(f'Pool de navegadores precalentado ({self.tamano} instancias)')
+
+    async def _lanzar(self) -> _NavegadorPool:
+        assert self._playwright is not None
+        logger.info('Lanzando Chromium...', extra={
+            'headless': settings.playwright_headless,
+            'slow_mo': settings.playwright_slow_mo
+        })
+        browser = await self._playwright.chromium.launch(
+            headless=settings.playwright_headless,
+            slow_mo=settings.playwright_slow_mo,
+            args=CHROMIUM_ARGS
+        )
+        navegador = _NavegadorPool(browser=browser, creado_en=time.monotonic())
+        self._navegadores.add(navegador)
+        logger.info('Chromium lanzado exitosamente')
+        return navegador
+
+    async def _descartar(self, navegador: _NavegadorPool) -> None:
+        self._navegadores.discard(navegador)
+        try:
+            await navegador.browser.close()
+        except Exception as e:
+            logger.warning(f'No se pudo cerrar Chromium reciclado: {str(e)}')
+
+    def _saludable(self, navegador: _NavegadorPool) -> bool:
+        try:
+            return navegador.browser.is_connected()
+        except Exception:
+            return False
+
+    async def _tomar(self) -> _NavegadorPool:
+        await self.iniciar()
+        assert self._libres is not None
+        slot = await self._libres.get()
+        try:
+            if slot is not None and not self._saludable(slot):
+                logger.warning('Chromium del pool no responde, relanzando')
+                await self._descartar(slot)
+                slot = None
+            if slot is None:
+                slot = await self._lanzar()
+            return slot
+        except BaseException:
+            # Devolver el slot vacío para no reducir la capacidad del pool
+            self._libres.put_nowait(None)
+            raise
+
+    async def _devolver(self, navegador: _NavegadorPool) -> None:
+        assert self._libres is not None
+        if self.cerrado:
+            await self._descartar(navegador)
+            return
+
+        slot: Optional[_NavegadorPool] = navegador
+        if not self._saludable(navegador) or navegador.debe_reciclarse(self.max_trabajos, self.max_edad_segundos):
+            logger.info('Reciclando Chromium del pool', extra={
+                'trabajos': navegador.trabajos,
+                'edad_segundos': round(navegador.edad_segundos(), 1)
+            })
+            await self._descartar(navegador)
+            self._reciclados += 1
+            slot = None  # Se relanza en el próximo uso
+        self._libres.put_nowait(slot)
+
+    @asynccontextmanager
+    async def contexto(self, **context_kwargs: Any) -> AsyncIterator[BrowserContext]:
+        """
+        Entrega un BrowserContext nuevo sobre un navegador caliente del pool
+
+        Args:
+            **context_kwargs: Argumentos para browser.new_context()
+
+        Yields:
+            BrowserContext: Contexto aislado (se cierra al salir)
+        """
+        navegador: Optional[_NavegadorPool] = None
+        context: Optional[BrowserContext] = None
+        try:
+            with etapa('browser_launch') as detalle:
+                navegador = await self._tomar()
+                detalle['reutilizado'] = navegador.trabajos > 0
+                context = await navegador.browser.new_context(**context_kwargs)
+            yield context
+        finally:
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception as e:
+                    logger.warning(f'No se pudo cerrar contexto: {str(e)}')
+            if navegador is not None:
+                navegador.trabajos += 1
+                self._trabajos_totales += 1
+                await self._devolver(navegador)
+
+    def estado(self) -> dict:
+        """
+        Estado actual del pool (para health checks)
+
+        Returns:
+            dict: tamano, navegadores activos, libres, trabajos y reciclados
+        """
+        return {
+            'tamano': self.tamano,
+            'navegadores_activos': len(self._navegadores),
+            'slots_libres': self._libres.qsize() if self._libres is not None else self.tamano,
+            'trabajos_totales': self._trabajos_totales,
+            'reciclados': self._reciclados,
+            'cerrado': self.cerrado,
+        }
+
+    async def cerrar(self) -> None:
+        """Cierra todos los navegadores y detiene Playwright"""
+        if self.cerrado:
+            return
+        self.cerrado = True
+
+        for navegador in list(self._navegadores):
+            await self._descartar(navegador)
+
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception as e:
+                logger.warning(f'No se pudo detener Playwright: {str(e)}')
+            self._playwright = None
+
+        logger.info('Pool de navegadores cerrado')
+
+
+# ============================================================================
+# INSTANCIA GLOBAL + HOOKS DE CIERRE
+# ============================================================================
+
+async def _cerrar_con_el_loop(pool: BrowserPool) -> AsyncIterator[None]:
+    """
+    Cierra `pool` cuando termina su event loop
+
+    El loop finaliza sus async generators pendientes en shutdown_asyncgens()
+    (asyncio.run lo llama antes de cerrarse), todavía corriendo, así que
+    Chromium y Playwright se cierran aunque nadie llame a cerrar_browser_pool.
+    """
+    try:
+        yield
+    finally:
+        with _pools_lock:
+            if _pools.get(pool.loop) is pool:
+                del _pools[pool.loop]
+        await pool.cerrar()
+
+
+# Un pool por event loop: Playwright queda ligado al loop donde se inició
+_pools: dict[asyncio.AbstractEventLoop, BrowserPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """
+    Retorna el pool del event loop actual, creándolo si no existe
+
+    Cada loop (ej: un asyncio.run por thread) tiene su propio pool, así que
+    cambiar de loop no deja huérfano el pool de otro: cada uno se cierra con
+    cerrar_browser_pool desde su loop o, si no, al terminar el loop
+    (asyncio.run / shutdown_asyncgens). Los pools de loops ya cerrados se
+    descartan.
+
+    Returns:
+        BrowserPool: Pool compartido por los trabajos del loop
+    """
+    loop = asyncio.get_running_loop()
+    with _pools_lock:
+        for otro in [loop_pool for loop_pool in _pools if loop_pool.is_closed()]:
+            if not _pools.pop(otro).cerrado:
+                logger.warning(
+                    'Pool de navegadores sin cerrar en un event loop terminado sin shutdown_asyncgens '
+                    '(usa asyncio.run o cerrar_browser_pool)'
+                )
+        pool = _pools.get(loop)
+        if pool is None or pool.cerrado:
+            pool = _pools[loop] = BrowserPool()
+        return pool
+
+
+async def cerrar_browser_pool() -> None:
+    """Cierra el pool del event loop actual (hook de shutdown para FastAPI/CLI)"""
+    with _pools_lock:
+        pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.cerrar()
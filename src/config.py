@@ -23,6 +23,15 @@ class Settings(BaseSettings):
     timeout_navigation: int = 30000
     timeout_element: int = 10000
     timeout_animation: int = 500
+    timeout_preview: int = 15000  # Plazo máximo para que la previsualización esté lista
+    timeout_registro: int = 15000  # Plazo máximo para confirmar el registro
+    
+    # Llenado del formulario: 'type' (tecla a tecla), 'fill' (Playwright fill) o
+    # 'batch' (un solo page.evaluate con todos los valores)
+    fill_strategy: str = 'type'  # 'fill'/'batch' son opt-in (FILL_STRATEGY)
+    fill_type_delay_ms: int = 50  # Delay entre teclas en modo 'type'
+    # Claves de SELECTORS que siempre se tipean tecla a tecla (separadas por coma)
+    fill_keystroke_fields: str = 'vehiculo_patente,vendedor_rut,comprador_rut'
     
     # Reintentos
     max_reintentos: int = 3
@@ -35,6 +44,50 @@ class Settings(BaseSettings):
     # Playwright
     playwright_headless: bool = True
     playwright_slow_mo: int = 0  # ms de delay entre acciones (útil para debugging)
+
+    # Pool de navegadores (Chromium persistente entre contratos)
+    browser_pool_size: int = 1  # Cantidad de Chromium calientes
+    browser_pool_max_jobs: int = 50  # Reciclar navegador tras N trabajos (0 = sin límite)
+    browser_pool_max_age_minutes: int = 30  # Reciclar navegador tras M minutos (0 = sin límite)
+    browser_pool_warmup: bool = False  # Lanzar navegadores al iniciar la API
+
+    # Cache de sesión autenticada (storage state cifrado en disco)
+    session_cache_enabled: bool = True
+    session_cache_path: str = '.cache/autotramite_session.enc'
+    session_cache_ttl_minutes: int = 240  # Máxima antigüedad antes de forzar login
+    session_cache_secret: Optional[str] = None  # Si vacío, se deriva de las credenciales
+    
+    # Lotes de contratos y rate limiting del portal
+    batch_parallel_pages: int = 3  # Páginas en paralelo sobre el mismo navegador logueado
+    portal_rate_limit_per_second: float = 1.0  # Operaciones por segundo contra el portal (0 = sin límite)
+    portal_rate_limit_burst: int = 2  # Operaciones que pueden salir juntas
+    
+    # Ruteo de requests del navegador (bloqueo de recursos innecesarios)
+    routing_enabled: bool = True
+    routing_block_types: str = 'image,font,media'  # resource types de Playwright (coma)
+    routing_block_patterns: str = (  # Fragmentos de URL a bloquear (coma)
+        'google-analytics.com,googletagmanager.com,doubleclick.net,'
+        'facebook.net,hotjar.com,clarity.ms'
+    )
+    routing_allow_patterns: str = ''  # Fragmentos de URL que nunca se bloquean (coma)
+    
+    # Worker persistente (src/worker.py): Chromium tibio atendido por socket local
+    worker_enabled: bool = True  # Streamlit/CLI envían trabajos al worker en vez de lanzar un proceso
+    worker_host: str = '127.0.0.1'
+    worker_port: int = 8765
+    worker_token: Optional[str] = None  # Token compartido; si falta se genera uno por instalación
+    worker_token_path: str = '.cache/worker.token'  # Token generado (permisos 0600)
+    worker_job_timeout_s: float = 300.0  # Segundos máximos sin mensajes del worker
+    
+    # Cola de trabajos asíncronos de la API (src/jobs.py)
+    jobs_db_path: str = '.cache/jobs.sqlite3'
+    jobs_concurrency: int = 2  # Trabajos ejecutándose a la vez
+    jobs_max_queue: int = 50  # Trabajos en cola antes de rechazar con 503
+    jobs_retention_hours: float = 168.0  # Purgar trabajos terminados más antiguos (0 = nunca)
+    
+    # Idempotencia de la API por (endpoint, correlation_id)
+    idempotency_ttl_seconds: float = 3600.0  # Vigencia de respuestas cacheadas (0 = desactivada)
+    idempotency_max_entries: int = 1000  # Tope de respuestas en memoria
     
     # SMTP Configuration (para envío de emails)
     smtp_host: Optional[str] = None
@@ -42,6 +95,37 @@ class Settings(BaseSettings):
     smtp_user: Optional[str] = None
     smtp_pass: Optional[str] = None
     smtp_secure: Optional[str] = 'none'  # 'tls', 'ssl', 'none', 'false'
+    
+    # Executors para trabajo bloqueante desde la API (src/executors.py)
+    smtp_max_workers: int = 4  # Envíos SMTP simultáneos
+    pdf_max_workers: int = 2  # PDFs (pypdf) generándose a la vez
+    pdf_process_workers: int = 0  # Procesos para lotes de PDFs TAG (0 = CPUs disponibles)
+    tag_lote_max_documentos: int = 100  # Tope de documentos por lote TAG
+
+    # Renderer de PDFs TAG (src/tag_pdf.py)
+    tag_pdf_renderer: str = 'incremental'  # 'incremental' o 'pypdf' (clon del reader cacheado, más lento)
+
+    # Cache de PDFs TAG generados (src/tag_cache.py)
+    tag_cache_enabled: bool = True
+    tag_cache_dir: str = '.cache/tag_pdf'
+    tag_cache_max_mb: float = 200.0  # Tamaño máximo en disco (se expulsan los menos usados)
+    
+    # Pool de conexiones SMTP (src/smtp_pool.py)
+    smtp_pool_enabled: bool = True
+    smtp_pool_size: int = 2  # Conexiones ociosas por servidor/usuario
+    smtp_pool_idle_seconds: float = 120.0  # Cerrar conexiones ociosas más antiguas (0 = sin límite)
+    smtp_pool_noop_after_seconds: float = 15.0  # Validar con NOOP si estuvo ociosa más que esto
+    smtp_pool_max_messages: int = 100  # Reciclar la conexión tras N mensajes (0 = sin límite)
+
+    # Outbox de envío masivo de correos (src/mail_outbox.py)
+    mail_outbox_db_path: str = '.cache/mail_outbox.sqlite3'
+    mail_outbox_rate_per_minute: float = 0.0  # 0 = límite según proveedor SMTP
+    mail_outbox_rate_burst: int = 1
+    mail_outbox_max_attempts: int = 5  # Intentos antes de marcar el correo como fallido
+    mail_outbox_backoff_seconds: float = 30.0  # Espera base entre reintentos (se duplica por intento)
+    mail_outbox_backoff_max_seconds: float = 900.0
+    mail_outbox_poll_seconds: float = 2.0  # Cada cuánto el worker revisa correos listos
+    mail_outbox_lease_seconds: float = 300.0  # Reserva de un correo 'enviando' antes de darlo por interrumpido
 
     # App auth (Streamlit login)
     app_auth_enabled: bool = False
@@ -0,0 +1,113 @@
+"""
+Executors acotados para trabajo bloqueante desde código async
+SMTP (smtplib) y generación de PDFs (pypdf) son síncronos; llamarlos
+directo dentro de un handler async congela el event loop completo
+(/health, trabajos en curso). Se corren en pools de threads con tope de
+workers; lo que exceda el tope espera en la cola del pool.
+
+El render de lotes TAG es CPU puro y usa además un pool de procesos
+(get_process_pool), para no competir por el GIL con el event loop.
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from .config import settings
+from .logging_utils import get_logger
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+T = TypeVar('T')
+
+# Pools por tipo de trabajo (se crean al primer uso)
+SMTP = 'smtp'
+PDF = 'pdf'
+
+_pools: dict[str, ThreadPoolExecutor] = {}
+_procesos: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def _max_workers(nombre: str) -> int:
+    if nombre == SMTP:
+        return max(1, settings.smtp_max_workers)
+    if nombre == PDF:
+        return max(1, settings.pdf_max_workers)
+    raise ValueError(f'Executor desconocido: {nombre}')
+
+
+def get_executor(nombre: str) -> ThreadPoolExecutor:
+    """
+    Retorna el pool de threads `nombre`, creándolo si no existe
+
+    Args:
+        nombre: SMTP o PDF
+
+    Returns:
+        ThreadPoolExecutor: Pool compartido del proceso
+    """
+    with _lock:
+        pool = _pools.get(nombre)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=_max_workers(nombre), thread_name_prefix=f'{nombre}-worker')
+            _pools[nombre] = pool
+        return pool
+
+
+def procesos_pdf() -> int:
+    """Procesos del pool de render (PDF_PROCESS_WORKERS, 0 = CPUs disponibles)"""
+    return max(1, settings.pdf_process_workers or os.cpu_count() or 1)
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Retorna el pool de procesos para render de PDFs, creándolo si no existe
+
+    Usa 'spawn': el proceso de la API tiene threads vivos (pools, navegador)
+    y un fork con threads puede heredar locks tomados.
+
+    Returns:
+        ProcessPoolExecutor: Pool compartido del proceso
+    """
+    global _procesos
+    with _lock:
+        if _procesos is None:
+            _procesos = ProcessPoolExecutor(
+                max_workers=procesos_pdf(),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _procesos
+
+
+async def en_executor(nombre: str, funcion: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Ejecuta una función bloqueante en el pool `nombre` sin bloquear el loop
+
+    Args:
+        nombre: SMTP o PDF
+        funcion: Función síncrona
+        *args, **kwargs: Argumentos de la función
+
+    Returns:
+        Resultado de la función (sus excepciones se propagan)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(nombre), functools.partial(funcion, *args, **kwargs))
+
+
+def cerrar_executors(esperar: bool = True) -> None:
+    """Cierra los pools (hook de shutdown de la API)"""
+    global _procesos
+    with _lock:
+        pools: list = list(_pools.values())
+        _pools.clear()
+        if _procesos is not None:
+            pools.append(_procesos)
+            _procesos = None
+    for pool in pools:
+        pool.shutdown(wait=esperar)
+
@@ -0,0 +1,191 @@
+"""
+Idempotencia por (endpoint, correlation_id) para la API
+Un reintento de n8n con el mismo correlation_id no vuelve a ejecutar el
+trabajo: si el original sigue en curso se engancha a él, y si ya terminó
+recibe la respuesta cacheada (hasta que vence el TTL). Se cachean las
+respuestas exitosas y las que ya registraron en el portal; un reintento
+tras un 'exito': false sin registro vuelve a ejecutar.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from .config import settings
+from .logging_utils import get_logger
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+T = TypeVar('T')
+
+
+class IdempotenciaConflictoError(Exception):
+    """Mismo correlation_id reutilizado con un cuerpo distinto"""
+    pass
+
+
+def huella_payload(payload: Any) -> str:
+    """Hash estable del cuerpo de la request (para detectar reusos con otro cuerpo)"""
+    if hasattr(payload, 'model_dump'):
+        payload = payload.model_dump(mode='json')
+    serializado = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serializado.encode('utf-8')).hexdigest()
+
+
+def respuesta_cacheable(respuesta: Any) -> bool:
+    """
+    Si un reintento debe recibir esta respuesta en vez de volver a ejecutar
+
+    False solo con exito=False (modelo o dict) y sin metadata['registro_enviado']:
+    un fallo posterior al click de "Registrar" se cachea igual, porque repetir
+    el trabajo registraría el contrato dos veces.
+    """
+    if isinstance(respuesta, dict):
+        exito, metadata = respuesta.get('exito'), respuesta.get('metadata')
+    else:
+        exito, metadata = getattr(respuesta, 'exito', True), getattr(respuesta, 'metadata', None)
+    return exito is not False or bool((metadata or {}).get('registro_enviado'))
+
+
+@dataclass
+class _Entrada:
+    huella: str
+    futuro: asyncio.Future
+    creada: float = field(default_factory=time.monotonic)
+    expira: Optional[float] = None  # Se fija al completar
+
+
+class IdempotencyStore:
+    """
+    Store en memoria de ejecuciones por (endpoint, correlation_id)
+
+    Solo se cachean las respuestas que pasan `cachear` (respuesta_cacheable):
+    si la ejecución lanza una excepción o responde exito=False sin haber
+    registrado, los que esperaban reciben ese mismo resultado y la clave se
+    libera para permitir un reintento.
+    """
+
+    def __init__(self, ttl_segundos: Optional[float] = None, max_entradas: Optional[int] = None):
+        """
+        Args:
+            ttl_segundos: Vigencia de una respuesta cacheada (default: settings.idempotency_ttl_seconds; 0 = sin idempotencia)
+            max_entradas: Tope de respuestas cacheadas (default: settings.idempotency_max_entries)
+        """
+        self.ttl_segundos = settings.idempotency_ttl_seconds if ttl_segundos is None else ttl_segundos
+        self.max_entradas = max_entradas or settings.idempotency_max_entries
+        self._entradas: dict[tuple[str, str], _Entrada] = {}
+        self.estadisticas = {'ejecuciones': 0, 'enganchados': 0, 'cacheados': 0, 'conflictos': 0}
+
+    def _purgar(self) -> None:
+        ahora = time.monotonic()
+        vencidas = [k for k, e in self._entradas.items() if e.expira is not None and e.expira <= ahora]
+        for clave in vencidas:
+            del self._entradas[clave]
+        completas = [(e.expira, k) for k, e in self._entradas.items() if e.expira is not None]
+        exceso = len(completas) - self.max_entradas
+        if exceso > 0:
+            for _, clave in sorted(completas)[:exceso]:
+                del self._entradas[clave]
+
+    async def ejecutar(
+        self,
+        endpoint: str,
+        correlation_id: Optional[str],
+        payload: Any,
+        funcion: Callable[[], Awaitable[T]],
+        cachear: Callable[[Any], bool] = respuesta_cacheable
+    ) -> T:
+        """
+        Ejecuta `funcion` una sola vez por (endpoint, correlation_id)
+
+        Args:
+            endpoint: Ruta del endpoint (parte de la clave)
+            correlation_id: Id de correlación del llamador
+            payload: Cuerpo de la request (para detectar conflictos)
+            funcion: Trabajo a ejecutar si no hay uno previo
+            cachear: Decide si la respuesta se guarda por el TTL (default: respuesta_cacheable)
+
+        Returns:
+            Respuesta de la ejecución original (propia, en curso o cacheada)
+
+        Raises:
+            IdempotenciaConflictoError: Si el correlation_id ya se usó con otro cuerpo
+        """
+        if not correlation_id or self.ttl_segundos <= 0:
+            return await funcion()
+
+        self._purgar()
+        clave = (endpoint, correlation_id)
+        huella = huella_payload(payload)
+        entrada = self._entradas.get(clave)
+
+        if entrada is not None:
+            if entrada.huella != huella:
+                self.estadisticas['conflictos'] += 1
+                raise IdempotenciaConflictoError(
+                    f'correlation_id {correlation_id} ya se usó en {endpoint} con otro contenido'
+                )
+            if entrada.futuro.done():
+                self.estadisticas['cacheados'] += 1
+                logger.info(f'[{correlation_id}] Respuesta cacheada de {endpoint}')
+            else:
+                self.estadisticas['enganchados'] += 1
+                logger.info(f'[{correlation_id}] Duplicado en curso de {endpoint}: esperando al original')
+            return await asyncio.shield(entrada.futuro)
+
+        entrada = _Entrada(huella=huella, futuro=asyncio.get_running_loop().create_future())
+        self._entradas[clave] = entrada
+        self.estadisticas['ejecuciones'] += 1
+        try:
+            respuesta = await funcion()
+        except BaseException as e:
+            self._entradas.pop(clave, None)
+            if not entrada.futuro.done():
+                if isinstance(e, asyncio.CancelledError):
+                    entrada.futuro.cancel()
+                else:
+                    entrada.futuro.set_exception(e)
+                    entrada.futuro.exception()  # Evitar 'exception was never retrieved' si nadie espera
+            raise
+        if cachear(respuesta):
+            entrada.expira = time.monotonic() + self.ttl_segundos
+        else:
+            self._entradas.pop(clave, None)
+        entrada.futuro.set_result(respuesta)
+        return respuesta
+
+
+# Store global de la API
+idempotencia = IdempotencyStore()
+
+
+def idempotente(
+    endpoint: str,
+    store: Optional[IdempotencyStore] = None,
+    cachear: Callable[[Any], bool] = respuesta_cacheable
+) -> Callable:
+    """
+    Decorador para endpoints FastAPI cuyo argumento `request` trae correlation_id
+
+    Conserva la firma del endpoint (FastAPI la lee vía __wrapped__).
+
+    Args:
+        endpoint: Ruta usada como parte de la clave
+        store: Store a usar (default: el global)
+        cachear: Decide si la respuesta se guarda (default: respuesta_cacheable)
+    """
+    def decorador(funcion: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(funcion)
+        async def envoltura(*args: Any, **kwargs: Any) -> T:
+            request = kwargs.get('request')
+            correlation_id = getattr(request, 'correlation_id', None)
+            return await (store or idempotencia).ejecutar(
+                endpoint, correlation_id, request, lambda: funcion(*args, **kwargs), cachear
+            )
+        return envoltura
+    return decorador
@@ -0,0 +1,339 @@
+"""
+Cola de trabajos asíncronos con estado persistido en SQLite
+La API responde de inmediato con un job id; un pool acotado de workers
+asyncio ejecuta los trabajos y GET /api/jobs/{id} expone estado, etapa
+actual, tiempos por etapa y resultado. Los trabajos sobreviven a un reinicio.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from .config import settings
+from .idempotency import IdempotenciaConflictoError, huella_payload, respuesta_cacheable
+from .logging_utils import get_logger
+from .stage_events import EventoEtapa, StageCallback
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+# Estados de un trabajo
+EN_COLA = 'en_cola'
+EJECUTANDO = 'ejecutando'
+COMPLETADO = 'completado'
+ERROR = 'error'
+ESTADOS_FINALES = (COMPLETADO, ERROR)
+
+# Un trabajo que estaba ejecutándose al reiniciar no se reintenta: pudo haber
+# registrado la operación en el portal y repetirlo la duplicaría
+MENSAJE_INTERRUMPIDO = 'Interrumpido por reinicio del servidor; verificar en el portal antes de reintentar'
+
+# Ejecutor: (payload, on_stage) -> resultado serializable
+Ejecutor = Callable[[dict[str, Any], StageCallback], Awaitable[dict[str, Any]]]
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    correlation_id TEXT,
+    payload TEXT NOT NULL,
+    etapa TEXT,
+    timings TEXT,
+    resultado TEXT,
+    error TEXT,
+    creado REAL NOT NULL,
+    iniciado REAL,
+    terminado REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_estado ON jobs (estado, creado);
+CREATE INDEX IF NOT EXISTS jobs_correlation ON jobs (tipo, correlation_id, creado);
+"""
+
+_COLUMNAS_JSON = ('payload', 'timings', 'resultado')
+
+
+class ColaLlenaError(Exception):
+    """La cola alcanzó su profundidad máxima"""
+    pass
+
+
+class JobStore:
+    """
+    Persistencia de trabajos en SQLite (una conexión, serializada con lock)
+
+    Las operaciones son escrituras de una fila, así que se hacen en el
+    propio event loop sin pasar por un executor.
+    """
+
+    def __init__(self, path: Optional[str | Path] = None):
+        self.path = Path(path or settings.jobs_db_path)
+        if str(self.path) != ':memory:':
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(_ESQUEMA)
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _ejecutar(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    @staticmethod
+    def _a_dict(fila: Optional[sqlite3.Row]) -> Optional[dict[str, Any]]:
+        if fila is None:
+            return None
+        job = dict(fila)
+        for columna in _COLUMNAS_JSON:
+            job[columna] = json.loads(job[columna]) if job[columna] else None
+        return job
+
+    def crear(self, tipo: str, payload: dict[str, Any], correlation_id: Optional[str] = None) -> dict[str, Any]:
+        job_id = uuid.uuid4().hex
+        self._ejecutar(
+            'INSERT INTO jobs (id, tipo, estado, correlation_id, payload, creado) VALUES (?, ?, ?, ?, ?, ?)',
+            (job_id, tipo, EN_COLA, correlation_id, json.dumps(payload, ensure_ascii=False), time.time()),
+        )
+        job = self.obtener(job_id)
+        assert job is not None
+        return job
+
+    def obtener(self, job_id: str) -> Optional[dict[str, Any]]:
+        return self._a_dict(self._ejecutar('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone())
+
+    def buscar_por_correlation(self, tipo: str, correlation_id: str, desde: float) -> Optional[dict[str, Any]]:
+        """Trabajo más reciente de ese tipo y correlation_id creado después de `desde` (epoch)"""
+        fila = self._ejecutar(
+            'SELECT * FROM jobs WHERE tipo = ? AND correlation_id = ? AND creado >= ? '
+            'ORDER BY creado DESC LIMIT 1',
+            (tipo, correlation_id, desde),
+        ).fetchone()
+        return self._a_dict(fila)
+
+    def contar(self, estado: str) -> int:
+        return self._ejecutar('SELECT COUNT(*) FROM jobs WHERE estado = ?', (estado,)).fetchone()[0]
+
+    def en_cola(self) -> list[dict[str, Any]]:
+        filas = self._ejecutar('SELECT * FROM jobs WHERE estado = ? ORDER BY creado', (EN_COLA,)).fetchall()
+        return [job for job in (self._a_dict(f) for f in filas) if job is not None]
+
+    def marcar_ejecutando(self, job_id: str) -> None:
+        self._ejecutar(
+            'UPDATE jobs SET estado = ?, iniciado = ? WHERE id = ?',
+            (EJECUTANDO, time.time(), job_id),
+        )
+
+    def actualizar_etapa(self, job_id: str, etapa: str, timings: Optional[dict[str, float]] = None) -> None:
+        if timings is None:
+            self._ejecutar('UPDATE jobs SET etapa = ? WHERE id = ?', (etapa, job_id))
+        else:
+            self._ejecutar(
+                'UPDATE jobs SET etapa = ?, timings = ? WHERE id = ?',
+                (etapa, json.dumps(timings), job_id),
+            )
+
+    def finalizar(
+        self,
+        job_id: str,
+        resultado: Optional[dict[str, Any]],
+        error: Optional[str] = None,
+        timings: Optional[dict[str, float]] = None
+    ) -> None:
+        self._ejecutar(
+            'UPDATE jobs SET estado = ?, resultado = ?, error = ?, timings = COALESCE(?, timings), '
+            'terminado = ? WHERE id = ?',
+            (
+                ERROR if error else COMPLETADO,
+                json.dumps(resultado, ensure_ascii=False) if resultado is not None else None,
+                error,
+                json.dumps(timings) if timings is not None else None,
+                time.time(),
+                job_id,
+            ),
+        )
+
+    def recuperar_interrumpidos(self) -> int:
+        """
+        Marca como error los trabajos que quedaron 'ejecutando' tras un reinicio
+
+        Returns:
+            int: Cantidad de trabajos marcados
+        """
+        cursor = self._ejecutar(
+            'UPDATE jobs SET estado = ?, error = ?, terminado = ? WHERE estado = ?',
+            (ERROR, MENSAJE_INTERRUMPIDO, time.time(), EJECUTANDO),
+        )
+        return cursor.rowcount
+
+    def purgar(self, horas: float) -> int:
+        """Elimina trabajos terminados hace más de `horas` (0 = no purgar)"""
+        if horas <= 0:
+            return 0
+        limite = time.time() - horas * 3600
+        cursor = self._ejecutar(
+            'DELETE FROM jobs WHERE estado IN (?, ?) AND terminado < ?',
+            (*ESTADOS_FINALES, limite),
+        )
+        return cursor.rowcount
+
+
+def _reintentable(job: dict[str, Any]) -> bool:
+    """Trabajo terminado sin éxito que un reintento con el mismo correlation_id puede reemplazar"""
+    if job['estado'] == ERROR:
+        return job['error'] != MENSAJE_INTERRUMPIDO
+    return job['estado'] == COMPLETADO and not respuesta_cacheable(job['resultado'] or {})
+
+
+class JobQueue:
+    """
+    Pool acotado de workers asyncio sobre un JobStore
+
+    La profundidad máxima cuenta los trabajos en cola (no los que ya se están
+    ejecutando); al superarla, encolar() lanza ColaLlenaError.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        ejecutores: dict[str, Ejecutor],
+        concurrencia: Optional[int] = None,
+        max_cola: Optional[int] = None
+    ):
+        """
+        Args:
+            store: Persistencia de trabajos
+            ejecutores: Mapa tipo de trabajo -> ejecutor
+            concurrencia: Workers simultáneos (default: settings.jobs_concurrency)
+            max_cola: Profundidad máxima de la cola (default: settings.jobs_max_queue)
+        """
+        self.store = store
+        self.ejecutores = ejecutores
+        self.concurrencia = max(1, concurrencia or settings.jobs_concurrency)
+        self.max_cola = max(1, max_cola or settings.jobs_max_queue)
+        self._cola: Optional[asyncio.Queue[str]] = None
+        self._workers: list[asyncio.Task] = []
+
+    async def iniciar(self) -> None:
+        """Recupera el estado persistido y lanza los workers"""
+        interrumpidos = self.store.recuperar_interrumpidos()
+        if interrumpidos:
+            logger.warning(f'{interrumpidos} trabajo(s) interrumpidos por reinicio marcados como error')
+        purgados = self.store.purgar(settings.jobs_retention_hours)
+        if purgados:
+            logger.info(f'{purgados} trabajo(s) antiguos purgados')
+
+        self._cola = asyncio.Queue()
+        pendientes = self.store.en_cola()
+        for job in pendientes:
+            self._cola.put_nowait(job['id'])
+        if pendientes:
+            logger.info(f'{len(pendientes)} trabajo(s) en cola recuperados')
+
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f'job-worker-{i}')
+            for i in range(self.concurrencia)
+        ]
+
+    async def detener(self) -> None:
+        """Cancela los workers (los trabajos en curso quedarán como interrumpidos)"""
+        for worker in self._workers:
+            worker.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def encolar(self, tipo: str, payload: dict[str, Any], correlation_id: Optional[str] = None) -> dict[str, Any]:
+        """
+        Persiste un trabajo y lo deja en cola
+
+        Si ya existe un trabajo del mismo tipo y correlation_id dentro del TTL
+        de idempotencia, lo retorna (en curso o terminado) con 'duplicado'=True
+        en vez de crear otro. Un trabajo que falló (error o exito=False)
+        antes de presionar "Registrar" no cuenta: el reintento crea uno nuevo.
+        Los que fallaron después del click o se interrumpieron por un reinicio
+        sí cuentan, porque registraron (o pudieron registrar) en el portal.
+
+        Returns:
+            dict: Trabajo creado (estado 'en_cola') o el existente
+
+        Raises:
+            ValueError: Si no hay ejecutor para el tipo
+            ColaLlenaError: Si la cola está llena
+            IdempotenciaConflictoError: Si el correlation_id ya se usó con otro payload
+        """
+        if self._cola is None:
+            raise RuntimeError('La cola de trabajos no está iniciada')
+        if tipo not in self.ejecutores:
+            raise ValueError(f'Tipo de trabajo desconocido: {tipo}')
+        if correlation_id and settings.idempotency_ttl_seconds > 0:
+            existente = self.store.buscar_por_correlation(
+                tipo, correlation_id, time.time() - settings.idempotency_ttl_seconds
+            )
+            if existente is not None and not _reintentable(existente):
+                if huella_payload(existente['payload']) != huella_payload(payload):
+                    raise IdempotenciaConflictoError(
+                        f'correlation_id {correlation_id} ya se usó con otro contenido (job {existente["id"]})'
+                    )
+                logger.info(f"[{correlation_id}] Trabajo duplicado: se retorna {existente['id']}")
+                return {**existente, 'duplicado': True}
+        if self.store.contar(EN_COLA) >= self.max_cola:
+            raise ColaLlenaError(f'Cola de trabajos llena ({self.max_cola})')
+        job = self.store.crear(tipo, payload, correlation_id)
+        self._cola.put_nowait(job['id'])
+        logger.info(f"[{correlation_id}] Trabajo {tipo} encolado: {job['id']}")
+        return job
+
+    async def _worker(self, indice: int) -> None:
+        assert self._cola is not None
+        while True:
+            job_id = await self._cola.get()
+            try:
+                await self._procesar(job_id)
+            except Exception as e:
+                logger.error(f'Worker {indice} falló procesando {job_id}: {str(e)}')
+            finally:
+                self._cola.task_done()
+
+    async def _procesar(self, job_id: str) -> None:
+        job = self.store.obtener(job_id)
+        if job is None or job['estado'] != EN_COLA:
+            return
+        ejecutor = self.ejecutores.get(job['tipo'])
+        if ejecutor is None:
+            self.store.finalizar(job_id, None, error=f"Tipo de trabajo desconocido: {job['tipo']}")
+            return
+
+        self.store.marcar_ejecutando(job_id)
+        timings: dict[str, float] = {}
+
+        def on_stage(evento: EventoEtapa) -> None:
+            if evento.estado == 'inicio':
+                self.store.actualizar_etapa(job_id, evento.etapa)
+            elif evento.duracion is not None:
+                timings[evento.etapa] = round(timings.get(evento.etapa, 0.0) + evento.duracion, 3)
+                self.store.actualizar_etapa(job_id, evento.etapa, timings)
+
+        try:
+            resultado = await ejecutor(job['payload'], on_stage)
+        except Exception as e:
+            logger.error(f"[{job['correlation_id']}] Trabajo {job_id} falló: {str(e)}")
+            self.store.finalizar(job_id, None, error=str(e), timings=timings or None)
+            return
+        # La API deja los tiempos finales en metadata (EjecutarResponse)
+        finales = ((resultado or {}).get('metadata') or {}).get('timings')
+        self.store.finalizar(job_id, resultado, timings=finales or timings or None)
+
+    async def esperar_vacia(self) -> None:
+        """Espera a que se procesen todos los trabajos encolados (tests/shutdown ordenado)"""
+        if self._cola is not None:
+            await self._cola.join()
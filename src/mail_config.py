@@ -0,0 +1,189 @@
+"""
+Configuración de Mail de Cierre (mail_config.yaml) con recarga en caliente
+El archivo se re-lee solo cuando cambia su mtime, tamaño o inode (chequeo
+con os.stat, como mucho una vez por intervalo). Cada lectura produce un
+snapshot inmutable con las claves aplanadas ('historial.enabled') y una
+vista tipada validada; el snapshot nuevo reemplaza al anterior de una vez,
+así que un lector nunca ve una configuración a medio cargar.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+import yaml
+
+from .config import settings
+from .logging_utils import get_logger
+from .validators import validar_email
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+SECCIONES_REQUERIDAS = ('remitente', 'plantillas', 'historial')
+
+# Segundos entre chequeos de cambio del archivo
+INTERVALO_CHEQUEO_S = 1.0
+
+
+def aplanar(datos: Any, prefijo: str = '') -> dict[str, Any]:
+    """
+    Aplana un dict anidado a claves con punto
+
+    Incluye también las claves intermedias ('visual.firma' -> dict), igual
+    que el recorrido de get_config.
+
+    Examples:
+        >>> aplanar({'a': {'b': 1}})
+        {'a': {'b': 1}, 'a.b': 1}
+    """
+    planos: dict[str, Any] = {}
+    if isinstance(datos, dict):
+        for clave, valor in datos.items():
+            ruta = f'{prefijo}.{clave}' if prefijo else str(clave)
+            planos[ruta] = valor
+            planos.update(aplanar(valor, ruta))
+    return planos
+
+
+@dataclass(frozen=True)
+class MailConfigTipada:
+    """Vista tipada y validada de los valores que usa el envío"""
+    remitente_nombre: Optional[str]
+    remitente_email: Optional[str]
+    cc_enabled: bool
+    cc_predeterminados: tuple[str, ...]
+    cc_invalidos: tuple[str, ...]
+    cc_allow_additional: bool
+    historial_enabled: bool
+    historial_formato: str
+    preview_default: bool
+    cooldown_segundos: int
+    errores: tuple[str, ...] = ()
+
+    @classmethod
+    def desde_dict(cls, config: dict) -> 'MailConfigTipada':
+        def seccion(nombre: str) -> dict:
+            valor = config.get(nombre)
+            return valor if isinstance(valor, dict) else {}
+
+        errores = [f'Sección requerida faltante: {s}' for s in SECCIONES_REQUERIDAS if s not in config]
+
+        remitente = seccion('remitente')
+        remitente_email = remitente.get('email')
+        if not remitente_email or not validar_email(remitente_email):
+            errores.append('Email de remitente inválido o faltante')
+
+        cc = seccion('cc')
+        direcciones = [str(e) for e in (cc.get('addresses') or [])]
+        validos = tuple(e for e in direcciones if validar_email(e))
+        invalidos = tuple(e for e in direcciones if e not in validos)
+
+        historial = seccion('historial')
+        comportamiento = seccion('comportamiento')
+        return cls(
+            remitente_nombre=remitente.get('nombre'),
+            remitente_email=remitente_email,
+            cc_enabled=bool(cc.get('enabled', False)),
+            cc_predeterminados=validos,
+            cc_invalidos=invalidos,
+            cc_allow_additional=bool(cc.get('allow_additional', True)),
+            historial_enabled=bool(historial.get('enabled', True)),
+            historial_formato=str(historial.get('formato', 'sqlite')),
+            preview_default=bool(comportamiento.get('preview_default', False)),
+            cooldown_segundos=int(comportamiento.get('cooldown_segundos', 30)),
+            errores=tuple(errores),
+        )
+
+
+@dataclass(frozen=True)
+class SnapshotConfig:
+    """Configuración leída en un momento dado (no se modifica)"""
+    datos: dict
+    planos: Mapping[str, Any]
+    tipada: MailConfigTipada
+    firma: tuple[int, int, int] = field(default=(0, 0, 0))  # (mtime_ns, tamaño, inode)
+
+    def get(self, clave: str, default: Any = None) -> Any:
+        return self.planos.get(clave, default)
+
+
+def _firma(path: Path) -> tuple[int, int, int]:
+    estado = os.stat(path)
+    return estado.st_mtime_ns, estado.st_size, estado.st_ino
+
+
+class MailConfigStore:
+    """
+    Snapshot actual de mail_config.yaml, recargado al cambiar el archivo
+
+    Si una recarga falla (YAML inválido a medio editar) se conserva el
+    snapshot anterior y se registra un warning.
+    """
+
+    def __init__(self, path: str | Path, intervalo_chequeo: float = INTERVALO_CHEQUEO_S):
+        self.path = Path(path)
+        self.intervalo_chequeo = intervalo_chequeo
+        self._snapshot: Optional[SnapshotConfig] = None
+        self._ultimo_chequeo = 0.0
+        self._lock = threading.Lock()
+
+    def _leer(self) -> SnapshotConfig:
+        firma = _firma(self.path)
+        with open(self.path, 'r', encoding='utf-8') as f:
+            datos = yaml.safe_load(f) or {}
+        if not isinstance(datos, dict):
+            raise yaml.YAMLError(f'{self.path} debe contener un mapeo YAML')
+        return SnapshotConfig(
+            datos=datos,
+            planos=MappingProxyType(aplanar(datos)),
+            tipada=MailConfigTipada.desde_dict(datos),
+            firma=firma,
+        )
+
+    def actual(self) -> SnapshotConfig:
+        """
+        Snapshot vigente (re-lee el archivo si cambió desde el último chequeo)
+
+        Raises:
+            FileNotFoundError: Si no existe el archivo en la primera carga
+            yaml.YAMLError: Si el archivo es inválido en la primera carga
+        """
+        snapshot = self._snapshot
+        ahora = time.monotonic()
+        if snapshot is not None and ahora - self._ultimo_chequeo < self.intervalo_chequeo:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                if not self.path.exists():
+                    raise FileNotFoundError(
+                        f'Archivo de configuración no encontrado: {self.path}\n'
+                        'Crea mail_config.yaml desde la plantilla en la documentación.'
+                    )
+                self._snapshot = snapshot = self._leer()
+            elif ahora - self._ultimo_chequeo >= self.intervalo_chequeo:
+                try:
+                    cambio = _firma(self.path) != snapshot.firma
+                except OSError:
+                    cambio = False  # Archivo reemplazándose: se reintenta en el próximo chequeo
+                if cambio:
+                    try:
+                        self._snapshot = snapshot = self._leer()
+                        logger.info(f'{self.path} recargado')
+                    except (OSError, yaml.YAMLError) as e:
+                        logger.warning(f'No se pudo recargar {self.path}; se mantiene la versión anterior: {e}')
+            self._ultimo_chequeo = ahora
+            return snapshot
+
+    def recargar(self) -> SnapshotConfig:
+        """Fuerza la lectura del archivo"""
+        with self._lock:
+            self._snapshot = self._leer()
+            self._ultimo_chequeo = time.monotonic()
+            return self._snapshot
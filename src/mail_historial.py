@@ -0,0 +1,322 @@
+"""
+Historial de envíos de Mail de Cierre en SQLite
+Reemplaza el archivo JSON por envío: agregar un registro es un INSERT, la
+retención por cantidad o antigüedad usa índices (no recorre el directorio)
+y se puede buscar por patente, destinatario o rango de fechas.
+
+Migración de los JSON existentes:
+    python -m src.mail_historial migrar --directorio docs/correo-cierre/enviados
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+from datetime import date, datetime, time as dtime
+from pathlib import Path
+from typing import Any, Optional
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS envios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    usuario TEXT,
+    email TEXT NOT NULL,
+    email_hash TEXT,
+    nombre_cliente TEXT,
+    cc TEXT NOT NULL,
+    vehiculo TEXT,
+    patente TEXT,
+    patente_norm TEXT,
+    asunto TEXT,
+    cuerpo_preview TEXT,
+    cuerpo TEXT,
+    exito INTEGER NOT NULL,
+    mensaje TEXT,
+    duracion_ms INTEGER,
+    origen TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS envios_ts ON envios (ts);
+CREATE INDEX IF NOT EXISTS envios_patente ON envios (patente_norm, ts);
+CREATE INDEX IF NOT EXISTS envios_email ON envios (email_hash, ts);
+"""
+
+
+def normalizar_patente(patente: str) -> str:
+    """'FPYK.18-2' -> 'FPYK182' (mismo criterio que los nombres de archivo JSON)"""
+    return (patente or '').replace('.', '').replace('-', '').replace(' ', '').upper()
+
+
+def hash_email(email: str) -> str:
+    """Huella del email para buscar por destinatario aunque se guarde ofuscado"""
+    return hashlib.sha256((email or '').strip().lower().encode('utf-8')).hexdigest()
+
+
+def _epoch(valor: datetime | date | str | float | None, fin_de_dia: bool = False) -> Optional[float]:
+    if valor is None or isinstance(valor, (int, float)):
+        return valor
+    if isinstance(valor, str):
+        valor = datetime.fromisoformat(valor) if 'T' in valor or ' ' in valor else date.fromisoformat(valor)
+    if not isinstance(valor, datetime):
+        valor = datetime.combine(valor, dtime.max if fin_de_dia else dtime.min)
+    return valor.timestamp()
+
+
+class HistorialEnvios:
+    """
+    Historial append-only en SQLite (una conexión, serializada con lock)
+
+    Los registros usan la misma estructura que los JSON de
+    guardar_historial_envio; buscar() los retorna en ese formato.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        if str(self.path) != ':memory:':
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript(_ESQUEMA)
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _ejecutar(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def agregar(
+        self,
+        registro: dict[str, Any],
+        email_destino: Optional[str] = None,
+        origen: Optional[str] = None
+    ) -> Optional[int]:
+        """
+        Agrega un registro con el formato JSON del historial
+
+        Args:
+            registro: Objeto con metadata, destinatario, cc, vehiculo, email y resultado
+            email_destino: Email real (sin ofuscar) para indexar la búsqueda por destinatario
+            origen: Identificador único de origen (nombre del JSON migrado); si ya
+                existe, el registro se omite
+
+        Returns:
+            int | None: Id del registro (None si se omitió por origen duplicado)
+        """
+        metadata = registro.get('metadata', {})
+        destinatario = registro.get('destinatario', {})
+        cc = registro.get('cc', {})
+        vehiculo = registro.get('vehiculo', {})
+        email = registro.get('email', {})
+        resultado = registro.get('resultado', {})
+        timestamp = metadata.get('timestamp') or datetime.now().isoformat()
+
+        cursor = self._ejecutar(
+            'INSERT OR IGNORE INTO envios (ts, timestamp, usuario, email, email_hash, nombre_cliente, cc, '
+            'vehiculo, patente, patente_norm, asunto, cuerpo_preview, cuerpo, exito, mensaje, duracion_ms, origen) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                datetime.fromisoformat(timestamp).timestamp(),
+                timestamp,
+                metadata.get('usuario'),
+                destinatario.get('email', ''),
+                hash_email(email_destino) if email_destino else None,
+                destinatario.get('nombre_cliente'),
+                json.dumps(cc.get('addresses', []), ensure_ascii=False),
+                vehiculo.get('descripcion'),
+                vehiculo.get('patente'),
+                normalizar_patente(vehiculo.get('patente', '')),
+                email.get('asunto'),
+                email.get('cuerpo_preview'),
+                email.get('cuerpo_completo'),
+                1 if resultado.get('exito') else 0,
+                resultado.get('mensaje'),
+                resultado.get('duracion_ms'),
+                origen,
+            ),
+        )
+        return cursor.lastrowid if cursor.rowcount == 1 else None
+
+    def aplicar_retencion(self, max_registros: int = 0, max_dias: float = 0) -> int:
+        """
+        Elimina registros por cantidad y/o antigüedad (ambos por el índice de ts)
+
+        Args:
+            max_registros: Registros a conservar (0 = sin límite)
+            max_dias: Antigüedad máxima en días (0 = sin límite)
+
+        Returns:
+            int: Registros eliminados
+        """
+        eliminados = 0
+        if max_registros > 0:
+            # Por fecha del envío, no por id: los importados de JSON llegan con ids nuevos
+            fila = self._ejecutar(
+                'SELECT ts, id FROM envios ORDER BY ts DESC, id DESC LIMIT 1 OFFSET ?', (max_registros,)
+            ).fetchone()
+            if fila is not None:
+                eliminados += self._ejecutar(
+                    'DELETE FROM envios WHERE ts < ? OR (ts = ? AND id <= ?)', (fila[0], fila[0], fila[1])
+                ).rowcount
+        if max_dias > 0:
+            limite = datetime.now().timestamp() - max_dias * 86400
+            eliminados += self._ejecutar('DELETE FROM envios WHERE ts < ?', (limite,)).rowcount
+        return eliminados
+
+    @staticmethod
+    def _a_registro(fila: sqlite3.Row) -> dict[str, Any]:
+        cc = json.loads(fila['cc'])
+        return {
+            'id': fila['id'],
+            'metadata': {'timestamp': fila['timestamp'], 'usuario': fila['usuario']},
+            'destinatario': {'email': fila['email'], 'nombre_cliente': fila['nombre_cliente']},
+            'cc': {'count': len(cc), 'addresses': cc},
+            'vehiculo': {'descripcion': fila['vehiculo'], 'patente': fila['patente']},
+            'email': {
+                'asunto': fila['asunto'],
+                'cuerpo_preview': fila['cuerpo_preview'],
+                'cuerpo_completo': fila['cuerpo'],
+            },
+            'resultado': {
+                'exito': bool(fila['exito']),
+                'mensaje': fila['mensaje'],
+                'duracion_ms': fila['duracion_ms'],
+            },
+        }
+
+    def buscar(
+        self,
+        patente: Optional[str] = None,
+        destinatario: Optional[str] = None,
+        desde: datetime | date | str | None = None,
+        hasta: datetime | date | str | None = None,
+        limite: int = 100
+    ) -> list[dict[str, Any]]:
+        """
+        Busca envíos (más recientes primero)
+
+        Args:
+            patente: Patente con o sin puntos/guiones
+            destinatario: Email del destinatario (coincide aunque se haya guardado ofuscado)
+            desde: Fecha/datetime inicial (inclusive; ISO o date)
+            hasta: Fecha/datetime final (inclusive; una fecha sin hora cubre el día completo)
+            limite: Máximo de registros
+
+        Returns:
+            list[dict]: Registros con el formato JSON del historial (más 'id')
+        """
+        condiciones, params = [], []
+        if patente:
+            condiciones.append('patente_norm = ?')
+            params.append(normalizar_patente(patente))
+        if destinatario:
+            condiciones.append('(email_hash = ? OR lower(email) = ?)')
+            params += [hash_email(destinatario), destinatario.strip().lower()]
+        if desde is not None:
+            condiciones.append('ts >= ?')
+            params.append(_epoch(desde))
+        if hasta is not None:
+            condiciones.append('ts <= ?')
+            params.append(_epoch(hasta, fin_de_dia=True))
+
+        sql = 'SELECT * FROM envios'
+        if condiciones:
+            sql += ' WHERE ' + ' AND '.join(condiciones)
+        sql += ' ORDER BY ts DESC, id DESC LIMIT ?'
+        params.append(limite)
+        return [self._a_registro(f) for f in self._ejecutar(sql, tuple(params)).fetchall()]
+
+    def contar(self) -> int:
+        return self._ejecutar('SELECT COUNT(*) FROM envios').fetchone()[0]
+
+    def importar_json(self, directorio: str | Path, borrar: bool = False) -> tuple[int, int, list[str]]:
+        """
+        Importa los JSON del historial anterior (un archivo por envío)
+
+        Es idempotente: cada archivo se registra con su nombre como origen.
+
+        Args:
+            directorio: Directorio con los *.json
+            borrar: Eliminar cada archivo tras importarlo (o si ya estaba importado)
+
+        Returns:
+            tuple: (importados, omitidos por ya existir, errores por archivo)
+        """
+        importados, omitidos, errores = 0, 0, []
+        for archivo in sorted(Path(directorio).glob('*.json')):
+            try:
+                registro = json.loads(archivo.read_text(encoding='utf-8'))
+                if self.agregar(registro, origen=archivo.name) is None:
+                    omitidos += 1
+                else:
+                    importados += 1
+            except (OSError, ValueError, AttributeError) as e:
+                errores.append(f'{archivo.name}: {e}')
+                continue
+            if borrar:
+                archivo.unlink()
+        return importados, omitidos, errores
+
+
+_historiales: dict[Path, HistorialEnvios] = {}
+_historiales_lock = threading.Lock()
+
+
+def obtener_historial(path: str | Path) -> HistorialEnvios:
+    """Historial compartido del proceso para `path` (una conexión por archivo)"""
+    clave = Path(path).resolve()
+    with _historiales_lock:
+        if clave not in _historiales:
+            _historiales[clave] = HistorialEnvios(clave)
+        return _historiales[clave]
+
+
+def main() -> int:
+    from src.mail_utils import get_config, ruta_db_historial
+
+    parser = argparse.ArgumentParser(description='Historial de envios de Mail de Cierre (SQLite).')
+    parser.add_argument('--db', help='Base SQLite (default: historial.db_path de mail_config.yaml)')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    migrar = sub.add_parser('migrar', help='Importar los JSON del historial anterior')
+    migrar.add_argument('--directorio', help='Directorio con los JSON (default: historial.directorio)')
+    migrar.add_argument('--borrar', action='store_true', help='Eliminar los JSON importados')
+
+    buscar = sub.add_parser('buscar', help='Buscar envios')
+    buscar.add_argument('--patente')
+    buscar.add_argument('--destinatario')
+    buscar.add_argument('--desde', help='YYYY-MM-DD')
+    buscar.add_argument('--hasta', help='YYYY-MM-DD')
+    buscar.add_argument('--limite', type=int, default=20)
+
+    args = parser.parse_args()
+    historial = HistorialEnvios(args.db or ruta_db_historial())
+
+    if args.comando == 'migrar':
+        directorio = args.directorio or get_config('historial.directorio', 'docs/correo-cierre/enviados')
+        importados, omitidos, errores = historial.importar_json(directorio, borrar=args.borrar)
+        print(f'Importados: {importados}  Ya existentes: {omitidos}  Errores: {len(errores)}')
+        for error in errores:
+            print(f'  {error}')
+        return 1 if errores else 0
+
+    registros = historial.buscar(args.patente, args.destinatario, args.desde, args.hasta, args.limite)
+    for registro in registros:
+        estado = 'OK ' if registro['resultado']['exito'] else 'ERR'
+        print(
+            f"{registro['metadata']['timestamp'][:19]}  {estado}  {registro['vehiculo']['patente'] or '-':<12} "
+            f"{registro['destinatario']['email']:<30} {registro['email']['asunto'] or ''}"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,600 @@
+"""
+Outbox de correos de cierre (envío masivo)
+Los correos se renderizan con la plantilla y se guardan en una cola SQLite
+local; un worker los envía respetando el límite del proveedor SMTP,
+reintenta con backoff exponencial los errores transitorios y deja estado
+por mensaje. El resultado final de cada correo se registra con
+guardar_historial_envio.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import re
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from .config import settings
+from .logging_utils import get_logger
+from .mail_utils import (
+    cargar_cc_predeterminados,
+    enviar_mensaje_smtp,
+    extraer_nombre_cliente,
+    generar_email_desde_plantilla,
+    guardar_historial_envio,
+    parsear_ficha_registro,
+    validar_datos_mail,
+)
+from .rate_limit import RateLimiter, limitador_smtp
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+# Estados de un correo
+PENDIENTE = 'pendiente'
+ENVIANDO = 'enviando'
+ENVIADO = 'enviado'
+FALLIDO = 'fallido'
+ESTADOS = (PENDIENTE, ENVIANDO, ENVIADO, FALLIDO)
+
+# Un correo que estaba 'enviando' al reiniciar pudo haber salido: no se
+# reenvía automáticamente para no duplicarlo
+MENSAJE_INTERRUMPIDO = 'Interrumpido durante el envío; verificar en la bandeja de enviados antes de reintentar'
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id TEXT PRIMARY KEY,
+    lote_id TEXT,
+    estado TEXT NOT NULL,
+    destinatario TEXT NOT NULL,
+    cc TEXT NOT NULL,
+    asunto TEXT NOT NULL,
+    cuerpo TEXT NOT NULL,
+    nombre_cliente TEXT,
+    vehiculo TEXT,
+    patente TEXT,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    proximo_intento REAL NOT NULL,
+    mensaje TEXT,
+    duracion_ms INTEGER,
+    creado REAL NOT NULL,
+    actualizado REAL NOT NULL,
+    reservado_hasta REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_listos ON outbox (estado, proximo_intento);
+CREATE INDEX IF NOT EXISTS outbox_lote ON outbox (lote_id, creado);
+"""
+
+# Columnas aceptadas en el CSV de envío masivo
+COLUMNAS_CSV_REQUERIDAS = ('email_destino', 'precio_acordado', 'fecha_pago')
+
+
+def es_error_transitorio(error: BaseException) -> bool:
+    """
+    Indica si vale la pena reintentar un envío fallido
+
+    Transitorios: cortes de conexión, errores de red y respuestas 4xx del
+    servidor (greylisting, límites temporales). Permanentes: autenticación,
+    respuestas 5xx y datos inválidos.
+
+    Args:
+        error: Excepción lanzada por enviar_mensaje_smtp
+
+    Returns:
+        bool: True si el error es transitorio
+    """
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codigos = [codigo for codigo, _ in error.recipients.values()]
+        return bool(codigos) and all(400 <= codigo < 500 for codigo in codigos)
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+def espera_reintento(intentos: int) -> float:
+    """Segundos antes del próximo intento (backoff exponencial con tope)"""
+    espera = settings.mail_outbox_backoff_seconds * (2 ** max(0, intentos - 1))
+    return min(espera, settings.mail_outbox_backoff_max_seconds)
+
+
+class MailOutbox:
+    """
+    Cola persistente de correos en SQLite (una conexión, serializada con lock)
+
+    Un correo se toma con un UPDATE condicionado al estado, así que dos
+    procesos (Streamlit y la API) pueden drenar el mismo archivo sin enviar
+    dos veces el mismo mensaje. La reserva vence a los
+    MAIL_OUTBOX_LEASE_SECONDS: solo entonces otro proceso la da por
+    interrumpida, nunca mientras el dueño sigue enviando.
+    """
+
+    def __init__(self, path: Optional[str | Path] = None):
+        self.path = Path(path or settings.mail_outbox_db_path)
+        if str(self.path) != ':memory:':
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript(_ESQUEMA)
+        columnas = {fila['name'] for fila in self._conn.execute('PRAGMA table_info(outbox)')}
+        if 'reservado_hasta' not in columnas:  # Archivo creado por una versión anterior
+            self._conn.execute('ALTER TABLE outbox ADD COLUMN reservado_hasta REAL')
+
+    def cerrar(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _ejecutar(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    @staticmethod
+    def _a_dict(fila: Optional[sqlite3.Row]) -> Optional[dict[str, Any]]:
+        if fila is None:
+            return None
+        mensaje = dict(fila)
+        mensaje['cc'] = json.loads(mensaje['cc'])
+        return mensaje
+
+    def encolar(
+        self,
+        destinatario: str,
+        asunto: str,
+        cuerpo: str,
+        cc: Optional[list[str]] = None,
+        nombre_cliente: Optional[str] = None,
+        vehiculo: Optional[str] = None,
+        patente: Optional[str] = None,
+        lote_id: Optional[str] = None
+    ) -> dict[str, Any]:
+        """
+        Agrega un correo ya renderizado a la cola
+
+        Returns:
+            dict: Fila creada (estado 'pendiente')
+        """
+        mensaje_id = uuid.uuid4().hex
+        ahora = time.time()
+        self._ejecutar(
+            'INSERT INTO outbox (id, lote_id, estado, destinatario, cc, asunto, cuerpo, nombre_cliente, '
+            'vehiculo, patente, proximo_intento, creado, actualizado) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                mensaje_id, lote_id, PENDIENTE, destinatario,
+                json.dumps([e.strip() for e in (cc or []) if e.strip()]),
+                asunto, cuerpo, nombre_cliente, vehiculo, patente, ahora, ahora, ahora,
+            ),
+        )
+        mensaje = self.obtener(mensaje_id)
+        assert mensaje is not None
+        return mensaje
+
+    def obtener(self, mensaje_id: str) -> Optional[dict[str, Any]]:
+        return self._a_dict(self._ejecutar('SELECT * FROM outbox WHERE id = ?', (mensaje_id,)).fetchone())
+
+    def listar(self, lote_id: Optional[str] = None) -> list[dict[str, Any]]:
+        if lote_id is None:
+            filas = self._ejecutar('SELECT * FROM outbox ORDER BY creado').fetchall()
+        else:
+            filas = self._ejecutar('SELECT * FROM outbox WHERE lote_id = ? ORDER BY creado', (lote_id,)).fetchall()
+        return [m for m in (self._a_dict(f) for f in filas) if m is not None]
+
+    def resumen(self, lote_id: Optional[str] = None) -> dict[str, int]:
+        """Cantidad de correos por estado (de un lote o de toda la cola)"""
+        if lote_id is None:
+            filas = self._ejecutar('SELECT estado, COUNT(*) FROM outbox GROUP BY estado').fetchall()
+        else:
+            filas = self._ejecutar(
+                'SELECT estado, COUNT(*) FROM outbox WHERE lote_id = ? GROUP BY estado', (lote_id,)
+            ).fetchall()
+        conteo = {estado: 0 for estado in ESTADOS}
+        conteo.update({estado: cantidad for estado, cantidad in filas})
+        return conteo
+
+    def tomar_siguiente(self) -> Optional[dict[str, Any]]:
+        """
+        Reserva el próximo correo listo para enviar (pasa a 'enviando')
+
+        Returns:
+            dict | None: Correo reservado o None si no hay ninguno listo
+        """
+        while True:
+            fila = self._ejecutar(
+                'SELECT id FROM outbox WHERE estado = ? AND proximo_intento <= ? '
+                'ORDER BY proximo_intento, creado LIMIT 1',
+                (PENDIENTE, time.time()),
+            ).fetchone()
+            if fila is None:
+                return None
+            ahora = time.time()
+            cursor = self._ejecutar(
+                'UPDATE outbox SET estado = ?, intentos = intentos + 1, actualizado = ?, reservado_hasta = ? '
+                'WHERE id = ? AND estado = ?',
+                (ENVIANDO, ahora, ahora + settings.mail_outbox_lease_seconds, fila['id'], PENDIENTE),
+            )
+            if cursor.rowcount == 1:
+                return self.obtener(fila['id'])
+            # Otro worker lo tomó primero
+
+    def renovar_reserva(self, mensaje_id: str) -> None:
+        """Extiende la reserva de un correo 'enviando' (antes de cada envío SMTP)"""
+        self._ejecutar(
+            'UPDATE outbox SET reservado_hasta = ? WHERE id = ? AND estado = ?',
+            (time.time() + settings.mail_outbox_lease_seconds, mensaje_id, ENVIANDO),
+        )
+
+    def marcar_enviado(self, mensaje_id: str, mensaje: str, duracion_ms: int) -> None:
+        self._ejecutar(
+            'UPDATE outbox SET estado = ?, mensaje = ?, duracion_ms = ?, actualizado = ? WHERE id = ?',
+            (ENVIADO, mensaje, duracion_ms, time.time(), mensaje_id),
+        )
+
+    def programar_reintento(self, mensaje_id: str, error: str, espera_segundos: float) -> None:
+        ahora = time.time()
+        self._ejecutar(
+            'UPDATE outbox SET estado = ?, mensaje = ?, proximo_intento = ?, actualizado = ? WHERE id = ?',
+            (PENDIENTE, error, ahora + espera_segundos, ahora, mensaje_id),
+        )
+
+    def marcar_fallido(self, mensaje_id: str, error: str, duracion_ms: Optional[int] = None) -> None:
+        self._ejecutar(
+            'UPDATE outbox SET estado = ?, mensaje = ?, duracion_ms = COALESCE(?, duracion_ms), '
+            'actualizado = ? WHERE id = ?',
+            (FALLIDO, error, duracion_ms, time.time(), mensaje_id),
+        )
+
+    def reintentar_fallidos(self, lote_id: Optional[str] = None) -> int:
+        """
+        Vuelve a encolar los correos fallidos (acción manual del usuario)
+
+        Returns:
+            int: Cantidad de correos reencolados
+        """
+        ahora = time.time()
+        sql = 'UPDATE outbox SET estado = ?, intentos = 0, proximo_intento = ?, actualizado = ? WHERE estado = ?'
+        params: tuple = (PENDIENTE, ahora, ahora, FALLIDO)
+        if lote_id is not None:
+            sql += ' AND lote_id = ?'
+            params += (lote_id,)
+        return self._ejecutar(sql, params).rowcount
+
+    def recuperar_interrumpidos(self) -> int:
+        """
+        Marca como fallidos los correos 'enviando' cuya reserva venció
+
+        Un proceso caído deja sus correos 'enviando'; los que otro proceso
+        vivo está enviando conservan la reserva vigente y no se tocan.
+
+        Returns:
+            int: Cantidad de correos marcados
+        """
+        ahora = time.time()
+        cursor = self._ejecutar(
+            'UPDATE outbox SET estado = ?, mensaje = ?, actualizado = ? '
+            'WHERE estado = ? AND COALESCE(reservado_hasta, 0) <= ?',
+            (FALLIDO, MENSAJE_INTERRUMPIDO, ahora, ENVIANDO, ahora),
+        )
+        return cursor.rowcount
+
+    def proximo_intento(self) -> Optional[float]:
+        """Epoch del próximo correo pendiente (None si no hay pendientes)"""
+        return self._ejecutar(
+            'SELECT MIN(proximo_intento) FROM outbox WHERE estado = ?', (PENDIENTE,)
+        ).fetchone()[0]
+
+
+# ============================================================================
+# RENDERIZADO Y CARGA MASIVA
+# ============================================================================
+
+def patente_desde_vehiculo(vehiculo: str) -> str:
+    """Patente del vehículo (última palabra, como en la vista de Mail de Cierre)"""
+    return vehiculo.split()[-1] if vehiculo and vehiculo.split() else 'SIN-PATENTE'
+
+
+def encolar_cierre(
+    outbox: MailOutbox,
+    datos_propietario: str,
+    vehiculo: str,
+    precio_acordado: str,
+    fecha_pago: str,
+    email_destino: str,
+    cc: Optional[list[str]] = None,
+    lote_id: Optional[str] = None
+) -> dict[str, Any]:
+    """
+    Valida, renderiza con la plantilla y encola un mail de cierre
+
+    Returns:
+        dict: Correo encolado
+
+    Raises:
+        ValueError: Datos inválidos (mensaje con todos los errores)
+        FileNotFoundError: Si no existe la plantilla
+    """
+    cc = cc or []
+    es_valido, errores = validar_datos_mail(
+        datos_propietario, email_destino, cc, vehiculo, precio_acordado, fecha_pago
+    )
+    if not es_valido:
+        raise ValueError('; '.join(errores))
+
+    asunto, cuerpo = generar_email_desde_plantilla(datos_propietario, vehiculo, precio_acordado, fecha_pago)
+    return outbox.encolar(
+        email_destino,
+        asunto,
+        cuerpo,
+        cc=cc,
+        nombre_cliente=extraer_nombre_cliente(datos_propietario) or 'DESCONOCIDO',
+        vehiculo=vehiculo,
+        patente=patente_desde_vehiculo(vehiculo),
+        lote_id=lote_id,
+    )
+
+
+def leer_csv_cierres(contenido: str | bytes) -> tuple[list[dict[str, Any]], list[str]]:
+    """
+    Lee un CSV de cierres para envío masivo
+
+    Columnas requeridas: email_destino, precio_acordado, fecha_pago. Además
+    ficha_registro (bloque completo, entre comillas) o bien datos_propietario
+    y vehiculo. La columna cc es opcional (emails separados por coma o
+    espacio); si falta se usan los CC predeterminados. Acepta ',' o ';'.
+
+    Args:
+        contenido: Texto del CSV (o bytes UTF-8)
+
+    Returns:
+        tuple: (filas listas para encolar_cierre, errores por línea)
+    """
+    if isinstance(contenido, bytes):
+        contenido = contenido.decode('utf-8-sig')
+    muestra = contenido[:2048]
+    delimitador = ';' if muestra.count(';') > muestra.count(',') else ','
+    lector = csv.DictReader(io.StringIO(contenido), delimiter=delimitador)
+
+    columnas = {(c or '').strip().lower() for c in (lector.fieldnames or [])}
+    faltantes = [c for c in COLUMNAS_CSV_REQUERIDAS if c not in columnas]
+    if 'ficha_registro' not in columnas and not {'datos_propietario', 'vehiculo'} <= columnas:
+        faltantes.append('ficha_registro (o datos_propietario + vehiculo)')
+    if faltantes:
+        return [], [f'Columnas faltantes: {", ".join(faltantes)}']
+
+    cc_predeterminados = cargar_cc_predeterminados()
+    filas, errores = [], []
+    siguiente_linea = 2
+    for fila in lector:
+        # Línea física donde empieza el registro (ficha_registro ocupa varias)
+        numero, siguiente_linea = siguiente_linea, lector.line_num + 1
+        fila = {(k or '').strip().lower(): (v or '').strip() for k, v in fila.items()}
+        if not any(fila.values()):
+            continue
+
+        if fila.get('ficha_registro'):
+            ficha = parsear_ficha_registro(fila['ficha_registro'])
+            if not ficha:
+                errores.append(f'Línea {numero}: no se pudo parsear ficha_registro')
+                continue
+            datos_propietario, vehiculo = ficha['datos_propietario_bloque'], ficha['vehiculo_final']
+        else:
+            datos_propietario, vehiculo = fila.get('datos_propietario', ''), fila.get('vehiculo', '')
+
+        cc_raw = fila.get('cc', '')
+        cc = [e for e in re.split(r'[,\s]+', cc_raw) if e] if cc_raw else list(cc_predeterminados)
+
+        filas.append({
+            'linea': numero,
+            'datos_propietario': datos_propietario,
+            'vehiculo': vehiculo,
+            'precio_acordado': fila['precio_acordado'],
+            'fecha_pago': fila['fecha_pago'],
+            'email_destino': fila['email_destino'],
+            'cc': cc,
+        })
+    return filas, errores
+
+
+def encolar_lote(outbox: MailOutbox, filas: list[dict[str, Any]]) -> tuple[str, list[str]]:
+    """
+    Encola las filas leídas de un CSV como un lote
+
+    Returns:
+        tuple: (lote_id, errores de validación por línea)
+    """
+    lote_id = uuid.uuid4().hex[:12]
+    errores = []
+    for fila in filas:
+        try:
+            encolar_cierre(
+                outbox,
+                fila['datos_propietario'],
+                fila['vehiculo'],
+                fila['precio_acordado'],
+                fila['fecha_pago'],
+                fila['email_destino'],
+                cc=fila['cc'],
+                lote_id=lote_id,
+            )
+        except (ValueError, FileNotFoundError) as e:
+            errores.append(f"Línea {fila.get('linea', '?')}: {e}")
+    return lote_id, errores
+
+
+# ============================================================================
+# WORKER
+# ============================================================================
+
+class OutboxWorker:
+    """
+    Drena el outbox en un thread de fondo
+
+    Un único worker por proceso envía los correos de a uno; el limitador
+    por proveedor espacia los envíos y los errores transitorios se
+    reprograman con backoff hasta MAIL_OUTBOX_MAX_ATTEMPTS.
+    """
+
+    def __init__(
+        self,
+        outbox: MailOutbox,
+        enviar: Optional[Callable[..., str]] = None,
+        limitador: Optional[RateLimiter] = None,
+        max_intentos: Optional[int] = None,
+        poll_segundos: Optional[float] = None
+    ):
+        """
+        Args:
+            outbox: Cola a drenar
+            enviar: Función de envío (default: enviar_mensaje_smtp)
+            limitador: Rate limiter (default: limitador_smtp() del SMTP_HOST)
+            max_intentos: Intentos por correo (default: settings.mail_outbox_max_attempts)
+            poll_segundos: Espera entre revisiones de la cola (default: settings.mail_outbox_poll_seconds)
+        """
+        self.outbox = outbox
+        self._enviar = enviar or enviar_mensaje_smtp
+        self._limitador = limitador
+        self.max_intentos = max(1, max_intentos or settings.mail_outbox_max_attempts)
+        self.poll_segundos = settings.mail_outbox_poll_seconds if poll_segundos is None else poll_segundos
+        self._thread: Optional[threading.Thread] = None
+        self._detener = threading.Event()
+        self._despertar = threading.Event()
+
+    @property
+    def limitador(self) -> RateLimiter:
+        return self._limitador or limitador_smtp()
+
+    def _registrar_historial(self, mensaje: dict[str, Any], exito: bool, resultado: str, duracion_ms: int) -> None:
+        try:
+            guardar_historial_envio(
+                email_destino=mensaje['destinatario'],
+                cc_emails=mensaje['cc'],
+                nombre_cliente=mensaje['nombre_cliente'] or 'DESCONOCIDO',
+                vehiculo=mensaje['vehiculo'] or '',
+                patente=mensaje['patente'] or 'SIN-PATENTE',
+                asunto=mensaje['asunto'],
+                cuerpo=mensaje['cuerpo'],
+                exito=exito,
+                mensaje=resultado,
+                duracion_ms=duracion_ms,
+            )
+        except Exception as e:
+            logger.warning(f"No se pudo guardar historial del correo {mensaje['id']}: {e}")
+
+    def procesar(self, mensaje: dict[str, Any]) -> str:
+        """
+        Envía un correo reservado y actualiza su estado
+
+        Returns:
+            str: Estado resultante (enviado, pendiente o fallido)
+        """
+        self.limitador.adquirir_sync()
+        self.outbox.renovar_reserva(mensaje['id'])  # La espera del limitador no consume la reserva
+        inicio = time.monotonic()
+        try:
+            resultado = self._enviar(
+                mensaje['destinatario'], mensaje['asunto'], mensaje['cuerpo'], cc=mensaje['cc']
+            )
+        except Exception as e:
+            duracion_ms = int((time.monotonic() - inicio) * 1000)
+            error = f'{type(e).__name__}: {e}'
+            if es_error_transitorio(e) and mensaje['intentos'] < self.max_intentos:
+                espera = espera_reintento(mensaje['intentos'])
+                self.outbox.programar_reintento(mensaje['id'], error, espera)
+                logger.warning(
+                    f"Correo {mensaje['id']} intento {mensaje['intentos']}/{self.max_intentos} fallido "
+                    f"({error}); reintento en {espera:.0f}s"
+                )
+                return PENDIENTE
+            self.outbox.marcar_fallido(mensaje['id'], error, duracion_ms)
+            self._registrar_historial(mensaje, False, error, duracion_ms)
+            logger.error(f"Correo {mensaje['id']} fallido tras {mensaje['intentos']} intento(s): {error}")
+            return FALLIDO
+
+        duracion_ms = int((time.monotonic() - inicio) * 1000)
+        self.outbox.marcar_enviado(mensaje['id'], resultado, duracion_ms)
+        self._registrar_historial(mensaje, True, resultado, duracion_ms)
+        return ENVIADO
+
+    def procesar_pendientes(self, max_mensajes: Optional[int] = None) -> int:
+        """
+        Envía los correos listos (sin esperar los reintentos programados)
+
+        Args:
+            max_mensajes: Tope de correos a procesar (None = todos los listos)
+
+        Returns:
+            int: Correos procesados
+        """
+        procesados = 0
+        while not self._detener.is_set() and (max_mensajes is None or procesados < max_mensajes):
+            mensaje = self.outbox.tomar_siguiente()
+            if mensaje is None:
+                break
+            self.procesar(mensaje)
+            procesados += 1
+        return procesados
+
+    def _recuperar_interrumpidos(self) -> None:
+        interrumpidos = self.outbox.recuperar_interrumpidos()
+        if interrumpidos:
+            logger.warning(f'{interrumpidos} correo(s) con la reserva vencida marcados como fallidos')
+
+    def _loop(self) -> None:
+        while not self._detener.is_set():
+            try:
+                self._recuperar_interrumpidos()
+                self.procesar_pendientes()
+            except Exception as e:
+                logger.error(f'Error en worker del outbox: {e}')
+            proximo = self.outbox.proximo_intento()
+            espera = self.poll_segundos if proximo is None else min(self.poll_segundos, max(0.0, proximo - time.time()))
+            self._despertar.wait(espera)
+            self._despertar.clear()
+
+    def iniciar(self) -> None:
+        """Inicia el thread de fondo (cada vuelta marca como fallidos los envíos interrumpidos)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._detener.clear()
+        self._thread = threading.Thread(target=self._loop, name='mail-outbox', daemon=True)
+        self._thread.start()
+
+    def despertar(self) -> None:
+        """Revisa la cola de inmediato (tras encolar)"""
+        self._despertar.set()
+
+    def detener(self, timeout: Optional[float] = 10.0) -> None:
+        self._detener.set()
+        self._despertar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def activo(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+
+_worker: Optional[OutboxWorker] = None
+_worker_lock = threading.Lock()
+
+
+def obtener_worker_outbox() -> OutboxWorker:
+    """Worker del outbox del proceso (se crea e inicia al primer uso)"""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = OutboxWorker(MailOutbox())
+        _worker.iniciar()
+        return _worker
@@ -0,0 +1,200 @@
+"""
+Plantillas de Mail de Cierre compiladas
+Cada plantilla se parsea una vez en una lista de segmentos (texto literal y
+placeholders {NOMBRE}) y se cachea por ruta + mtime, así que las ediciones
+se toman sin reiniciar. El render reemplaza todos los placeholders en una
+sola pasada. Las condiciones de plantillas.alternativas (mail_config.yaml)
+se compilan a predicados una vez por configuración.
+"""
+from __future__ import annotations
+
+import operator
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from .config import settings
+from .logging_utils import get_logger
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+PATRON_PLACEHOLDER = re.compile(r'\{([A-Z][A-Z0-9_]*)\}')
+_PATRON_CONDICION = re.compile(r'^\s*([a-z_]+)\s*(>=|<=|==|!=|>|<)\s*(-?\d[\d.,_]*)\s*$')
+_OPERADORES: dict[str, Callable[[Any, Any], bool]] = {
+    '>': operator.gt, '>=': operator.ge, '<': operator.lt,
+    '<=': operator.le, '==': operator.eq, '!=': operator.ne,
+}
+
+# Variables disponibles en las condiciones
+VARIABLES_CONDICION = ('precio',)
+
+Predicado = Callable[[dict[str, Any]], bool]
+
+
+@dataclass(frozen=True)
+class PlantillaCompilada:
+    """Plantilla parseada: literales en posiciones pares, placeholders en impares"""
+    segmentos: tuple[str, ...]
+
+    @property
+    def placeholders(self) -> frozenset[str]:
+        return frozenset(self.segmentos[1::2])
+
+    def render(self, valores: dict[str, str]) -> str:
+        """
+        Reemplaza los placeholders en una pasada
+
+        Los placeholders sin valor se dejan tal cual ({NOMBRE}), igual que
+        con los str.replace encadenados.
+        """
+        partes = list(self.segmentos)
+        for i in range(1, len(partes), 2):
+            nombre = partes[i]
+            partes[i] = valores[nombre] if nombre in valores else '{' + nombre + '}'
+        return ''.join(partes)
+
+
+def compilar_plantilla(texto: str) -> PlantillaCompilada:
+    """Parsea el texto de una plantilla en segmentos"""
+    return PlantillaCompilada(tuple(PATRON_PLACEHOLDER.split(texto)))
+
+
+_cache: dict[Path, tuple[int, int, PlantillaCompilada]] = {}
+_cache_lock = threading.Lock()
+
+
+def cargar_plantilla(path: str | Path) -> PlantillaCompilada:
+    """
+    Plantilla compilada de `path` (recompila si cambió mtime o tamaño)
+
+    Args:
+        path: Ruta al archivo .md de la plantilla
+
+    Returns:
+        PlantillaCompilada: Plantilla lista para render
+
+    Raises:
+        FileNotFoundError: Si no existe la plantilla
+    """
+    ruta = Path(path)
+    try:
+        estado = os.stat(ruta)
+    except FileNotFoundError:
+        raise FileNotFoundError(f'Plantilla no encontrada: {ruta}') from None
+
+    with _cache_lock:
+        cacheada = _cache.get(ruta)
+    if cacheada is not None and cacheada[:2] == (estado.st_mtime_ns, estado.st_size):
+        return cacheada[2]
+
+    plantilla = compilar_plantilla(ruta.read_text(encoding='utf-8'))
+    with _cache_lock:
+        _cache[ruta] = (estado.st_mtime_ns, estado.st_size, plantilla)
+    return plantilla
+
+
+def limpiar_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+        _alternativas_cache.clear()
+
+
+# ============================================================================
+# SELECCIÓN DE PLANTILLA (plantillas.alternativas)
+# ============================================================================
+
+def _numero(texto: str) -> Optional[float]:
+    """'LIQUIDO A RECIBIR $17.000.000' -> 17000000 (formato chileno: '.' de miles)"""
+    digitos = re.sub(r'[^\d,]', '', texto or '').replace(',', '.')
+    try:
+        return float(digitos) if digitos else None
+    except ValueError:
+        return None
+
+
+def compilar_condicion(condicion: str) -> Predicado:
+    """
+    Compila una condición de mail_config.yaml
+
+    Soporta 'default' y comparaciones '<variable> <op> <número>' con
+    op en >, >=, <, <=, ==, != (ej: 'precio > 25000000').
+
+    Raises:
+        ValueError: Condición con sintaxis o variable no soportada
+    """
+    condicion = (condicion or '').strip()
+    if condicion.lower() == 'default':
+        return lambda contexto: True
+
+    match = _PATRON_CONDICION.match(condicion)
+    if not match or match.group(1) not in VARIABLES_CONDICION:
+        raise ValueError(f'Condición no soportada: {condicion!r}')
+    variable, simbolo, literal = match.groups()
+    comparar = _OPERADORES[simbolo]
+    umbral = float(literal.replace('.', '').replace(',', '.').replace('_', ''))
+
+    def predicado(contexto: dict[str, Any]) -> bool:
+        valor = contexto.get(variable)
+        return valor is not None and comparar(valor, umbral)
+    return predicado
+
+
+def contexto_condiciones(precio_acordado: str) -> dict[str, Any]:
+    """Variables que pueden usar las condiciones de las plantillas"""
+    return {'precio': _numero(precio_acordado)}
+
+
+_alternativas_cache: dict[tuple, list[tuple[str, Path, Predicado]]] = {}
+
+
+def _compilar_alternativas(alternativas: list[dict], directorio: Path) -> list[tuple[str, Path, Predicado]]:
+    clave = (str(directorio),) + tuple(
+        (a.get('nombre'), a.get('archivo'), a.get('condicion')) for a in alternativas if isinstance(a, dict)
+    )
+    with _cache_lock:
+        compiladas = _alternativas_cache.get(clave)
+    if compiladas is not None:
+        return compiladas
+
+    compiladas = []
+    for alternativa in alternativas:
+        if not isinstance(alternativa, dict) or not alternativa.get('archivo'):
+            continue
+        try:
+            predicado = compilar_condicion(str(alternativa.get('condicion', 'default')))
+        except ValueError as e:
+            logger.warning(f"Plantilla '{alternativa.get('nombre')}' ignorada: {e}")
+            continue
+        compiladas.append((alternativa.get('nombre') or alternativa['archivo'], directorio / alternativa['archivo'], predicado))
+    with _cache_lock:
+        _alternativas_cache[clave] = compiladas
+    return compiladas
+
+
+def seleccionar_plantilla(
+    alternativas: Optional[list[dict]],
+    default: Path,
+    contexto: dict[str, Any]
+) -> Path:
+    """
+    Elige la plantilla según las condiciones (la primera que se cumple)
+
+    Las alternativas cuyo archivo no existe se saltan.
+
+    Args:
+        alternativas: plantillas.alternativas de mail_config.yaml
+        default: Plantilla por defecto (y directorio base de las alternativas)
+        contexto: Variables de las condiciones (ver contexto_condiciones)
+
+    Returns:
+        Path: Ruta a la plantilla elegida
+    """
+    for nombre, ruta, predicado in _compilar_alternativas(alternativas or [], default.parent):
+        if predicado(contexto):
+            if ruta.exists():
+                return ruta
+            logger.warning(f"Plantilla '{nombre}' seleccionada pero no existe: {ruta}")
+    return default
@@ -3,7 +3,6 @@ Utilidades para el módulo Mail de Cierre
 Incluye parsing, generación de emails, envío SMTP y gestión de historial
 """
 import os
-import re
 import json
 import smtplib
 import yaml
@@ -15,6 +14,11 @@ from email.mime.multipart import MIMEMultipart
 
 from src.validators import validar_email
 from src.config import settings
+from src.smtp_pool import smtp_pool, smtp_pool_habilitado
+from src.mail_config import MailConfigStore, MailConfigTipada
+from src.parsers import FICHA_REGISTRO, PROPIETARIO
+from src.mail_historial import obtener_historial
+from src.mail_templates import cargar_plantilla, contexto_condiciones, seleccionar_plantilla
 
 
 # ============================================================================
@@ -22,13 +26,17 @@ from src.config import settings
 # ============================================================================
 
 CONFIG_PATH = Path('docs/correo-cierre/mail_config.yaml')
-_config_cache: dict | None = None
+PLANTILLAS_DIR = Path('docs/correo-cierre')
+_config_store = MailConfigStore(CONFIG_PATH)
 
 
 def cargar_config() -> dict:
     """
     Carga configuración desde mail_config.yaml con cache.
 
+    El cache se invalida solo cuando cambia el archivo (mtime/tamaño/inode);
+    ver src/mail_config.py.
+
     Returns:
         dict: Configuración completa
 
@@ -36,21 +44,12 @@ def cargar_config() -> dict:
         FileNotFoundError: Si no existe mail_config.yaml
         yaml.YAMLError: Si el archivo tiene sintaxis inválida
     """
-    global _config_cache
-
-    if _config_cache is not None:
-        return _config_cache
+    return _config_store.actual().datos
 
-    if not CONFIG_PATH.exists():
-        raise FileNotFoundError(
-            f'Archivo de configuración no encontrado: {CONFIG_PATH}\n'
-            'Crea mail_config.yaml desde la plantilla en la documentación.'
-        )
 
-    with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-        _config_cache = yaml.safe_load(f)
-
-    return _config_cache
+def config_tipada() -> MailConfigTipada:
+    """Vista tipada y validada de mail_config.yaml (snapshot vigente)"""
+    return _config_store.actual().tipada
 
 
 def get_config(key: str, default: Any = None) -> Any:
@@ -70,26 +69,14 @@ def get_config(key: str, default: Any = None) -> Any:
         >>> get_config('visual.firma.incluir', False)
         True
     """
-    config = cargar_config()
-    keys = key.split('.')
-    value = config
-
-    for k in keys:
-        if isinstance(value, dict) and k in value:
-            value = value[k]
-        else:
-            return default
-
-    return value
+    return _config_store.actual().get(key, default)
 
 
 def reload_config():
     """
-    Recarga configuración desde archivo (útil después de editar YAML).
+    Recarga configuración desde archivo (los cambios también se detectan solos).
     """
-    global _config_cache
-    _config_cache = None
-    return cargar_config()
+    return _config_store.recargar().datos
 
 
 def validar_config() -> tuple[bool, list[str]]:
@@ -99,26 +86,13 @@ def validar_config() -> tuple[bool, list[str]]:
     Returns:
         tuple[bool, list[str]]: (es_valido, lista_de_errores)
     """
-    errores = []
-
     try:
-        config = cargar_config()
+        errores = list(config_tipada().errores)
     except FileNotFoundError:
         return False, ['Archivo mail_config.yaml no encontrado']
     except yaml.YAMLError as e:
         return False, [f'Error de sintaxis YAML: {str(e)}']
 
-    # Validar secciones requeridas
-    required_sections = ['remitente', 'plantillas', 'historial']
-    for section in required_sections:
-        if section not in config:
-            errores.append(f'Sección requerida faltante: {section}')
-
-    # Validar remitente
-    remitente_email = config.get('remitente', {}).get('email')
-    if not remitente_email or not validar_email(remitente_email):
-        errores.append('Email de remitente inválido o faltante')
-
     return (len(errores) == 0, errores)
 
 
@@ -150,18 +124,8 @@ def extraer_nombre_cliente(texto: str) -> str | None:
         >>> extraer_nombre_cliente(texto)
         'ORIANA ISOLINA ARAYA AVENDAÑO'
     """
-    # Regex: busca "Nombre :" seguido de cualquier texto hasta fin de línea
-    match = re.search(
-        r'^\s*Nombre\s*:\s*(.+)$',
-        texto,
-        flags=re.IGNORECASE | re.MULTILINE
-    )
-
-    if match:
-        nombre = match.group(1).strip().upper()
-        return nombre if nombre else None
-
-    return None
+    nombre = PROPIETARIO.parsear(texto)['nombre']
+    return nombre.upper() if nombre else None
 
 
 def parsear_ficha_registro(texto: str) -> dict | None:
@@ -193,19 +157,14 @@ def parsear_ficha_registro(texto: str) -> dict | None:
     if not texto or not texto.strip():
         return None
 
-    # Regex tolerantes a espacios y variaciones
-    def buscar(pattern: str) -> str | None:
-        match = re.search(pattern, texto, flags=re.IGNORECASE | re.MULTILINE)
-        return match.group(1).strip() if match else None
-
-    # Extraer campos
-    inscripcion = buscar(r'Inscripci[oó]n\s*:\s*(.+?)(?:\r?\n|$)')
-    marca = buscar(r'Marca\s*:\s*(.+?)(?:\r?\n|$)')
-    modelo = buscar(r'Modelo\s*:\s*(.+?)(?:\r?\n|$)')
-    anio = buscar(r'A[ñn]o\s*:\s*(\d{4})')
-    nombre = buscar(r'Nombre\s*:\s*(.+?)(?:\r?\n|$)')
-    run = buscar(r'R\.?U\.?(?:N|T)\.?\s*:\s*(.+?)(?:\r?\n|$)')
-    fec_adquisicion = buscar(r'Fec\.?\s*adquisici[oó]n\s*:?\s*(.+?)(?:\r?\n|$)')
+    campos = FICHA_REGISTRO.parsear(texto)
+    inscripcion = campos['inscripcion']
+    marca = campos['marca']
+    modelo = campos['modelo']
+    anio = campos['anio']
+    nombre = campos['nombre']
+    run = campos['run']
+    fec_adquisicion = campos['fec_adquisicion']
 
     # Validar campos obligatorios
     campos_faltantes = []
@@ -258,30 +217,37 @@ def generar_email_desde_plantilla(
     vehiculo: str,
     precio_acordado: str,
     fecha_pago: str,
-    plantilla_path: Path = Path('docs/correo-cierre/plantilla.md')
+    plantilla_path: Optional[Path] = None
 ) -> tuple[str, str]:
     """
     Genera email desde plantilla con reemplazo de placeholders.
 
+    La plantilla se compila una vez y se cachea por ruta + mtime (ver
+    src/mail_templates.py); los placeholders se reemplazan en una pasada.
+
     Args:
         datos_propietario: Bloque DATOS DEL PROPIETARIO
         vehiculo: Descripción del vehículo
         precio_acordado: Precio acordado con cliente
         fecha_pago: Rango de fechas de pago
-        plantilla_path: Ruta a plantilla.md
+        plantilla_path: Ruta a la plantilla (default: según plantillas.alternativas
+            de mail_config.yaml, o plantilla.md)
 
     Returns:
         tuple[str, str]: (asunto, cuerpo_email)
 
     Raises:
-        FileNotFoundError: Si no existe plantilla.md
+        FileNotFoundError: Si no existe la plantilla
         ValueError: Si no se puede extraer nombre del cliente
     """
-    if not plantilla_path.exists():
-        raise FileNotFoundError(f'Plantilla no encontrada: {plantilla_path}')
-
-    # 1. Cargar plantilla
-    plantilla = plantilla_path.read_text(encoding='utf-8')
+    # 1. Elegir y cargar plantilla (compilada y cacheada)
+    if plantilla_path is None:
+        plantilla_path = seleccionar_plantilla(
+            get_config('plantillas.alternativas', []),
+            PLANTILLAS_DIR / get_config('plantillas.default', 'plantilla.md'),
+            contexto_condiciones(precio_acordado),
+        )
+    plantilla = cargar_plantilla(plantilla_path)
 
     # 2. Extraer nombre del cliente
     nombre_cliente = extraer_nombre_cliente(datos_propietario)
@@ -289,12 +255,13 @@ def generar_email_desde_plantilla(
         raise ValueError('No se pudo extraer nombre del cliente')
 
     # 3. Reemplazar placeholders
-    email_body = plantilla
-    email_body = email_body.replace('{NOMBRE_CLIENTE}', nombre_cliente)
-    email_body = email_body.replace('{VEHICULO}', vehiculo)
-    email_body = email_body.replace('{PRECIO_ACORDADO_CLIENTE}', precio_acordado)
-    email_body = email_body.replace('{FECHA_PAGO}', fecha_pago)
-    email_body = email_body.replace('{DATOS_PROPIETARIO_COMPLETOS}', datos_propietario)
+    email_body = plantilla.render({
+        'NOMBRE_CLIENTE': nombre_cliente,
+        'VEHICULO': vehiculo,
+        'PRECIO_ACORDADO_CLIENTE': precio_acordado,
+        'FECHA_PAGO': fecha_pago,
+        'DATOS_PROPIETARIO_COMPLETOS': datos_propietario,
+    })
 
     # 4. Generar asunto con vehículo completo
     asunto = f'Confirmación de Cierre de Negocio – {vehiculo}'
@@ -381,27 +348,105 @@ def cargar_cc_predeterminados() -> list[str]:
     """
     Carga lista de emails CC predeterminados desde configuración.
 
+    Los emails se validan una vez por versión del archivo de configuración.
+
     Returns:
         list[str]: Lista de emails para CC predeterminados
     """
-    if not get_config('cc.enabled', False):
+    tipada = config_tipada()
+    if not tipada.cc_enabled:
         return []
-
-    cc_addresses = get_config('cc.addresses', [])
-
-    # Validar que todos los emails sean válidos
-    valid_cc = []
-    for email in cc_addresses:
-        if validar_email(email):
-            valid_cc.append(email)
-
-    return valid_cc
+    return list(tipada.cc_predeterminados)
 
 
 # ============================================================================
 # ENVÍO SMTP (CON CC VISIBLE)
 # ============================================================================
 
+def enviar_mensaje_smtp(
+    destinatario: str,
+    asunto: str,
+    cuerpo: str,
+    cc: Optional[list[str]] = None,
+    remitente: Optional[str] = None
+) -> str:
+    """
+    Envía email via SMTP propagando los errores (ver enviar_email_smtp).
+
+    Lo usa el outbox de envío masivo para distinguir errores transitorios
+    (reintentables) de permanentes.
+
+    Returns:
+        str: Mensaje de confirmación
+
+    Raises:
+        ValueError: SMTP no configurado o emails inválidos
+        smtplib.SMTPException: Errores del servidor SMTP
+        OSError: Errores de red (conexión rechazada, timeout)
+    """
+    # 1. Obtener configuración desde settings
+    host = settings.smtp_host
+    port = settings.smtp_port or 587
+    user = settings.smtp_user
+    password = settings.smtp_pass
+    secure = (settings.smtp_secure or 'none').lower()
+
+    if not all([host, user, password]):
+        raise ValueError('SMTP no configurado correctamente')
+
+    remitente = remitente or user
+    cc = cc or []
+
+    # 2. Validar todos los emails (destinatario + cc)
+    if not validar_email(destinatario):
+        raise ValueError(f'Email destinatario inválido: {destinatario}')
+
+    for email in cc:
+        if email.strip() and not validar_email(email.strip()):
+            raise ValueError(f'Email CC inválido: {email}')
+
+    # 3. Crear mensaje
+    msg = MIMEMultipart()
+    msg['From'] = remitente
+    msg['To'] = destinatario
+    msg['Subject'] = asunto
+
+    # IMPORTANTE: CC es VISIBLE (aparece en los headers del email)
+    if cc:
+        cc_clean = [e.strip() for e in cc if e.strip()]
+        if cc_clean:
+            msg['Cc'] = ', '.join(cc_clean)
+
+    # Detectar si es HTML o texto plano
+    if '<html>' in cuerpo.lower() or '<br>' in cuerpo.lower():
+        msg.attach(MIMEText(cuerpo, 'html'))
+    else:
+        msg.attach(MIMEText(cuerpo, 'plain'))
+
+    # 4. Enviar a destinatario principal + CC
+    all_recipients = [destinatario] + [e.strip() for e in cc if e.strip()]
+    if smtp_pool_habilitado():
+        # Conexión autenticada reutilizada entre correos (ver src/smtp_pool.py)
+        smtp_pool.enviar(
+            host, port, user, password, secure,
+            msg['From'], all_recipients, msg.as_string()
+        )
+    else:
+        if secure == 'ssl':
+            server = smtplib.SMTP_SSL(host, port)
+        else:
+            server = smtplib.SMTP(host, port)
+            if secure == 'tls':
+                server.starttls()
+
+        server.login(user, password)
+        server.sendmail(msg['From'], all_recipients, msg.as_string())
+        server.quit()
+
+    cc_info = f" (+{len([e for e in cc if e.strip()])} CC)" if cc else ""
+    return f'Email enviado exitosamente a {destinatario}{cc_info}'
+
+
 def enviar_email_smtp(
     destinatario: str,
     asunto: str,
@@ -433,63 +478,9 @@ def enviar_email_smtp(
         ... )
     """
     try:
-        # 1. Obtener configuración desde settings
-        host = settings.smtp_host
-        port = settings.smtp_port or 587
-        user = settings.smtp_user
-        password = settings.smtp_pass
-        secure = (settings.smtp_secure or 'none').lower()
-
-        if not all([host, user, password]):
-            return False, 'SMTP no configurado correctamente'
-
-        remitente = remitente or user
-        cc = cc or []
-
-        # 2. Validar todos los emails (destinatario + cc)
-        if not validar_email(destinatario):
-            return False, f'Email destinatario inválido: {destinatario}'
-
-        for email in cc:
-            if email.strip() and not validar_email(email.strip()):
-                return False, f'Email CC inválido: {email}'
-
-        # 3. Crear mensaje
-        msg = MIMEMultipart()
-        msg['From'] = remitente
-        msg['To'] = destinatario
-        msg['Subject'] = asunto
-
-        # IMPORTANTE: CC es VISIBLE (aparece en los headers del email)
-        if cc:
-            cc_clean = [e.strip() for e in cc if e.strip()]
-            if cc_clean:
-                msg['Cc'] = ', '.join(cc_clean)
-
-        # Detectar si es HTML o texto plano
-        if '<html>' in cuerpo.lower() or '<br>' in cuerpo.lower():
-            msg.attach(MIMEText(cuerpo, 'html'))
-        else:
-            msg.attach(MIMEText(cuerpo, 'plain'))
-
-        # 4. Conectar y enviar
-        if secure == 'ssl':
-            server = smtplib.SMTP_SSL(host, port)
-        else:
-            server = smtplib.SMTP(host, port)
-            if secure == 'tls':
-                server.starttls()
-
-        server.login(user, password)
-
-        # Enviar a destinatario principal + CC
-        all_recipients = [destinatario] + [e.strip() for e in cc if e.strip()]
-        server.sendmail(msg['From'], all_recipients, msg.as_string())
-        server.quit()
-
-        cc_info = f" (+{len([e for e in cc if e.strip()])} CC)" if cc else ""
-        return True, f'Email enviado exitosamente a {destinatario}{cc_info}'
-
+        return True, enviar_mensaje_smtp(destinatario, asunto, cuerpo, cc=cc, remitente=remitente)
+    except ValueError as e:
+        return False, str(e)
     except smtplib.SMTPAuthenticationError:
         return False, 'Error de autenticación SMTP (verifica SMTP_USER y SMTP_PASS)'
     except smtplib.SMTPException as e:
@@ -534,7 +525,11 @@ def guardar_historial_envio(
     duracion_ms: int
 ) -> Path | None:
     """
-    Guarda registro de email enviado en formato JSON liviano.
+    Guarda registro de email enviado en el historial.
+
+    Por defecto agrega una fila a la base SQLite del historial
+    (src/mail_historial.py); con historial.formato = 'json' escribe el
+    archivo JSON por envío del formato anterior.
 
     Args:
         email_destino: Email del cliente (TO)
@@ -549,24 +544,15 @@ def guardar_historial_envio(
         duracion_ms: Duración del envío en milisegundos
 
     Returns:
-        Path: Ruta al archivo JSON creado o None si historial deshabilitado
+        Path: Base SQLite (o archivo JSON creado) o None si historial deshabilitado
     """
     # 1. Validar que historial esté habilitado
     if not get_config('historial.enabled', True):
         return None
 
-    # 2. Crear directorio si no existe
-    historial_dir = Path(get_config('historial.directorio', 'docs/correo-cierre/enviados'))
-    historial_dir.mkdir(parents=True, exist_ok=True)
-
-    # 3. Generar timestamp y nombre de archivo
     timestamp = datetime.now()
-    timestamp_str = timestamp.strftime('%Y%m%d_%H%M%S')
-    patente_safe = patente.replace('.', '').replace('-', '')
-    filename = f"{timestamp_str}_{patente_safe}.json"
-    filepath = historial_dir / filename
 
-    # 4. Ofuscar email si está configurado
+    # 2. Ofuscar email si está configurado
     incluir_cuerpo = get_config('historial.incluir_cuerpo', True)
     campos_ofuscados = get_config('historial.campos_ofuscados', ['email_destinatario'])
 
@@ -578,7 +564,7 @@ def guardar_historial_envio(
     if 'cc_addresses' in campos_ofuscados:
         cc_display = [ofuscar_email(e) for e in cc_emails]
 
-    # 5. Construir objeto JSON
+    # 3. Construir objeto JSON
     historial_data = {
         'metadata': {
             'timestamp': timestamp.isoformat(),
@@ -609,14 +595,34 @@ def guardar_historial_envio(
         }
     }
 
-    # 6. Guardar archivo
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(historial_data, f, indent=2, ensure_ascii=False)
+    # 4. Formato legado: un archivo JSON por envío
+    if get_config('historial.formato', 'sqlite') == 'json':
+        historial_dir = Path(get_config('historial.directorio', 'docs/correo-cierre/enviados'))
+        historial_dir.mkdir(parents=True, exist_ok=True)
+        patente_safe = patente.replace('.', '').replace('-', '')
+        filepath = historial_dir / f"{timestamp.strftime('%Y%m%d_%H%M%S')}_{patente_safe}.json"
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(historial_data, f, indent=2, ensure_ascii=False)
+        rotar_historial(historial_dir)
+        return filepath
+
+    # 5. SQLite: INSERT + retención por índice (sin recorrer el directorio)
+    db_path = ruta_db_historial()
+    historial = obtener_historial(db_path)
+    historial.agregar(historial_data, email_destino=email_destino)
+    historial.aplicar_retencion(
+        max_registros=get_config('historial.max_registros', get_config('historial.max_archivos', 100)),
+        max_dias=get_config('historial.max_dias', 0),
+    )
+    return db_path
 
-    # 7. Rotar archivos si excede límite
-    rotar_historial(historial_dir)
 
-    return filepath
+def ruta_db_historial() -> Path:
+    """Base SQLite del historial (historial.db_path o <historial.directorio>/historial.sqlite3)"""
+    db_path = get_config('historial.db_path')
+    if db_path:
+        return Path(db_path)
+    return Path(get_config('historial.directorio', 'docs/correo-cierre/enviados')) / 'historial.sqlite3'
 
 
 def rotar_historial(directorio: Path):
@@ -3,6 +3,8 @@ Modelos Pydantic para datos de contratos + funciones de parsing
 Basado en: Sección 0.1 del plan (parsing de texto estructurado)
 """
 import re
+from dataclasses import dataclass
+from itertools import chain
 from typing import Optional, List
 from pydantic import BaseModel, Field, field_validator
 
@@ -96,6 +98,8 @@ class ContratoResult(BaseModel):
     mensaje: str = Field(..., description='Mensaje descriptivo del resultado')
     error: Optional[str] = Field(None, description='Mensaje de error si hubo fallo')
     duracion_segundos: Optional[float] = Field(None, description='Duración de la operación')
+    timings: dict[str, float] = Field(default_factory=dict, description='Segundos por etapa (ver src/stage_events.ETAPAS)')
+    registro_enviado: bool = Field(False, description='Si se presionó "Registrar" (aunque después fallara): no reintentar')
 
 
 class ValidationError(BaseModel):
@@ -108,19 +112,22 @@ class ValidationError(BaseModel):
 # FUNCIONES DE PARSING DE TEXTO ESTRUCTURADO
 # ============================================================================
 
-def extraer(texto: str, regex: str, flags: int = re.IGNORECASE) -> Optional[str]:
+def extraer(texto: str, regex: str | re.Pattern, flags: int = re.IGNORECASE) -> Optional[str]:
     """
     Extrae valor usando regex
     
     Args:
         texto: Texto fuente
-        regex: Expresión regular (debe tener 1 grupo de captura)
-        flags: Flags de regex
+        regex: Expresión regular o patrón compilado (debe tener 1 grupo de captura)
+        flags: Flags de regex (se ignoran si el patrón ya está compilado)
     
     Returns:
         str: Valor extraído o None
     """
-    match = re.search(regex, texto, flags)
+    if isinstance(regex, re.Pattern):
+        match = regex.search(texto)
+    else:
+        match = re.search(regex, texto, flags)
     return match.group(1).strip() if match else None
 
 
@@ -240,13 +247,144 @@ def separar_direccion(direccion_completa: str) -> dict[str, str]:
     }
 
 
+# ============================================================================
+# PATRONES PRECOMPILADOS Y BLOQUES
+# ============================================================================
+
+_NO_DIGITOS = re.compile(r'[^0-9]')
+_ESPACIOS = re.compile(r'\s+')
+
+_PATRON_INSCRIPCION = re.compile(
+    r'(?:Inscripci(?:o|ó)n|Inscripcion|Patente)\s*:\s*([A-Z0-9.]+)\s*-\s*([0-9K])',
+    re.IGNORECASE
+)
+
+# Encabezados de bloque por tipo, en orden de preferencia (un grupo por alternativa)
+_ENCABEZADOS = {
+    'vehiculo': [r'DATOS\s+(?:DEL\s+)?VEH[IÍ]CULO'],
+    'vendedor': [r'DATOS\s+(?:DEL\s+)?VENDEDOR', r'DATOS\s+PROPIETARIO'],
+    'comprador': [r'DATOS\s+(?:DEL\s+)?COMPRADOR', r'DATOS\s+COMPRADOR'],
+}
+
+
+def _compilar_por_linea(patron: str, flags: int = re.IGNORECASE) -> tuple[re.Pattern, re.Pattern]:
+    """
+    Equivalente a (?m)^patron como dos regex: al inicio del texto y tras '\\n'
+
+    Con el '\\n' literal al frente sre salta de línea en línea en vez de
+    probar el patrón en cada carácter (importa en textos pegados largos).
+    """
+    return re.compile(patron, flags), re.compile(r'\n' + patron, flags)
+
+
+def _buscar_por_linea(patrones: tuple[re.Pattern, re.Pattern], texto: str) -> Optional[re.Match]:
+    al_inicio, tras_salto = patrones
+    return al_inicio.match(texto) or tras_salto.search(texto)
+
+
+_PATRONES_ENCABEZADO = _compilar_por_linea(
+    r'\s*(?:' + '|'.join(
+        f'(?P<{tipo}_{i}>{encabezado})'
+        for tipo, encabezados in _ENCABEZADOS.items()
+        for i, encabezado in enumerate(encabezados)
+    ) + r')\b'
+)
+
+_CAMPOS_VEHICULO = {
+    'tipo_vehiculo': re.compile(r'Tipo\s+Veh[ií]culo\s*:\s*(.+?)(?=\s+A[ñn]o\s*:|\n|$)', re.IGNORECASE),
+    'ano': re.compile(r'A[ñn]o\s*:\s*(\d{4})', re.IGNORECASE),
+    'marca': re.compile(r'Marca\s*:\s*(.+?)(?:\n|$)', re.IGNORECASE),
+    'modelo': re.compile(r'Modelo\s*:\s*(.+?)(?:\n|$)', re.IGNORECASE),
+    'motor': re.compile(r'Nro\.\s*Motor\s*:\s*([^\n\r]+)', re.IGNORECASE),
+    'chasis': re.compile(r'Nro\.\s*(?:Chasis|Vin)\s*:\s*([^\n\r]+)', re.IGNORECASE),
+    'color': re.compile(r'Color\s*:\s*(.+?)(?:\n|$)', re.IGNORECASE),
+}
+
+_CAMPOS_PERSONA = {
+    'nombre': re.compile(r'Nombre\s*:\s*(.+?)(?:\n|R\.?U\.?(?:T|N)\.?)', re.IGNORECASE),
+    'rut': re.compile(r'R\.?U\.?(?:T|N)\.?\s*:\s*([0-9Kk.-]+)', re.IGNORECASE),
+    'direccion': re.compile(r'Direcci[oó]n\s*:\s*(.+?)(?:\n|Tel[eé]fono|Correo|Email|$)', re.IGNORECASE),
+    'telefono': re.compile(r'Tel[eé]fono\s*:\s*(\d+)', re.IGNORECASE),
+    'email': re.compile(r'(?:Correo|Email)\s*:\s*(\S+@\S+)', re.IGNORECASE),
+}
+
+
+def _patrones_monto(etiqueta: str) -> tuple[tuple[re.Pattern, re.Pattern], re.Pattern]:
+    return (
+        _compilar_por_linea(fr'\s*{etiqueta}\s*:?\s*\$?\s*([0-9.]+)\s*$', re.IGNORECASE | re.MULTILINE),
+        re.compile(fr'\b{etiqueta}\b\s*:?\s*\$?\s*([0-9.]+)', re.IGNORECASE),
+    )
+
+
+_MONTO_TASACION = _patrones_monto(r'TASACI(?:O|Ó)N')
+_MONTO_VENTA = _patrones_monto(r'VENTA')
+
+
+@dataclass(frozen=True)
+class _Bloque:
+    """Tramo texto[inicio:fin] de un bloque (sin copiar el texto)"""
+    texto: str
+    inicio: int
+    fin: int
+
+    def extraer(self, patron: re.Pattern) -> Optional[str]:
+        match = patron.search(self.texto, self.inicio, self.fin)
+        return match.group(1).strip() if match else None
+
+
+def _tokenizar_bloques(texto: str) -> dict[str, _Bloque]:
+    """
+    Separa el texto en bloques por encabezado en una sola pasada
+
+    Cada bloque va desde su encabezado hasta el siguiente encabezado (de
+    cualquier tipo) o el final del texto. Si un tipo aparece varias veces
+    se usa la primera aparición del encabezado preferido (ver _ENCABEZADOS).
+
+    Args:
+        texto: Texto pegado completo
+
+    Returns:
+        dict: tipo ('vehiculo', 'vendedor', 'comprador') -> _Bloque no vacío
+    """
+    encontrados: dict[str, tuple[int, int, int]] = {}  # tipo -> (preferencia, inicio, fin)
+    abierto: Optional[tuple[str, int, int]] = None
+
+    def cerrar(fin: int) -> None:
+        tipo, preferencia, inicio = abierto
+        actual = encontrados.get(tipo)
+        if actual is None or preferencia < actual[0]:
+            encontrados[tipo] = (preferencia, inicio, fin)
+
+    al_inicio, tras_salto = _PATRONES_ENCABEZADO
+    primero = al_inicio.match(texto)
+    siguientes = tras_salto.finditer(texto, primero.end() if primero else 0)
+    for match in chain([primero] if primero else [], siguientes):
+        if abierto is not None:
+            cerrar(match.start())
+        tipo, preferencia = match.lastgroup.rsplit('_', 1)
+        abierto = (tipo, int(preferencia), match.end())
+    if abierto is not None:
+        cerrar(len(texto))
+
+    bloques = {}
+    for tipo, (_, inicio, fin) in encontrados.items():
+        # Recortar espacios por offsets (equivale al strip() del bloque)
+        while inicio < fin and texto[inicio].isspace():
+            inicio += 1
+        while fin > inicio and texto[fin - 1].isspace():
+            fin -= 1
+        if fin > inicio:
+            bloques[tipo] = _Bloque(texto, inicio, fin)
+    return bloques
+
+
 def _normalizar_monto(valor: Optional[str | int]) -> Optional[int]:
     if valor is None:
         return None
     if isinstance(valor, int):
         return valor
 
-    limpio = re.sub(r'[^0-9]', '', str(valor))
+    limpio = _NO_DIGITOS.sub('', str(valor))
     if not limpio:
         return None
     return int(limpio)
@@ -256,32 +394,14 @@ def _normalizar_identificador_vehiculo(valor: Optional[str]) -> Optional[str]:
     if valor is None:
         return None
 
-    normalizado = re.sub(r'\s+', '', valor)
+    normalizado = _ESPACIOS.sub('', valor)
     return normalizado or None
 
 
-def _extraer_bloque(texto: str, encabezados: list[str], todos_encabezados: list[str]) -> Optional[str]:
-    union_encabezados = '|'.join(f'(?:{h})' for h in todos_encabezados)
-
-    for encabezado in encabezados:
-        match = re.search(fr'(?im)^\s*(?:{encabezado})\b', texto)
-        if not match:
-            continue
-
-        inicio = match.end()
-        resto = texto[inicio:]
-        siguiente = re.search(fr'(?im)^\s*(?:{union_encabezados})\b', resto)
-        if siguiente:
-            return resto[:siguiente.start()].strip()
-        return resto.strip()
-
-    return None
-
-
-def _extraer_monto(texto: str, etiqueta: str) -> Optional[int]:
-    valor = extraer(texto, fr'(?im)^\s*{etiqueta}\s*:?\s*\$?\s*([0-9.]+)\s*$')
-    if valor is None:
-        valor = extraer(texto, fr'\b{etiqueta}\b\s*:?\s*\$?\s*([0-9.]+)')
+def _extraer_monto(texto: str, patrones: tuple[tuple[re.Pattern, re.Pattern], re.Pattern]) -> Optional[int]:
+    por_linea, en_texto = patrones
+    match = _buscar_por_linea(por_linea, texto)
+    valor = match.group(1).strip() if match else extraer(texto, en_texto)
     return _normalizar_monto(valor)
 
 
@@ -303,11 +423,7 @@ def parsear_texto_contrato(
     
     try:
         # ============ PATENTE ============
-        inscripcion_match = re.search(
-            r'(?:Inscripci(?:o|ó)n|Inscripcion|Patente)\s*:\s*([A-Z0-9.]+)\s*-\s*([0-9K])',
-            texto,
-            re.IGNORECASE
-        )
+        inscripcion_match = _PATRON_INSCRIPCION.search(texto)
         
         if not inscripcion_match:
             errores.append(ValidationError(
@@ -321,14 +437,10 @@ def parsear_texto_contrato(
         patente = limpiar_patente(patente_raw)
         
         # ============ BLOQUES (orden flexible) ============
-        encabezados_vehiculo = [r'DATOS\s+(?:DEL\s+)?VEH[IÍ]CULO']
-        encabezados_vendedor = [r'DATOS\s+(?:DEL\s+)?VENDEDOR', r'DATOS\s+PROPIETARIO']
-        encabezados_comprador = [r'DATOS\s+(?:DEL\s+)?COMPRADOR', r'DATOS\s+COMPRADOR']
-        todos_encabezados = encabezados_vehiculo + encabezados_vendedor + encabezados_comprador
-
-        bloque_vehiculo = _extraer_bloque(texto, encabezados_vehiculo, todos_encabezados)
-        bloque_vendedor = _extraer_bloque(texto, encabezados_vendedor, todos_encabezados)
-        bloque_comprador = _extraer_bloque(texto, encabezados_comprador, todos_encabezados)
+        bloques = _tokenizar_bloques(texto)
+        bloque_vehiculo = bloques.get('vehiculo')
+        bloque_vendedor = bloques.get('vendedor')
+        bloque_comprador = bloques.get('comprador')
 
         if not bloque_vehiculo:
             errores.append(ValidationError(campo='vehiculo', mensaje='Bloque DATOS DEL VEHICULO no encontrado'))
@@ -341,20 +453,13 @@ def parsear_texto_contrato(
             return None, errores
 
         # ============ VEHICULO ============
-        tipo_vehiculo = extraer(
-            bloque_vehiculo,
-            r'Tipo\s+Veh[ií]culo\s*:\s*(.+?)(?=\s+A[ñn]o\s*:|\n|$)'
-        ) or 'AUTOMOVIL'
-        ano_str = extraer(bloque_vehiculo, r'A[ñn]o\s*:\s*(\d{4})')
-        marca = extraer(bloque_vehiculo, r'Marca\s*:\s*(.+?)(?:\n|$)')
-        modelo = extraer(bloque_vehiculo, r'Modelo\s*:\s*(.+?)(?:\n|$)')
-        motor = _normalizar_identificador_vehiculo(
-            extraer(bloque_vehiculo, r'Nro\.\s*Motor\s*:\s*([^\n\r]+)')
-        )
-        chasis = _normalizar_identificador_vehiculo(
-            extraer(bloque_vehiculo, r'Nro\.\s*(?:Chasis|Vin)\s*:\s*([^\n\r]+)')
-        )
-        color = extraer(bloque_vehiculo, r'Color\s*:\s*(.+?)(?:\n|$)') or 'SIN ESPECIFICAR'
+        tipo_vehiculo = bloque_vehiculo.extraer(_CAMPOS_VEHICULO['tipo_vehiculo']) or 'AUTOMOVIL'
+        ano_str = bloque_vehiculo.extraer(_CAMPOS_VEHICULO['ano'])
+        marca = bloque_vehiculo.extraer(_CAMPOS_VEHICULO['marca'])
+        modelo = bloque_vehiculo.extraer(_CAMPOS_VEHICULO['modelo'])
+        motor = _normalizar_identificador_vehiculo(bloque_vehiculo.extraer(_CAMPOS_VEHICULO['motor']))
+        chasis = _normalizar_identificador_vehiculo(bloque_vehiculo.extraer(_CAMPOS_VEHICULO['chasis']))
+        color = bloque_vehiculo.extraer(_CAMPOS_VEHICULO['color']) or 'SIN ESPECIFICAR'
         
         # Validar campos requeridos vehículo
         if not ano_str:
@@ -383,106 +488,76 @@ def parsear_texto_contrato(
         # ============ TASACION Y VENTA ============
         tasacion = _normalizar_monto(tasacion_override)
         if tasacion is None:
-            tasacion = _extraer_monto(texto, r'TASACI(?:O|Ó)N')
+            tasacion = _extraer_monto(texto, _MONTO_TASACION)
 
         valor_venta = _normalizar_monto(venta_override)
         if valor_venta is None:
-            valor_venta = _extraer_monto(texto, r'VENTA')
+            valor_venta = _extraer_monto(texto, _MONTO_VENTA)
 
         if valor_venta is None:
             errores.append(ValidationError(campo='venta', mensaje='Valor de venta no encontrado'))
             return None, errores
 
         # ============ VENDEDOR ============
-        nombre_vendedor = extraer(
-            bloque_vendedor,
-            r'Nombre\s*:\s*(.+?)(?:\n|R\.?U\.?(?:T|N)\.?)'
-        )
+        nombre_vendedor = bloque_vendedor.extraer(_CAMPOS_PERSONA['nombre'])
         if not nombre_vendedor:
             errores.append(ValidationError(campo='vendedor_nombre', mensaje='Nombre del vendedor no encontrado'))
             return None, errores
         
         partes_vendedor = separar_nombre(nombre_vendedor.strip())
         
-        rut_vendedor_raw = extraer(
-            bloque_vendedor,
-            r'R\.?U\.?(?:T|N)\.?\s*:\s*([0-9Kk.-]+)'
-        )
+        rut_vendedor_raw = bloque_vendedor.extraer(_CAMPOS_PERSONA['rut'])
         if not rut_vendedor_raw:
             errores.append(ValidationError(campo='vendedor_rut', mensaje='RUT del vendedor no encontrado'))
             return None, errores
         
         rut_vendedor = formatear_rut(rut_vendedor_raw)
         
-        dir_vendedor_raw = extraer(
-            bloque_vendedor,
-            r'Direcci[oó]n\s*:\s*(.+?)(?:\n|Tel[eé]fono|Correo|Email|$)'
-        )
+        dir_vendedor_raw = bloque_vendedor.extraer(_CAMPOS_PERSONA['direccion'])
         if not dir_vendedor_raw:
             errores.append(ValidationError(campo='vendedor_direccion', mensaje='Dirección del vendedor no encontrada'))
             return None, errores
         
         dir_vendedor = separar_direccion(dir_vendedor_raw)
         
-        tel_vendedor = extraer(
-            bloque_vendedor,
-            r'Tel[eé]fono\s*:\s*(\d+)'
-        )
+        tel_vendedor = bloque_vendedor.extraer(_CAMPOS_PERSONA['telefono'])
         if not tel_vendedor:
             errores.append(ValidationError(campo='vendedor_telefono', mensaje='Teléfono del vendedor no encontrado'))
             return None, errores
         
-        email_vendedor = extraer(
-            bloque_vendedor,
-            r'(?:Correo|Email)\s*:\s*(\S+@\S+)'
-        )
+        email_vendedor = bloque_vendedor.extraer(_CAMPOS_PERSONA['email'])
         if not email_vendedor:
             errores.append(ValidationError(campo='vendedor_email', mensaje='Email del vendedor no encontrado'))
             return None, errores
         
         # ============ COMPRADOR ============
-        nombre_comprador = extraer(
-            bloque_comprador,
-            r'Nombre\s*:\s*(.+?)(?:\n|R\.?U\.?(?:T|N)\.?)'
-        )
+        nombre_comprador = bloque_comprador.extraer(_CAMPOS_PERSONA['nombre'])
         if not nombre_comprador:
             errores.append(ValidationError(campo='comprador_nombre', mensaje='Nombre del comprador no encontrado'))
             return None, errores
         
         partes_comprador = separar_nombre(nombre_comprador.strip())
         
-        rut_comprador_raw = extraer(
-            bloque_comprador,
-            r'R\.?U\.?(?:T|N)\.?\s*:\s*([0-9Kk.-]+)'
-        )
+        rut_comprador_raw = bloque_comprador.extraer(_CAMPOS_PERSONA['rut'])
         if not rut_comprador_raw:
             errores.append(ValidationError(campo='comprador_rut', mensaje='RUT del comprador no encontrado'))
             return None, errores
         
         rut_comprador = formatear_rut(rut_comprador_raw)
         
-        dir_comprador_raw = extraer(
-            bloque_comprador,
-            r'Direcci[oó]n\s*:\s*(.+?)(?:\n|Tel[eé]fono|Correo|Email|$)'
-        )
+        dir_comprador_raw = bloque_comprador.extraer(_CAMPOS_PERSONA['direccion'])
         if not dir_comprador_raw:
             errores.append(ValidationError(campo='comprador_direccion', mensaje='Dirección del comprador no encontrada'))
             return None, errores
         
         dir_comprador = separar_direccion(dir_comprador_raw)
         
-        tel_comprador = extraer(
-            bloque_comprador,
-            r'Tel[eé]fono\s*:\s*(\d+)'
-        )
+        tel_comprador = bloque_comprador.extraer(_CAMPOS_PERSONA['telefono'])
         if not tel_comprador:
             errores.append(ValidationError(campo='comprador_telefono', mensaje='Teléfono del comprador no encontrado'))
             return None, errores
         
-        email_comprador = extraer(
-            bloque_comprador,
-            r'(?:Correo|Email)\s*:\s*(\S+@\S+)'
-        )
+        email_comprador = bloque_comprador.extraer(_CAMPOS_PERSONA['email'])
         if not email_comprador:
             errores.append(ValidationError(campo='comprador_email', mensaje='Email del comprador no encontrado'))
             return None, errores
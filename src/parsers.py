@@ -0,0 +1,279 @@
+"""
+Parsers de texto pegado: TAG, correo de cierre (Telegram) y ficha de registro
+Cada formato se declara como una lista de Campo ('Etiqueta : valor'). Al
+importar el módulo los campos de cada formato se unen en una sola regex
+compilada, así que un parseo recorre el texto una vez y llena todos los
+campos (gana la primera aparición de cada uno). app.py, api.py y
+mail_utils usan estas funciones en vez de sus propias re.search.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+
+@dataclass(frozen=True)
+class Campo:
+    """
+    Campo 'Etiqueta : valor' de un formato
+
+    `etiqueta` y `valor` son regex sin grupos de captura; la etiqueta debe
+    empezar una palabra (o la línea, si `inicio_linea`). Sin `inicio_linea`
+    el valor termina donde empieza otra etiqueta del formato en la misma
+    línea ('Marca : KIA Año : 2015'). Un campo `bloque` sigue en las líneas
+    siguientes hasta la próxima etiqueta del formato.
+    """
+    nombre: str
+    etiqueta: str
+    valor: str = r'.+'
+    separador: str = r'[ \t]*:[ \t]*'
+    inicio_linea: bool = True
+    bloque: bool = False
+
+
+class Formato:
+    """Campos de un formato compilados en una regex (alternativa por campo)"""
+
+    def __init__(self, nombre: str, campos: Iterable[Campo]):
+        self.nombre = nombre
+        self.campos = tuple(campos)
+        self._bloques = frozenset(c.nombre for c in self.campos if c.bloque)
+        self._en_linea = frozenset(c.nombre for c in self.campos if not c.inicio_linea)
+        al_inicio, en_linea = [], []
+        for campo in self.campos:
+            (al_inicio if campo.inicio_linea else en_linea).append(
+                f'(?:{campo.etiqueta}){campo.separador}(?P<{campo.nombre}>{campo.valor})'
+            )
+        # Prefijo común por grupo: la regex descarta rápido las posiciones
+        # que no abren línea (o palabra, para las etiquetas a mitad de línea)
+        partes = []
+        if al_inicio:
+            partes.append(rf"^[ \t]*(?:{'|'.join(al_inicio)})")
+        if en_linea:
+            partes.append(rf"(?<!\w)(?:{'|'.join(en_linea)})")
+        self.patron = re.compile('|'.join(partes), re.IGNORECASE | re.MULTILINE)
+
+    def parsear(self, texto: str) -> dict[str, Optional[str]]:
+        """
+        Valores de los campos en `texto`
+
+        Args:
+            texto: Texto pegado por el usuario
+
+        Returns:
+            dict: nombre del campo -> valor sin espacios extremos (None si no está)
+        """
+        valores: dict[str, Optional[str]] = dict.fromkeys(c.nombre for c in self.campos)
+        pendientes = len(valores)
+        bloque: Optional[tuple[str, int]] = None  # (campo, inicio del valor)
+
+        match = self.patron.search(texto)
+        while match is not None:
+            if bloque is not None:
+                valores[bloque[0]] = texto[bloque[1]:match.start()].strip()
+                bloque = None
+            nombre = match.lastgroup
+            inicio, fin = match.span(nombre)
+            # Sin inicio de línea el valor puede contener la etiqueta siguiente:
+            # se retoma la búsqueda desde el valor y se corta donde empieza
+            siguiente = self.patron.search(texto, inicio if nombre in self._en_linea else fin)
+            if siguiente is not None and siguiente.start() < fin:
+                fin = siguiente.start()
+            if valores[nombre] is None:
+                if nombre in self._bloques:
+                    valores[nombre] = ''
+                    bloque = (nombre, inicio)
+                else:
+                    valores[nombre] = texto[inicio:fin].strip()
+                pendientes -= 1
+                if not pendientes and bloque is None:
+                    break
+            match = siguiente
+
+        if bloque is not None:
+            valores[bloque[0]] = texto[bloque[1]:].strip()
+        return valores
+
+
+# ============================================================================
+# REGISTRO DE FORMATOS
+# ============================================================================
+
+TAG = Formato('tag', [
+    Campo('nombre', r'Nombre'),
+    Campo('rut', r'RUT'),
+    Campo('direccion', r'Direccion'),
+    Campo('telefono', r'Telefono'),
+    Campo('correo', r'Correo'),
+    Campo('patente', r'PATENTE'),
+    Campo('tag', r'TAG', separador=r'[ \t]*[:\-]?[ \t]*'),
+])
+
+CORREO_RAW = Formato('correo_raw', [
+    Campo('datos_propietario', r'DATOS_PROPIETARIO', valor=r'.*', bloque=True),
+    Campo('vehiculo', r'VEHICULO'),
+    Campo('precio', r'PRECIO'),
+    Campo('fecha_pago', r'FECHA_PAGO'),
+    Campo('email', r'EMAIL'),
+    Campo('cc', r'CC'),
+])
+
+FICHA_REGISTRO = Formato('ficha_registro', [
+    Campo('inscripcion', r'Inscripci[oó]n', inicio_linea=False),
+    Campo('marca', r'Marca', inicio_linea=False),
+    Campo('modelo', r'Modelo', inicio_linea=False),
+    Campo('anio', r'A[ñn]o', valor=r'\d{4}', inicio_linea=False),
+    Campo('nombre', r'Nombre', inicio_linea=False),
+    Campo('run', r'R\.?U\.?(?:N|T)\.?', inicio_linea=False),
+    Campo('fec_adquisicion', r'Fec\.?[ \t]*adquisici[oó]n', separador=r'[ \t]*:?[ \t]*', inicio_linea=False),
+])
+
+PROPIETARIO = Formato('propietario', [
+    Campo('nombre', r'Nombre'),
+])
+
+FORMATOS: dict[str, Formato] = {f.nombre: f for f in (TAG, CORREO_RAW, FICHA_REGISTRO, PROPIETARIO)}
+
+
+def parsear(formato: str, texto: str) -> dict[str, Optional[str]]:
+    """
+    Parsea `texto` con un formato del registro
+
+    Raises:
+        KeyError: Si el formato no está registrado
+    """
+    return FORMATOS[formato].parsear(texto)
+
+
+# ============================================================================
+# TAG
+# ============================================================================
+
+MESES_TAG = {
+    1: 'ENERO', 2: 'FEBRERO', 3: 'MARZO', 4: 'ABRIL',
+    5: 'MAYO', 6: 'JUNIO', 7: 'JULIO', 8: 'AGOSTO',
+    9: 'SEPTIEMBRE', 10: 'OCTUBRE', 11: 'NOVIEMBRE', 12: 'DICIEMBRE'
+}
+
+_NO_RUT = re.compile(r'[^0-9Kk]')
+_NO_DIGITO = re.compile(r'\D')
+_NO_ALFANUMERICO = re.compile(r'[^A-Za-z0-9]')
+_SEPARADOR_CC = re.compile(r'[,;\s]+')
+
+
+def _con_dv(valor: str) -> str:
+    return f'{valor[:-1]}-{valor[-1]}' if len(valor) >= 2 else valor
+
+
+def normalizar_rut(valor: str) -> str:
+    """'12.345.678-k' -> '12345678-K'"""
+    return _con_dv(_NO_RUT.sub('', valor).upper()) if valor else ''
+
+
+def normalizar_telefono(valor: str) -> str:
+    """Últimos 9 dígitos, sin el prefijo 56"""
+    if not valor:
+        return ''
+    digitos = _NO_DIGITO.sub('', valor)
+    if digitos.startswith('56'):
+        digitos = digitos[2:]
+    return digitos[-9:]
+
+
+def normalizar_patente(valor: str) -> str:
+    """'KYTR.55-5' -> 'KYTR55-5' (el último carácter es el DV)"""
+    return _con_dv(_NO_ALFANUMERICO.sub('', valor).upper()) if valor else ''
+
+
+def _separar_email(valor: str) -> tuple[str, str]:
+    if not valor or '@' not in valor:
+        return '', ''
+    usuario, dominio = valor.split('@', 1)
+    return usuario.strip(), dominio.strip()
+
+
+def mapping_tag(
+    texto: str,
+    patente: str = '',
+    tag: str = '',
+    fecha: Optional[date] = None,
+) -> dict[str, str]:
+    """
+    Campos CAMPO1..CAMPO16 del formulario TAG desde el texto pegado
+
+    Args:
+        texto: Líneas 'Nombre: ...', 'RUT: ...', 'Direccion: calle, comuna', etc.
+        patente: Reemplaza la PATENTE del texto si viene
+        tag: Reemplaza el TAG del texto si viene
+        fecha: Fecha del documento (hoy por defecto)
+
+    Returns:
+        dict: Mapping en MAYÚSCULAS listo para tag_pdf
+    """
+    campos = {k: v or '' for k, v in TAG.parsear(texto).items()}
+
+    direccion = campos['direccion'].rstrip('.')
+    if ',' in direccion:
+        direccion_1, comuna = [p.strip() for p in direccion.split(',', 1)]
+    else:
+        partes = direccion.split()
+        direccion_1 = ' '.join(partes[:-1]).strip()
+        comuna = partes[-1].strip() if partes else ''
+
+    patente = normalizar_patente(patente or campos['patente'])
+    email_usuario, email_dominio = _separar_email(campos['correo'])
+    fecha = fecha or datetime.now().date()
+
+    mapping = {
+        'CAMPO1': f'{fecha.day:02d}',
+        'CAMPO2': MESES_TAG[fecha.month],
+        'CAMPO3': f'{fecha.year}',
+        'CAMPO4': campos['nombre'],
+        'CAMPO5': normalizar_rut(campos['rut']),
+        'CAMPO6': '',
+        'CAMPO7': direccion_1,
+        'CAMPO8': comuna,
+        'CAMPO9': comuna,
+        'CAMPO10': normalizar_telefono(campos['telefono']),
+        'CAMPO11': email_usuario,
+        'CAMPO12': email_dominio,
+        'CAMPO13': tag or campos['tag'],
+        'CAMPO14': patente,
+        'CAMPO15': patente,
+        'CAMPO16': '',
+    }
+    return {k: v.upper() for k, v in mapping.items()}
+
+
+# ============================================================================
+# CORREO DE CIERRE
+# ============================================================================
+
+def parsear_correo_raw(texto: str) -> dict:
+    """
+    Campos del correo de cierre desde el formato de Telegram
+
+    DATOS_PROPIETARIO puede ocupar varias líneas (hasta la próxima etiqueta);
+    si no viene, se usa el texto completo.
+
+    Returns:
+        dict: datos_propietario, vehiculo, precio_acordado, fecha_pago, email_to, cc
+
+    Raises:
+        ValueError: Si falta EMAIL
+    """
+    campos = CORREO_RAW.parsear(texto)
+    if not campos['email']:
+        raise ValueError("Campo EMAIL es requerido")
+
+    datos_propietario = campos['datos_propietario']
+    return {
+        'datos_propietario': texto if datos_propietario is None else datos_propietario,
+        'vehiculo': campos['vehiculo'] or '',
+        'precio_acordado': campos['precio'] or '',
+        'fecha_pago': campos['fecha_pago'] or '',
+        'email_to': campos['email'],
+        'cc': [e for e in _SEPARADOR_CC.split(campos['cc'] or '') if '@' in e],
+    }
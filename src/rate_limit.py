@@ -0,0 +1,149 @@
+"""
+Rate limiting por servicio externo (token bucket)
+Compartido entre trabajos async (AutoTramite) y código sync
+"""
+import asyncio
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+from .config import settings
+
+
+class RateLimiter:
+    """
+    Token bucket con reservas
+
+    Cada llamada reserva un token; si no hay disponibles, el token queda
+    "en deuda" y la llamada espera lo necesario para respetar la tasa. El
+    estado se protege con un lock de threading, por lo que el mismo
+    limitador sirve para hilos y para distintos event loops.
+    """
+
+    def __init__(self, tasa_por_segundo: float, rafaga: int = 1):
+        """
+        Args:
+            tasa_por_segundo: Operaciones permitidas por segundo (0 = sin límite)
+            rafaga: Operaciones que pueden salir juntas sin esperar
+        """
+        self.tasa_por_segundo = tasa_por_segundo
+        self.rafaga = max(1, rafaga)
+        self._tokens = float(self.rafaga)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reservar(self) -> float:
+        """Reserva un token y retorna los segundos a esperar"""
+        if self.tasa_por_segundo <= 0:
+            return 0.0
+        with self._lock:
+            ahora = time.monotonic()
+            self._tokens = min(self.rafaga, self._tokens + (ahora - self._ultimo) * self.tasa_por_segundo)
+            self._ultimo = ahora
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.tasa_por_segundo
+
+    async def adquirir(self) -> float:
+        """
+        Espera (async) hasta que la operación esté permitida
+
+        Returns:
+            float: Segundos esperados
+        """
+        espera = self._reservar()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        return espera
+
+    def adquirir_sync(self) -> float:
+        """
+        Espera (bloqueante) hasta que la operación esté permitida
+
+        Returns:
+            float: Segundos esperados
+        """
+        espera = self._reservar()
+        if espera > 0:
+            time.sleep(espera)
+        return espera
+
+
+_limitadores: dict[str, RateLimiter] = {}
+_limitadores_lock = threading.Lock()
+
+
+def limitador_portal(url: Optional[str] = None) -> RateLimiter:
+    """
+    Limitador compartido del portal (uno por host)
+
+    Args:
+        url: URL del portal (usa AUTOTRAMITE_BASE_URL si None)
+
+    Returns:
+        RateLimiter: Limitador del host
+    """
+    host = urlparse(url or settings.autotramite_base_url).netloc.lower()
+    with _limitadores_lock:
+        if host not in _limitadores:
+            _limitadores[host] = RateLimiter(
+                settings.portal_rate_limit_per_second,
+                settings.portal_rate_limit_burst,
+            )
+        return _limitadores[host]
+
+
+# Mensajes por minuto según proveedor SMTP (sufijo del host). Office 365
+# documenta 30 mensajes/minuto por buzón; Gmail corta ráfagas sostenidas.
+LIMITES_SMTP_POR_PROVEEDOR: dict[str, float] = {
+    'office365.com': 30.0,
+    'outlook.com': 30.0,
+    'gmail.com': 20.0,
+    'googlemail.com': 20.0,
+}
+LIMITE_SMTP_DEFAULT = 30.0
+
+_limitadores_smtp: dict[str, RateLimiter] = {}
+
+
+def mensajes_por_minuto_smtp(host: Optional[str] = None) -> float:
+    """
+    Tasa de envío para el servidor SMTP
+
+    MAIL_OUTBOX_RATE_PER_MINUTE > 0 tiene prioridad sobre el límite del proveedor.
+
+    Args:
+        host: Host SMTP (usa SMTP_HOST si None)
+
+    Returns:
+        float: Mensajes por minuto
+    """
+    if settings.mail_outbox_rate_per_minute > 0:
+        return settings.mail_outbox_rate_per_minute
+    host = (host or settings.smtp_host or '').lower()
+    for sufijo, limite in LIMITES_SMTP_POR_PROVEEDOR.items():
+        if host == sufijo or host.endswith('.' + sufijo):
+            return limite
+    return LIMITE_SMTP_DEFAULT
+
+
+def limitador_smtp(host: Optional[str] = None) -> RateLimiter:
+    """
+    Limitador compartido de envíos SMTP (uno por host)
+
+    Args:
+        host: Host SMTP (usa SMTP_HOST si None)
+
+    Returns:
+        RateLimiter: Limitador del host
+    """
+    host = (host or settings.smtp_host or '').lower()
+    with _limitadores_lock:
+        if host not in _limitadores_smtp:
+            _limitadores_smtp[host] = RateLimiter(
+                mensajes_por_minuto_smtp(host) / 60,
+                settings.mail_outbox_rate_burst,
+            )
+        return _limitadores_smtp[host]
@@ -0,0 +1,167 @@
+"""
+Perfil de ruteo de requests para los contextos de Playwright
+Bloquea recursos que la automatización no necesita y mide bytes por trabajo
+"""
+import asyncio
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import urlparse
+from playwright.async_api import BrowserContext, Request, Route
+
+from .config import settings
+from .logging_utils import get_logger
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+# Fragmentos de URL que nunca se bloquean: PDF del contrato y endpoints del
+# formulario (mismos tokens que usa la búsqueda del PDF en autotramite.py)
+PATRONES_SIEMPRE_PERMITIDOS = (
+    '.pdf',
+    'pdf_',
+    'generacontrato.php',
+    'contrato.php',
+    'pdf_autotramite',
+    'descargar',
+    'download',
+)
+
+# Tipos que nunca se bloquean (el HTML y las llamadas del formulario)
+TIPOS_SIEMPRE_PERMITIDOS = frozenset({'document', 'xhr', 'fetch'})
+
+# Tamaño promedio estimado por tipo (bytes): un request abortado no se
+# descarga, así que su tamaño solo se puede estimar
+BYTES_ESTIMADOS_POR_TIPO = {
+    'image': 30_000,
+    'font': 40_000,
+    'media': 200_000,
+    'stylesheet': 15_000,
+    'script': 25_000,
+}
+BYTES_ESTIMADOS_DEFAULT = 5_000
+
+
+def _lista(valor: Optional[str]) -> tuple[str, ...]:
+    return tuple(p.strip().lower() for p in (valor or '').split(',') if p.strip())
+
+
+@dataclass(frozen=True)
+class PerfilRuteo:
+    """Reglas de bloqueo de requests"""
+    tipos_bloqueados: frozenset[str]
+    patrones_bloqueados: tuple[str, ...]
+    patrones_permitidos: tuple[str, ...] = ()
+
+    @classmethod
+    def desde_config(cls) -> 'PerfilRuteo':
+        """
+        Construye el perfil desde ROUTING_* y las URLs de AutoTramite
+
+        Returns:
+            PerfilRuteo: Perfil configurado
+        """
+        permitidos = list(PATRONES_SIEMPRE_PERMITIDOS) + list(_lista(settings.routing_allow_patterns))
+        for url in (settings.autotramite_form_url, settings.autotramite_login_url):
+            ruta = urlparse(url).path.lower()
+            if ruta:
+                permitidos.append(ruta)
+        return cls(
+            tipos_bloqueados=frozenset(_lista(settings.routing_block_types)) - TIPOS_SIEMPRE_PERMITIDOS,
+            patrones_bloqueados=_lista(settings.routing_block_patterns),
+            patrones_permitidos=tuple(permitidos),
+        )
+
+    def bloquear(self, url: str, resource_type: str) -> bool:
+        """
+        Decide si un request se aborta
+
+        Args:
+            url: URL del request
+            resource_type: Tipo de recurso según Playwright
+
+        Returns:
+            bool: True si se debe abortar
+        """
+        url = url.lower()
+        if any(patron in url for patron in self.patrones_permitidos):
+            return False
+        if any(patron in url for patron in self.patrones_bloqueados):
+            return True
+        return resource_type in self.tipos_bloqueados
+
+
+@dataclass
+class EstadisticasRuteo:
+    """Requests y bytes permitidos/bloqueados de un trabajo"""
+    permitidos: int = 0
+    bloqueados: int = 0
+    bytes_permitidos: int = 0
+    bytes_bloqueados_estimados: int = 0
+    bloqueados_por_tipo: dict[str, int] = field(default_factory=dict)
+    _pendientes: set = field(default_factory=set, repr=False)
+
+    def registrar_bloqueo(self, resource_type: str) -> None:
+        self.bloqueados += 1
+        self.bloqueados_por_tipo[resource_type] = self.bloqueados_por_tipo.get(resource_type, 0) + 1
+        self.bytes_bloqueados_estimados += BYTES_ESTIMADOS_POR_TIPO.get(resource_type, BYTES_ESTIMADOS_DEFAULT)
+
+    async def _medir(self, request: Request) -> None:
+        try:
+            tamanos = await request.sizes()
+            self.bytes_permitidos += tamanos.get('responseBodySize', 0) + tamanos.get('responseHeadersSize', 0)
+        except Exception:
+            pass
+
+    def registrar_finalizado(self, request: Request) -> None:
+        tarea = asyncio.ensure_future(self._medir(request))
+        self._pendientes.add(tarea)
+        tarea.add_done_callback(self._pendientes.discard)
+
+    async def resumen(self) -> dict:
+        """
+        Espera las mediciones pendientes y retorna el resumen del trabajo
+
+        Returns:
+            dict: Contadores y bytes (los bloqueados son una estimación)
+        """
+        if self._pendientes:
+            await asyncio.gather(*list(self._pendientes), return_exceptions=True)
+        return {
+            'permitidos': self.permitidos,
+            'bloqueados': self.bloqueados,
+            'bytes_permitidos': self.bytes_permitidos,
+            'bytes_bloqueados_estimados': self.bytes_bloqueados_estimados,
+            'bloqueados_por_tipo': dict(self.bloqueados_por_tipo),
+        }
+
+
+async def aplicar_ruteo(
+    context: BrowserContext,
+    perfil: Optional[PerfilRuteo] = None
+) -> Optional[EstadisticasRuteo]:
+    """
+    Instala el perfil de ruteo en un contexto nuevo
+
+    Args:
+        context: Contexto de Playwright del trabajo
+        perfil: Perfil a usar (desde config si None)
+
+    Returns:
+        EstadisticasRuteo | None: Estadísticas del trabajo, o None si ROUTING_ENABLED=false
+    """
+    if not settings.routing_enabled:
+        return None
+
+    perfil = perfil or PerfilRuteo.desde_config()
+    estadisticas = EstadisticasRuteo()
+
+    async def manejar(route: Route, request: Request) -> None:
+        if perfil.bloquear(request.url, request.resource_type):
+            estadisticas.registrar_bloqueo(request.resource_type)
+            await route.abort('blockedbyclient')
+            return
+        estadisticas.permitidos += 1
+        await route.continue_()
+
+    await context.route('**/*', manejar)
+    context.on('requestfinished', estadisticas.registrar_finalizado)
+    return estadisticas
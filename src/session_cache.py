@@ -0,0 +1,224 @@
+"""
+Cache cifrado del storage state autenticado de AutoTramite
+Permite reutilizar cookies de sesión entre contratos y omitir el login
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from .config import settings
+from .logging_utils import get_logger
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # Dependencia opcional: sin ella el cache queda deshabilitado
+    Fernet = None  # type: ignore[assignment,misc]
+    InvalidToken = Exception  # type: ignore[assignment,misc]
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+_SALT_CLAVE = b'autotramite-session-cache'
+
+
+def _derivar_clave(secreto: str) -> bytes:
+    """
+    Deriva una clave Fernet (32 bytes urlsafe-base64) desde un secreto
+
+    Args:
+        secreto: Secreto configurado o credenciales de AutoTramite
+
+    Returns:
+        bytes: Clave apta para Fernet
+    """
+    raw = hashlib.pbkdf2_hmac('sha256', secreto.encode('utf-8'), _SALT_CLAVE, 100_000)
+    return base64.urlsafe_b64encode(raw)
+
+
+class SessionCache:
+    """
+    Storage state (cookies + localStorage) cifrado en disco
+
+    El archivo se escribe de forma atómica y solo es legible con la clave
+    derivada de SESSION_CACHE_SECRET (o de las credenciales si no existe).
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl_minutos: Optional[int] = None,
+        secreto: Optional[str] = None,
+    ):
+        self.path = Path(path or settings.session_cache_path)
+        self.ttl_segundos = (ttl_minutos if ttl_minutos is not None else settings.session_cache_ttl_minutes) * 60
+        secreto = secreto or settings.session_cache_secret or (
+            f'{settings.autotramite_email}:{settings.autotramite_password}'
+        )
+        self._fernet = Fernet(_derivar_clave(secreto)) if Fernet is not None else None
+
+    @property
+    def habilitado(self) -> bool:
+        return settings.session_cache_enabled and self._fernet is not None
+
+    def version(self) -> Optional[float]:
+        """
+        Marca de versión del cache (mtime del archivo)
+
+        Returns:
+            float | None: mtime o None si no existe
+        """
+        try:
+            return self.path.stat().st_mtime
+        except OSError:
+            return None
+
+    def cargar(self) -> Optional[dict]:
+        """
+        Lee y descifra el storage state si existe y no expiró
+
+        Returns:
+            dict | None: storage state para browser.new_context(storage_state=...)
+        """
+        if not self.habilitado or not self.path.exists():
+            return None
+        assert self._fernet is not None
+
+        try:
+            contenido = self._fernet.decrypt(self.path.read_bytes())
+            data = json.loads(contenido.decode('utf-8'))
+        except InvalidToken:
+            logger.warning('Cache de sesión ilegible (clave distinta o archivo corrupto), se descarta')
+            self.invalidar()
+            return None
+        except Exception as e:
+            logger.warning(f'No se pudo leer cache de sesión: {str(e)}')
+            return None
+
+        guardado_en = data.get('guardado_en', 0)
+        if self.ttl_segundos > 0 and (time.time() - guardado_en) > self.ttl_segundos:
+            logger.info('Cache de sesión expirado por TTL')
+            return None
+
+        return data.get('storage_state')
+
+    def guardar(self, storage_state: dict) -> None:
+        """
+        Cifra y guarda el storage state de forma atómica
+
+        Args:
+            storage_state: Resultado de context.storage_state()
+        """
+        if not self.habilitado:
+            return
+        assert self._fernet is not None
+
+        payload = json.dumps({
+            'guardado_en': time.time(),
+            'storage_state': storage_state,
+        }).encode('utf-8')
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+            tmp_path.write_bytes(self._fernet.encrypt(payload))
+            try:
+                os.chmod(tmp_path, 0o600)
+            except OSError:
+                pass
+            os.replace(tmp_path, self.path)
+            logger.info('Sesión autenticada guardada en cache')
+        except Exception as e:
+            logger.warning(f'No se pudo guardar cache de sesión: {str(e)}')
+
+    def invalidar(self) -> None:
+        """Elimina el cache de sesión"""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f'No se pudo eliminar cache de sesión: {str(e)}')
+
+
+class LoginLock:
+    """
+    Lock single-flight para el login
+
+    Combina un asyncio.Lock (trabajos del mismo proceso) con un archivo de
+    lock exclusivo (procesos distintos, ej. CLI en paralelo). Mientras se
+    tiene el lock se renueva el mtime del archivo cada `stale_segundos / 3`,
+    así que solo un lock sin renovar por más de `stale_segundos` (proceso
+    caído) se considera abandonado, aunque el login con reintentos tarde más.
+    """
+
+    def __init__(self, path: Path, stale_segundos: float = 120.0):
+        self.path = path
+        self.stale_segundos = stale_segundos
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._latido: Optional[asyncio.Task] = None
+
+    def _lock_local(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    async def _adquirir_archivo(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            try:
+                fd = os.open(str(self.path), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode('ascii'))
+                os.close(fd)
+                return
+            except FileExistsError:
+                try:
+                    if time.time() - self.path.stat().st_mtime > self.stale_segundos:
+                        logger.warning('Lock de login abandonado, se libera')
+                        self.path.unlink()
+                        continue
+                except FileNotFoundError:
+                    continue
+                await asyncio.sleep(0.2)
+
+    async def _renovar_archivo(self) -> None:
+        while True:
+            await asyncio.sleep(self.stale_segundos / 3)
+            try:
+                os.utime(self.path)
+            except OSError as e:
+                logger.warning(f'No se pudo renovar el lock de login: {str(e)}')
+
+    def _liberar_archivo(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    async def __aenter__(self) -> 'LoginLock':
+        await self._lock_local().acquire()
+        try:
+            await self._adquirir_archivo()
+        except BaseException:
+            self._lock_local().release()
+            raise
+        self._latido = asyncio.create_task(self._renovar_archivo())
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self._latido is not None:
+            self._latido.cancel()  # Suspendido en el sleep: ya no toca el archivo
+            self._latido = None
+        self._liberar_archivo()
+        self._lock_local().release()
+
+
+# Instancias globales
+session_cache = SessionCache()
+login_lock = LoginLock(Path(settings.session_cache_path).with_suffix('.lock'))
@@ -0,0 +1,231 @@
+"""
+Pool de conexiones SMTP autenticadas
+Reutiliza conexiones por (host, puerto, usuario, seguridad) para no pagar
+conexión + STARTTLS/SSL + login en cada correo. Las conexiones ociosas se
+validan con NOOP y se descartan al vencer; si el servidor cortó una
+conexión reutilizada (SMTPServerDisconnected) se reintenta con una nueva.
+
+Lo comparten la vista de Mail de Cierre en Streamlit y /api/mail/enviar
+(ambos usan mail_utils.enviar_email_smtp).
+"""
+import atexit
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+from .config import settings
+from .logging_utils import get_logger
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+ClaveSMTP = tuple[str, int, str, str]
+
+
+@dataclass
+class _ConexionSMTP:
+    server: smtplib.SMTP
+    creada: float = field(default_factory=time.monotonic)
+    ultimo_uso: float = field(default_factory=time.monotonic)
+    mensajes: int = 0
+
+
+def _cerrar_conexion(server: smtplib.SMTP) -> None:
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+class SMTPPool:
+    """
+    Conexiones SMTP reutilizables, seguras entre threads
+
+    Las conexiones ociosas se guardan por clave; una conexión solo la usa un
+    thread a la vez. Si hay más envíos simultáneos que conexiones ociosas se
+    abren más, y al devolverlas se cierran las que superen el tope.
+    """
+
+    def __init__(
+        self,
+        max_ociosas: Optional[int] = None,
+        max_idle_segundos: Optional[float] = None,
+        noop_despues_segundos: Optional[float] = None,
+        max_mensajes: Optional[int] = None
+    ):
+        """
+        Args:
+            max_ociosas: Conexiones ociosas por clave (default: settings.smtp_pool_size)
+            max_idle_segundos: Descartar conexiones ociosas más antiguas (default: settings.smtp_pool_idle_seconds)
+            noop_despues_segundos: Validar con NOOP si estuvo ociosa más que esto (default: settings.smtp_pool_noop_after_seconds)
+            max_mensajes: Reciclar la conexión tras N mensajes (default: settings.smtp_pool_max_messages; 0 = sin límite)
+        """
+        self.max_ociosas = max(1, max_ociosas or settings.smtp_pool_size)
+        self.max_idle_segundos = settings.smtp_pool_idle_seconds if max_idle_segundos is None else max_idle_segundos
+        self.noop_despues_segundos = (
+            settings.smtp_pool_noop_after_seconds if noop_despues_segundos is None else noop_despues_segundos
+        )
+        self.max_mensajes = settings.smtp_pool_max_messages if max_mensajes is None else max_mensajes
+        self._ociosas: dict[ClaveSMTP, list[_ConexionSMTP]] = {}
+        self._lock = threading.Lock()
+        self.estadisticas = {'conexiones': 0, 'reutilizadas': 0, 'descartadas': 0, 'reconexiones': 0}
+
+    def _conectar(self, host: str, port: int, user: str, password: str, secure: str) -> _ConexionSMTP:
+        if secure == 'ssl':
+            server = smtplib.SMTP_SSL(host, port)
+        else:
+            server = smtplib.SMTP(host, port)
+            if secure == 'tls':
+                server.starttls()
+        try:
+            server.login(user, password)
+        except Exception:
+            _cerrar_conexion(server)
+            raise
+        with self._lock:
+            self.estadisticas['conexiones'] += 1
+        return _ConexionSMTP(server)
+
+    def _tomar_ociosa(self, clave: ClaveSMTP) -> Optional[_ConexionSMTP]:
+        """Saca una conexión ociosa utilizable (valida con NOOP si hace falta)"""
+        while True:
+            with self._lock:
+                ociosas = self._ociosas.get(clave)
+                if not ociosas:
+                    return None
+                conexion = ociosas.pop()
+            ociosa = time.monotonic() - conexion.ultimo_uso
+            if self.max_idle_segundos and ociosa > self.max_idle_segundos:
+                self._descartar(conexion)
+                continue
+            if ociosa > self.noop_despues_segundos:
+                try:
+                    codigo, _ = conexion.server.noop()
+                except (smtplib.SMTPException, OSError):
+                    codigo = 0
+                if codigo != 250:
+                    self._descartar(conexion)
+                    continue
+            with self._lock:
+                self.estadisticas['reutilizadas'] += 1
+            return conexion
+
+    def _descartar(self, conexion: _ConexionSMTP) -> None:
+        with self._lock:
+            self.estadisticas['descartadas'] += 1
+        _cerrar_conexion(conexion.server)
+
+    def _devolver(self, clave: ClaveSMTP, conexion: _ConexionSMTP) -> None:
+        conexion.ultimo_uso = time.monotonic()
+        conexion.mensajes += 1
+        if self.max_mensajes and conexion.mensajes >= self.max_mensajes:
+            self._descartar(conexion)
+            return
+        with self._lock:
+            ociosas = self._ociosas.setdefault(clave, [])
+            if len(ociosas) < self.max_ociosas:
+                ociosas.append(conexion)
+                return
+        self._descartar(conexion)
+
+    @contextmanager
+    def conexion(
+        self,
+        host: str,
+        port: int,
+        user: str,
+        password: str,
+        secure: str = 'none'
+    ) -> Iterator[tuple[smtplib.SMTP, bool]]:
+        """
+        Presta una conexión autenticada
+
+        Yields:
+            tuple: (servidor SMTP, True si es una conexión reutilizada)
+
+        Si el bloque lanza una excepción la conexión se descarta.
+        """
+        clave: ClaveSMTP = (host, port, user, secure)
+        conexion = self._tomar_ociosa(clave)
+        reutilizada = conexion is not None
+        if conexion is None:
+            conexion = self._conectar(host, port, user, password, secure)
+        try:
+            yield conexion.server, reutilizada
+        except BaseException:
+            self._descartar(conexion)
+            raise
+        self._devolver(clave, conexion)
+
+    def enviar(
+        self,
+        host: str,
+        port: int,
+        user: str,
+        password: str,
+        secure: str,
+        remitente: str,
+        destinatarios: list[str],
+        mensaje: str
+    ) -> None:
+        """
+        Envía un mensaje por una conexión del pool
+
+        Si una conexión reutilizada resulta estar cortada por el servidor, se
+        reintenta una vez con una conexión nueva (el corte ocurre antes de que
+        el servidor acepte el mensaje, así que no se duplica).
+
+        Raises:
+            smtplib.SMTPException: Errores SMTP (autenticación, destinatarios, etc.)
+        """
+        reutilizada = False
+        try:
+            with self.conexion(host, port, user, password, secure) as (server, reutilizada):
+                server.sendmail(remitente, destinatarios, mensaje)
+            return
+        except smtplib.SMTPServerDisconnected:
+            if not reutilizada:
+                raise
+        with self._lock:
+            self.estadisticas['reconexiones'] += 1
+        logger.info('Conexion SMTP reutilizada cerrada por el servidor; reconectando')
+        conexion = self._conectar(host, port, user, password, secure)
+        try:
+            conexion.server.sendmail(remitente, destinatarios, mensaje)
+        except BaseException:
+            self._descartar(conexion)
+            raise
+        self._devolver((host, port, user, secure), conexion)
+
+    def cerrar(self) -> None:
+        """Cierra todas las conexiones ociosas"""
+        with self._lock:
+            conexiones = [c for ociosas in self._ociosas.values() for c in ociosas]
+            self._ociosas.clear()
+        for conexion in conexiones:
+            _cerrar_conexion(conexion.server)
+
+    def ociosas(self) -> int:
+        with self._lock:
+            return sum(len(c) for c in self._ociosas.values())
+
+
+# Pool global del proceso
+smtp_pool = SMTPPool()
+
+
+def smtp_pool_habilitado() -> bool:
+    return bool(settings.smtp_pool_enabled)
+
+
+def cerrar_pool_smtp() -> None:
+    """Cierra las conexiones del pool global (shutdown de la API / salida del proceso)"""
+    smtp_pool.cerrar()
+
+
+atexit.register(cerrar_pool_smtp)
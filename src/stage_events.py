@@ -0,0 +1,174 @@
+"""
+Eventos estructurados de etapas del motor AutoTramite
+Tiempos monotónicos por etapa (ContratoResult.timings) y callback opcional
+para mostrar progreso real en Streamlit, la API o el CLI
+"""
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional
+
+from .config import settings
+from .logging_utils import get_logger
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+# Etapas en orden de ejecución
+ETAPAS = (
+    'browser_launch',
+    'login',
+    'form_goto',
+    'fill_vehiculo',
+    'fill_vendedor',
+    'fill_comprador',
+    'fill_configuracion',
+    'preview',
+    'pdf_capture',
+    'register',
+)
+
+# Prefijo de las líneas de evento que emite el CLI por stdout
+PREFIJO_EVENTO = 'STAGE_EVENT '
+
+
+@dataclass
+class EventoEtapa:
+    """Evento de inicio/fin/error de una etapa"""
+    etapa: str
+    estado: str  # 'inicio' | 'fin' | 'error'
+    t: float  # Segundos desde el inicio del trabajo (monotónico)
+    duracion: Optional[float] = None  # Solo en 'fin' / 'error'
+    detalle: dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> dict[str, Any]:
+        data: dict[str, Any] = {'etapa': self.etapa, 'estado': self.estado, 't': round(self.t, 3)}
+        if self.duracion is not None:
+            data['duracion'] = round(self.duracion, 3)
+        if self.detalle:
+            data['detalle'] = self.detalle
+        return data
+
+
+StageCallback = Callable[[EventoEtapa], None]
+
+
+class RegistroEtapas:
+    """
+    Acumula tiempos por etapa de un trabajo y reenvía eventos al callback
+
+    Las etapas que se repiten (reintentos) acumulan su duración.
+    """
+
+    def __init__(self, callback: Optional[StageCallback] = None, contexto: Optional[dict[str, Any]] = None):
+        """
+        Args:
+            callback: Función que recibe cada EventoEtapa (errores del callback se ignoran)
+            contexto: Datos agregados al detalle de cada evento (ej: índice en un lote)
+        """
+        self.callback = callback
+        self.contexto = contexto or {}
+        self.inicio = time.monotonic()
+        self.timings: dict[str, float] = {}
+
+    def _emitir(self, evento: EventoEtapa) -> None:
+        if self.callback is None:
+            return
+        if self.contexto:
+            evento.detalle = {**self.contexto, **evento.detalle}
+        try:
+            self.callback(evento)
+        except Exception as e:
+            logger.warning(f'Callback de etapas falló: {str(e)}')
+
+    def registrar(self, etapa: str, duracion: float) -> None:
+        self.timings[etapa] = round(self.timings.get(etapa, 0.0) + duracion, 3)
+
+    @contextmanager
+    def etapa(self, nombre: str, **detalle: Any) -> Iterator[dict[str, Any]]:
+        """
+        Mide una etapa y emite sus eventos de inicio y fin (o error)
+
+        Yields:
+            dict: Detalle mutable que se adjunta al evento de fin
+        """
+        inicio = time.monotonic()
+        self._emitir(EventoEtapa(nombre, 'inicio', inicio - self.inicio, detalle=dict(detalle)))
+        try:
+            yield detalle
+        except BaseException as e:
+            duracion = time.monotonic() - inicio
+            self.registrar(nombre, duracion)
+            self._emitir(EventoEtapa(
+                nombre, 'error', time.monotonic() - self.inicio, duracion,
+                {**detalle, 'error': str(e)[:200]}
+            ))
+            raise
+        duracion = time.monotonic() - inicio
+        self.registrar(nombre, duracion)
+        self._emitir(EventoEtapa(nombre, 'fin', time.monotonic() - self.inicio, duracion, dict(detalle)))
+
+    def total(self) -> float:
+        return time.monotonic() - self.inicio
+
+
+# Registro del trabajo en curso (cada tarea asyncio tiene su propio valor)
+_registro_actual: ContextVar[Optional[RegistroEtapas]] = ContextVar('registro_etapas', default=None)
+
+
+def iniciar_registro(
+    callback: Optional[StageCallback] = None,
+    contexto: Optional[dict[str, Any]] = None
+) -> RegistroEtapas:
+    """
+    Crea el registro del trabajo actual y lo deja activo en el contexto
+
+    Returns:
+        RegistroEtapas: Registro activo para la tarea actual
+    """
+    registro = RegistroEtapas(callback, contexto)
+    _registro_actual.set(registro)
+    return registro
+
+
+def registro_actual() -> Optional[RegistroEtapas]:
+    return _registro_actual.get()
+
+
+@contextmanager
+def etapa(nombre: str, **detalle: Any) -> Iterator[dict[str, Any]]:
+    """
+    Mide una etapa en el registro activo (no hace nada si no hay registro)
+
+    Yields:
+        dict: Detalle mutable que se adjunta al evento de fin
+    """
+    registro = _registro_actual.get()
+    if registro is None:
+        yield detalle
+        return
+    with registro.etapa(nombre, **detalle) as d:
+        yield d
+
+
+def evento_a_linea(evento: EventoEtapa) -> str:
+    """Serializa un evento como línea de stdout (JSON ASCII con prefijo)"""
+    return PREFIJO_EVENTO + json.dumps(evento.to_dict(), ensure_ascii=True)
+
+
+def linea_a_evento(linea: str) -> Optional[dict[str, Any]]:
+    """
+    Parsea una línea de evento emitida por el CLI
+
+    Returns:
+        dict | None: Evento, o None si la línea no es un evento
+    """
+    linea = linea.strip()
+    if not linea.startswith(PREFIJO_EVENTO):
+        return None
+    try:
+        data = json.loads(linea[len(PREFIJO_EVENTO):])
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) and 'etapa' in data else None
@@ -0,0 +1,209 @@
+"""
+Cache en disco de PDFs TAG generados (direccionado por contenido)
+La clave es el hash del mapping normalizado más la huella (sha256) de la
+plantilla, así que los mismos datos sobre la misma plantilla dan siempre
+el mismo archivo y el mismo ETag. Un reenvío (reintentos de Telegram,
+doble clic) se sirve del disco sin renderizar. El tamaño total se acota
+expulsando los PDFs menos usados (LRU por mtime, que se actualiza en
+cada hit y sobrevive a reinicios).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from .config import settings
+from .logging_utils import get_logger
+from .tag_pdf import guardar_pdf, obtener_plantilla_tag
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+# Subir si cambia la forma de renderizar (invalida las entradas anteriores)
+VERSION_RENDER = 1
+
+
+@dataclass(frozen=True)
+class PdfTag:
+    """PDF generado o leído del cache"""
+    datos: bytes
+    clave: str
+    hit: bool
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.clave}"'
+
+
+def normalizar_mapping(mapping: dict[str, Any]) -> dict[str, str]:
+    """Mapping con valores str ('' para None) y claves ordenadas"""
+    return {clave: '' if valor is None else str(valor) for clave, valor in sorted(mapping.items())}
+
+
+def clave_pdf_tag(mapping: dict[str, Any], huella_plantilla: str) -> str:
+    """
+    Hash que identifica el PDF de `mapping` sobre una plantilla
+
+    Args:
+        mapping: Campos (CAMPO1..)
+        huella_plantilla: sha256 del contenido de la plantilla
+
+    Returns:
+        str: sha256 hex
+    """
+    contenido = json.dumps(normalizar_mapping(mapping), ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(f'{VERSION_RENDER}\0{huella_plantilla}\0{contenido}'.encode('utf-8')).hexdigest()
+
+
+class TagPdfCache:
+    """
+    PDFs en `directorio` como {clave}.pdf, con tope de bytes y expulsión LRU
+
+    El índice en memoria se arma desde el directorio al crear el cache
+    (más antiguo primero); si otro proceso borró un archivo, la lectura
+    cuenta como miss.
+    """
+
+    def __init__(self, directorio: str | Path, max_bytes: int):
+        self.directorio = Path(directorio)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entradas: OrderedDict[str, int] = OrderedDict()  # clave -> tamaño, menos usado primero
+        self._bytes = 0
+        self.estadisticas = {'hits': 0, 'misses': 0, 'escrituras': 0, 'expulsiones': 0}
+
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        archivos = []
+        for ruta in self.directorio.glob('*.pdf'):
+            try:
+                estado = ruta.stat()
+            except OSError:
+                continue
+            archivos.append((estado.st_mtime_ns, ruta.stem, estado.st_size))
+        for _, clave, tamano in sorted(archivos):
+            self._entradas[clave] = tamano
+            self._bytes += tamano
+        with self._lock:
+            self._expulsar()
+
+    def _ruta(self, clave: str) -> Path:
+        return self.directorio / f'{clave}.pdf'
+
+    def _expulsar(self) -> None:
+        while self._bytes > self.max_bytes and self._entradas:
+            clave, tamano = self._entradas.popitem(last=False)
+            self._bytes -= tamano
+            self.estadisticas['expulsiones'] += 1
+            self._ruta(clave).unlink(missing_ok=True)
+
+    def obtener(self, clave: str) -> Optional[bytes]:
+        """PDF de `clave` o None (actualiza el orden LRU y las métricas)"""
+        ruta = self._ruta(clave)
+        try:
+            datos = ruta.read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self.estadisticas['misses'] += 1
+                tamano = self._entradas.pop(clave, None)
+                if tamano is not None:
+                    self._bytes -= tamano
+            return None
+
+        try:
+            os.utime(ruta)  # El mtime es el orden LRU entre reinicios
+        except OSError:
+            pass
+        with self._lock:
+            self.estadisticas['hits'] += 1
+            if clave not in self._entradas:
+                self._entradas[clave] = len(datos)
+                self._bytes += len(datos)
+            self._entradas.move_to_end(clave)
+        return datos
+
+    def guardar(self, clave: str, datos: bytes) -> None:
+        """Agrega el PDF y expulsa los menos usados si se pasa del tope"""
+        if len(datos) > self.max_bytes:
+            return
+        guardar_pdf(datos, self._ruta(clave))
+        with self._lock:
+            self._bytes += len(datos) - self._entradas.pop(clave, 0)
+            self._entradas[clave] = len(datos)
+            self.estadisticas['escrituras'] += 1
+            self._expulsar()
+
+    def limpiar(self) -> None:
+        with self._lock:
+            for clave in list(self._entradas):
+                self._ruta(clave).unlink(missing_ok=True)
+            self._entradas.clear()
+            self._bytes = 0
+
+    def metricas(self) -> dict:
+        """Contadores, ocupación y tasa de hits"""
+        with self._lock:
+            consultas = self.estadisticas['hits'] + self.estadisticas['misses']
+            return {
+                **self.estadisticas,
+                'hit_rate': round(self.estadisticas['hits'] / consultas, 3) if consultas else 0.0,
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+_cache: Optional[TagPdfCache] = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache_tag() -> Optional[TagPdfCache]:
+    """Cache global según settings (None si TAG_CACHE_ENABLED=false)"""
+    global _cache
+    if not settings.tag_cache_enabled:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = TagPdfCache(settings.tag_cache_dir, int(settings.tag_cache_max_mb * 1024 * 1024))
+        return _cache
+
+
+def etag_pdf_tag(mapping: dict[str, Any], template_path: str | Path) -> str:
+    """ETag del PDF de `mapping` sin renderizarlo (para If-None-Match)"""
+    return f'"{clave_pdf_tag(mapping, obtener_plantilla_tag(template_path).huella)}"'
+
+
+def pdf_tag(mapping: dict[str, Any], template_path: str | Path) -> PdfTag:
+    """
+    PDF TAG de `mapping`, del cache si ya se generó
+
+    Args:
+        mapping: Campos (CAMPO1..)
+        template_path: Plantilla AcroForm
+
+    Returns:
+        PdfTag: Bytes del PDF, clave (ETag) y si vino del cache
+
+    Raises:
+        RuntimeError: Si la plantilla no es válida (ver tag_pdf.PlantillaTag)
+    """
+    plantilla = obtener_plantilla_tag(template_path)
+    clave = clave_pdf_tag(mapping, plantilla.huella)
+    cache = obtener_cache_tag()
+
+    if cache is not None:
+        datos = cache.obtener(clave)
+        if datos is not None:
+            return PdfTag(datos, clave, hit=True)
+
+    datos = plantilla.render(mapping)
+    if cache is not None:
+        try:
+            cache.guardar(clave, datos)
+        except OSError as e:
+            logger.warning(f'No se pudo guardar el PDF TAG en cache: {e}')
+    return PdfTag(datos, clave, hit=False)
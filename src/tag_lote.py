@@ -0,0 +1,456 @@
+"""
+Lotes de PDFs TAG: render en pool de procesos y salida en streaming
+Cada documento se renderiza en un proceso (src.tag_pdf) y se emite en
+orden apenas está listo, como entrada de un ZIP o como páginas de un PDF
+único. Solo hay una ventana acotada de documentos en vuelo, así que la
+memoria no crece con el tamaño del lote.
+
+PDF único: cada proceso devuelve los objetos de su documento ya
+renumerados en un rango propio (indice * _OBJETOS_POR_DOCUMENTO), con sus
+campos bajo un campo padre 'docN' para que los nombres no choquen entre
+documentos ('doc1.RUT', 'doc2.RUT'). El proceso principal solo concatena
+y escribe catálogo, árbol de páginas y xref al final.
+
+Los errores previsibles (plantilla, campos desconocidos) se detectan con
+validar_lote antes de emitir el primer byte. Si igual falla un documento
+durante el render, el ZIP lleva errores.txt y el PDF único una página
+final con la lista de documentos que faltan.
+"""
+from __future__ import annotations
+
+import asyncio
+import re
+import textwrap
+import zipfile
+from collections import deque
+from concurrent.futures import Executor, Future, wait
+from contextlib import closing
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+from .config import settings
+from .logging_utils import get_logger
+from .tag_pdf import obtener_plantilla_tag, render_pdf_tag, texto_pdf
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+FORMATO_ZIP = 'zip'
+FORMATO_PDF = 'pdf'
+FORMATOS = (FORMATO_ZIP, FORMATO_PDF)
+
+# Objetos 1-3 del PDF único: catálogo, árbol de páginas y AcroForm
+_CATALOGO, _PAGINAS, _ACROFORM = 1, 2, 3
+_PRIMER_OBJETO = 4
+_OBJETOS_POR_DOCUMENTO = 10_000
+
+# Página de errores del PDF único (carta, Helvetica 10)
+_LINEAS_POR_PAGINA = 60
+_CARACTERES_POR_LINEA = 95
+
+
+def nombre_pdf_tag(mapping: dict) -> str:
+    """Solicitud-Tag-{patente}.pdf (misma convención que /api/tag/generar)"""
+    patente = re.sub(r'[^A-Za-z0-9\-]', '', mapping.get('CAMPO14') or '') or 'UNKNOWN'
+    return f'Solicitud-Tag-{patente}.pdf'
+
+
+# ============================================================================
+# PDF ÚNICO
+# ============================================================================
+
+@dataclass
+class FragmentoPdf:
+    """Objetos de un documento listos para concatenar al PDF único"""
+    objetos: list[tuple[int, bytes]]
+    paginas: list[int]
+    campo_padre: int
+    acroform_extra: bytes  # /DA y /DR de la plantilla (se usa el del primer documento)
+
+
+def _renumerar(objeto: Any, numeros: dict[int, int], reemplazos: Optional[dict[str, Any]] = None) -> Any:
+    """
+    Apunta las referencias de `objeto` a su número en el PDF único
+
+    Modifica diccionarios y arrays en el lugar (el reader del documento se
+    descarta después) para que los streams conserven sus bytes codificados.
+    """
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
+
+    if isinstance(objeto, IndirectObject):
+        return IndirectObject(numeros[objeto.idnum], 0, None)
+    if isinstance(objeto, DictionaryObject):
+        reemplazos = reemplazos or {}
+        for clave, valor in list(objeto.items()):
+            if clave not in reemplazos:
+                objeto[clave] = _renumerar(valor, numeros)
+        for clave, valor in reemplazos.items():
+            objeto[NameObject(clave)] = valor
+    elif isinstance(objeto, ArrayObject):
+        objeto[:] = [_renumerar(valor, numeros) for valor in objeto]
+    return objeto
+
+
+def _escribir(objeto: Any, numeros: dict[int, int], reemplazos: Optional[dict[str, Any]] = None) -> bytes:
+    """Serializa `objeto` con las referencias renumeradas"""
+    buffer = BytesIO()
+    _renumerar(objeto, numeros, reemplazos).write_to_stream(buffer)
+    return buffer.getvalue()
+
+
+def _recolectar(objeto: Any, numeros: dict[int, int], pendientes: deque, omitir: frozenset = frozenset()) -> None:
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+
+    if isinstance(objeto, IndirectObject):
+        if objeto.idnum not in numeros:
+            numeros[objeto.idnum] = -1  # Se asigna al sacarlo de la cola
+            pendientes.append(objeto)
+    elif isinstance(objeto, DictionaryObject):
+        for clave, valor in objeto.items():
+            if clave not in omitir:
+                _recolectar(valor, numeros, pendientes)
+    elif isinstance(objeto, ArrayObject):
+        for valor in objeto:
+            _recolectar(valor, numeros, pendientes)
+
+
+def fragmento_pdf_tag(mapping: dict, template_path: str | Path, indice: int) -> FragmentoPdf:
+    """
+    Renderiza un documento y lo convierte en fragmento del PDF único
+
+    Corre en el pool de procesos: el resultado son bytes ya serializados.
+
+    Args:
+        mapping: Campos del documento (CAMPO1..)
+        template_path: Plantilla AcroForm
+        indice: Posición en el lote (define el rango de números de objeto)
+
+    Raises:
+        RuntimeError: Si el documento excede el rango de objetos
+    """
+    from pypdf import PdfReader
+    from pypdf.generic import IndirectObject
+
+    reader = PdfReader(BytesIO(render_pdf_tag(mapping, template_path)))
+    base = _PRIMER_OBJETO + indice * _OBJETOS_POR_DOCUMENTO
+    campo_padre = base
+    acroform = reader.trailer['/Root']['/AcroForm']
+
+    numeros: dict[int, int] = {}
+    pendientes: deque = deque()
+    paginas = [pagina.indirect_reference for pagina in reader.pages]
+    campos = list(acroform.get('/Fields') or [])
+    for referencia in paginas + campos:
+        _recolectar(referencia, numeros, pendientes)
+    for clave in ('/DA', '/DR'):
+        if clave in acroform:
+            _recolectar(acroform.raw_get(clave), numeros, pendientes)
+
+    # Orden BFS: asigna números y descubre referencias (sin subir por /Parent de las páginas)
+    orden = []
+    id_paginas = {p.idnum for p in paginas}
+    while pendientes:
+        referencia = pendientes.popleft()
+        numeros[referencia.idnum] = base + 1 + len(orden)
+        orden.append(referencia)
+        omitir = frozenset({'/Parent'}) if referencia.idnum in id_paginas else frozenset()
+        _recolectar(referencia.get_object(), numeros, pendientes, omitir)
+    if len(orden) + 1 > _OBJETOS_POR_DOCUMENTO:
+        raise RuntimeError(f'Documento {indice + 1} con demasiados objetos ({len(orden)})')
+
+    id_campos = {c.idnum for c in campos}
+    objetos = []
+    for referencia in orden:
+        reemplazos = {}
+        if referencia.idnum in id_paginas:
+            reemplazos['/Parent'] = IndirectObject(_PAGINAS, 0, None)
+        elif referencia.idnum in id_campos:
+            reemplazos['/Parent'] = IndirectObject(campo_padre, 0, None)
+        objetos.append((numeros[referencia.idnum], _escribir(referencia.get_object(), numeros, reemplazos)))
+
+    hijos = ' '.join(f'{numeros[c.idnum]} 0 R' for c in campos)
+    objetos.insert(0, (campo_padre, f'<< /T (doc{indice + 1}) /Kids [{hijos}] >>'.encode('ascii')))
+
+    extra = bytearray()
+    for clave in ('/DA', '/DR'):
+        if clave in acroform:
+            extra += clave.encode('ascii') + b' ' + _escribir(acroform.raw_get(clave), numeros) + b'\n'
+    return FragmentoPdf(objetos, [numeros[p.idnum] for p in paginas], campo_padre, bytes(extra))
+
+
+class EscritorPdfUnido:
+    """Arma el PDF único a medida que llegan los fragmentos (en orden)"""
+
+    def __init__(self):
+        self._offset = 0
+        self._offsets: dict[int, int] = {}
+        self._paginas: list[int] = []
+        self._campos: list[int] = []
+        self._acroform_extra = b''
+
+    def _emitir(self, datos: bytes) -> bytes:
+        self._offset += len(datos)
+        return datos
+
+    def _objeto(self, numero: int, cuerpo: bytes) -> bytes:
+        self._offsets[numero] = self._offset
+        return self._emitir(f'{numero} 0 obj\n'.encode('ascii') + cuerpo + b'\nendobj\n')
+
+    def inicio(self) -> bytes:
+        return self._emitir(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+
+    def agregar(self, fragmento: FragmentoPdf) -> bytes:
+        if not self._campos:
+            self._acroform_extra = fragmento.acroform_extra
+        self._paginas += fragmento.paginas
+        self._campos.append(fragmento.campo_padre)
+        return b''.join(self._objeto(numero, cuerpo) for numero, cuerpo in fragmento.objetos)
+
+    def _paginas_errores(self, errores: list[str]) -> bytes:
+        """Páginas finales con la lista de documentos que no se generaron"""
+        lineas = [f'Documentos no generados ({len(errores)}):', '']
+        for error in errores:
+            lineas += textwrap.wrap(error, _CARACTERES_POR_LINEA, subsequent_indent='    ') or ['']
+        numero = max(self._offsets, default=_PRIMER_OBJETO - 1) + 1
+        fuente, numero = numero, numero + 1
+        partes = [self._objeto(
+            fuente, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>'
+        )]
+        for desde in range(0, len(lineas), _LINEAS_POR_PAGINA):
+            texto = b' T* '.join(texto_pdf(linea) + b' Tj' for linea in lineas[desde:desde + _LINEAS_POR_PAGINA])
+            contenido = b'BT /F1 10 Tf 12 TL 50 750 Td ' + texto + b' ET'
+            pagina, numero = numero, numero + 2
+            partes.append(self._objeto(pagina + 1, f'<< /Length {len(contenido)} >>\nstream\n'.encode('ascii') + contenido + b'\nendstream'))
+            partes.append(self._objeto(pagina, (
+                f'<< /Type /Page /Parent {_PAGINAS} 0 R /MediaBox [0 0 612 792] '
+                f'/Resources << /Font << /F1 {fuente} 0 R >> >> /Contents {pagina + 1} 0 R >>'
+            ).encode('ascii')))
+            self._paginas.append(pagina)
+        return b''.join(partes)
+
+    def cerrar(self, errores: Optional[list[str]] = None) -> bytes:
+        previas = self._paginas_errores(errores) if errores else b''
+        kids = ' '.join(f'{n} 0 R' for n in self._paginas)
+        campos = ' '.join(f'{n} 0 R' for n in self._campos)
+        partes = [
+            previas,
+            self._objeto(_CATALOGO, f'<< /Type /Catalog /Pages {_PAGINAS} 0 R /AcroForm {_ACROFORM} 0 R >>'.encode('ascii')),
+            self._objeto(_PAGINAS, f'<< /Type /Pages /Kids [{kids}] /Count {len(self._paginas)} >>'.encode('ascii')),
+            self._objeto(_ACROFORM, f'<< /Fields [{campos}] /NeedAppearances true\n'.encode('ascii') + self._acroform_extra + b'>>'),
+        ]
+
+        inicio_xref = self._offset
+        xref = bytearray(b'xref\n0 1\n0000000000 65535 f\r\n')
+        numeros = sorted(self._offsets)
+        tramos: list[list[int]] = []
+        for numero in numeros:
+            if tramos and tramos[-1][-1] + 1 == numero:
+                tramos[-1].append(numero)
+            else:
+                tramos.append([numero])
+        for tramo in tramos:
+            xref += f'{tramo[0]} {len(tramo)}\n'.encode('ascii')
+            for numero in tramo:
+                xref += f'{self._offsets[numero]:010d} 00000 n\r\n'.encode('ascii')
+        xref += (
+            f'trailer\n<< /Size {numeros[-1] + 1} /Root {_CATALOGO} 0 R >>\n'
+            f'startxref\n{inicio_xref}\n%%EOF\n'
+        ).encode('ascii')
+        partes.append(self._emitir(bytes(xref)))
+        return b''.join(partes)
+
+
+# ============================================================================
+# ZIP
+# ============================================================================
+
+class _BufferSalida:
+    """Destino sin seek para ZipFile: acumula lo escrito hasta que se drena"""
+
+    def __init__(self):
+        self._datos = bytearray()
+
+    def write(self, datos: bytes) -> int:
+        self._datos += datos
+        return len(datos)
+
+    def flush(self) -> None:
+        pass
+
+    def drenar(self) -> bytes:
+        datos = bytes(self._datos)
+        self._datos.clear()
+        return datos
+
+
+class EscritorZip:
+    """ZIP en streaming (data descriptors, sin volver atrás en la salida)"""
+
+    def __init__(self):
+        self._buffer = _BufferSalida()
+        self._zip = zipfile.ZipFile(self._buffer, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._nombres: set[str] = set()
+
+    def inicio(self) -> bytes:
+        return b''
+
+    def agregar(self, nombre: str, datos: bytes) -> bytes:
+        ruta, candidato, n = Path(nombre), nombre, 2
+        while candidato in self._nombres:  # Patente repetida en el lote
+            candidato, n = f'{ruta.stem}-{n}{ruta.suffix}', n + 1
+        self._nombres.add(candidato)
+        self._zip.writestr(candidato, datos)
+        return self._buffer.drenar()
+
+    def cerrar(self, errores: Optional[list[str]] = None) -> bytes:
+        if errores:
+            self._zip.writestr('errores.txt', '\n'.join(errores) + '\n')
+        self._zip.close()
+        return self._buffer.drenar()
+
+
+# ============================================================================
+# LOTE
+# ============================================================================
+
+class _Lote:
+    """Estado de un lote: qué tarea se envía por documento y cómo se escribe"""
+
+    def __init__(self, mappings: list[dict], formato: str, template_path: str | Path):
+        if formato not in FORMATOS:
+            raise ValueError(f'Formato no soportado: {formato} (usa {" o ".join(FORMATOS)})')
+        self.mappings = mappings
+        self.formato = formato
+        self.template_path = template_path
+        self.escritor = EscritorZip() if formato == FORMATO_ZIP else EscritorPdfUnido()
+        self.errores: list[str] = []
+
+    def enviar(self, executor: Executor, indice: int) -> Future:
+        mapping = self.mappings[indice]
+        if self.formato == FORMATO_ZIP:
+            return executor.submit(render_pdf_tag, mapping, self.template_path)
+        return executor.submit(fragmento_pdf_tag, mapping, self.template_path, indice)
+
+    def recibir(self, indice: int, obtener: Callable[[], Any]) -> bytes:
+        nombre = nombre_pdf_tag(self.mappings[indice])
+        try:
+            resultado = obtener()
+        except Exception as e:
+            logger.warning(f'Lote TAG: documento {indice + 1} ({nombre}) falló: {e}')
+            self.errores.append(f'Documento {indice + 1} ({nombre}): {e}')
+            return b''
+        if self.formato == FORMATO_ZIP:
+            return self.escritor.agregar(nombre, resultado)
+        return self.escritor.agregar(resultado)
+
+    def cerrar(self) -> bytes:
+        return self.escritor.cerrar(self.errores)
+
+
+def validar_lote(mappings: list[dict], template_path: str | Path) -> list[str]:
+    """
+    Errores previsibles del lote, para rechazarlo antes de empezar el streaming
+
+    Args:
+        mappings: Un dict de campos por documento
+        template_path: Plantilla AcroForm
+
+    Returns:
+        list[str]: Un mensaje por documento con campos desconocidos (vacía si todo está bien)
+
+    Raises:
+        FileNotFoundError: Si la plantilla no existe
+        RuntimeError: Si la plantilla no sirve (sin pypdf, sin AcroForm, campos faltantes)
+    """
+    campos = obtener_plantilla_tag(template_path).field_map
+    errores = []
+    for indice, mapping in enumerate(mappings):
+        desconocidas = [clave for clave in mapping if clave not in campos]
+        if desconocidas:
+            errores.append(f'Documento {indice + 1} ({nombre_pdf_tag(mapping)}): campos desconocidos {desconocidas}')
+    return errores
+
+
+def _pasos_lote(
+    mappings: list[dict],
+    formato: str,
+    template_path: str | Path,
+    executor: Executor,
+    ventana: int
+) -> Iterator[bytes | Future]:
+    """
+    Núcleo de iterar_lote y stream_lote
+
+    Mantiene la ventana de documentos en vuelo y escribe la salida. Antes de
+    recibir cada documento cede su Future para que quien itera espere a que
+    termine (bloqueando o con await); el resto de lo cedido son trozos de bytes.
+    """
+    lote = _Lote(mappings, formato, template_path)
+    en_vuelo: deque[tuple[int, Future]] = deque()
+    siguiente = 0
+    yield lote.escritor.inicio()
+    try:
+        while en_vuelo or siguiente < len(mappings):
+            while siguiente < len(mappings) and len(en_vuelo) < max(1, ventana):
+                en_vuelo.append((siguiente, lote.enviar(executor, siguiente)))
+                siguiente += 1
+            indice, futuro = en_vuelo.popleft()
+            yield futuro
+            trozo = lote.recibir(indice, futuro.result)
+            if trozo:
+                yield trozo
+        yield lote.cerrar()
+    finally:
+        for _, futuro in en_vuelo:
+            futuro.cancel()
+
+
+def iterar_lote(
+    mappings: list[dict],
+    formato: str,
+    template_path: str | Path,
+    executor: Executor,
+    ventana: int = 4
+) -> Iterator[bytes]:
+    """
+    Genera el lote como trozos de bytes, en orden
+
+    Args:
+        mappings: Un dict de campos por documento (ver _tag_parse_text)
+        formato: FORMATO_ZIP o FORMATO_PDF
+        template_path: Plantilla AcroForm
+        executor: Pool donde se renderiza (get_process_pool en la API)
+        ventana: Documentos en vuelo a la vez
+
+    Yields:
+        bytes: Trozos del ZIP o PDF, apenas cada documento está listo
+
+    Raises:
+        ValueError: Formato no soportado
+    """
+    with closing(_pasos_lote(mappings, formato, template_path, executor, ventana)) as pasos:
+        for paso in pasos:
+            if isinstance(paso, Future):
+                wait([paso])
+            else:
+                yield paso
+
+
+async def stream_lote(
+    mappings: list[dict],
+    formato: str,
+    template_path: str | Path,
+    executor: Executor,
+    ventana: int = 4
+) -> AsyncIterator[bytes]:
+    """Versión async de iterar_lote (espera los documentos sin bloquear el loop)"""
+    with closing(_pasos_lote(mappings, formato, template_path, executor, ventana)) as pasos:
+        for paso in pasos:
+            if isinstance(paso, Future):
+                try:
+                    await asyncio.wrap_future(paso)
+                except Exception:
+                    pass  # recibir() registra el error del documento
+            else:
+                yield paso
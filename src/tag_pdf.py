@@ -0,0 +1,525 @@
+"""
+Renderer de PDFs de Habilitación Tag
+La plantilla AcroForm se parsea y valida una sola vez (cache por ruta +
+mtime) y se guarda un índice nombre de campo -> objetos a reescribir. Cada
+PDF se arma como actualización incremental: los bytes de la plantilla tal
+cual, más las versiones nuevas de los campos (/V y apariencia /AP) y una
+sección xref que apunta a ellas. No se clona ni se re-serializa el
+documento completo por cada PDF.
+
+El otro camino es pypdf clonando el reader cacheado (PdfWriter(clone_from=..)).
+Se usa con TAG_PDF_RENDERER=pypdf y para plantillas con campos que el
+camino incremental no soporta (no texto, widgets rotados, campos directos).
+No es el default porque con docs/tag/PDF-EJEMPLO.pdf rinde ~15 PDFs/s
+contra ~2400 del incremental (python -m benchmarks.bench_tag_pdf).
+
+Caracteres soportados en la apariencia incremental: Helvetica con
+WinAnsiEncoding, restringido a Latin-1 imprimible (ASCII 32-126 y
+161-255: tildes, ñ, ü, ¿, ¡, °). Lo demás (€, comillas tipográficas,
+emojis, otros alfabetos) se dibuja como '?'. Los anchos salen de las
+métricas AFM de Helvetica para ASCII; las letras acentuadas usan el ancho
+de su letra base. /V siempre guarda el texto exacto y /NeedAppearances
+permite que el visor redibuje el campo.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Optional
+
+from .config import settings
+from .logging_utils import get_logger
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+RENDERER_INCREMENTAL = 'incremental'
+RENDERER_PYPDF = 'pypdf'
+
+# Clave del formulario -> nombre real del campo en docs/tag/PDF-EJEMPLO.pdf
+TAG_FIELD_NAME_MAP = {
+    'CAMPO1': 'En Santiago  a',
+    'CAMPO2': 'de',
+    'CAMPO3': 'de_2',
+    'CAMPO4': 'dondoña',
+    'CAMPO5': 'RUT',
+    'CAMPO6': 'Giro',
+    'CAMPO7': 'domiciliado a en',
+    'CAMPO8': 'comuna',
+    'CAMPO9': 'ciudad',
+    'CAMPO10': 'fono',
+    'CAMPO11': 'mail',
+    'CAMPO12': 'undefined',
+    'CAMPO13': 'Tag asignado',
+    'CAMPO14': '1 Que es propietario mero tenedor yo responsable del vehículo Placa Patente Única',
+    'CAMPO15': 'Patente Única',
+    'CAMPO16': 'undefined_2',
+}
+
+_PATRON_DA = re.compile(r'/([^\s/]+)\s+(-?[\d.]+)\s+Tf')
+_PATRON_STARTXREF = re.compile(rb'startxref\s+(\d+)')
+_FUENTE_DEFAULT = b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>'
+_MARGEN = 2.0  # Padding horizontal del texto dentro del widget
+_TAMANO_AUTO_MAX = 12.0  # Tamaño máximo cuando el /DA pide auto (0 Tf)
+_ALTO_VISIBLE = 0.742  # Fracción del tamaño de fuente usada para centrar verticalmente
+
+# Anchos Helvetica (AFM, 1/1000 em) para ASCII 32..126; el resto usa la
+# letra base (Ñ -> N) o 556
+_ANCHOS_HELVETICA = dict(zip(
+    range(32, 127),
+    (278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+     556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+     1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+     667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+     333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+     556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584),
+))
+
+
+def _ancho_caracter(caracter: str) -> int:
+    ancho = _ANCHOS_HELVETICA.get(ord(caracter))
+    if ancho is None:
+        base = unicodedata.normalize('NFD', caracter)[:1]
+        ancho = _ANCHOS_HELVETICA.get(ord(base), 556) if base else 556
+    return ancho
+
+
+def ancho_texto(texto: str, tamano: float) -> float:
+    """Ancho aproximado de `texto` en puntos (métricas de Helvetica)"""
+    return sum(_ancho_caracter(c) for c in texto) * tamano / 1000
+
+
+def texto_pdf(texto: str) -> bytes:
+    """String literal para Tj (Latin-1; lo no representable se reemplaza por '?')"""
+    salida = bytearray(b'(')
+    for caracter in texto:
+        codigo = ord(caracter)
+        if caracter in '\\()':
+            salida += b'\\' + caracter.encode('ascii')
+        elif 32 <= codigo <= 126 or 161 <= codigo <= 255:
+            salida.append(codigo)
+        else:
+            salida += b'?'
+    salida += b')'
+    return bytes(salida)
+
+
+def _numero(valor: float) -> str:
+    return f'{valor:.3f}'.rstrip('0').rstrip('.') or '0'
+
+
+def _serializar(objeto: Any) -> bytes:
+    buffer = BytesIO()
+    objeto.write_to_stream(buffer)
+    return buffer.getvalue()
+
+
+def _heredado(nodo: Any, clave: str, default: Any = None) -> Any:
+    """Valor de `clave` en el nodo o el primer padre que la tenga"""
+    while nodo is not None:
+        if clave in nodo:
+            return nodo[clave]
+        padre = nodo.get('/Parent')
+        nodo = padre.get_object() if padre is not None else None
+    return default
+
+
+class _NoSoportado(Exception):
+    """La plantilla necesita el camino pypdf (clon del reader)"""
+
+
+class _Widget:
+    """Apariencia precalculada de un widget (todo lo que no depende del valor)"""
+
+    def __init__(self, numero: int, ancho: float, alto: float, fuente: str, tamano: float,
+                 color: str, alineacion: int, recurso_fuente: bytes):
+        self.numero = numero
+        self.ancho = ancho
+        self.alto = alto
+        self.fuente = fuente
+        self.tamano = tamano
+        self.color = color
+        self.alineacion = alineacion
+        self._encabezado = (
+            f'<< /Type /XObject /Subtype /Form /BBox [0 0 {_numero(ancho)} {_numero(alto)}] '
+            f'/Resources << /Font << /{fuente} '
+        ).encode('latin-1') + recurso_fuente + b' >> /ProcSet [/PDF /Text] >> /Length '
+
+    def apariencia(self, valor: str) -> bytes:
+        """Stream /AP /N con el texto (una línea, recortado al widget)"""
+        tamano = self.tamano
+        ancho_util = self.ancho - 2 * _MARGEN
+        if tamano <= 0:
+            tamano = min(_TAMANO_AUTO_MAX, self.alto * 0.7)
+            ancho = ancho_texto(valor, tamano)
+            if ancho > ancho_util > 0:
+                tamano = max(4.0, tamano * ancho_util / ancho)
+        ancho = ancho_texto(valor, tamano)
+
+        if self.alineacion == 1:
+            x = (self.ancho - ancho) / 2
+        elif self.alineacion == 2:
+            x = self.ancho - _MARGEN - ancho
+        else:
+            x = _MARGEN
+        y = (self.alto - tamano * _ALTO_VISIBLE) / 2
+
+        contenido = b''.join((
+            b'/Tx BMC\nq\n',
+            f'1 1 {_numero(self.ancho - 2)} {_numero(self.alto - 2)} re W n\n'.encode('latin-1'),
+            f'BT\n/{self.fuente} {_numero(tamano)} Tf {self.color}\n'.encode('latin-1'),
+            f'{_numero(max(x, _MARGEN))} {_numero(y)} Td\n'.encode('latin-1'),
+            texto_pdf(' '.join(valor.split())), b' Tj\nET\nQ\nEMC\n',
+        ))
+        return self._encabezado + str(len(contenido)).encode('ascii') + b' >>\nstream\n' + contenido + b'\nendstream'
+
+
+class _Campo:
+    def __init__(self, numero: int, widgets: list[_Widget]):
+        self.numero = numero  # Objeto donde va /V
+        self.widgets = widgets  # Objetos donde va /AP (puede incluir `numero`)
+
+
+class PlantillaTag:
+    """
+    Plantilla AcroForm parseada y validada
+
+    Es inmutable tras la carga, así que una instancia se comparte entre
+    hilos (render() no toca el reader salvo en el camino pypdf, que va
+    con lock).
+    """
+
+    def __init__(self, path: str | Path, field_map: Optional[dict[str, str]] = None):
+        """
+        Args:
+            path: Ruta a la plantilla PDF
+            field_map: Clave del formulario -> nombre del campo (default TAG_FIELD_NAME_MAP)
+
+        Raises:
+            RuntimeError: Si falta pypdf, la plantilla no tiene AcroForm o faltan campos
+        """
+        try:
+            from pypdf import PdfReader
+        except Exception:
+            raise RuntimeError('pypdf no esta instalado. Instala con: pip install pypdf')
+
+        self.path = Path(path)
+        self.field_map = dict(field_map or TAG_FIELD_NAME_MAP)
+        self._bytes = self.path.read_bytes()
+        self.huella = hashlib.sha256(self._bytes).hexdigest()  # Identifica el contenido de la plantilla
+        self._reader = PdfReader(BytesIO(self._bytes))
+        self._lock = threading.Lock()
+
+        root = self._reader.trailer['/Root'].get_object()
+        acroform = root.get('/AcroForm')
+        if acroform is None:
+            raise RuntimeError(f'La plantilla no tiene formulario AcroForm: {self.path}')
+        acroform = acroform.get_object()
+
+        self.campos_pdf = self._indexar(acroform)
+        faltantes = [nombre for nombre in self.field_map.values() if nombre not in self.campos_pdf]
+        if faltantes:
+            raise RuntimeError(
+                f"Campos no encontrados en PDF: {faltantes}. "
+                "Revisa nombres reales con get_fields()."
+            )
+
+        self._campos: dict[str, _Campo] = {}
+        self._objetos_base: dict[int, tuple[int, bytes]] = {}
+        try:
+            self._preparar_incremental(root, acroform)
+            self.incremental = True
+        except _NoSoportado as e:
+            logger.info(f'Plantilla TAG {self.path.name}: se rellena con pypdf ({e})')
+            self.incremental = False
+
+    def _indexar(self, acroform: Any) -> dict[str, Any]:
+        """Nombre completo del campo -> referencia indirecta (o dict directo)"""
+        indice: dict[str, Any] = {}
+
+        def recorrer(referencias: Any, prefijo: str) -> None:
+            for referencia in referencias or []:
+                nodo = referencia.get_object()
+                parcial = nodo.get('/T')
+                nombre = f'{prefijo}.{parcial}' if prefijo and parcial else (parcial or prefijo)
+                hijos = nodo.get('/Kids')
+                if hijos and any('/T' in h.get_object() for h in hijos):
+                    recorrer(hijos, nombre)
+                elif nombre:
+                    indice[str(nombre)] = referencia
+
+        recorrer(acroform.get('/Fields'), '')
+        return indice
+
+    def _preparar_incremental(self, root: Any, acroform: Any) -> None:
+        from pypdf.generic import BooleanObject, DictionaryObject, IndirectObject, NameObject
+
+        if self._reader.is_encrypted:
+            raise _NoSoportado('plantilla cifrada')
+        coincidencias = _PATRON_STARTXREF.findall(self._bytes[-2048:])
+        if not coincidencias:
+            raise _NoSoportado('startxref no encontrado')
+        self._startxref = int(coincidencias[-1])
+        self._xref_stream = not self._bytes[self._startxref:self._startxref + 4].startswith(b'xref')
+
+        trailer = self._reader.trailer
+        self._tamano = int(trailer['/Size'])
+        self._trailer = b''.join(
+            b'/' + clave[1:].encode('latin-1') + b' ' + _serializar(trailer.raw_get(clave)) + b' '
+            for clave in ('/Root', '/Info', '/ID') if clave in trailer
+        )
+
+        fuentes_form = (acroform.get('/DR') or {}).get('/Font') or {}
+        da_form = str(acroform.get('/DA', ''))
+        q_form = int(acroform.get('/Q', 0))
+
+        def base(referencia: Any) -> None:
+            if not isinstance(referencia, IndirectObject):
+                raise _NoSoportado('campo sin objeto indirecto')
+            nodo = referencia.get_object()
+            sin_valor = DictionaryObject({k: v for k, v in nodo.items() if k not in ('/V', '/AP')})
+            self._objetos_base[referencia.idnum] = (referencia.generation, _serializar(sin_valor)[:-2])
+
+        for clave, nombre in self.field_map.items():
+            referencia = self.campos_pdf[nombre]
+            nodo = referencia.get_object()
+            if _heredado(nodo, '/FT') != '/Tx':
+                raise _NoSoportado(f"campo '{nombre}' no es de texto")
+            hijos = nodo.get('/Kids') or []
+            widgets_ref = hijos if hijos else [referencia]
+
+            base(referencia)
+            widgets = []
+            for widget_ref in widgets_ref:
+                base(widget_ref)
+                widget = widget_ref.get_object()
+                if int((widget.get('/MK') or {}).get('/R', 0)) % 360:
+                    raise _NoSoportado(f"widget rotado en '{nombre}'")
+
+                da = str(_heredado(widget, '/DA', da_form))
+                match = _PATRON_DA.search(da)
+                fuente, tamano = (match.group(1), float(match.group(2))) if match else ('Helv', 0.0)
+                color = _PATRON_DA.sub('', da).strip() or '0 g'
+                fuentes_widget = (widget.get('/DR') or {}).get('/Font') or {}
+                recurso = fuentes_form.raw_get(f'/{fuente}') if f'/{fuente}' in fuentes_form else (
+                    fuentes_widget.raw_get(f'/{fuente}') if f'/{fuente}' in fuentes_widget else None
+                )
+
+                x1, y1, x2, y2 = (float(v) for v in widget['/Rect'])
+                widgets.append(_Widget(
+                    numero=widget_ref.idnum,
+                    ancho=abs(x2 - x1),
+                    alto=abs(y2 - y1),
+                    fuente=fuente,
+                    tamano=tamano,
+                    color=color,
+                    alineacion=int(_heredado(widget, '/Q', q_form)),
+                    recurso_fuente=_serializar(recurso) if recurso is not None else _FUENTE_DEFAULT,
+                ))
+            self._campos[clave] = _Campo(referencia.idnum, widgets)
+
+        # /NeedAppearances true: igual para todos los PDFs, se serializa una vez
+        con_flag = DictionaryObject(acroform)
+        con_flag[NameObject('/NeedAppearances')] = BooleanObject(True)
+        referencia_form = root.raw_get('/AcroForm')
+        if isinstance(referencia_form, IndirectObject):
+            self._objeto_form = (referencia_form.idnum, referencia_form.generation, _serializar(con_flag))
+        else:
+            root_ref = trailer.raw_get('/Root')
+            nuevo_root = DictionaryObject(root)
+            nuevo_root[NameObject('/AcroForm')] = con_flag
+            self._objeto_form = (root_ref.idnum, root_ref.generation, _serializar(nuevo_root))
+
+    def render(self, mapping: dict[str, Any], renderer: Optional[str] = None) -> bytes:
+        """
+        Genera el PDF relleno
+
+        Args:
+            mapping: Clave del formulario (CAMPO1..) -> valor; las claves
+                ausentes conservan el valor de la plantilla
+            renderer: RENDERER_INCREMENTAL o RENDERER_PYPDF (default: settings.tag_pdf_renderer)
+
+        Returns:
+            bytes: PDF completo
+
+        Raises:
+            KeyError: Si una clave no existe en field_map
+        """
+        desconocidas = [clave for clave in mapping if clave not in self.field_map]
+        if desconocidas:
+            raise KeyError(f'Campos TAG desconocidos: {desconocidas}')
+        valores = {clave: '' if valor is None else str(valor) for clave, valor in mapping.items()}
+        if not self.incremental or (renderer or settings.tag_pdf_renderer) == RENDERER_PYPDF:
+            return self._render_pypdf(valores)
+        return self._render_incremental(valores)
+
+    def _render_incremental(self, valores: dict[str, str]) -> bytes:
+        from pypdf.generic import TextStringObject
+
+        extras: dict[int, list[bytes]] = {}
+        apariencias: list[bytes] = []
+        siguiente = self._tamano
+        for clave, valor in valores.items():
+            campo = self._campos[clave]
+            extras.setdefault(campo.numero, []).append(b'/V ' + _serializar(TextStringObject(valor)))
+            for widget in campo.widgets:
+                extras.setdefault(widget.numero, []).append(f'/AP << /N {siguiente} 0 R >>'.encode('ascii'))
+                apariencias.append(widget.apariencia(valor))
+                siguiente += 1
+
+        salida = bytearray(self._bytes)
+        if not salida.endswith(b'\n'):
+            salida += b'\n'
+        offsets: dict[int, tuple[int, int]] = {}
+
+        def escribir(numero: int, generacion: int, cuerpo: bytes) -> None:
+            offsets[numero] = (len(salida), generacion)
+            salida.extend(f'{numero} {generacion} obj\n'.encode('ascii'))
+            salida.extend(cuerpo)
+            salida.extend(b'\nendobj\n')
+
+        for numero, partes in extras.items():
+            generacion, base = self._objetos_base[numero]
+            escribir(numero, generacion, base + b' '.join(partes) + b'\n>>')
+        for i, apariencia in enumerate(apariencias):
+            escribir(self._tamano + i, 0, apariencia)
+        escribir(*self._objeto_form)
+
+        if self._xref_stream:
+            self._xref_como_stream(salida, offsets, siguiente)
+        else:
+            self._xref_como_tabla(salida, offsets, siguiente)
+        return bytes(salida)
+
+    @staticmethod
+    def _tramos(numeros: list[int]) -> list[list[int]]:
+        tramos: list[list[int]] = []
+        for numero in numeros:
+            if tramos and tramos[-1][-1] + 1 == numero:
+                tramos[-1].append(numero)
+            else:
+                tramos.append([numero])
+        return tramos
+
+    def _xref_como_tabla(self, salida: bytearray, offsets: dict[int, tuple[int, int]], tamano: int) -> None:
+        inicio = len(salida)
+        # Se repite la entrada 0 (cabeza de la lista libre): algunos lectores
+        # asumen que la primera subsección parte en 0
+        salida.extend(b'xref\n0 1\n0000000000 65535 f\r\n')
+        for tramo in self._tramos(sorted(offsets)):
+            salida.extend(f'{tramo[0]} {len(tramo)}\n'.encode('ascii'))
+            for numero in tramo:
+                offset, generacion = offsets[numero]
+                salida.extend(f'{offset:010d} {generacion:05d} n\r\n'.encode('ascii'))
+        salida.extend(
+            f'trailer\n<< /Size {max(tamano, self._tamano)} '.encode('ascii') + self._trailer
+            + f'/Prev {self._startxref} >>\nstartxref\n{inicio}\n%%EOF\n'.encode('ascii')
+        )
+
+    def _xref_como_stream(self, salida: bytearray, offsets: dict[int, tuple[int, int]], tamano: int) -> None:
+        numero_xref = tamano
+        offsets[numero_xref] = (len(salida), 0)
+        indice, filas = [], bytearray()
+        for tramo in self._tramos(sorted(offsets)):
+            indice += [str(tramo[0]), str(len(tramo))]
+            for numero in tramo:
+                offset, generacion = offsets[numero]
+                filas += b'\x01' + offset.to_bytes(4, 'big') + generacion.to_bytes(2, 'big')
+        inicio = len(salida)
+        salida.extend(
+            f'{numero_xref} 0 obj\n<< /Type /XRef /Size {numero_xref + 1} /Index [{" ".join(indice)}] '
+            '/W [1 4 2] '.encode('ascii') + self._trailer
+            + f'/Prev {self._startxref} /Length {len(filas)} >>\nstream\n'.encode('ascii')
+            + bytes(filas)
+            + f'\nendstream\nendobj\nstartxref\n{inicio}\n%%EOF\n'.encode('ascii')
+        )
+
+    def _render_pypdf(self, valores: dict[str, str]) -> bytes:
+        from pypdf import PdfWriter
+
+        pdf_mapping = {self.field_map[clave]: valor for clave, valor in valores.items()}
+        with self._lock:
+            writer = PdfWriter(clone_from=self._reader)
+        for page in writer.pages:
+            writer.update_page_form_field_values(page, pdf_mapping)
+        writer.set_need_appearances_writer(True)
+        buffer = BytesIO()
+        writer.write(buffer)
+        return buffer.getvalue()
+
+
+_cache: dict[Path, tuple[int, int, PlantillaTag]] = {}
+_cache_lock = threading.Lock()
+
+
+def obtener_plantilla_tag(path: str | Path) -> PlantillaTag:
+    """
+    Plantilla parseada de `path` (se vuelve a parsear si cambió mtime o tamaño)
+
+    Raises:
+        FileNotFoundError: Si no existe la plantilla
+        RuntimeError: Si la plantilla no es válida (ver PlantillaTag)
+    """
+    ruta = Path(path)
+    try:
+        estado = os.stat(ruta)
+    except FileNotFoundError:
+        raise FileNotFoundError(f'Plantilla TAG no encontrada: {ruta}') from None
+
+    with _cache_lock:
+        cacheada = _cache.get(ruta)
+    if cacheada is not None and cacheada[:2] == (estado.st_mtime_ns, estado.st_size):
+        return cacheada[2]
+
+    plantilla = PlantillaTag(ruta)
+    with _cache_lock:
+        _cache[ruta] = (estado.st_mtime_ns, estado.st_size, plantilla)
+    return plantilla
+
+
+def limpiar_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
+def render_pdf_tag(mapping: dict[str, Any], template_path: str | Path) -> bytes:
+    """PDF TAG relleno en memoria (ver PlantillaTag.render)"""
+    return obtener_plantilla_tag(template_path).render(mapping)
+
+
+def escribir_pdf_tag(mapping: dict[str, Any], template_path: str | Path, output_path: str | Path) -> None:
+    """
+    Rellena la plantilla TAG y escribe el resultado en `output_path`
+
+    Args:
+        mapping: Clave del formulario (CAMPO1..) -> valor
+        template_path: Plantilla AcroForm
+        output_path: Ruta del PDF generado
+
+    Raises:
+        RuntimeError: Si falta pypdf o la plantilla no tiene los campos esperados
+    """
+    guardar_pdf(render_pdf_tag(mapping, template_path), output_path)
+
+
+def guardar_pdf(datos: bytes, output_path: str | Path) -> None:
+    """
+    Escribe el PDF de forma atómica (archivo temporal + os.replace)
+
+    Dos generaciones con la misma patente no dejan un archivo mezclado:
+    gana la última y un lector ve siempre un PDF completo.
+    """
+    destino = Path(output_path)
+    fd, temporal = tempfile.mkstemp(dir=destino.parent, prefix=f'.{destino.stem}-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(datos)
+        os.replace(temporal, destino)
+    except BaseException:
+        Path(temporal).unlink(missing_ok=True)
+        raise
@@ -0,0 +1,497 @@
+"""
+Worker persistente de AutoTramite
+Proceso de larga vida que mantiene Chromium tibio (browser pool + sesión en
+cache) y atiende trabajos por un socket TCP local con protocolo JSON por línea.
+Streamlit y el CLI son clientes delgados de este worker.
+
+Protocolo (una línea JSON por mensaje):
+    cliente -> {"tipo": "ejecutar", "texto": ..., "output": ..., "dry_run": false,
+                "tasacion": null, "venta": null, "correlation_id": ..., "token": ...}
+    worker  -> {"tipo": "evento", "evento": {...}}   (0..N, ver stage_events)
+    worker  -> {"tipo": "resultado", "resultado": {...}}
+
+    Una vez enviado "ejecutar" el trabajo sigue aunque el cliente se vaya:
+    si la conexión se corta sin resultado, el cliente no sabe si el contrato
+    quedó registrado (WorkerResultadoDesconocidoError) y no debe reintentar.
+
+    cliente -> {"tipo": "ping"}    worker -> {"tipo": "pong", "pid": ..., "trabajos": ...}
+    cliente -> {"tipo": "detener"} worker -> {"tipo": "ok"} y cierra
+
+    Todo mensaje debe llevar "token" (ver token_worker): WORKER_TOKEN si está
+    definido o, si no, el token aleatorio generado por instalación en
+    WORKER_TOKEN_PATH. Mensajes sin token válido se rechazan.
+
+Uso:
+    python -m src.worker
+"""
+from __future__ import annotations
+
+import asyncio
+import hmac
+import json
+import os
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from .config import settings, validar_credenciales
+from .logging_utils import get_logger
+from .stage_events import EventoEtapa
+
+logger = get_logger(__name__, level=settings.log_level, log_file=settings.log_file)
+
+# Tamaño máximo de una línea del protocolo (el texto de un contrato cabe holgado)
+LIMITE_LINEA = 1024 * 1024
+
+
+class WorkerNoDisponibleError(Exception):
+    """No hay worker escuchando (o no respondió a tiempo)"""
+    pass
+
+
+class WorkerResultadoDesconocidoError(Exception):
+    """
+    La conexión se cortó después de que el worker aceptó el trabajo
+
+    El worker sigue con el trabajo aunque el cliente se vaya, así que el
+    contrato puede haber quedado registrado: no se debe reintentar en local.
+    """
+
+    def __init__(self, mensaje: str, correlation_id: str):
+        super().__init__(mensaje)
+        self.correlation_id = correlation_id
+
+    def a_resultado(self) -> dict[str, Any]:
+        """Resultado serializable (formato de ejecutar_texto) para UI/CLI"""
+        return {
+            'success': False,
+            'resultado_desconocido': True,
+            'correlation_id': self.correlation_id,
+            'error': (
+                f'Resultado desconocido (correlation_id={self.correlation_id}): {str(self)}. '
+                'Revisar en el portal antes de reintentar.'
+            ),
+        }
+
+
+def _linea(mensaje: dict[str, Any]) -> bytes:
+    return (json.dumps(mensaje, ensure_ascii=True) + '\n').encode('ascii')
+
+
+def token_worker() -> str:
+    """
+    Token compartido entre el worker y sus clientes
+
+    Usa WORKER_TOKEN si está definido; si no, lee (o genera la primera vez)
+    un token aleatorio por instalación en WORKER_TOKEN_PATH, legible solo por
+    el usuario. Así el socket local nunca queda abierto sin autenticación.
+
+    Returns:
+        Token a enviar/exigir en cada mensaje
+    """
+    if settings.worker_token:
+        return settings.worker_token
+
+    destino = Path(settings.worker_token_path)
+    if not destino.exists():
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        temporal = destino.with_name(f'{destino.name}.{os.getpid()}.{uuid.uuid4().hex}')
+        fd = os.open(temporal, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        try:
+            with os.fdopen(fd, 'w', encoding='ascii') as f:
+                f.write(secrets.token_urlsafe(32))
+            try:
+                # link falla si otro proceso ya lo creó: gana el primero
+                os.link(temporal, destino)
+            except FileExistsError:
+                pass
+        finally:
+            temporal.unlink(missing_ok=True)
+    return destino.read_text(encoding='ascii').strip()
+
+
+def _token_valido(token: Optional[str], esperado: str) -> bool:
+    return hmac.compare_digest(str(token or ''), esperado)
+
+
+async def ejecutar_texto(
+    texto: str,
+    output_path: str,
+    dry_run: bool = False,
+    tasacion: Optional[str] = None,
+    venta: Optional[str] = None,
+    on_stage: Optional[Callable[[EventoEtapa], None]] = None
+) -> dict[str, Any]:
+    """
+    Parsea el texto del contrato y lo ejecuta en el motor AutoTramite
+
+    Es la unidad de trabajo común del worker y del CLI en modo local.
+
+    Args:
+        texto: Texto del contrato (formato de parsear_texto_contrato)
+        output_path: Ruta donde guardar el PDF de previsualización
+        dry_run: Solo previsualizar, sin registrar
+        tasacion: Override de tasación (opcional)
+        venta: Override de venta (opcional)
+        on_stage: Callback de eventos de etapa (opcional)
+
+    Returns:
+        dict: Resultado serializable (mismo formato que imprime el CLI)
+    """
+    from .autotramite import crear_contrato_autotramite
+    from .models import parsear_texto_contrato
+
+    creds_ok, creds_error = validar_credenciales()
+    if not creds_ok:
+        return {'success': False, 'error': f'Invalid credentials: {creds_error}'}
+
+    contrato, errores = parsear_texto_contrato(texto, tasacion_override=tasacion, venta_override=venta)
+    if errores:
+        return {
+            'success': False,
+            'error': 'Validation errors',
+            'validation_errors': [{'campo': e.campo, 'mensaje': e.mensaje} for e in errores],
+        }
+    if not contrato:
+        return {'success': False, 'error': 'Failed to parse contract'}
+
+    try:
+        resultado = await crear_contrato_autotramite(
+            contrato, dry_run=dry_run, screenshot_path=str(output_path), on_stage=on_stage
+        )
+    except Exception as e:
+        return {'success': False, 'error': f'Execution error: {str(e)}'}
+
+    return {
+        'success': bool(resultado.success),
+        'operacion_id': resultado.operacion_id,
+        'pdf_url': resultado.pdf_url,
+        'mensaje': resultado.mensaje,
+        'error': resultado.error,
+        'duracion_segundos': resultado.duracion_segundos,
+        'timings': resultado.timings,
+        'pdf_path': str(output_path),
+    }
+
+
+class AutoTramiteWorker:
+    """
+    Servidor asyncio que atiende trabajos AutoTramite sobre un navegador tibio
+
+    Cada conexión es una tarea asyncio propia, así que los eventos de etapa
+    (ContextVar de stage_events) no se mezclan entre trabajos concurrentes.
+    La concurrencia real la acota el browser pool.
+    """
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None, precalentar: bool = True):
+        """
+        Args:
+            host: Interfaz de escucha (default: settings.worker_host)
+            port: Puerto (default: settings.worker_port; 0 = efímero)
+            precalentar: Lanzar Chromium al iniciar en vez de en el primer trabajo
+        """
+        self.precalentar = precalentar
+        self.host = host or settings.worker_host
+        self.port = settings.worker_port if port is None else port
+        self.token = token_worker()
+        self.trabajos = 0
+        self.en_curso = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._detener = asyncio.Event()
+
+    @property
+    def direccion(self) -> tuple[str, int]:
+        """Host y puerto reales (útil con port=0)"""
+        assert self._server is not None
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def iniciar(self) -> None:
+        self._server = await asyncio.start_server(
+            self._atender, self.host, self.port, limit=LIMITE_LINEA
+        )
+        host, port = self.direccion
+        logger.info(f'Worker AutoTramite escuchando en {host}:{port} (pid {os.getpid()})')
+
+        if self.precalentar:
+            from .browser_pool import get_browser_pool
+            try:
+                await get_browser_pool().iniciar(precalentar=True)
+            except Exception as e:
+                logger.warning(f'No se pudo precalentar el browser pool: {str(e)}')
+
+    async def servir(self) -> None:
+        """Atiende hasta recibir 'detener' (o señal); luego cierra el pool"""
+        from .browser_pool import cerrar_browser_pool
+
+        if self._server is None:
+            await self.iniciar()
+        try:
+            await self._detener.wait()
+        finally:
+            assert self._server is not None
+            self._server.close()
+            await self._server.wait_closed()
+            await cerrar_browser_pool()
+            logger.info('Worker AutoTramite detenido')
+
+    def detener(self) -> None:
+        self._detener.set()
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            linea = await reader.readline()
+            if not linea:
+                return
+            try:
+                mensaje = json.loads(linea)
+            except ValueError:
+                writer.write(_linea({'tipo': 'error', 'error': 'JSON inválido'}))
+                return
+            if not isinstance(mensaje, dict) or not _token_valido(mensaje.get('token'), self.token):
+                writer.write(_linea({'tipo': 'error', 'error': 'No autorizado'}))
+                return
+
+            tipo = mensaje.get('tipo')
+            if tipo == 'ping':
+                writer.write(_linea({
+                    'tipo': 'pong', 'pid': os.getpid(), 'trabajos': self.trabajos, 'en_curso': self.en_curso
+                }))
+            elif tipo == 'detener':
+                writer.write(_linea({'tipo': 'ok'}))
+                self.detener()
+            elif tipo == 'ejecutar':
+                await self._ejecutar(mensaje, writer)
+            else:
+                writer.write(_linea({'tipo': 'error', 'error': f'Tipo desconocido: {tipo}'}))
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.warning(f'Cliente del worker desconectado: {str(e)}')
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def _ejecutar(self, mensaje: dict[str, Any], writer: asyncio.StreamWriter) -> None:
+        texto = mensaje.get('texto')
+        output = mensaje.get('output')
+        if not isinstance(texto, str) or not isinstance(output, str):
+            writer.write(_linea({'tipo': 'error', 'error': "Faltan 'texto' u 'output'"}))
+            return
+
+        def on_stage(evento: EventoEtapa) -> None:
+            # Si el cliente se fue, el trabajo sigue igual (no se corta a mitad de registro)
+            if not writer.is_closing():
+                writer.write(_linea({'tipo': 'evento', 'evento': evento.to_dict()}))
+
+        correlation_id = mensaje.get('correlation_id') or '-'
+        logger.info(f'Trabajo recibido (correlation_id={correlation_id})')
+        self.en_curso += 1
+        try:
+            resultado = await ejecutar_texto(
+                texto,
+                output,
+                dry_run=bool(mensaje.get('dry_run')),
+                tasacion=mensaje.get('tasacion'),
+                venta=mensaje.get('venta'),
+                on_stage=on_stage,
+            )
+        finally:
+            self.en_curso -= 1
+            self.trabajos += 1
+        logger.info(f"Trabajo terminado (correlation_id={correlation_id}, success={resultado.get('success')})")
+        if not writer.is_closing():
+            writer.write(_linea({'tipo': 'resultado', 'resultado': resultado}))
+
+
+# =============================================================================
+# CLIENTE (síncrono: sirve desde Streamlit y desde el CLI)
+# =============================================================================
+
+class WorkerClient:
+    """Cliente del worker por socket TCP local"""
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None, token: Optional[str] = None):
+        self.host = host or settings.worker_host
+        self.port = port or settings.worker_port
+        self.token = token if token is not None else token_worker()
+
+    def _conectar(self, timeout: float) -> socket.socket:
+        try:
+            return socket.create_connection((self.host, self.port), timeout=timeout)
+        except OSError as e:
+            raise WorkerNoDisponibleError(f'Worker no disponible en {self.host}:{self.port}: {str(e)}')
+
+    def _enviar(self, mensaje: dict[str, Any], timeout: float) -> tuple[socket.socket, Any]:
+        conexion = self._conectar(timeout)
+        if self.token:
+            mensaje = {**mensaje, 'token': self.token}
+        try:
+            conexion.sendall(_linea(mensaje))
+        except OSError as e:
+            conexion.close()
+            raise WorkerNoDisponibleError(f'No se pudo enviar al worker: {str(e)}')
+        return conexion, conexion.makefile('r', encoding='utf-8')
+
+    def ping(self, timeout: float = 1.0) -> dict[str, Any]:
+        """
+        Raises:
+            WorkerNoDisponibleError: Si no hay worker o no responde
+        """
+        conexion, lector = self._enviar({'tipo': 'ping'}, timeout)
+        try:
+            respuesta = json.loads(lector.readline() or 'null')
+        except (OSError, ValueError) as e:
+            raise WorkerNoDisponibleError(f'Respuesta inválida del worker: {str(e)}')
+        finally:
+            conexion.close()
+        if not isinstance(respuesta, dict) or respuesta.get('tipo') != 'pong':
+            raise WorkerNoDisponibleError(f'Respuesta inesperada del worker: {respuesta}')
+        return respuesta
+
+    def disponible(self) -> bool:
+        try:
+            self.ping()
+            return True
+        except WorkerNoDisponibleError:
+            return False
+
+    def detener(self, timeout: float = 5.0) -> None:
+        conexion, lector = self._enviar({'tipo': 'detener'}, timeout)
+        try:
+            lector.readline()
+        finally:
+            conexion.close()
+
+    def ejecutar(
+        self,
+        texto: str,
+        output_path: str,
+        dry_run: bool = False,
+        tasacion: Optional[str] = None,
+        venta: Optional[str] = None,
+        on_evento: Optional[Callable[[dict[str, Any]], None]] = None,
+        timeout: Optional[float] = None,
+        correlation_id: Optional[str] = None
+    ) -> dict[str, Any]:
+        """
+        Envía un trabajo y bloquea hasta el resultado
+
+        Args:
+            texto: Texto del contrato
+            output_path: Ruta del PDF de salida (la escribe el worker)
+            dry_run: Solo previsualizar
+            tasacion: Override de tasación (opcional)
+            venta: Override de venta (opcional)
+            on_evento: Callback por cada evento de etapa (dict de EventoEtapa.to_dict)
+            timeout: Segundos máximos sin recibir mensajes (default: settings.worker_job_timeout_s)
+            correlation_id: Id del trabajo para los logs del worker (se genera si falta)
+
+        Returns:
+            dict: Resultado del trabajo (formato de ejecutar_texto)
+
+        Raises:
+            WorkerNoDisponibleError: Si no se pudo conectar o enviar el trabajo (se puede correr en local)
+            WorkerResultadoDesconocidoError: Si la conexión se corta con el trabajo ya enviado
+        """
+        correlation_id = correlation_id or uuid.uuid4().hex[:12]
+        conexion, lector = self._enviar({
+            'tipo': 'ejecutar',
+            'texto': texto,
+            'output': str(output_path),
+            'dry_run': dry_run,
+            'tasacion': tasacion,
+            'venta': venta,
+            'correlation_id': correlation_id,
+        }, timeout=2.0)
+        conexion.settimeout(timeout or settings.worker_job_timeout_s)
+        try:
+            for linea in lector:
+                try:
+                    mensaje = json.loads(linea)
+                except ValueError:
+                    continue
+                tipo = mensaje.get('tipo')
+                if tipo == 'evento' and on_evento is not None:
+                    on_evento(mensaje.get('evento') or {})
+                elif tipo == 'resultado':
+                    return mensaje.get('resultado') or {}
+                elif tipo == 'error':
+                    return {'success': False, 'error': f"Worker: {mensaje.get('error')}"}
+        except OSError as e:
+            raise WorkerResultadoDesconocidoError(f'Conexión con el worker interrumpida: {str(e)}', correlation_id)
+        finally:
+            conexion.close()
+        raise WorkerResultadoDesconocidoError('El worker cerró la conexión sin resultado', correlation_id)
+
+
+def asegurar_worker(timeout: float = 20.0) -> WorkerClient:
+    """
+    Retorna un cliente del worker, lanzándolo en segundo plano si no corre
+
+    El proceso queda desacoplado de quien lo lanza (sobrevive a reruns de
+    Streamlit) y se reutiliza en los siguientes trabajos.
+
+    Raises:
+        WorkerNoDisponibleError: Si el worker no responde dentro del plazo
+    """
+    cliente = WorkerClient()
+    if cliente.disponible():
+        return cliente
+
+    raiz = Path(__file__).resolve().parent.parent
+    kwargs: dict[str, Any] = {}
+    if os.name == 'nt':
+        kwargs['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    logger.info('Lanzando worker AutoTramite en segundo plano')
+    subprocess.Popen(
+        [sys.executable, '-m', 'src.worker'],
+        cwd=str(raiz),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        **kwargs,
+    )
+
+    plazo = time.monotonic() + timeout
+    while time.monotonic() < plazo:
+        if cliente.disponible():
+            return cliente
+        time.sleep(0.2)
+    raise WorkerNoDisponibleError(f'El worker no respondió en {timeout:.0f}s')
+
+
+async def _main() -> None:
+    worker = AutoTramiteWorker()
+    await worker.iniciar()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.detener)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C llega como KeyboardInterrupt
+    await worker.servir()
+
+
+def main() -> int:
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        logger.error(f'No se pudo iniciar el worker: {str(e)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,7 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 from src.models import parsear_texto_contrato
 from src.autotramite import crear_contrato_autotramite
+from src.browser_pool import cerrar_browser_pool
 from src.logging_utils import get_logger
 from src.config import validar_credenciales
 
@@ -77,11 +78,14 @@ async def test_previsualizar():
     logger.info(f'   > PDF: {pdf_path}')
     logger.info('   > NO se registrará el contrato')
     
-    resultado = await crear_contrato_autotramite(
-        contrato, 
-        dry_run=True,
-        screenshot_path=str(pdf_path)
-    )
+    try:
+        resultado = await crear_contrato_autotramite(
+            contrato, 
+            dry_run=True,
+            screenshot_path=str(pdf_path)
+        )
+    finally:
+        await cerrar_browser_pool()
     
     # Paso 4: Mostrar resultado
     logger.info('\n3. Resultado:')
@@ -0,0 +1,79 @@
+"""
+Tests de que SMTP y PDF TAG no bloquean el event loop de la API
+"""
+import asyncio
+import time
+from unittest.mock import patch
+
+import httpx
+
+import api
+from src import executors
+from src.idempotency import IdempotencyStore
+
+DEMORA_S = 0.2
+
+
+def _smtp_bloqueante(**kwargs):
+    time.sleep(DEMORA_S)
+    return True, 'ok'
+
+
+def _pdf_bloqueante(mapping, template_path, output_path):
+    time.sleep(DEMORA_S)
+
+
+def _mail(i):
+    return {
+        'datos_propietario': 'JUAN PEREZ', 'vehiculo': 'TOYOTA YARIS', 'precio_acordado': '1000',
+        'fecha_pago': '01-01-2026', 'email_to': 'a@b.cl', 'cc': [], 'correlation_id': f'mail-{i}',
+    }
+
+
+def test_health_plano_con_40_trabajos_bloqueantes_en_vuelo(tmp_path):
+    headers = {'Authorization': f'Bearer {api.API_TOKEN}'}
+
+    async def main():
+        transporte = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transporte, base_url='http://test') as client:
+            inicio = time.monotonic()
+            trabajos = [
+                asyncio.create_task(client.post('/api/mail/enviar', headers=headers, json=_mail(i)))
+                for i in range(20)
+            ] + [
+                asyncio.create_task(client.post('/api/tag/generar', headers=headers, json={
+                    'datos_raw': 'x', 'correlation_id': f'tag-{i}',
+                }))
+                for i in range(20)
+            ]
+
+            latencias = []
+            while not all(t.done() for t in trabajos):
+                t0 = time.monotonic()
+                respuesta = await client.get('/health')
+                latencias.append(time.monotonic() - t0)
+                assert respuesta.status_code == 200
+                await asyncio.sleep(0.01)
+
+            respuestas = await asyncio.gather(*trabajos)
+            return latencias, respuestas, time.monotonic() - inicio
+
+    with patch('src.idempotency.idempotencia', IdempotencyStore(ttl_segundos=60)), \
+            patch.object(api, 'TAG_OUTPUT_DIR', tmp_path), \
+            patch.object(api, '_tag_parse_text', return_value={'CAMPO14': 'BCDF12'}), \
+            patch.object(api, '_tag_fill_pdf', _pdf_bloqueante), \
+            patch.object(api, 'validar_smtp_config', return_value=(True, '')), \
+            patch.object(api, 'validar_datos_mail', return_value=(True, [])), \
+            patch.object(api, 'generar_email_desde_plantilla', return_value=('Asunto', 'Cuerpo')), \
+            patch.object(api, 'enviar_email_smtp', _smtp_bloqueante):
+        try:
+            latencias, respuestas, total = asyncio.run(main())
+        finally:
+            executors.cerrar_executors()
+
+    assert all(r.status_code == 200 and r.json()['exito'] for r in respuestas)
+    # Con llamadas directas cada /health esperaría al menos DEMORA_S
+    assert len(latencias) >= 5
+    assert max(latencias) < DEMORA_S / 2
+    # Los pools acotan el paralelismo: 20 PDFs con 2 workers no terminan en una sola ronda
+    assert total >= (20 / 2) * DEMORA_S * 0.9
@@ -0,0 +1,171 @@
+"""
+Tests unitarios para el lote de contratos (pool y páginas simulados)
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
+from src import autotramite
+from src.autotramite import _EscuchaPdf
+from src.models import ContratoResult, parsear_texto_contrato
+from tests.test_models_parsing import _texto_base
+
+
+class FakePage:
+    def __init__(self):
+        self.handlers = {}
+        self.cerrada = False
+
+    def on(self, evento, handler):
+        self.handlers.setdefault(evento, []).append(handler)
+
+    def remove_listener(self, evento, handler):
+        self.handlers[evento].remove(handler)
+
+    def emitir(self, evento, valor):
+        for handler in list(self.handlers.get(evento, [])):
+            handler(valor)
+
+    async def close(self):
+        self.cerrada = True
+
+
+class FakeContext:
+    def __init__(self):
+        self.paginas = 0
+
+    async def new_page(self):
+        self.paginas += 1
+        return FakePage()
+
+
+class FakePool:
+    def __init__(self):
+        self.context = FakeContext()
+        self.contextos = 0
+
+    @asynccontextmanager
+    async def contexto(self, **kwargs):
+        self.contextos += 1
+        yield self.context
+
+
+def _contratos(n):
+    contrato, _ = parsear_texto_contrato(_texto_base())
+    contratos = []
+    for i in range(n):
+        copia = contrato.model_copy(deep=True)
+        copia.vehiculo.patente = f'AAAA{i:02d}'
+        contratos.append(copia)
+    return contratos
+
+
+def _ejecutar(contratos, procesar, paralelismo=2, asegurar=None):
+    pool = FakePool()
+
+    async def asegurar_ok(page, usa_cache, version):
+        return True
+
+    with patch.object(autotramite, 'get_browser_pool', return_value=pool), \
+            patch.object(autotramite, 'aplicar_ruteo', return_value=None), \
+            patch.object(autotramite, 'asegurar_sesion', side_effect=asegurar or asegurar_ok), \
+            patch.object(autotramite, '_procesar_en_pagina', side_effect=procesar), \
+            patch.object(autotramite.session_cache, 'cargar', return_value=None):
+        resultados = asyncio.run(
+            autotramite.crear_contratos_autotramite_batch(contratos, dry_run=True, paralelismo=paralelismo)
+        )
+    return pool, resultados
+
+
+def test_resultados_en_orden_y_errores_por_item():
+    activos = 0
+    maximo = 0
+
+    async def procesar(page, datos, dry_run, path, en_formulario, progreso=None):
+        nonlocal activos, maximo
+        activos += 1
+        maximo = max(maximo, activos)
+        await asyncio.sleep(0.01 if datos.vehiculo.patente != 'AAAA00' else 0.03)
+        activos -= 1
+        if datos.vehiculo.patente == 'AAAA02':
+            raise autotramite.RecoverableError('timeout portal')
+        return ContratoResult(success=True, operacion_id=datos.vehiculo.patente, mensaje='ok')
+
+    pool, resultados = _ejecutar(_contratos(5), procesar, paralelismo=2)
+
+    assert [r.success for r in resultados] == [True, True, False, True, True]
+    assert [r.operacion_id for r in resultados if r.success] == ['AAAA00', 'AAAA01', 'AAAA03', 'AAAA04']
+    assert 'timeout portal' in resultados[2].error
+    assert maximo == 2
+    assert pool.contextos == 1
+    assert pool.context.paginas == 2
+
+
+def test_login_fallido_marca_todo_el_lote():
+    async def asegurar_falla(page, usa_cache, version):
+        raise autotramite.LoginFailedError('credenciales invalidas')
+
+    async def procesar(*args, **kwargs):
+        raise AssertionError('no debe procesar')
+
+    _, resultados = _ejecutar(_contratos(3), procesar, asegurar=asegurar_falla)
+    assert len(resultados) == 3
+    assert all(not r.success and 'credenciales' in r.error for r in resultados)
+
+
+def test_popups_del_contrato_se_cierran_al_terminar():
+    popups = []
+
+    async def procesar(page, datos, dry_run, path, en_formulario, progreso=None):
+        popup = FakePage()
+        popups.append(popup)
+        page.emitir('popup', popup)
+        return ContratoResult(success=True, operacion_id=datos.vehiculo.patente, mensaje='ok')
+
+    _, resultados = _ejecutar(_contratos(3), procesar, paralelismo=1)
+
+    assert all(r.success for r in resultados)
+    assert len(popups) == 3 and all(p.cerrada for p in popups)
+
+
+class FakeFrame:
+    def __init__(self, page):
+        self.page = page
+
+
+class FakeResponse:
+    def __init__(self, page, url='https://portal/pdf_contrato'):
+        self.frame = FakeFrame(page)
+        self.url = url
+        self.headers = {'content-type': 'application/pdf'}
+
+
+def test_escucha_pdf_ignora_otras_paginas_del_contexto():
+    async def escenario():
+        propia, otra, popup = FakePage(), FakePage(), FakePage()
+        escucha = _EscuchaPdf(propia, asyncio.get_running_loop())
+
+        escucha.respuesta(FakeResponse(otra))
+        assert not escucha.pdf.done()
+
+        # El documento del popup llega antes que el evento 'popup'
+        del_popup = FakeResponse(popup)
+        escucha.respuesta(del_popup)
+        assert not escucha.pdf.done()
+        escucha.agregar_pagina(popup)
+        assert escucha.pdf.result() is del_popup
+
+    asyncio.run(escenario())
+
+
+def test_fallo_tras_el_click_marca_registro_enviado():
+    async def procesar(page, datos, dry_run, path, en_formulario, progreso=None):
+        if datos.vehiculo.patente == 'AAAA01':
+            progreso.registro_clickado = True
+            raise autotramite.RecoverableError('timeout confirmacion')
+        return ContratoResult(success=False, mensaje='error', error='timeout formulario')
+
+    _, resultados = _ejecutar(_contratos(2), procesar, paralelismo=1)
+
+    assert [r.success for r in resultados] == [False, False]
+    assert [r.registro_enviado for r in resultados] == [False, True]
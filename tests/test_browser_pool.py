@@ -0,0 +1,188 @@
+"""
+Tests unitarios para el pool de navegadores (Playwright simulado)
+"""
+import asyncio
+from unittest.mock import patch
+
+from src import browser_pool
+from src.browser_pool import BrowserPool
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+        self.contexts: list[FakeContext] = []
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **kwargs):
+        context = FakeContext()
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.connected = False
+
+
+class FakeChromium:
+    def __init__(self):
+        self.launches = 0
+
+    async def launch(self, **kwargs):
+        self.launches += 1
+        return FakeBrowser()
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.chromium = FakeChromium()
+        self.stopped = False
+
+    async def stop(self):
+        self.stopped = True
+
+
+class FakeStarter:
+    def __init__(self, playwright):
+        self.playwright = playwright
+
+    async def start(self):
+        return self.playwright
+
+
+def _run(coro_fn):
+    fake = FakePlaywright()
+    with patch.object(browser_pool, 'async_playwright', lambda: FakeStarter(fake)):
+        asyncio.run(coro_fn(fake))
+    return fake
+
+
+def test_reutiliza_navegador_entre_trabajos():
+    """Dos trabajos seguidos usan el mismo Chromium con contextos distintos"""
+    async def escenario(fake):
+        pool = BrowserPool(tamano=1, max_trabajos=0, max_edad_minutos=0)
+        async with pool.contexto() as ctx1:
+            pass
+        async with pool.contexto() as ctx2:
+            pass
+        assert fake.chromium.launches == 1
+        assert ctx1 is not ctx2
+        assert ctx1.closed and ctx2.closed
+        await pool.cerrar()
+
+    fake = _run(escenario)
+    assert fake.stopped
+
+
+def test_recicla_tras_max_trabajos():
+    async def escenario(fake):
+        pool = BrowserPool(tamano=1, max_trabajos=2, max_edad_minutos=0)
+        for _ in range(3):
+            async with pool.contexto():
+                pass
+        assert fake.chromium.launches == 2
+        assert pool.estado()['reciclados'] == 1
+        await pool.cerrar()
+
+    _run(escenario)
+
+
+def test_relanza_navegador_desconectado():
+    async def escenario(fake):
+        pool = BrowserPool(tamano=1, max_trabajos=0, max_edad_minutos=0)
+        async with pool.contexto():
+            pass
+        for navegador in list(pool._navegadores):
+            navegador.browser.connected = False
+        async with pool.contexto():
+            pass
+        assert fake.chromium.launches == 2
+        await pool.cerrar()
+
+    _run(escenario)
+
+
+def test_tamano_limita_concurrencia():
+    async def escenario(fake):
+        pool = BrowserPool(tamano=2, max_trabajos=0, max_edad_minutos=0)
+        activos = 0
+        maximo = 0
+
+        async def trabajo():
+            nonlocal activos, maximo
+            async with pool.contexto():
+                activos += 1
+                maximo = max(maximo, activos)
+                await asyncio.sleep(0.01)
+                activos -= 1
+
+        await asyncio.gather(*(trabajo() for _ in range(5)))
+        assert maximo == 2
+        assert fake.chromium.launches == 2
+        await pool.cerrar()
+
+    _run(escenario)
+
+
+def test_pool_por_event_loop():
+    """Otro loop recibe su propio pool sin dejar huérfano el del primero"""
+    import threading
+
+    fake = FakePlaywright()
+    otro_loop = asyncio.new_event_loop()
+    hilo = threading.Thread(target=otro_loop.run_forever, daemon=True)
+    hilo.start()
+
+    async def en_otro_loop():
+        pool = browser_pool.get_browser_pool()
+        async with pool.contexto():
+            pass
+        return pool
+
+    async def en_este_loop():
+        pool = browser_pool.get_browser_pool()
+        assert browser_pool.get_browser_pool() is pool
+        await browser_pool.cerrar_browser_pool()
+        return pool
+
+    with patch.object(browser_pool, 'async_playwright', lambda: FakeStarter(fake)):
+        del_otro = asyncio.run_coroutine_threadsafe(en_otro_loop(), otro_loop).result(5)
+        propio = asyncio.run(en_este_loop())
+        assert propio is not del_otro and propio.cerrado
+        assert not del_otro.cerrado and not fake.stopped
+
+        asyncio.run_coroutine_threadsafe(browser_pool.cerrar_browser_pool(), otro_loop).result(5)
+    otro_loop.call_soon_threadsafe(otro_loop.stop)
+    hilo.join(5)
+    otro_loop.close()
+
+    assert del_otro.cerrado and fake.stopped
+    assert browser_pool._pools == {}
+
+
+def test_cierra_al_terminar_el_loop_sin_cerrar_browser_pool():
+    """asyncio.run cierra Chromium y Playwright aunque falte cerrar_browser_pool"""
+    navegadores = []
+
+    async def main():
+        pool = browser_pool.get_browser_pool()
+        async with pool.contexto():
+            pass
+        navegadores.extend(n.browser for n in pool._navegadores)
+
+    fake = FakePlaywright()
+    with patch.object(browser_pool, 'async_playwright', lambda: FakeStarter(fake)):
+        asyncio.run(main())
+
+    assert len(navegadores) == 1 and not navegadores[0].is_connected()
+    assert fake.stopped
+    assert browser_pool._pools == {}
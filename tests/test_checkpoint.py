@@ -0,0 +1,168 @@
+"""
+Tests unitarios para el checkpoint de contratos (página simulada)
+"""
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from src import autotramite
+from src.autotramite import ProgresoContrato, VistaPrevia, RecoverableError
+from src.config import SELECTORS
+from src.models import ContratoResult
+from tests.test_fill_strategy import FakePage, _contrato
+
+
+class PaginaFormulario(FakePage):
+    """Página que falla una vez al llenar un campo y permite verificar valores"""
+
+    def __init__(self, falla_en=None):
+        super().__init__()
+        self.falla_en = falla_en
+        self.cerrada = False
+
+    def is_closed(self):
+        return self.cerrada
+
+    async def fill(self, selector, value):
+        if selector == self.falla_en:
+            self.falla_en = None
+            raise RuntimeError('elemento desconectado')
+        await super().fill(selector, value)
+
+    async def evaluate(self, script, campos):
+        if 'norm' in script:
+            return [clave for clave, selector, valor in campos if self.valores.get(selector) == valor]
+        return await super().evaluate(script, campos)
+
+
+def _llenar(page, progreso, navegar):
+    with patch.object(autotramite.settings, 'fill_strategy', 'fill'), \
+            patch.object(autotramite.settings, 'fill_keystroke_fields', ''):
+        return asyncio.run(autotramite.llenar_formulario(page, _contrato(), navegar=navegar, progreso=progreso))
+
+
+def test_reintento_de_llenado_retoma_desde_campo_pendiente():
+    page = PaginaFormulario(falla_en=SELECTORS['vendedor_rut'])
+    progreso = ProgresoContrato()
+
+    try:
+        _llenar(page, progreso, navegar=False)
+        raise AssertionError('debió fallar')
+    except RecoverableError:
+        pass
+
+    llenados_primer_intento = [sel for op, sel in page.llamadas if op == 'fill']
+    page.llamadas.clear()
+    _llenar(page, progreso, navegar=False)
+    llenados_reintento = [sel for op, sel in page.llamadas if op == 'fill']
+
+    assert SELECTORS['vehiculo_patente'] in llenados_primer_intento
+    assert SELECTORS['vehiculo_patente'] not in llenados_reintento
+    assert llenados_reintento[0] == SELECTORS['vendedor_rut']
+    assert progreso.formulario_completo
+
+
+def test_navegar_reinicia_checkpoint():
+    progreso = ProgresoContrato(campos_verificados={'vehiculo_patente'}, formulario_completo=True)
+    page = PaginaFormulario()
+    _llenar(page, progreso, navegar=True)
+    assert ('fill', SELECTORS['vehiculo_patente']) in page.llamadas
+
+
+def test_registro_nunca_se_clickea_dos_veces():
+    page = PaginaFormulario()
+    progreso = ProgresoContrato()
+    previsualizaciones = 0
+    clicks = 0
+
+    async def previsualizar(page, screenshot_path):
+        nonlocal previsualizaciones
+        previsualizaciones += 1
+        return VistaPrevia(page=page)
+
+    async def clickear(preview_page, progreso, tiempos, loop):
+        nonlocal clicks
+        clicks += 1
+        progreso.registro_clickado = True
+        raise RecoverableError('timeout esperando confirmacion')
+
+    async def escenario():
+        with patch.object(autotramite, '_previsualizar', side_effect=previsualizar), \
+                patch.object(autotramite, '_clickear_registro', side_effect=clickear):
+            try:
+                await autotramite.previsualizar_y_registrar(page, progreso=progreso)
+            except RecoverableError:
+                pass
+            return await autotramite.previsualizar_y_registrar(page, progreso=progreso)
+
+    resultado = asyncio.run(escenario())
+    assert isinstance(resultado, ContratoResult) and resultado.success
+    assert clicks == 1
+    assert previsualizaciones == 1
+
+
+def test_vista_previa_se_regenera_si_falla_antes_del_click():
+    page = PaginaFormulario()
+    progreso = ProgresoContrato()
+    previsualizaciones = 0
+
+    async def previsualizar(page, screenshot_path):
+        nonlocal previsualizaciones
+        previsualizaciones += 1
+        return VistaPrevia(page=page)
+
+    async def clickear(preview_page, progreso, tiempos, loop):
+        raise RecoverableError('No se encontro boton')
+
+    async def escenario():
+        with patch.object(autotramite, '_previsualizar', side_effect=previsualizar), \
+                patch.object(autotramite, '_clickear_registro', side_effect=clickear):
+            for _ in range(2):
+                try:
+                    await autotramite.previsualizar_y_registrar(page, progreso=progreso)
+                except RecoverableError:
+                    pass
+
+    asyncio.run(escenario())
+    assert previsualizaciones == 2
+
+
+def test_click_que_lanza_no_prueba_otro_selector():
+    """Si click() lanza tras despachar el evento no se clickea otro botón 'Registrar'"""
+    clicks = []
+
+    class Boton:
+        def __init__(self, selector):
+            self.selector = selector
+            self.first = self
+
+        async def scroll_into_view_if_needed(self):
+            pass
+
+        async def click(self):
+            clicks.append(self.selector)
+            raise RuntimeError('Target page, context or browser has been closed')
+
+    class VistaConBotones:
+        def on(self, evento, handler):
+            pass
+
+        def remove_listener(self, evento, handler):
+            pass
+
+        async def wait_for_selector(self, selector, **kwargs):
+            return object()
+
+        def locator(self, selector):
+            return Boton(selector)
+
+    progreso = ProgresoContrato()
+
+    async def escenario():
+        with pytest.raises(RuntimeError):
+            await autotramite._clickear_registro(VistaConBotones(), progreso, {}, asyncio.get_running_loop())
+
+    asyncio.run(escenario())
+    assert len(clicks) == 1
+    assert progreso.registro_clickado
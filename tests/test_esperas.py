@@ -0,0 +1,66 @@
+"""
+Tests unitarios para las esperas por eventos de la previsualización
+"""
+import asyncio
+import time
+
+from src import autotramite
+from src.autotramite import _esperar_primera
+
+
+async def _despues(segundos, valor):
+    await asyncio.sleep(segundos)
+    return valor
+
+
+async def _falla(segundos):
+    await asyncio.sleep(segundos)
+    raise TimeoutError('selector no apareció')
+
+
+def test_gana_la_primera_senal():
+    async def escenario():
+        inicio = time.monotonic()
+        ganador, valor, _ = await _esperar_primera('test_rapida', {
+            'lenta': _despues(1.0, 'lenta'),
+            'rapida': _despues(0.01, 'rapida'),
+        }, 5000)
+        return ganador, valor, time.monotonic() - inicio
+
+    ganador, valor, segundos = asyncio.run(escenario())
+    assert (ganador, valor) == ('rapida', 'rapida')
+    assert segundos < 0.5
+
+
+def test_ignora_esperas_fallidas():
+    async def escenario():
+        return await _esperar_primera('test_fallida', {
+            'falla': _falla(0.0),
+            'ok': _despues(0.02, 'ok'),
+        }, 5000)
+
+    ganador, valor, _ = asyncio.run(escenario())
+    assert ganador == 'ok'
+
+
+def test_deadline_duro():
+    async def escenario():
+        return await _esperar_primera('test_deadline', {'nunca': _despues(10, None)}, 50)
+
+    ganador, _, segundos = asyncio.run(escenario())
+    assert ganador is None
+    assert segundos < 1
+    assert autotramite.ESTADISTICAS_ESPERAS['test_deadline']['ganador:deadline'] >= 1
+
+
+def test_future_compartido_no_se_cancela():
+    async def escenario():
+        future = asyncio.get_running_loop().create_future()
+        ganador, _, _ = await _esperar_primera('test_shield', {
+            'pdf': future,
+            'dom': _despues(0.01, True),
+        }, 5000)
+        future.set_result('respuesta')
+        return ganador, await future
+
+    assert asyncio.run(escenario()) == ('dom', 'respuesta')
@@ -0,0 +1,109 @@
+"""
+Tests unitarios para las estrategias de llenado del formulario (página simulada)
+"""
+import asyncio
+from unittest.mock import patch
+
+from src import autotramite
+from src.config import SELECTORS
+from src.models import parsear_texto_contrato
+from tests.test_models_parsing import _texto_base
+
+
+class FakeKeyboard:
+    def __init__(self, page):
+        self.page = page
+
+    async def press(self, key):
+        self.page.llamadas.append(('press', key))
+
+
+class FakePage:
+    def __init__(self):
+        self.llamadas: list[tuple] = []
+        self.valores: dict[str, str] = {}
+        self.keyboard = FakeKeyboard(self)
+        self.url = 'https://autotramite.cl/contrato.php'
+
+    async def goto(self, url, **kwargs):
+        self.llamadas.append(('goto', url))
+
+    async def wait_for_selector(self, selector, **kwargs):
+        pass
+
+    async def click(self, selector, **kwargs):
+        self.llamadas.append(('click', selector))
+
+    async def type(self, selector, value, delay=0):
+        self.llamadas.append(('type', selector))
+        self.valores[selector] = value
+
+    async def fill(self, selector, value):
+        self.llamadas.append(('fill', selector))
+        self.valores[selector] = value
+
+    async def evaluate(self, script, campos):
+        self.llamadas.append(('evaluate', len(campos)))
+        for selector, valor in campos:
+            self.valores[selector] = valor
+        return []
+
+    async def check(self, selector):
+        pass
+
+    async def select_option(self, selector, **kwargs):
+        pass
+
+
+def _contrato():
+    contrato, errores = parsear_texto_contrato(_texto_base())
+    assert not errores
+    return contrato
+
+
+def _llenar(estrategia):
+    page = FakePage()
+    with patch.object(autotramite.settings, 'fill_strategy', estrategia), \
+            patch.object(autotramite.settings, 'fill_keystroke_fields', 'vehiculo_patente'):
+        resumen = asyncio.run(autotramite.llenar_formulario(page, _contrato(), navegar=False))
+    return page, resumen
+
+
+def test_campos_formulario_incluye_ambas_partes():
+    claves = [clave for clave, _, _ in autotramite.campos_formulario(_contrato())]
+    assert 'vehiculo_patente' in claves
+    assert 'vendedor_email' in claves
+    assert 'comprador_rut' in claves
+    assert all(clave in SELECTORS for clave in claves)
+
+
+def test_estrategia_fill_no_tipea_salvo_override():
+    page, resumen = _llenar('fill')
+    tipeados = [sel for op, sel in page.llamadas if op == 'type']
+    assert tipeados == [SELECTORS['vehiculo_patente']]
+    assert resumen['estrategia'] == 'fill'
+    assert resumen['ahorro_estimado_segundos'] >= 0
+
+
+def test_estrategia_batch_un_evaluate_por_seccion():
+    page, resumen = _llenar('batch')
+    evaluates = [op for op, _ in page.llamadas if op == 'evaluate']
+    assert len(evaluates) == 3  # vehiculo, vendedor, comprador
+    assert page.valores[SELECTORS['comprador_rut']] == '26.033.082-9'
+    assert page.valores[SELECTORS['vehiculo_patente']]
+
+
+def test_estrategia_type_sin_ahorro():
+    page, resumen = _llenar('type')
+    assert not any(op == 'fill' for op, _ in page.llamadas)
+    assert resumen['ahorro_estimado_segundos'] == 0
+    assert resumen['estimado_type_segundos'] > 0
+
+
+def test_estrategia_invalida_usa_type():
+    with patch.object(autotramite.settings, 'fill_strategy', 'turbo'):
+        assert autotramite.estrategia_llenado() == 'type'
+
+
+def test_default_es_type():
+    assert type(autotramite.settings).model_fields['fill_strategy'].default == 'type'
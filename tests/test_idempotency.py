@@ -0,0 +1,264 @@
+"""
+Tests de idempotencia por (endpoint, correlation_id)
+"""
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.idempotency import IdempotenciaConflictoError, IdempotencyStore
+from src.jobs import JobQueue, JobStore
+
+
+def test_duplicado_en_curso_se_engancha_al_original():
+    store = IdempotencyStore(ttl_segundos=60)
+    ejecuciones = 0
+
+    async def trabajo():
+        nonlocal ejecuciones
+        ejecuciones += 1
+        await asyncio.sleep(0.02)
+        return {'n': ejecuciones}
+
+    async def main():
+        return await asyncio.gather(*(
+            store.ejecutar('/x', 'c-1', {'a': 1}, trabajo) for _ in range(3)
+        ))
+
+    respuestas = asyncio.run(main())
+    assert ejecuciones == 1
+    assert respuestas == [{'n': 1}] * 3
+    assert store.estadisticas['enganchados'] == 2
+
+
+def test_completado_retorna_cache_hasta_vencer_ttl():
+    store = IdempotencyStore(ttl_segundos=0.05)
+    llamadas = []
+
+    async def trabajo():
+        llamadas.append(1)
+        return len(llamadas)
+
+    async def main():
+        primera = await store.ejecutar('/x', 'c-1', {}, trabajo)
+        cacheada = await store.ejecutar('/x', 'c-1', {}, trabajo)
+        otro_endpoint = await store.ejecutar('/y', 'c-1', {}, trabajo)
+        await asyncio.sleep(0.06)
+        vencida = await store.ejecutar('/x', 'c-1', {}, trabajo)
+        return primera, cacheada, otro_endpoint, vencida
+
+    assert asyncio.run(main()) == (1, 1, 2, 3)
+
+
+def test_error_no_se_cachea():
+    store = IdempotencyStore(ttl_segundos=60)
+    intentos = []
+
+    async def trabajo():
+        intentos.append(1)
+        if len(intentos) == 1:
+            raise RuntimeError('timeout portal')
+        return 'ok'
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await store.ejecutar('/x', 'c-1', {}, trabajo)
+        return await store.ejecutar('/x', 'c-1', {}, trabajo)
+
+    assert asyncio.run(main()) == 'ok'
+    assert len(intentos) == 2
+
+
+def test_exito_false_no_se_cachea_salvo_que_cachear_lo_pida():
+    store = IdempotencyStore(ttl_segundos=60)
+    intentos = []
+
+    async def trabajo():
+        intentos.append(1)
+        return {'exito': len(intentos) > 1, 'exitosos': 1}
+
+    async def main():
+        fallida = await store.ejecutar('/x', 'c-1', {}, trabajo)
+        reintento = await store.ejecutar('/x', 'c-1', {}, trabajo)
+        cacheada = await store.ejecutar('/x', 'c-1', {}, trabajo)
+        intentos.clear()
+        parcial = await store.ejecutar('/lote', 'c-1', {}, trabajo, cachear=lambda r: r['exitosos'] > 0)
+        return fallida, reintento, cacheada, parcial, await store.ejecutar('/lote', 'c-1', {}, trabajo)
+
+    fallida, reintento, cacheada, parcial, lote_cacheado = asyncio.run(main())
+    assert fallida['exito'] is False and reintento['exito'] is True
+    assert cacheada is reintento
+    assert lote_cacheado is parcial and len(intentos) == 1
+
+
+def test_conflicto_y_desactivado():
+    async def trabajo():
+        return 'ok'
+
+    async def conflicto():
+        store = IdempotencyStore(ttl_segundos=60)
+        await store.ejecutar('/x', 'c-1', {'a': 1}, trabajo)
+        await store.ejecutar('/x', 'c-1', {'a': 2}, trabajo)
+
+    with pytest.raises(IdempotenciaConflictoError):
+        asyncio.run(conflicto())
+
+    llamadas = []
+
+    async def contar():
+        llamadas.append(1)
+
+    async def desactivado():
+        store = IdempotencyStore(ttl_segundos=0)
+        await store.ejecutar('/x', 'c-1', {}, contar)
+        await store.ejecutar('/x', 'c-1', {}, contar)
+        await store.ejecutar('/x', None, {}, contar)
+
+    asyncio.run(desactivado())
+    assert len(llamadas) == 3
+
+
+def test_max_entradas_descarta_las_mas_antiguas():
+    store = IdempotencyStore(ttl_segundos=60, max_entradas=2)
+
+    async def trabajo():
+        return 'ok'
+
+    async def main():
+        for i in range(4):
+            await store.ejecutar('/x', f'c-{i}', {}, trabajo)
+        await store.ejecutar('/x', 'c-4', {}, trabajo)
+
+    asyncio.run(main())
+    assert len(store._entradas) <= 3
+
+
+def test_jobs_duplicados_retornan_el_mismo_trabajo(tmp_path):
+    async def ejecutor(payload, on_stage):
+        return {}
+
+    async def main():
+        cola = JobQueue(JobStore(tmp_path / 'jobs.sqlite3'), {'autotramite': ejecutor}, concurrencia=1)
+        await cola.iniciar()
+        original = cola.encolar('autotramite', {'a': 1}, 'tg-1')
+        duplicado = cola.encolar('autotramite', {'a': 1}, 'tg-1')
+        with pytest.raises(IdempotenciaConflictoError):
+            cola.encolar('autotramite', {'a': 2}, 'tg-1')
+        otro = cola.encolar('autotramite', {'a': 1}, 'tg-2')
+        await cola.esperar_vacia()
+        await cola.detener()
+        return original, duplicado, otro
+
+    original, duplicado, otro = asyncio.run(main())
+    assert duplicado['id'] == original['id'] and duplicado['duplicado'] is True
+    assert otro['id'] != original['id']
+
+
+def test_jobs_fallidos_se_reintentan_pero_no_los_interrumpidos(tmp_path):
+    from src.jobs import MENSAJE_INTERRUMPIDO
+
+    async def ejecutor(payload, on_stage):
+        if payload['falla'] == 'excepcion':
+            raise RuntimeError('timeout portal')
+        return {'exito': payload['falla'] is None}
+
+    async def main():
+        store = JobStore(tmp_path / 'jobs.sqlite3')
+        cola = JobQueue(store, {'autotramite': ejecutor}, concurrencia=1)
+        await cola.iniciar()
+        ids = {}
+        for falla in ('excepcion', 'exito_false', None):
+            original = cola.encolar('autotramite', {'falla': falla}, f'tg-{falla}')
+            await cola.esperar_vacia()
+            ids[falla] = (original['id'], cola.encolar('autotramite', {'falla': falla}, f'tg-{falla}')['id'])
+        await cola.esperar_vacia()
+        interrumpido = store.crear('autotramite', {'falla': None}, 'tg-int')
+        store.finalizar(interrumpido['id'], None, error=MENSAJE_INTERRUMPIDO)
+        duplicado = cola.encolar('autotramite', {'falla': None}, 'tg-int')
+        await cola.detener()
+        return ids, interrumpido['id'], duplicado
+
+    ids, interrumpido, duplicado = asyncio.run(main())
+    assert ids['excepcion'][0] != ids['excepcion'][1]
+    assert ids['exito_false'][0] != ids['exito_false'][1]
+    assert ids[None][0] == ids[None][1]
+    assert duplicado['id'] == interrumpido and duplicado['duplicado'] is True
+
+
+def test_api_mail_reintento_no_reenvia(tmp_path):
+    import api
+    from src.idempotency import IdempotencyStore
+
+    envios = []
+
+    def enviar(**kwargs):
+        envios.append(kwargs)
+        return True, 'ok'
+
+    body = {
+        'datos_propietario': 'JUAN PEREZ', 'vehiculo': 'TOYOTA YARIS', 'precio_acordado': '1000',
+        'fecha_pago': '01-01-2026', 'email_to': 'a@b.cl', 'cc': [], 'correlation_id': 'mail-1',
+    }
+    headers = {'Authorization': f'Bearer {api.API_TOKEN}'}
+    with patch.object(api.settings, 'jobs_db_path', str(tmp_path / 'jobs.sqlite3')), \
+            patch('src.idempotency.idempotencia', IdempotencyStore(ttl_segundos=60)), \
+            patch.object(api, 'validar_smtp_config', return_value=(True, '')), \
+            patch.object(api, 'validar_datos_mail', return_value=(True, [])), \
+            patch.object(api, 'generar_email_desde_plantilla', return_value=('Asunto', 'Cuerpo')), \
+            patch.object(api, 'enviar_email_smtp', side_effect=enviar), \
+            TestClient(api.app) as client:
+        primera = client.post('/api/mail/enviar', headers=headers, json=body)
+        reintento = client.post('/api/mail/enviar', headers=headers, json=body)
+        conflicto = client.post('/api/mail/enviar', headers=headers, json={**body, 'email_to': 'c@d.cl'})
+
+    assert primera.status_code == 200 and primera.json()['exito'] is True
+    assert reintento.json() == primera.json()
+    assert len(envios) == 1
+    assert conflicto.status_code == 409
+
+
+def test_api_fallo_tras_registrar_no_vuelve_a_ejecutar(tmp_path):
+    import api
+    from src.idempotency import IdempotencyStore
+    from src.models import ContratoResult, parsear_texto_contrato
+    from tests.test_models_parsing import _texto_base
+
+    contrato, _ = parsear_texto_contrato(_texto_base())
+    llamadas = []
+
+    async def motor(datos, dry_run, screenshot_path, on_stage=None):
+        llamadas.append(datos.vehiculo.patente)
+        # Timeout esperando la confirmación después de presionar "Registrar"
+        return ContratoResult(success=False, mensaje='Error', error='timeout registro', registro_enviado=True)
+
+    body = {'datos': contrato.model_dump(mode='json'), 'modo': 'registro', 'correlation_id': 'tg-reg'}
+    headers = {'Authorization': f'Bearer {api.API_TOKEN}'}
+    with patch.object(api.settings, 'jobs_db_path', str(tmp_path / 'jobs.sqlite3')), \
+            patch('src.idempotency.idempotencia', IdempotencyStore(ttl_segundos=60)), \
+            patch.object(api, 'crear_contrato_autotramite', side_effect=motor), \
+            TestClient(api.app) as client:
+        primera = client.post('/api/autotramite/ejecutar', headers=headers, json=body)
+        reintento = client.post('/api/autotramite/ejecutar', headers=headers, json=body)
+
+    assert primera.json()['exito'] is False
+    assert primera.json()['metadata']['registro_enviado'] is True
+    assert reintento.json() == primera.json()
+    assert len(llamadas) == 1
+
+
+def test_job_fallido_tras_registrar_se_deduplica(tmp_path):
+    async def ejecutor(payload, on_stage):
+        return {'exito': False, 'metadata': {'registro_enviado': True}}
+
+    async def main():
+        cola = JobQueue(JobStore(tmp_path / 'jobs.sqlite3'), {'autotramite': ejecutor}, concurrencia=1)
+        await cola.iniciar()
+        original = cola.encolar('autotramite', {'a': 1}, 'tg-1')
+        await cola.esperar_vacia()
+        reintento = cola.encolar('autotramite', {'a': 1}, 'tg-1')
+        await cola.detener()
+        return original, reintento
+
+    original, reintento = asyncio.run(main())
+    assert reintento['id'] == original['id'] and reintento['duplicado'] is True
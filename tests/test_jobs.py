@@ -0,0 +1,208 @@
+"""
+Tests de la cola de trabajos asíncronos (SQLite) y sus endpoints
+"""
+import asyncio
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.jobs import (
+    COMPLETADO,
+    EJECUTANDO,
+    EN_COLA,
+    ERROR,
+    MENSAJE_INTERRUMPIDO,
+    ColaLlenaError,
+    JobQueue,
+    JobStore,
+)
+from src.models import parsear_texto_contrato
+from src.stage_events import EventoEtapa
+from tests.test_models_parsing import _texto_base
+
+
+def test_store_roundtrip(tmp_path):
+    store = JobStore(tmp_path / 'jobs.sqlite3')
+    job = store.crear('autotramite', {'modo': 'preview'}, 'c-1')
+
+    assert job['estado'] == EN_COLA
+    assert job['payload'] == {'modo': 'preview'}
+
+    store.marcar_ejecutando(job['id'])
+    store.actualizar_etapa(job['id'], 'login', {'login': 0.5})
+    store.finalizar(job['id'], {'exito': True})
+
+    final = store.obtener(job['id'])
+    assert final['estado'] == COMPLETADO
+    assert final['etapa'] == 'login'
+    assert final['timings'] == {'login': 0.5}
+    assert final['resultado'] == {'exito': True}
+    assert final['terminado'] >= final['iniciado']
+    assert store.obtener('no-existe') is None
+
+
+def test_reinicio_recupera_cola_y_marca_interrumpidos(tmp_path):
+    path = tmp_path / 'jobs.sqlite3'
+    store = JobStore(path)
+    en_curso = store.crear('autotramite', {'n': 1})
+    store.marcar_ejecutando(en_curso['id'])
+    pendiente = store.crear('autotramite', {'n': 2})
+    store.cerrar()
+
+    ejecutados = []
+
+    async def ejecutor(payload, on_stage):
+        ejecutados.append(payload['n'])
+        return {'ok': True}
+
+    async def main():
+        store2 = JobStore(path)
+        cola = JobQueue(store2, {'autotramite': ejecutor}, concurrencia=1)
+        await cola.iniciar()
+        await cola.esperar_vacia()
+        await cola.detener()
+        return store2
+
+    store2 = asyncio.run(main())
+    assert ejecutados == [2]
+    interrumpido = store2.obtener(en_curso['id'])
+    assert interrumpido['estado'] == ERROR
+    assert interrumpido['error'] == MENSAJE_INTERRUMPIDO
+    assert store2.obtener(pendiente['id'])['estado'] == COMPLETADO
+
+
+def test_concurrencia_acotada_y_tiempos_por_etapa(tmp_path):
+    activos, pico = 0, 0
+
+    async def ejecutor(payload, on_stage):
+        nonlocal activos, pico
+        activos += 1
+        pico = max(pico, activos)
+        on_stage(EventoEtapa('login', 'inicio', 0.0))
+        await asyncio.sleep(0.02)
+        on_stage(EventoEtapa('login', 'fin', 0.02, 0.02))
+        activos -= 1
+        return {'n': payload['n']}
+
+    async def main():
+        cola = JobQueue(JobStore(tmp_path / 'jobs.sqlite3'), {'autotramite': ejecutor}, concurrencia=2, max_cola=10)
+        await cola.iniciar()
+        jobs = [cola.encolar('autotramite', {'n': i}) for i in range(6)]
+        await cola.esperar_vacia()
+        await cola.detener()
+        return [cola.store.obtener(j['id']) for j in jobs]
+
+    finales = asyncio.run(main())
+    assert pico == 2
+    assert all(j['estado'] == COMPLETADO for j in finales)
+    assert [j['resultado']['n'] for j in finales] == list(range(6))
+    assert finales[0]['timings'] == {'login': 0.02}
+
+
+def test_error_del_ejecutor_queda_en_el_trabajo(tmp_path):
+    async def ejecutor(payload, on_stage):
+        raise RuntimeError('portal caído')
+
+    async def main():
+        cola = JobQueue(JobStore(tmp_path / 'jobs.sqlite3'), {'autotramite': ejecutor}, concurrencia=1)
+        await cola.iniciar()
+        job = cola.encolar('autotramite', {})
+        await cola.esperar_vacia()
+        await cola.detener()
+        return cola.store.obtener(job['id'])
+
+    job = asyncio.run(main())
+    assert job['estado'] == ERROR
+    assert job['error'] == 'portal caído'
+
+
+def test_cola_llena_y_tipo_desconocido(tmp_path):
+    bloqueo = None
+
+    async def ejecutor(payload, on_stage):
+        await bloqueo.wait()
+        return {}
+
+    async def main():
+        nonlocal bloqueo
+        bloqueo = asyncio.Event()
+        cola = JobQueue(JobStore(tmp_path / 'jobs.sqlite3'), {'autotramite': ejecutor}, concurrencia=1, max_cola=2)
+        await cola.iniciar()
+        cola.encolar('autotramite', {})
+        await asyncio.sleep(0.01)  # El primero pasa a 'ejecutando'
+        assert cola.store.contar(EJECUTANDO) == 1
+        cola.encolar('autotramite', {})
+        cola.encolar('autotramite', {})
+        with pytest.raises(ColaLlenaError):
+            cola.encolar('autotramite', {})
+        with pytest.raises(ValueError):
+            cola.encolar('otro', {})
+        bloqueo.set()
+        await cola.esperar_vacia()
+        await cola.detener()
+
+    asyncio.run(main())
+
+
+def test_api_encola_y_expone_estado(tmp_path):
+    import api
+
+    contrato, errores = parsear_texto_contrato(_texto_base())
+    assert not errores
+
+    async def ejecutor(payload, on_stage):
+        on_stage(EventoEtapa('preview', 'inicio', 0.0))
+        await asyncio.sleep(0.05)
+        return {
+            'exito': True, 'correlation_id': payload['correlation_id'],
+            'metadata': {'timings': {'preview': 0.05, 'total': 0.06}},
+        }
+
+    headers = {'Authorization': f'Bearer {api.API_TOKEN}'}
+    with patch.object(api.settings, 'jobs_db_path', str(tmp_path / 'jobs.sqlite3')), \
+            patch.object(api, '_ejecutar_job_autotramite', ejecutor), \
+            TestClient(api.app) as client:
+        inicio = time.monotonic()
+        respuesta = client.post('/api/autotramite/jobs', headers=headers, json={
+            'datos': contrato.model_dump(mode='json'), 'modo': 'preview', 'correlation_id': 'tg-1',
+        })
+        assert respuesta.status_code == 202
+        assert time.monotonic() - inicio < 0.05 + 1.0
+        job_id = respuesta.json()['job_id']
+        assert respuesta.json()['status_url'] == f'/api/jobs/{job_id}'
+
+        for _ in range(100):
+            estado = client.get(f'/api/jobs/{job_id}', headers=headers).json()
+            if estado['estado'] == COMPLETADO:
+                break
+            time.sleep(0.01)
+
+        assert estado['resultado']['exito'] is True
+        assert estado['timings'] == {'preview': 0.05, 'total': 0.06}  # Los de metadata, no los de on_stage
+        assert estado['correlation_id'] == 'tg-1'
+        assert client.get('/api/jobs/no-existe', headers=headers).status_code == 404
+        invalido = client.post('/api/autotramite/jobs', headers=headers, json={
+            'datos': {}, 'correlation_id': 'tg-2',
+        })
+        assert invalido.status_code == 422
+
+
+def test_job_no_escribe_fuera_de_screenshots(tmp_path, monkeypatch):
+    import api
+
+    contrato, _ = parsear_texto_contrato(_texto_base())
+    rutas = []
+
+    async def ejecutar_contrato(contrato, modo, correlation_id, screenshot_path, on_stage=None):
+        rutas.append(screenshot_path)
+        return api.EjecutarResponse(exito=True, mensaje='ok', correlation_id=correlation_id)
+
+    monkeypatch.chdir(tmp_path)
+    payload = {'datos': contrato.model_dump(mode='json'), 'modo': 'preview', 'correlation_id': '../../etc/x y'}
+    with patch.object(api, '_ejecutar_contrato', ejecutar_contrato):
+        asyncio.run(api._ejecutar_job_autotramite(payload, lambda evento: None))
+
+    assert rutas == [str(Path('screenshots') / 'etcxy.pdf')]
@@ -0,0 +1,108 @@
+"""
+Tests de recarga en caliente de mail_config.yaml
+"""
+import os
+from unittest.mock import patch
+
+import pytest
+import yaml
+
+from src import mail_config
+from src.mail_config import MailConfigStore, aplanar
+
+BASE = '''
+remitente:
+  email: ventas@queirolo.cl
+plantillas:
+  default: plantilla.md
+historial:
+  enabled: true
+cc:
+  enabled: true
+  addresses: [a@queirolo.cl, no-es-email, b@queirolo.cl]
+visual:
+  firma:
+    incluir: true
+'''
+
+
+def _escribir(ruta, texto):
+    ruta.write_text(texto, encoding='utf-8')
+    estado = ruta.stat()
+    # Forzar mtime distinto aunque el sistema de archivos tenga baja resolución
+    os.utime(ruta, ns=(estado.st_atime_ns, estado.st_mtime_ns + 1_000_000))
+
+
+def test_aplanar_incluye_claves_intermedias():
+    planos = aplanar({'visual': {'firma': {'incluir': True}}, 'x': 1})
+    assert planos['visual.firma.incluir'] is True
+    assert planos['visual.firma'] == {'incluir': True}
+    assert planos['x'] == 1
+
+
+def test_vista_tipada_valida_cc_una_vez(tmp_path):
+    ruta = tmp_path / 'mail_config.yaml'
+    _escribir(ruta, BASE)
+    store = MailConfigStore(ruta, intervalo_chequeo=0)
+
+    with patch.object(mail_config, 'validar_email', wraps=mail_config.validar_email) as validar:
+        tipada = store.actual().tipada
+        llamadas = validar.call_count
+        for _ in range(10):
+            assert store.actual().tipada.cc_predeterminados == ('a@queirolo.cl', 'b@queirolo.cl')
+        assert validar.call_count == llamadas
+
+    assert tipada.cc_invalidos == ('no-es-email',)
+    assert tipada.errores == ()
+    assert store.actual().get('visual.firma.incluir') is True
+    assert store.actual().get('visual.firma.color', 'azul') == 'azul'
+
+
+def test_recarga_al_cambiar_y_conserva_version_valida(tmp_path):
+    ruta = tmp_path / 'mail_config.yaml'
+    _escribir(ruta, BASE)
+    store = MailConfigStore(ruta, intervalo_chequeo=0)
+    primera = store.actual()
+    assert store.actual() is primera
+
+    _escribir(ruta, BASE.replace('enabled: true\ncc', 'enabled: false\ncc'))
+    segunda = store.actual()
+    assert segunda is not primera
+    assert segunda.get('historial.enabled') is False
+
+    # YAML roto a medio editar: se mantiene la última versión válida
+    _escribir(ruta, 'remitente: [sin cerrar')
+    assert store.actual() is segunda
+
+    # Reemplazo atómico (editor que escribe a un temporal y renombra)
+    temporal = tmp_path / 'nuevo.yaml'
+    _escribir(temporal, BASE.replace('ventas@', 'otro@'))
+    os.replace(temporal, ruta)
+    assert store.actual().tipada.remitente_email == 'otro@queirolo.cl'
+
+
+def test_intervalo_de_chequeo_evita_stat_en_cada_lectura(tmp_path):
+    ruta = tmp_path / 'mail_config.yaml'
+    _escribir(ruta, BASE)
+    store = MailConfigStore(ruta, intervalo_chequeo=60)
+    store.actual()
+
+    with patch.object(mail_config, '_firma', wraps=mail_config._firma) as firma:
+        for _ in range(100):
+            store.actual()
+    assert firma.call_count == 0
+
+
+def test_errores_en_primera_carga(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        MailConfigStore(tmp_path / 'no_existe.yaml').actual()
+
+    ruta = tmp_path / 'roto.yaml'
+    ruta.write_text('remitente: [sin cerrar', encoding='utf-8')
+    with pytest.raises(yaml.YAMLError):
+        MailConfigStore(ruta).actual()
+
+    ruta.write_text('plantillas: {}\n', encoding='utf-8')
+    errores = MailConfigStore(ruta).actual().tipada.errores
+    assert 'Sección requerida faltante: remitente' in errores
+    assert 'Email de remitente inválido o faltante' in errores
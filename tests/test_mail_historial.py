@@ -0,0 +1,116 @@
+"""
+Tests del historial de envíos en SQLite
+"""
+import json
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+
+from src import mail_utils
+from src.mail_historial import HistorialEnvios
+
+
+def _registro(patente='FPYK.18-2', email='cl***@****.cl', exito=True, cuando=None):
+    return {
+        'metadata': {'timestamp': (cuando or datetime.now()).isoformat(), 'usuario': 'ventas@queirolo.cl'},
+        'destinatario': {'email': email, 'nombre_cliente': 'CAMILO MENA'},
+        'cc': {'count': 1, 'addresses': ['ge***@****.cl']},
+        'vehiculo': {'descripcion': f'CHEVROLET SAIL 2013 {patente}', 'patente': patente},
+        'email': {'asunto': 'Cierre', 'cuerpo_preview': 'Hola', 'cuerpo_completo': 'Hola Camilo'},
+        'resultado': {'exito': exito, 'mensaje': 'ok', 'duracion_ms': 120},
+    }
+
+
+@pytest.fixture
+def historial(tmp_path):
+    store = HistorialEnvios(tmp_path / 'historial.sqlite3')
+    yield store
+    store.cerrar()
+
+
+def test_busqueda_por_patente_destinatario_y_fecha(historial):
+    hace_10_dias = datetime.now() - timedelta(days=10)
+    historial.agregar(_registro('FPYK.18-2', cuando=hace_10_dias), email_destino='cliente@ejemplo.cl')
+    historial.agregar(_registro('BCDF-12'), email_destino='Otro@Ejemplo.cl')
+    historial.agregar(_registro('FPYK.18-2', exito=False), email_destino='cliente@ejemplo.cl')
+
+    por_patente = historial.buscar(patente='fpyk182')
+    assert len(por_patente) == 2
+    assert por_patente[0]['resultado']['exito'] is False  # Más reciente primero
+
+    # El email se guardó ofuscado pero se encuentra por su huella
+    assert len(historial.buscar(destinatario='otro@ejemplo.cl')) == 1
+    assert historial.buscar(destinatario='otro@ejemplo.cl')[0]['destinatario']['email'] == 'cl***@****.cl'
+
+    hoy = datetime.now().date()
+    assert len(historial.buscar(desde=hoy)) == 2
+    assert len(historial.buscar(hasta=(hace_10_dias).date())) == 1
+    assert len(historial.buscar(patente='FPYK.18-2', desde=hoy.isoformat(), hasta=hoy.isoformat())) == 1
+
+
+def test_retencion_por_cantidad_y_antiguedad(historial):
+    for dias in (40, 20, 5, 1, 0):
+        historial.agregar(_registro(cuando=datetime.now() - timedelta(days=dias)))
+
+    assert historial.aplicar_retencion(max_registros=4) == 1
+    assert historial.contar() == 4
+    assert historial.aplicar_retencion(max_dias=10) == 1
+    assert historial.contar() == 3
+    assert historial.aplicar_retencion() == 0
+
+
+def test_retencion_por_cantidad_conserva_los_mas_recientes_por_fecha(historial):
+    # Importados después (ids mayores) pero más antiguos: son los que se eliminan
+    for dias in (0, 1, 30, 60):
+        historial.agregar(_registro(patente=f'P{dias}', cuando=datetime.now() - timedelta(days=dias)))
+
+    assert historial.aplicar_retencion(max_registros=2) == 2
+    assert sorted(r['vehiculo']['patente'] for r in historial.buscar()) == ['P0', 'P1']
+
+
+def test_migracion_de_json_es_idempotente(historial, tmp_path):
+    directorio = tmp_path / 'enviados'
+    directorio.mkdir()
+    for i, patente in enumerate(['FPYK.18-2', 'BCDF-12']):
+        (directorio / f'20260101_12000{i}_{patente}.json').write_text(
+            json.dumps(_registro(patente)), encoding='utf-8'
+        )
+    (directorio / 'roto.json').write_text('{no es json', encoding='utf-8')
+
+    importados, omitidos, errores = historial.importar_json(directorio)
+    assert (importados, omitidos, len(errores)) == (2, 0, 1)
+
+    importados, omitidos, errores = historial.importar_json(directorio, borrar=True)
+    assert (importados, omitidos) == (0, 2)
+    assert historial.contar() == 2
+    assert [p.name for p in directorio.glob('*.json')] == ['roto.json']
+    assert historial.buscar(patente='BCDF12')[0]['email']['cuerpo_completo'] == 'Hola Camilo'
+
+
+def test_guardar_historial_envio_usa_sqlite(tmp_path):
+    config = {
+        'historial.enabled': True,
+        'historial.formato': 'sqlite',
+        'historial.db_path': str(tmp_path / 'historial.sqlite3'),
+        'historial.max_registros': 2,
+        'historial.campos_ofuscados': ['email_destinatario'],
+    }
+
+    def get_config(clave, default=None):
+        return config.get(clave, default)
+
+    with patch.object(mail_utils, 'get_config', side_effect=get_config):
+        for i in range(3):
+            ruta = mail_utils.guardar_historial_envio(
+                email_destino='cliente@ejemplo.cl', cc_emails=[], nombre_cliente='CAMILO',
+                vehiculo=f'SAIL ABCD-1{i}', patente=f'ABCD-1{i}', asunto='Cierre', cuerpo='Hola',
+                exito=True, mensaje='ok', duracion_ms=10,
+            )
+
+    historial = HistorialEnvios(ruta)
+    registros = historial.buscar(destinatario='cliente@ejemplo.cl')
+    assert [r['vehiculo']['patente'] for r in registros] == ['ABCD-12', 'ABCD-11']
+    assert registros[0]['destinatario']['email'] == 'cl***@****.cl'
+    assert not list(tmp_path.glob('*.json'))
+    historial.cerrar()
@@ -0,0 +1,187 @@
+"""
+Tests del outbox de envío masivo de correos
+"""
+import smtplib
+import time
+from unittest.mock import patch
+
+import pytest
+
+from src import mail_outbox
+from src.mail_outbox import (
+    ENVIADO, ENVIANDO, FALLIDO, PENDIENTE,
+    MailOutbox, OutboxWorker,
+    encolar_lote, es_error_transitorio, leer_csv_cierres,
+)
+from src.rate_limit import RateLimiter
+
+FICHA = '''Inscripción : FPYK.18-2
+DATOS DEL VEHICULO
+Tipo Vehículo : AUTOMOVIL Año : 2013
+Marca : CHEVROLET
+Modelo : SAIL II 1.4
+DATOS DEL PROPIETARIO
+Nombre : CAMILO IGNACIO MENA MALDONADO
+R.U.N. : 19.001.667-6
+Fec. adquisición: 07-05-2018'''
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    store = MailOutbox(tmp_path / 'outbox.sqlite3')
+    yield store
+    store.cerrar()
+
+
+@pytest.fixture(autouse=True)
+def sin_backoff():
+    with patch.object(mail_outbox.settings, 'mail_outbox_backoff_seconds', 0), \
+            patch.object(mail_outbox, 'guardar_historial_envio') as historial:
+        yield historial
+
+
+def _worker(outbox, enviar, **kwargs):
+    return OutboxWorker(outbox, enviar=enviar, limitador=RateLimiter(0), **kwargs)
+
+
+def test_transitorio_se_reintenta_y_registra_historial(outbox, sin_backoff):
+    fallas = [smtplib.SMTPServerDisconnected('corte'), smtplib.SMTPResponseException(451, b'greylist')]
+
+    def enviar(destinatario, asunto, cuerpo, cc=None):
+        if fallas:
+            raise fallas.pop(0)
+        return f'Email enviado exitosamente a {destinatario}'
+
+    mensaje = outbox.encolar('a@b.cl', 'Asunto', 'Cuerpo', cc=['c@d.cl'], patente='FPYK.18-2')
+    assert _worker(outbox, enviar).procesar_pendientes() == 3
+
+    final = outbox.obtener(mensaje['id'])
+    assert final['estado'] == ENVIADO and final['intentos'] == 3
+    sin_backoff.assert_called_once()
+    assert sin_backoff.call_args.kwargs['exito'] is True
+    assert sin_backoff.call_args.kwargs['cc_emails'] == ['c@d.cl']
+
+
+def test_permanente_y_agotado_quedan_fallidos(outbox, sin_backoff):
+    def rechazo(*args, **kwargs):
+        raise smtplib.SMTPRecipientsRefused({'a@b.cl': (550, b'no existe')})
+
+    def corte(*args, **kwargs):
+        raise smtplib.SMTPServerDisconnected('corte')
+
+    permanente = outbox.encolar('a@b.cl', 'Asunto', 'Cuerpo')
+    _worker(outbox, rechazo).procesar_pendientes()
+    assert outbox.obtener(permanente['id'])['intentos'] == 1
+
+    agotado = outbox.encolar('a@b.cl', 'Asunto', 'Cuerpo')
+    _worker(outbox, corte, max_intentos=2).procesar_pendientes()
+    final = outbox.obtener(agotado['id'])
+
+    assert outbox.obtener(permanente['id'])['estado'] == FALLIDO
+    assert final['estado'] == FALLIDO and final['intentos'] == 2
+    assert 'SMTPServerDisconnected' in final['mensaje']
+    assert [c.kwargs['exito'] for c in sin_backoff.call_args_list] == [False, False]
+
+
+def test_backoff_programa_el_reintento(outbox):
+    def corte(*args, **kwargs):
+        raise smtplib.SMTPServerDisconnected('corte')
+
+    mensaje = outbox.encolar('a@b.cl', 'Asunto', 'Cuerpo')
+    with patch.object(mail_outbox.settings, 'mail_outbox_backoff_seconds', 60):
+        assert _worker(outbox, corte).procesar_pendientes() == 1
+
+    pendiente = outbox.obtener(mensaje['id'])
+    assert pendiente['estado'] == PENDIENTE
+    assert pendiente['proximo_intento'] > pendiente['actualizado'] + 59
+    assert outbox.tomar_siguiente() is None
+
+
+def test_worker_en_segundo_plano_drena_la_cola(outbox):
+    worker = _worker(outbox, lambda *a, **k: 'ok', poll_segundos=5)
+    worker.iniciar()
+    try:
+        mensaje = outbox.encolar('a@b.cl', 'Asunto', 'Cuerpo')
+        worker.despertar()
+        limite = time.monotonic() + 2
+        while outbox.obtener(mensaje['id'])['estado'] != ENVIADO and time.monotonic() < limite:
+            time.sleep(0.01)
+    finally:
+        worker.detener()
+
+    assert outbox.obtener(mensaje['id'])['estado'] == ENVIADO
+    assert not worker.activo
+
+
+def test_clasificacion_de_errores():
+    assert es_error_transitorio(smtplib.SMTPServerDisconnected())
+    assert es_error_transitorio(ConnectionRefusedError())
+    assert es_error_transitorio(smtplib.SMTPDataError(421, b'demasiados mensajes'))
+    assert es_error_transitorio(smtplib.SMTPRecipientsRefused({'a@b.cl': (450, b'buzon ocupado')}))
+    assert not es_error_transitorio(smtplib.SMTPAuthenticationError(535, b'credenciales'))
+    assert not es_error_transitorio(smtplib.SMTPDataError(554, b'rechazado'))
+    assert not es_error_transitorio(ValueError('Email destinatario inválido'))
+
+
+def test_tomar_siguiente_no_entrega_dos_veces_y_recupera_interrumpidos(tmp_path):
+    ruta = tmp_path / 'outbox.sqlite3'
+    uno, otro = MailOutbox(ruta), MailOutbox(ruta)
+    uno.encolar('a@b.cl', 'Asunto', 'Cuerpo')
+
+    assert uno.tomar_siguiente()['estado'] == ENVIANDO
+    assert otro.tomar_siguiente() is None
+    # Mientras la reserva está vigente el correo es de `uno` (puede estar enviándose)
+    assert otro.recuperar_interrumpidos() == 0
+    vencida = time.time() + mail_outbox.settings.mail_outbox_lease_seconds + 1
+    with patch.object(mail_outbox.time, 'time', return_value=vencida):
+        assert otro.recuperar_interrumpidos() == 1
+    assert otro.resumen()[FALLIDO] == 1
+    assert otro.reintentar_fallidos() == 1
+    assert otro.resumen()[PENDIENTE] == 1
+    uno.cerrar()
+    otro.cerrar()
+
+
+def test_rate_limit_espacia_los_envios(outbox):
+    enviados = []
+    for i in range(3):
+        outbox.encolar(f'c{i}@b.cl', 'Asunto', 'Cuerpo')
+    worker = OutboxWorker(outbox, enviar=lambda *a, **k: enviados.append(a) or 'ok', limitador=RateLimiter(20))
+
+    with patch('src.rate_limit.time.sleep') as dormir:
+        worker.procesar_pendientes()
+
+    assert len(enviados) == 3
+    assert dormir.call_count == 2
+
+
+def test_csv_a_lote(outbox):
+    contenido = (
+        'email_destino;precio_acordado;fecha_pago;cc;ficha_registro\n'
+        f'cliente@ejemplo.cl;$17.000.000;01-02-2026 AL 05-02-2026;gerencia@ejemplo.cl;"{FICHA}"\n'
+        'otro@ejemplo.cl;$1;01-02-2026;;"sin ficha"\n'
+        'malo;$1;01-02-2026;;' + f'"{FICHA}"\n'
+    ).encode('utf-8')
+
+    with patch.object(mail_outbox, 'cargar_cc_predeterminados', return_value=[]), \
+            patch.object(mail_outbox.settings, 'smtp_host', 'smtp.test.cl'), \
+            patch.object(mail_outbox.settings, 'smtp_user', 'user@test.cl'):
+        filas, errores = leer_csv_cierres(contenido)
+        lote_id, errores_lote = encolar_lote(outbox, filas)
+
+    assert [f['linea'] for f in filas] == [2, 12]
+    assert errores and 'ficha_registro' in errores[0]
+    assert len(errores_lote) == 1 and 'Línea 12' in errores_lote[0]
+
+    mensajes = outbox.listar(lote_id)
+    assert len(mensajes) == 1
+    assert mensajes[0]['vehiculo'] == 'CHEVROLET SAIL II 1.4 2013 FPYK.18-2'
+    assert mensajes[0]['nombre_cliente'] == 'CAMILO IGNACIO MENA MALDONADO'
+    assert mensajes[0]['cc'] == ['gerencia@ejemplo.cl']
+    assert 'CHEVROLET' in mensajes[0]['asunto']
+
+
+def test_csv_sin_columnas_requeridas():
+    filas, errores = leer_csv_cierres('email_destino,precio_acordado\na@b.cl,1\n')
+    assert filas == []
+    assert 'fecha_pago' in errores[0] and 'ficha_registro' in errores[0]
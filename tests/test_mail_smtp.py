@@ -4,6 +4,15 @@ Tests unitarios para envío SMTP (mocked)
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 from src.mail_utils import enviar_email_smtp, validar_smtp_config, validar_datos_mail
+from src.smtp_pool import smtp_pool, cerrar_pool_smtp
+
+
+@pytest.fixture(autouse=True)
+def pool_limpio():
+    """Cada test parte sin conexiones SMTP ociosas en el pool global"""
+    smtp_pool.cerrar()
+    yield
+    smtp_pool.cerrar()
 
 
 @patch('src.mail_utils.settings')
@@ -58,6 +67,9 @@ def test_enviar_email_smtp_success(mock_smtp, mock_settings):
     assert mock_server.starttls.called
     assert mock_server.login.called
     assert mock_server.sendmail.called
+    # La conexión queda en el pool para el siguiente correo; se cierra al apagar
+    assert not mock_server.quit.called
+    cerrar_pool_smtp()
     assert mock_server.quit.called
 
 
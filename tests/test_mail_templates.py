@@ -0,0 +1,99 @@
+"""
+Tests de plantillas compiladas de Mail de Cierre
+"""
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src import mail_templates, mail_utils
+from src.mail_templates import (
+    cargar_plantilla, compilar_condicion, compilar_plantilla, contexto_condiciones, seleccionar_plantilla,
+)
+
+DATOS = '''DATOS DEL PROPIETARIO
+Nombre : CAMILO IGNACIO MENA MALDONADO
+R.U.N. : 19.001.667-6'''
+
+
+@pytest.fixture(autouse=True)
+def cache_limpio():
+    mail_templates.limpiar_cache()
+    yield
+    mail_templates.limpiar_cache()
+
+
+def test_render_en_una_pasada():
+    plantilla = compilar_plantilla('Hola {NOMBRE}, su {VEHICULO} ({DESCONOCIDO}) {NOMBRE}')
+    assert plantilla.placeholders == {'NOMBRE', 'VEHICULO', 'DESCONOCIDO'}
+    # Un valor que contiene otro placeholder no se vuelve a reemplazar
+    texto = plantilla.render({'NOMBRE': 'ANA', 'VEHICULO': 'auto {NOMBRE}'})
+    assert texto == 'Hola ANA, su auto {NOMBRE} ({DESCONOCIDO}) ANA'
+
+
+def test_cache_por_mtime(tmp_path):
+    ruta = tmp_path / 'plantilla.md'
+    ruta.write_text('Hola {NOMBRE_CLIENTE}', encoding='utf-8')
+
+    with patch.object(mail_templates, 'compilar_plantilla', wraps=compilar_plantilla) as compilar:
+        primera = cargar_plantilla(ruta)
+        assert cargar_plantilla(ruta) is primera
+        assert compilar.call_count == 1
+
+        ruta.write_text('Chao {NOMBRE_CLIENTE}', encoding='utf-8')
+        estado = ruta.stat()
+        os.utime(ruta, ns=(estado.st_atime_ns, estado.st_mtime_ns + 1_000_000))
+        assert cargar_plantilla(ruta).render({'NOMBRE_CLIENTE': 'ANA'}) == 'Chao ANA'
+        assert compilar.call_count == 2
+
+    with pytest.raises(FileNotFoundError):
+        cargar_plantilla(tmp_path / 'no_existe.md')
+
+
+def test_condiciones():
+    assert compilar_condicion('default')({})
+    mayor = compilar_condicion('precio > 25000000')
+    assert mayor(contexto_condiciones('LIQUIDO A RECIBIR $30.000.000'))
+    assert not mayor(contexto_condiciones('$17.000.000'))
+    assert not mayor(contexto_condiciones('a convenir'))
+    assert compilar_condicion('precio <= 25.000.000')(contexto_condiciones('$25.000.000'))
+    for invalida in ('precio >', 'kilometraje > 10', '__import__("os")'):
+        with pytest.raises(ValueError):
+            compilar_condicion(invalida)
+
+
+def test_seleccion_de_alternativa(tmp_path):
+    default = tmp_path / 'plantilla.md'
+    premium = tmp_path / 'plantilla_premium.md'
+    default.write_text('estandar', encoding='utf-8')
+    alternativas = [
+        {'nombre': 'Premium', 'archivo': 'plantilla_premium.md', 'condicion': 'precio > 25000000'},
+        {'nombre': 'Rota', 'archivo': 'x.md', 'condicion': 'precio ~ 1'},
+        {'nombre': 'Estandar', 'archivo': 'plantilla.md', 'condicion': 'default'},
+    ]
+    caro = contexto_condiciones('$30.000.000')
+
+    # La premium aplica pero su archivo no existe: cae en la estándar
+    assert seleccionar_plantilla(alternativas, default, caro) == default
+    premium.write_text('premium', encoding='utf-8')
+    assert seleccionar_plantilla(alternativas, default, caro) == premium
+    assert seleccionar_plantilla(alternativas, default, contexto_condiciones('$1.000')) == default
+    assert seleccionar_plantilla(None, default, caro) == default
+
+
+def test_generar_email_con_plantilla_del_repo():
+    asunto, cuerpo = mail_utils.generar_email_desde_plantilla(
+        DATOS, 'CHEVROLET SAIL 2013 FPYK.18-2', 'LIQUIDO A RECIBIR $17.000.000', '01-02-2026 AL 05-02-2026'
+    )
+    assert asunto == 'Confirmación de Cierre de Negocio – CHEVROLET SAIL 2013 FPYK.18-2'
+    assert 'CAMILO IGNACIO MENA MALDONADO' in cuerpo
+    assert '$17.000.000' in cuerpo and DATOS in cuerpo
+    assert not mail_templates.PATRON_PLACEHOLDER.search(cuerpo)
+
+
+def test_generar_email_ruta_explicita(tmp_path):
+    ruta = tmp_path / 'otra.md'
+    ruta.write_text('{NOMBRE_CLIENTE} / {FECHA_PAGO}', encoding='utf-8')
+    _, cuerpo = mail_utils.generar_email_desde_plantilla(DATOS, 'AUTO', '$1', 'HOY', plantilla_path=Path(ruta))
+    assert cuerpo == 'CAMILO IGNACIO MENA MALDONADO / HOY'
@@ -0,0 +1,82 @@
+"""
+Tests del portal AutoTramite simulado (sin navegador, vía urllib)
+"""
+import http.cookiejar
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from benchmarks.mock_portal import MockPortal, MockPortalConfig, PDF_PATH, PREVIEW_PATH
+from src.config import SELECTORS
+
+
+def _cliente():
+    jar = http.cookiejar.CookieJar()
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+
+
+def _login(portal, cliente, password='bench'):
+    datos = urllib.parse.urlencode({'correo': portal.estado.config.email, 'clave': password}).encode()
+    return cliente.open(portal.login_url, data=datos)
+
+
+def test_flujo_completo_login_formulario_preview_registro():
+    with MockPortal() as portal:
+        cliente = _cliente()
+
+        # Sin sesión redirige a login
+        assert 'login.php' in cliente.open(portal.form_url).geturl()
+
+        respuesta = _login(portal, cliente)
+        assert respuesta.geturl() == portal.form_url
+        html = respuesta.read().decode()
+        for clave, selector in SELECTORS.items():
+            if selector.startswith('#') and not clave.startswith('login_'):
+                assert f'id="{selector[1:]}"' in html, clave
+
+        query = urllib.parse.urlencode({SELECTORS['vehiculo_patente'][1:]: 'BCDF12'})
+        preview = cliente.open(f'{portal.base_url}{PREVIEW_PATH}?{query}').read().decode()
+        assert 'Registrar Operacion' in preview
+        borrador = preview.split('name="borrador" value="')[1].split('"')[0]
+
+        pdf = cliente.open(f'{portal.base_url}{PDF_PATH}?borrador={borrador}')
+        assert pdf.headers['Content-Type'] == 'application/pdf'
+        assert pdf.read().startswith(b'%PDF')
+
+        datos = urllib.parse.urlencode({'borrador': borrador, 'accion': 'guardar_contrato'}).encode()
+        registrado = cliente.open(f'{portal.base_url}{PREVIEW_PATH}', data=datos).read().decode()
+        assert 'id="numero-operacion"' in registrado
+        assert len(portal.estado.registros) == 1
+
+
+def test_credenciales_invalidas_quedan_en_login():
+    with MockPortal() as portal:
+        respuesta = _login(portal, _cliente(), password='otra')
+        assert 'login.php' in respuesta.geturl()
+        assert 'Credenciales' in respuesta.read().decode()
+
+
+def test_latencia_y_fallas_inyectadas():
+    config = MockPortalConfig(latency_ms=50, fail_rate=1.0, fail_on=('form',))
+    with MockPortal(config) as portal:
+        cliente = _cliente()
+        inicio = time.monotonic()
+        try:
+            _login(portal, cliente)
+            raise AssertionError('debió fallar el formulario')
+        except urllib.error.HTTPError as e:
+            assert e.code == 500
+        assert time.monotonic() - inicio >= 0.1  # login + redirect al formulario
+        assert portal.estado.fallas == 1
+
+
+def test_configurar_y_restaurar_settings():
+    from src.config import settings
+
+    original = settings.autotramite_form_url
+    with MockPortal() as portal:
+        anteriores = portal.configurar_settings()
+        assert settings.autotramite_form_url == portal.form_url
+        MockPortal.restaurar_settings(anteriores)
+    assert settings.autotramite_form_url == original
@@ -1,4 +1,4 @@
-from src.models import parsear_texto_contrato
+from src.models import _tokenizar_bloques, parsear_texto_contrato
 
 
 def _texto_base(tipo_vehiculo: str = 'AUTOMOVIL') -> str:
@@ -108,3 +108,27 @@ def test_normaliza_motor_y_chasis_fraccionados_en_dos_bloques():
     assert contrato is not None
     assert contrato.vehiculo.motor == 'SJNFBAJ11NA992989'
     assert contrato.vehiculo.chasis == 'LSGSA58M4DY101211'
+
+
+def test_tokenizador_bloques_por_offsets_y_encabezado_preferido():
+    texto = '\nDATOS PROPIETARIO\nNombre : OTRO\n' + _texto_base()
+    bloques = _tokenizar_bloques(texto)
+
+    vendedor = bloques['vendedor']
+    assert vendedor.texto is texto
+    assert texto[vendedor.inicio:vendedor.fin].startswith('Nombre : DENNYS')
+    assert texto[vendedor.inicio:vendedor.fin].endswith('Correo: dparra@queirolo.cl')
+    assert set(bloques) == {'vehiculo', 'vendedor', 'comprador'}
+
+
+def test_parsea_texto_largo_con_relleno_en_cada_bloque():
+    relleno = ''.join(f'Anotacion {i} : sin datos\n' for i in range(500))
+    texto = _texto_base().replace('\n\nDATOS', f'\n{relleno}\nDATOS')
+
+    contrato, errores = parsear_texto_contrato(texto)
+
+    assert not errores
+    assert contrato is not None
+    assert contrato.vehiculo.color == 'ROJO'
+    assert contrato.comprador.email == 'comprador@ejemplo.cl'
+    assert contrato.valor_venta == 9500000
@@ -0,0 +1,88 @@
+"""
+Tests del registro de parsers (TAG, correo de cierre, ficha de registro)
+"""
+from datetime import date
+
+import pytest
+
+from src.parsers import Campo, Formato, mapping_tag, parsear, parsear_correo_raw
+from src.mail_utils import parsear_ficha_registro
+
+FICHA = """Inscripción : FPYK.18-2
+DATOS DEL VEHICULO
+Tipo Vehículo : AUTOMOVIL Año : 2013
+Marca : CHEVROLET
+Modelo : SAIL II 1.4
+DATOS DEL PROPIETARIO
+Nombre : camilo ignacio mena maldonado
+R.U.N. : 19.001.667-6
+Fec. adquisición: 07-05-2018"""
+
+
+def test_formato_una_pasada_primera_aparicion_gana():
+    formato = Formato('prueba', [
+        Campo('nombre', r'Nombre'),
+        Campo('anio', r'A[ñn]o', valor=r'\d{4}', inicio_linea=False),
+    ])
+    texto = 'Tipo : AUTO Año : 2013\n  nombre :  Ana  \nNombre : Otra\nSobreaño : 1999'
+    assert formato.parsear(texto) == {'nombre': 'Ana', 'anio': '2013'}
+    assert formato.parsear('Nombre :\nAño : x') == {'nombre': None, 'anio': None}
+
+
+def test_mapping_tag_normaliza_y_respeta_overrides():
+    texto = """Nombre: Camilo Mena
+RUT: 19.001.667-k
+Direccion: Av. Los Leones 1234, Providencia.
+Telefono: +56 9 1234 5678
+Correo: cliente@ejemplo.cl
+PATENTE: KYTR.55-5
+TAG - 147258369"""
+    mapping = mapping_tag(texto, fecha=date(2026, 10, 17))
+    assert (mapping['CAMPO1'], mapping['CAMPO2'], mapping['CAMPO3']) == ('17', 'OCTUBRE', '2026')
+    assert mapping['CAMPO5'] == '19001667-K'
+    assert (mapping['CAMPO7'], mapping['CAMPO8']) == ('AV. LOS LEONES 1234', 'PROVIDENCIA')
+    assert mapping['CAMPO10'] == '912345678'
+    assert (mapping['CAMPO11'], mapping['CAMPO12']) == ('CLIENTE', 'EJEMPLO.CL')
+    assert (mapping['CAMPO13'], mapping['CAMPO14']) == ('147258369', 'KYTR55-5')
+
+    reemplazado = mapping_tag(texto, patente='bcdf12', tag='999')
+    assert (reemplazado['CAMPO13'], reemplazado['CAMPO15']) == ('999', 'BCDF1-2')
+
+
+def test_correo_raw_con_propietario_multilinea():
+    datos = parsear_correo_raw("""DATOS_PROPIETARIO:
+Nombre : ORIANA ARAYA
+R.U.N. : 10.982.440-2
+VEHICULO: CHEVROLET SAIL 2013
+PRECIO: $5.000.000
+EMAIL: cliente@ejemplo.cl
+CC: a@b.cl; no-es-correo, c@d.cl""")
+    assert datos['datos_propietario'] == 'Nombre : ORIANA ARAYA\nR.U.N. : 10.982.440-2'
+    assert datos['vehiculo'] == 'CHEVROLET SAIL 2013'
+    assert datos['fecha_pago'] == ''
+    assert datos['cc'] == ['a@b.cl', 'c@d.cl']
+
+    with pytest.raises(ValueError, match='EMAIL'):
+        parsear_correo_raw('VEHICULO: X')
+
+
+def test_ficha_registro_y_registro_por_nombre():
+    ficha = parsear_ficha_registro(FICHA)
+    assert ficha['vehiculo_final'] == 'CHEVROLET SAIL II 1.4 2013 FPYK.18-2'
+    assert ficha['nombre_cliente'] == 'CAMILO IGNACIO MENA MALDONADO'
+    assert ficha['fec_adquisicion'] == '07-05-2018'
+    assert parsear_ficha_registro(FICHA.replace('Marca', 'Fabricante')) is None
+
+    assert parsear('propietario', FICHA) == {'nombre': 'camilo ignacio mena maldonado'}
+    with pytest.raises(KeyError):
+        parsear('desconocido', FICHA)
+
+
+def test_ficha_registro_con_varias_etiquetas_en_la_misma_linea():
+    ficha = parsear_ficha_registro("""Inscripción : BCDF.12-3 Marca : KIA Año : 2015
+Modelo : RIO 5
+Nombre : ANA ROJAS R.U.N. : 12.345.678-5 Fec. adquisición: 01-02-2020""")
+    assert ficha['vehiculo_final'] == 'KIA RIO 5 2015 BCDF.12-3'
+    assert ficha['nombre_cliente'] == 'ANA ROJAS'
+    assert ficha['fec_adquisicion'] == '01-02-2020'
+    assert parsear('ficha_registro', 'Marca : KIA Año : 2015')['marca'] == 'KIA'
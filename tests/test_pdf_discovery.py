@@ -0,0 +1,152 @@
+"""
+Tests de búsqueda de candidatos PDF (un evaluate) y descarga concurrente
+"""
+import asyncio
+
+from src.autotramite import (
+    buscar_candidatos_pdf,
+    candidatos_pdf_en_html,
+    descargar_primer_pdf,
+    normalizar_url_pdf,
+    priorizar_candidatos_pdf,
+)
+
+BASE = 'https://portal.test/secciones/generaContrato.php'
+
+
+class FakeFrame:
+    def __init__(self, url):
+        self.url = url
+
+
+class FakePage:
+    def __init__(self, data, url=BASE, frames=()):
+        self.data = data
+        self.url = url
+        self.frames = [FakeFrame(u) for u in frames]
+        self.evaluates = 0
+
+    async def evaluate(self, script, arg=None):
+        self.evaluates += 1
+        return self.data
+
+
+class FakeResponse:
+    def __init__(self, body, status=200, content_type='application/pdf'):
+        self._body = body
+        self.status = status
+        self.ok = 200 <= status < 300
+        self.headers = {'content-type': content_type}
+
+    async def body(self):
+        return self._body
+
+
+class FakeRequest:
+    """APIRequestContext falso: url -> (demora en segundos, FakeResponse)"""
+
+    def __init__(self, rutas):
+        self.rutas = rutas
+        self.pedidas: list[str] = []
+        self.canceladas: list[str] = []
+
+    async def get(self, url, headers=None):
+        self.pedidas.append(url)
+        demora, respuesta = self.rutas.get(url, (0, FakeResponse(b'', status=404)))
+        try:
+            await asyncio.sleep(demora)
+        except asyncio.CancelledError:
+            self.canceladas.append(url)
+            raise
+        return respuesta
+
+
+def test_normalizar_url_extrae_file_y_relativas():
+    visor = 'https://portal.test/pdfjs/web/viewer.html?file=%2Fpdf%2Fc1.pdf'
+    assert normalizar_url_pdf(visor, BASE) == 'https://portal.test/pdf/c1.pdf'
+    assert normalizar_url_pdf('../pdf/c2.pdf', BASE) == 'https://portal.test/pdf/c2.pdf'
+    assert normalizar_url_pdf('//cdn.test/c3.pdf', BASE) == 'https://cdn.test/c3.pdf'
+    assert normalizar_url_pdf('blob:https://portal.test/x', BASE) is None
+    assert normalizar_url_pdf('  ', BASE) is None
+
+
+def test_priorizar_ordena_por_regla_y_deduplica():
+    candidatos = [
+        '/secciones/contrato.php?id=1',
+        '/secciones/generaContrato.php?b=1',
+        '/pdf/c1.pdf',
+        '/pdf/c1.pdf',
+        '/imagenes/logo.png',
+        '/pdf_autotramite/x',
+    ]
+    assert priorizar_candidatos_pdf(candidatos, BASE) == [
+        'https://portal.test/pdf/c1.pdf',
+        'https://portal.test/secciones/generaContrato.php?b=1',
+        'https://portal.test/pdf_autotramite/x',
+        'https://portal.test/secciones/contrato.php?id=1',
+    ]
+
+
+def test_candidatos_en_html():
+    html = '<a href="/pdf/c9.pdf">x</a><iframe src="viewer.html?file=/pdf/c8.pdf"></iframe><img src="/logo.png">'
+    candidatos = candidatos_pdf_en_html(html)
+    assert '/pdf/c8.pdf' in candidatos
+    assert '/pdf/c9.pdf' in candidatos
+    assert '/logo.png' not in candidatos
+
+
+def test_buscar_candidatos_un_solo_evaluate():
+    page = FakePage(
+        {'candidatos': ['/pdf/c1.pdf', 'about:blank'], 'base64': 'JVBERi0='},
+        frames=['https://portal.test/pdf/frame.pdf'],
+    )
+    urls, b64 = asyncio.run(buscar_candidatos_pdf(page))
+
+    assert page.evaluates == 1
+    assert urls[:2] == ['https://portal.test/pdf/c1.pdf', 'https://portal.test/pdf/frame.pdf']
+    assert BASE in urls
+    assert b64 == 'JVBERi0='
+
+
+def test_buscar_candidatos_tolera_error_de_evaluate():
+    class PaginaRota(FakePage):
+        async def evaluate(self, script, arg=None):
+            raise RuntimeError('contexto destruido')
+
+    urls, b64 = asyncio.run(buscar_candidatos_pdf(PaginaRota({})))
+    assert urls == [BASE]
+    assert b64 is None
+
+
+def test_gana_el_primer_pdf_valido_y_cancela_el_resto():
+    lento, rapido, roto = 'https://p/lento.pdf', 'https://p/rapido.pdf', 'https://p/roto.pdf'
+    request = FakeRequest({
+        lento: (1.0, FakeResponse(b'%PDF-1.4 lento')),
+        roto: (0.0, FakeResponse(b'<html>no</html>', content_type='text/html')),
+        rapido: (0.01, FakeResponse(b'%PDF-1.4 rapido')),
+    })
+
+    resultado = asyncio.run(descargar_primer_pdf(request, [lento, roto, rapido], BASE))
+
+    assert resultado == (rapido, b'%PDF-1.4 rapido')
+    assert request.canceladas == [lento]
+
+
+def test_respuesta_html_agrega_candidatos_anidados():
+    pagina = 'https://p/secciones/generaContrato.php'
+    request = FakeRequest({
+        pagina: (0, FakeResponse(b'<embed src="/pdf/final.pdf">', content_type='text/html')),
+        'https://p/pdf/final.pdf': (0, FakeResponse(b'%PDF-1.7 final')),
+    })
+
+    resultado = asyncio.run(descargar_primer_pdf(request, [pagina], BASE))
+
+    assert resultado == ('https://p/pdf/final.pdf', b'%PDF-1.7 final')
+
+
+def test_sin_pdf_valido_retorna_none_y_respeta_tope():
+    urls = [f'https://p/{i}.pdf' for i in range(5)]
+    request = FakeRequest({u: (0, FakeResponse(b'nope', content_type='text/plain')) for u in urls})
+
+    assert asyncio.run(descargar_primer_pdf(request, urls, BASE, max_candidatos=3)) is None
+    assert len(request.pedidas) == 3
@@ -0,0 +1,35 @@
+"""
+Tests unitarios para el rate limiter (token bucket)
+"""
+import asyncio
+import time
+
+from src.rate_limit import RateLimiter, limitador_portal
+
+
+def test_rafaga_sin_espera():
+    limitador = RateLimiter(tasa_por_segundo=10, rafaga=3)
+    esperas = [limitador.adquirir_sync() for _ in range(3)]
+    assert esperas == [0.0, 0.0, 0.0]
+
+
+def test_respeta_tasa_async():
+    limitador = RateLimiter(tasa_por_segundo=50, rafaga=1)
+
+    async def escenario():
+        inicio = time.monotonic()
+        await asyncio.gather(*(limitador.adquirir() for _ in range(5)))
+        return time.monotonic() - inicio
+
+    # 1 inmediata + 4 a 50/s = ~0.08s
+    assert asyncio.run(escenario()) >= 0.07
+
+
+def test_tasa_cero_sin_limite():
+    limitador = RateLimiter(tasa_por_segundo=0)
+    assert all(limitador.adquirir_sync() == 0 for _ in range(100))
+
+
+def test_limitador_compartido_por_host():
+    assert limitador_portal('https://autotramite.cl/a') is limitador_portal('https://AUTOTRAMITE.cl/b')
+    assert limitador_portal('https://autotramite.cl') is not limitador_portal('https://otro.cl')
@@ -0,0 +1,82 @@
+"""
+Tests unitarios para el perfil de ruteo de requests (contexto simulado)
+"""
+import asyncio
+
+from src.request_routing import PerfilRuteo, aplicar_ruteo
+
+
+class FakeRequest:
+    def __init__(self, url, resource_type, tamano=0):
+        self.url = url
+        self.resource_type = resource_type
+        self.tamano = tamano
+
+    async def sizes(self):
+        return {'responseBodySize': self.tamano, 'responseHeadersSize': 0}
+
+
+class FakeRoute:
+    def __init__(self):
+        self.resultado = None
+
+    async def abort(self, error_code=None):
+        self.resultado = 'abort'
+
+    async def continue_(self):
+        self.resultado = 'continue'
+
+
+class FakeContext:
+    def __init__(self):
+        self.handler = None
+        self.listeners = {}
+
+    async def route(self, pattern, handler):
+        self.handler = handler
+
+    def on(self, evento, callback):
+        self.listeners[evento] = callback
+
+
+def test_perfil_desde_config_bloquea_recursos_y_analytics():
+    perfil = PerfilRuteo.desde_config()
+    assert perfil.bloquear('https://autotramite.cl/img/logo.png', 'image')
+    assert perfil.bloquear('https://autotramite.cl/fonts/a.woff2', 'font')
+    assert perfil.bloquear('https://www.googletagmanager.com/gtm.js', 'script')
+    assert not perfil.bloquear('https://autotramite.cl/js/app.js', 'script')
+
+
+def test_pdf_y_formulario_siempre_permitidos():
+    perfil = PerfilRuteo(
+        tipos_bloqueados=frozenset({'image', 'document'}),
+        patrones_bloqueados=('autotramite.cl',),
+        patrones_permitidos=('generacontrato.php', '.pdf'),
+    )
+    assert not perfil.bloquear('https://autotramite.cl/generaContrato.php?id=1', 'document')
+    assert not perfil.bloquear('https://autotramite.cl/tmp/contrato.pdf', 'other')
+    assert perfil.bloquear('https://autotramite.cl/otra.php', 'document')
+
+
+def test_aplicar_ruteo_cuenta_requests_y_bytes():
+    async def escenario():
+        context = FakeContext()
+        perfil = PerfilRuteo(tipos_bloqueados=frozenset({'image'}), patrones_bloqueados=())
+        estadisticas = await aplicar_ruteo(context, perfil)
+
+        bloqueada, permitida = FakeRoute(), FakeRoute()
+        await context.handler(bloqueada, FakeRequest('https://x/logo.png', 'image'))
+        request = FakeRequest('https://x/form.php', 'document', tamano=1234)
+        await context.handler(permitida, request)
+        context.listeners['requestfinished'](request)
+
+        return bloqueada, permitida, await estadisticas.resumen()
+
+    bloqueada, permitida, resumen = asyncio.run(escenario())
+    assert bloqueada.resultado == 'abort'
+    assert permitida.resultado == 'continue'
+    assert resumen['bloqueados'] == 1
+    assert resumen['bloqueados_por_tipo'] == {'image': 1}
+    assert resumen['bytes_bloqueados_estimados'] > 0
+    assert resumen['permitidos'] == 1
+    assert resumen['bytes_permitidos'] == 1234
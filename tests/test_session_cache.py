@@ -0,0 +1,82 @@
+"""
+Tests unitarios para el cache cifrado de sesión y el lock de login
+"""
+import asyncio
+import time
+
+from src.session_cache import SessionCache, LoginLock
+
+STATE = {'cookies': [{'name': 'PHPSESSID', 'value': 'abc123', 'domain': 'autotramite.cl', 'path': '/'}], 'origins': []}
+
+
+def test_guardar_y_cargar_roundtrip(tmp_path):
+    cache = SessionCache(path=str(tmp_path / 'sesion.enc'), ttl_minutos=60, secreto='secreto')
+    cache.guardar(STATE)
+
+    assert cache.cargar() == STATE
+    # El archivo en disco no contiene la cookie en texto plano
+    assert b'abc123' not in (tmp_path / 'sesion.enc').read_bytes()
+
+
+def test_clave_distinta_descarta_cache(tmp_path):
+    path = str(tmp_path / 'sesion.enc')
+    SessionCache(path=path, secreto='uno').guardar(STATE)
+
+    otro = SessionCache(path=path, secreto='dos')
+    assert otro.cargar() is None
+    assert not (tmp_path / 'sesion.enc').exists()
+
+
+def test_ttl_expirado(tmp_path, monkeypatch):
+    cache = SessionCache(path=str(tmp_path / 'sesion.enc'), ttl_minutos=1, secreto='secreto')
+    cache.guardar(STATE)
+
+    ahora = time.time()
+    monkeypatch.setattr('src.session_cache.time.time', lambda: ahora + 120)
+    assert cache.cargar() is None
+
+
+def test_login_lock_single_flight(tmp_path):
+    lock = LoginLock(tmp_path / 'login.lock')
+    activos = 0
+    maximo = 0
+
+    async def login():
+        nonlocal activos, maximo
+        async with lock:
+            activos += 1
+            maximo = max(maximo, activos)
+            await asyncio.sleep(0.01)
+            activos -= 1
+
+    async def escenario():
+        await asyncio.gather(*(login() for _ in range(4)))
+
+    asyncio.run(escenario())
+    assert maximo == 1
+    assert not (tmp_path / 'login.lock').exists()
+
+
+def test_login_lock_largo_no_se_considera_abandonado(tmp_path):
+    """Un login con reintentos más largo que stale_segundos conserva el lock"""
+    ruta = tmp_path / 'login.lock'
+    dueno, otro = LoginLock(ruta, stale_segundos=0.15), LoginLock(ruta, stale_segundos=0.15)
+    orden = []
+
+    async def login_largo():
+        async with dueno:
+            orden.append('inicio')
+            await asyncio.sleep(0.5)
+            orden.append('fin')
+
+    async def esperar_lock():
+        await asyncio.sleep(0.05)
+        async with otro:
+            orden.append('otro')
+
+    async def escenario():
+        await asyncio.gather(login_largo(), esperar_lock())
+
+    asyncio.run(escenario())
+    assert orden == ['inicio', 'fin', 'otro']
+    assert not ruta.exists()
@@ -0,0 +1,110 @@
+"""
+Tests del pool de conexiones SMTP (contra el servidor SMTP local del benchmark)
+"""
+import smtplib
+import socket
+from unittest.mock import patch
+
+import pytest
+
+from benchmarks.bench_smtp import PASSWORD, USUARIO, SMTPStandIn, SMTPStandInConfig
+from src.smtp_pool import SMTPPool
+
+
+@pytest.fixture
+def servidor():
+    with SMTPStandIn(SMTPStandInConfig(handshake_ms=0, login_ms=0, mensaje_ms=0)) as stand_in:
+        yield stand_in
+
+
+def _enviar(pool, servidor, i=0):
+    pool.enviar(
+        servidor.host, servidor.port, USUARIO, PASSWORD, 'none',
+        USUARIO, [f'cliente{i}@ejemplo.cl'], f'Subject: {i}\r\n\r\ncuerpo {i}'
+    )
+
+
+def test_reutiliza_conexion_autenticada(servidor):
+    pool = SMTPPool(max_ociosas=2, noop_despues_segundos=60)
+    for i in range(5):
+        _enviar(pool, servidor, i)
+    pool.cerrar()
+
+    assert len(servidor.estado.mensajes) == 5
+    assert servidor.estado.conexiones == 1
+    assert servidor.estado.logins == 1
+    assert pool.estadisticas['reutilizadas'] == 4
+
+
+def test_noop_valida_ociosas_y_descarta_las_caidas(servidor):
+    pool = SMTPPool(max_ociosas=2, noop_despues_segundos=0)
+    _enviar(pool, servidor, 0)
+    _enviar(pool, servidor, 1)
+    assert servidor.estado.noops == 1
+
+    # Conexión ociosa cortada: el NOOP falla y se abre otra
+    with pool._lock:
+        pool._ociosas[next(iter(pool._ociosas))][0].server.sock.shutdown(socket.SHUT_RDWR)
+    _enviar(pool, servidor, 2)
+    pool.cerrar()
+
+    assert len(servidor.estado.mensajes) == 3
+    assert servidor.estado.conexiones == 2
+    assert pool.estadisticas['descartadas'] == 1
+
+
+def test_reconecta_si_el_servidor_corto_la_conexion(servidor):
+    servidor.estado.config.cortar_despues = 1
+    # Sin NOOP previo: el corte se descubre recién al enviar
+    pool = SMTPPool(max_ociosas=2, noop_despues_segundos=60)
+    for i in range(3):
+        _enviar(pool, servidor, i)
+    pool.cerrar()
+
+    assert len(servidor.estado.mensajes) == 3
+    assert servidor.estado.conexiones == 3
+    assert pool.estadisticas['reconexiones'] == 2
+
+
+def test_error_en_conexion_nueva_no_se_reintenta(servidor):
+    pool = SMTPPool()
+    with pytest.raises(smtplib.SMTPAuthenticationError):
+        pool.enviar(servidor.host, servidor.port, USUARIO, 'incorrecta', 'none', USUARIO, ['a@b.cl'], 'x')
+    assert pool.ociosas() == 0
+    assert pool.estadisticas['reconexiones'] == 0
+
+
+def test_tope_de_ociosas_y_max_mensajes(servidor):
+    pool = SMTPPool(max_ociosas=1, max_mensajes=2, noop_despues_segundos=60)
+    with pool.conexion(servidor.host, servidor.port, USUARIO, PASSWORD) as (a, _), \
+            pool.conexion(servidor.host, servidor.port, USUARIO, PASSWORD) as (b, _):
+        assert a is not b
+    assert pool.ociosas() == 1
+
+    # La ociosa ya lleva 1 mensaje: con el segundo se recicla
+    with pool.conexion(servidor.host, servidor.port, USUARIO, PASSWORD) as (c, reutilizada):
+        assert reutilizada
+    assert pool.ociosas() == 0
+    assert pool.estadisticas['descartadas'] == 2
+    pool.cerrar()
+
+
+def test_enviar_email_smtp_sin_pool_abre_una_conexion_por_correo(servidor):
+    import src.mail_utils as mail_utils
+    from src.config import settings
+
+    anteriores = servidor.configurar_settings()
+    try:
+        with patch.object(settings, 'smtp_pool_enabled', False):
+            for i in range(2):
+                assert mail_utils.enviar_email_smtp(f'c{i}@ejemplo.cl', 'Asunto', 'Cuerpo')[0]
+        with patch.object(settings, 'smtp_pool_enabled', True), \
+                patch.object(mail_utils, 'smtp_pool', SMTPPool()) as pool:
+            for i in range(2):
+                assert mail_utils.enviar_email_smtp(f'c{i}@ejemplo.cl', 'Asunto', 'Cuerpo')[0]
+            pool.cerrar()
+    finally:
+        SMTPStandIn.restaurar_settings(anteriores)
+
+    assert len(servidor.estado.mensajes) == 4
+    assert servidor.estado.conexiones == 3
@@ -0,0 +1,103 @@
+"""
+Tests de eventos estructurados y tiempos por etapa
+"""
+import asyncio
+
+import pytest
+
+from src.stage_events import (
+    PREFIJO_EVENTO,
+    EventoEtapa,
+    RegistroEtapas,
+    etapa,
+    evento_a_linea,
+    iniciar_registro,
+    linea_a_evento,
+    registro_actual,
+)
+
+
+def test_registro_acumula_duracion_de_etapas_repetidas():
+    registro = RegistroEtapas()
+    registro.registrar('login', 0.5)
+    registro.registrar('login', 0.25)
+    registro.registrar('preview', 1.0)
+
+    assert registro.timings == {'login': 0.75, 'preview': 1.0}
+
+
+def test_callback_recibe_inicio_y_fin_con_contexto():
+    eventos: list[EventoEtapa] = []
+    registro = RegistroEtapas(eventos.append, {'indice': 2})
+
+    with registro.etapa('form_goto', url='x') as detalle:
+        detalle['reutilizado'] = True
+
+    assert [e.estado for e in eventos] == ['inicio', 'fin']
+    assert eventos[1].detalle == {'indice': 2, 'url': 'x', 'reutilizado': True}
+    assert eventos[1].duracion is not None
+    assert 'form_goto' in registro.timings
+
+
+def test_error_emite_evento_y_registra_tiempo():
+    eventos: list[EventoEtapa] = []
+    registro = RegistroEtapas(eventos.append)
+
+    with pytest.raises(ValueError):
+        with registro.etapa('register'):
+            raise ValueError('boom')
+
+    assert eventos[-1].estado == 'error'
+    assert eventos[-1].detalle['error'] == 'boom'
+    assert 'register' in registro.timings
+
+
+def test_callback_que_falla_no_interrumpe_la_etapa():
+    def callback(evento):
+        raise RuntimeError('ui caída')
+
+    registro = RegistroEtapas(callback)
+    with registro.etapa('login'):
+        pass
+
+    assert 'login' in registro.timings
+
+
+def test_etapa_sin_registro_activo_no_hace_nada():
+    async def sin_registro():
+        with etapa('login') as detalle:
+            detalle['omitido'] = True
+        return registro_actual()
+
+    assert asyncio.run(sin_registro()) is None
+
+
+def test_registro_aislado_por_tarea():
+    async def trabajo(nombre: str):
+        registro = iniciar_registro()
+        with etapa(nombre):
+            await asyncio.sleep(0)
+        return registro.timings
+
+    async def main():
+        return await asyncio.gather(trabajo('fill_vehiculo'), trabajo('fill_comprador'))
+
+    a, b = asyncio.run(main())
+    assert list(a) == ['fill_vehiculo']
+    assert list(b) == ['fill_comprador']
+
+
+def test_linea_roundtrip():
+    evento = EventoEtapa('preview', 'fin', 1.23456, 0.5, {'popup': True})
+    linea = evento_a_linea(evento)
+
+    assert linea.startswith(PREFIJO_EVENTO)
+    assert linea_a_evento(linea) == {
+        'etapa': 'preview', 'estado': 'fin', 't': 1.235, 'duracion': 0.5, 'detalle': {'popup': True}
+    }
+
+
+def test_linea_no_evento_retorna_none():
+    assert linea_a_evento('INFO Login exitoso') is None
+    assert linea_a_evento(PREFIJO_EVENTO + '{roto') is None
+    assert linea_a_evento(PREFIJO_EVENTO + '[1, 2]') is None
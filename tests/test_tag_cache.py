@@ -0,0 +1,91 @@
+"""
+Tests del cache de PDFs TAG (clave por contenido, LRU, ETag)
+"""
+import asyncio
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+pytest.importorskip('pypdf')
+
+import api
+from src import tag_cache
+from src.tag_cache import TagPdfCache, clave_pdf_tag, pdf_tag
+
+PLANTILLA = Path(__file__).resolve().parent.parent / 'docs' / 'tag' / 'PDF-EJEMPLO.pdf'
+
+
+@pytest.fixture(autouse=True)
+def cache_temporal(tmp_path):
+    with patch.object(tag_cache.settings, 'tag_cache_dir', str(tmp_path / 'cache')), \
+            patch.object(tag_cache.settings, 'tag_cache_enabled', True), \
+            patch.object(tag_cache, '_cache', None):
+        yield tmp_path / 'cache'
+
+
+def test_clave_depende_del_contenido_y_la_plantilla():
+    base = clave_pdf_tag({'CAMPO1': '17', 'CAMPO2': 'OCTUBRE'}, 'plantilla-a')
+    assert clave_pdf_tag({'CAMPO2': 'OCTUBRE', 'CAMPO1': '17'}, 'plantilla-a') == base
+    assert clave_pdf_tag({'CAMPO1': '17', 'CAMPO2': 'OCTUBRE'}, 'plantilla-b') != base
+    assert clave_pdf_tag({'CAMPO1': '18', 'CAMPO2': 'OCTUBRE'}, 'plantilla-a') != base
+    assert clave_pdf_tag({'CAMPO1': None}, 'x') == clave_pdf_tag({'CAMPO1': ''}, 'x')
+
+
+def test_segundo_pedido_sale_del_cache_sin_renderizar(cache_temporal):
+    mapping = {'CAMPO4': 'JUAN PEREZ', 'CAMPO14': 'FPYK18'}
+    primero = pdf_tag(mapping, PLANTILLA)
+
+    with patch('src.tag_pdf.PlantillaTag.render', side_effect=AssertionError('no debe renderizar')):
+        segundo = pdf_tag(dict(mapping), PLANTILLA)
+
+    assert (primero.hit, segundo.hit) == (False, True)
+    assert segundo.datos == primero.datos and segundo.etag == primero.etag
+    assert (cache_temporal / f'{primero.clave}.pdf').exists()
+    metricas = tag_cache.obtener_cache_tag().metricas()
+    assert (metricas['hits'], metricas['misses'], metricas['escrituras']) == (1, 1, 1)
+    assert metricas['hit_rate'] == 0.5
+
+
+def test_expulsion_lru_por_tamano_y_reinicio(tmp_path):
+    cache = TagPdfCache(tmp_path / 'lru', max_bytes=250)
+    cache.guardar('a', b'a' * 100)
+    cache.guardar('b', b'b' * 100)
+    assert cache.obtener('a') is not None  # 'a' pasa a ser el más reciente
+    cache.guardar('c', b'c' * 100)
+
+    assert cache.obtener('b') is None
+    assert sorted(p.stem for p in (tmp_path / 'lru').glob('*.pdf')) == ['a', 'c']
+    assert cache.metricas()['expulsiones'] == 1
+
+    # Tras reiniciar, el orden sale del mtime: 'a' es más antiguo que 'c'
+    os.utime(tmp_path / 'lru' / 'a.pdf', ns=(0, 0))
+    reiniciado = TagPdfCache(tmp_path / 'lru', max_bytes=150)
+    assert sorted(p.stem for p in (tmp_path / 'lru').glob('*.pdf')) == ['c']
+    assert reiniciado.metricas()['bytes'] == 100
+
+
+def test_endpoint_etag_304_y_metricas():
+    headers = {'Authorization': f'Bearer {api.API_TOKEN}'}
+    cuerpo = {'datos_raw': 'Nombre: Juan Perez\nPATENTE: FPYK18\nTAG 147258369', 'correlation_id': 'c-1'}
+
+    async def main():
+        transporte = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transporte, base_url='http://test') as client:
+            primera = await client.post('/api/tag/pdf', headers=headers, json=cuerpo)
+            repetida = await client.post('/api/tag/pdf', headers=headers, json=cuerpo)
+            condicional = await client.post('/api/tag/pdf', json=cuerpo, headers={
+                **headers, 'If-None-Match': primera.headers['etag'],
+            })
+            metricas = await client.get('/api/tag/cache', headers=headers)
+            return primera, repetida, condicional, metricas
+
+    primera, repetida, condicional, metricas = asyncio.run(main())
+
+    assert primera.headers['x-cache'] == 'MISS' and repetida.headers['x-cache'] == 'HIT'
+    assert repetida.content == primera.content
+    assert condicional.status_code == 304 and not condicional.content
+    assert metricas.json()['habilitado'] is True
+    assert metricas.json()['hits'] == 1
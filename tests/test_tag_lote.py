@@ -0,0 +1,127 @@
+"""
+Tests de lotes de PDFs TAG (ZIP / PDF único en streaming)
+"""
+import asyncio
+import io
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+pypdf = pytest.importorskip('pypdf')
+
+import api
+from src import tag_lote
+from src.tag_lote import iterar_lote, stream_lote, validar_lote
+
+PLANTILLA = Path(__file__).resolve().parent.parent / 'docs' / 'tag' / 'PDF-EJEMPLO.pdf'
+
+
+def _mapping(nombre, patente):
+    return {'CAMPO4': nombre, 'CAMPO13': '147258369', 'CAMPO14': patente, 'CAMPO15': patente}
+
+
+def test_zip_en_orden_con_patentes_repetidas_y_errores():
+    mappings = [_mapping('JUAN', 'FPYK18'), _mapping('ANA', 'FPYK18'), {'CAMPO99': 'x', 'CAMPO14': 'BCDF12'}]
+    with ThreadPoolExecutor(2) as executor:
+        trozos = list(iterar_lote(mappings, 'zip', PLANTILLA, executor, ventana=2))
+
+    assert len([t for t in trozos if t]) >= 3  # Un trozo por documento listo + el cierre
+    archivo = zipfile.ZipFile(io.BytesIO(b''.join(trozos)))
+    assert archivo.namelist() == ['Solicitud-Tag-FPYK18.pdf', 'Solicitud-Tag-FPYK18-2.pdf', 'errores.txt']
+    segundo = pypdf.PdfReader(io.BytesIO(archivo.read('Solicitud-Tag-FPYK18-2.pdf')))
+    assert segundo.get_fields()['dondoña']['/V'] == 'ANA'
+    assert 'BCDF12' in archivo.read('errores.txt').decode('utf-8')
+
+
+def test_pdf_unico_con_campos_por_documento():
+    mappings = [_mapping('JUAN', 'FPYK18'), _mapping('ANA', 'BCDF12'), _mapping('LUIS', 'GHJK34')]
+    with ThreadPoolExecutor(2) as executor:
+        datos = b''.join(iterar_lote(mappings, 'pdf', PLANTILLA, executor))
+
+    reader = pypdf.PdfReader(io.BytesIO(datos), strict=True)
+    assert len(reader.pages) == 3
+    campos = reader.get_fields()
+    assert [campos[f'doc{i}.dondoña']['/V'] for i in (1, 2, 3)] == ['JUAN', 'ANA', 'LUIS']
+    assert campos['doc2.Patente Única']['/V'] == 'BCDF12'
+    assert reader.trailer['/Root']['/AcroForm']['/NeedAppearances']
+
+
+def test_pdf_unico_con_pagina_de_errores():
+    mappings = [_mapping('JUAN', 'FPYK18'), {'CAMPO99': 'x', 'CAMPO14': 'BCDF12'}, _mapping('LUIS', 'GHJK34')]
+    with ThreadPoolExecutor(2) as executor:
+        datos = b''.join(iterar_lote(mappings, 'pdf', PLANTILLA, executor))
+        solo_errores = b''.join(iterar_lote(mappings[1:2], 'pdf', PLANTILLA, executor))
+
+    reader = pypdf.PdfReader(io.BytesIO(datos), strict=True)
+    assert len(reader.pages) == 3
+    assert 'Documento 2 (Solicitud-Tag-BCDF12.pdf)' in reader.pages[-1].extract_text()
+    assert [reader.get_fields()[f'doc{i}.dondoña']['/V'] for i in (1, 3)] == ['JUAN', 'LUIS']
+
+    # Si fallan todos, el PDF igual se cierra bien (solo con la página de errores)
+    reader = pypdf.PdfReader(io.BytesIO(solo_errores), strict=True)
+    assert len(reader.pages) == 1
+    assert 'BCDF12' in reader.pages[0].extract_text()
+
+
+def test_stream_lote_igual_a_iterar_lote():
+    mappings = [_mapping('JUAN', 'FPYK18'), {'CAMPO99': 'x', 'CAMPO14': 'BCDF12'}, _mapping('LUIS', 'GHJK34')]
+
+    async def juntar(executor):
+        return b''.join([trozo async for trozo in stream_lote(mappings, 'pdf', PLANTILLA, executor, ventana=2)])
+
+    with ThreadPoolExecutor(2) as executor:
+        asincrono = asyncio.run(juntar(executor))
+        sincrono = b''.join(iterar_lote(mappings, 'pdf', PLANTILLA, executor, ventana=2))
+
+    assert asincrono == sincrono
+
+
+def test_validar_lote_antes_del_streaming():
+    assert validar_lote([_mapping('JUAN', 'FPYK18')], PLANTILLA) == []
+    errores = validar_lote([_mapping('JUAN', 'FPYK18'), {'CAMPO99': 'x', 'CAMPO14': 'BCDF12'}], PLANTILLA)
+    assert len(errores) == 1 and errores[0].startswith('Documento 2 (Solicitud-Tag-BCDF12.pdf)')
+    with pytest.raises(FileNotFoundError):
+        validar_lote([_mapping('JUAN', 'FPYK18')], PLANTILLA.with_name('no-existe.pdf'))
+
+
+def test_formato_invalido():
+    with ThreadPoolExecutor(1) as executor, pytest.raises(ValueError):
+        list(iterar_lote([_mapping('JUAN', 'FPYK18')], 'rar', PLANTILLA, executor))
+
+
+def test_endpoint_lote_en_pool_de_procesos():
+    headers = {'Authorization': f'Bearer {api.API_TOKEN}'}
+    textos = [f'Nombre: Cliente {i}\nRUT: 12345678-9\nPATENTE: FPYK.1{i}-K\nTAG 14725836{i}' for i in range(3)]
+
+    async def main():
+        transporte = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transporte, base_url='http://test') as client:
+            vacio = await client.post('/api/tag/generar-lote', headers=headers, json={
+                'datos_raw': [], 'correlation_id': 'lote-0',
+            })
+            respuesta = await client.post('/api/tag/generar-lote', headers=headers, json={
+                'datos_raw': textos, 'formato': 'zip', 'correlation_id': 'lote-1',
+            })
+            with patch.object(api, 'TAG_TEMPLATE_PDF', PLANTILLA.with_name('no-existe.pdf')):
+                sin_plantilla = await client.post('/api/tag/generar-lote', headers=headers, json={
+                    'datos_raw': textos, 'formato': 'pdf', 'correlation_id': 'lote-2',
+                })
+            return vacio, respuesta, sin_plantilla
+
+    with patch.object(api.settings, 'pdf_process_workers', 2):
+        try:
+            vacio, respuesta, sin_plantilla = asyncio.run(main())
+        finally:
+            api.cerrar_executors()
+
+    assert vacio.status_code == 400
+    assert sin_plantilla.status_code == 500  # Antes de empezar el streaming
+    assert respuesta.status_code == 200
+    assert respuesta.headers['content-type'] == 'application/zip'
+    nombres = zipfile.ZipFile(io.BytesIO(respuesta.content)).namelist()
+    assert nombres == [f'Solicitud-Tag-FPYK1{i}-K.pdf' for i in range(3)]
+    assert tag_lote.nombre_pdf_tag({}) == 'Solicitud-Tag-UNKNOWN.pdf'
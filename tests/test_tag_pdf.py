@@ -0,0 +1,143 @@
+"""
+Tests del renderer de PDFs TAG con plantilla cacheada
+"""
+import asyncio
+import os
+import shutil
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+pypdf = pytest.importorskip('pypdf')
+
+import api
+from src import tag_cache, tag_pdf
+from src.tag_pdf import TAG_FIELD_NAME_MAP, PlantillaTag, obtener_plantilla_tag
+
+PLANTILLA = Path(__file__).resolve().parent.parent / 'docs' / 'tag' / 'PDF-EJEMPLO.pdf'
+
+
+def _valores(datos: bytes) -> dict:
+    reader = pypdf.PdfReader(BytesIO(datos), strict=True)
+    return {nombre: campo.get('/V') for nombre, campo in reader.get_fields().items()}
+
+
+@pytest.fixture(autouse=True)
+def cache_limpio(tmp_path):
+    tag_pdf.limpiar_cache()
+    with patch.object(tag_cache.settings, 'tag_cache_dir', str(tmp_path / 'cache')), \
+            patch.object(tag_cache, '_cache', None):
+        yield
+    tag_pdf.limpiar_cache()
+
+
+def test_rellena_campos_como_actualizacion_incremental():
+    plantilla = obtener_plantilla_tag(PLANTILLA)
+    datos = plantilla.render({'CAMPO4': 'JUAN PÉREZ (HIJO)', 'CAMPO6': '', 'CAMPO13': '147258369'})
+
+    assert plantilla.incremental
+    assert datos.startswith(PLANTILLA.read_bytes())
+    valores = _valores(datos)
+    assert valores[TAG_FIELD_NAME_MAP['CAMPO4']] == 'JUAN PÉREZ (HIJO)'
+    assert valores[TAG_FIELD_NAME_MAP['CAMPO6']] == ''
+    assert valores[TAG_FIELD_NAME_MAP['CAMPO13']] == '147258369'
+    assert valores[TAG_FIELD_NAME_MAP['CAMPO1']] == 'CAMPO1'  # Sin valor: se conserva la plantilla
+
+    reader = pypdf.PdfReader(BytesIO(datos))
+    assert reader.trailer['/Root']['/AcroForm']['/NeedAppearances']
+    widget = next(
+        a.get_object() for a in reader.pages[0]['/Annots']
+        if a.get_object().get('/T') == TAG_FIELD_NAME_MAP['CAMPO4']
+    )
+    assert b'(JUAN P\xc9REZ \\(HIJO\\)) Tj' in widget['/AP']['/N'].get_object().get_data()
+
+
+def test_plantilla_con_xref_clasica_y_camino_pypdf(tmp_path):
+    clasica = tmp_path / 'clasica.pdf'
+    pypdf.PdfWriter(clone_from=str(PLANTILLA)).write(clasica)
+    plantilla = PlantillaTag(clasica)
+    assert plantilla.incremental and b'\nxref\n' in plantilla.render({'CAMPO1': '17'})[-400:]
+    assert _valores(plantilla.render({'CAMPO1': '17'}))['En Santiago  a'] == '17'
+
+    plantilla.incremental = False
+    assert _valores(plantilla.render({'CAMPO1': '18'}))['En Santiago  a'] == '18'
+
+
+def test_renderer_pypdf_por_configuracion():
+    plantilla = obtener_plantilla_tag(PLANTILLA)
+    with patch.object(tag_pdf.settings, 'tag_pdf_renderer', tag_pdf.RENDERER_PYPDF):
+        clonado = plantilla.render({'CAMPO4': 'ANA'})
+    explicito = plantilla.render({'CAMPO4': 'ANA'}, renderer=tag_pdf.RENDERER_PYPDF)
+
+    for datos in (clonado, explicito):
+        assert not datos.startswith(PLANTILLA.read_bytes())  # PDF reescrito, no incremental
+        assert _valores(datos)[TAG_FIELD_NAME_MAP['CAMPO4']] == 'ANA'
+    assert plantilla.render({'CAMPO4': 'ANA'}).startswith(PLANTILLA.read_bytes())
+
+
+def test_cache_se_reutiliza_hasta_que_cambia_el_archivo(tmp_path):
+    copia = tmp_path / 'plantilla.pdf'
+    shutil.copyfile(PLANTILLA, copia)
+
+    primera = obtener_plantilla_tag(copia)
+    assert obtener_plantilla_tag(copia) is primera
+
+    estado = os.stat(copia)
+    os.utime(copia, ns=(estado.st_atime_ns, estado.st_mtime_ns + 1_000_000_000))
+    assert obtener_plantilla_tag(copia) is not primera
+
+
+def test_campos_faltantes_y_claves_desconocidas():
+    with pytest.raises(RuntimeError, match='Campos no encontrados'):
+        PlantillaTag(PLANTILLA, field_map={'CAMPO1': 'No existe'})
+    with pytest.raises(KeyError):
+        obtener_plantilla_tag(PLANTILLA).render({'CAMPO99': 'x'})
+
+
+def test_api_usa_los_nombres_reales_de_la_plantilla(tmp_path):
+    mapping = api._tag_parse_text('Nombre: Juan Perez\nRUT: 12345678-9\nPATENTE: FPYK.18-2\nTAG 147258369')
+    salida = tmp_path / 'tag.pdf'
+    api._tag_fill_pdf(mapping, PLANTILLA, salida)
+
+    valores = _valores(salida.read_bytes())
+    assert valores[TAG_FIELD_NAME_MAP['CAMPO4']] == 'JUAN PEREZ'
+    assert valores[TAG_FIELD_NAME_MAP['CAMPO15']] == 'FPYK18-2'
+
+
+def test_endpoint_pdf_directo_con_persistencia_opcional(tmp_path):
+    headers = {'Authorization': f'Bearer {api.API_TOKEN}'}
+    texto = 'Nombre: Juan Perez\nRUT: 12345678-9\nPATENTE: FPYK.18-2\nTAG 147258369'
+
+    async def main():
+        transporte = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transporte, base_url='http://test') as client:
+            directo = await client.post('/api/tag/pdf', headers=headers, json={
+                'datos_raw': texto, 'correlation_id': 'pdf-1',
+            })
+            persistido = await client.post('/api/tag/pdf', headers=headers, json={
+                'datos_raw': texto, 'correlation_id': 'pdf-2', 'persistir': True,
+            })
+            return directo, persistido
+
+    salida = tmp_path / 'output'
+    with patch.object(api, 'TAG_OUTPUT_DIR', salida):
+        directo, persistido = asyncio.run(main())
+
+    assert directo.status_code == 200
+    assert directo.headers['content-type'] == 'application/pdf'
+    assert 'Solicitud-Tag-FPYK18-2.pdf' in directo.headers['content-disposition']
+    assert _valores(directo.content)[TAG_FIELD_NAME_MAP['CAMPO4']] == 'JUAN PEREZ'
+    assert [p.name for p in salida.iterdir()] == ['Solicitud-Tag-FPYK18-2.pdf']
+    assert (salida / 'Solicitud-Tag-FPYK18-2.pdf').read_bytes() == persistido.content
+
+
+def test_guardar_pdf_reemplaza_sin_dejar_temporales(tmp_path):
+    destino = tmp_path / 'Solicitud-Tag-FPYK18.pdf'
+    destino.write_bytes(b'viejo')
+    tag_pdf.guardar_pdf(b'%PDF-nuevo', destino)
+
+    assert destino.read_bytes() == b'%PDF-nuevo'
+    assert list(tmp_path.iterdir()) == [destino]
@@ -0,0 +1,160 @@
+"""
+Tests del worker persistente AutoTramite (servidor real en puerto efímero)
+"""
+import asyncio
+import os
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from src import worker as worker_mod
+from src.stage_events import EventoEtapa
+from src.worker import (
+    AutoTramiteWorker, WorkerClient, WorkerNoDisponibleError, WorkerResultadoDesconocidoError, token_worker,
+)
+
+
+@pytest.fixture(autouse=True)
+def _token_de_prueba():
+    with patch.object(worker_mod.settings, 'worker_token', 'token-de-prueba'):
+        yield
+
+
+class _WorkerEnThread:
+    """Corre AutoTramiteWorker en un event loop propio (como el proceso daemon)"""
+
+    def __init__(self):
+        self.worker = None
+        self.listo = threading.Event()
+        self.thread = threading.Thread(target=lambda: asyncio.run(self._correr()), daemon=True)
+
+    async def _correr(self):
+        self.worker = AutoTramiteWorker(host='127.0.0.1', port=0, precalentar=False)
+        await self.worker.iniciar()
+        self.listo.set()
+        await self.worker.servir()
+
+    def __enter__(self):
+        self.thread.start()
+        assert self.listo.wait(5)
+        host, port = self.worker.direccion
+        self.cliente = WorkerClient(host, port)
+        return self
+
+    def __exit__(self, *exc):
+        self.cliente.detener()
+        self.thread.join(5)
+
+
+async def _ejecutar_fake(texto, output_path, dry_run=False, tasacion=None, venta=None, on_stage=None):
+    on_stage(EventoEtapa('login', 'inicio', 0.0))
+    on_stage(EventoEtapa('login', 'fin', 0.1, 0.1))
+    await asyncio.sleep(0)
+    return {
+        'success': True,
+        'pdf_path': output_path,
+        'mensaje': f'dry_run={dry_run} tasacion={tasacion}',
+        'timings': {'login': 0.1},
+    }
+
+
+def test_ejecutar_reenvia_eventos_y_resultado():
+    eventos = []
+    with patch.object(worker_mod, 'ejecutar_texto', _ejecutar_fake), _WorkerEnThread() as w:
+        resultado = w.cliente.ejecutar(
+            'texto', '/tmp/salida.pdf', dry_run=True, tasacion='100', on_evento=eventos.append
+        )
+        pong = w.cliente.ping()
+
+    assert resultado['success'] is True
+    assert resultado['pdf_path'] == '/tmp/salida.pdf'
+    assert resultado['mensaje'] == 'dry_run=True tasacion=100'
+    assert [(e['etapa'], e['estado']) for e in eventos] == [('login', 'inicio'), ('login', 'fin')]
+    assert pong['trabajos'] == 1 and pong['en_curso'] == 0
+
+
+def test_trabajos_concurrentes_no_mezclan_eventos():
+    async def fake(texto, output_path, dry_run=False, tasacion=None, venta=None, on_stage=None):
+        for i in range(3):
+            on_stage(EventoEtapa('fill_vehiculo', 'fin', float(i), detalle={'texto': texto}))
+            await asyncio.sleep(0.01)
+        return {'success': True, 'pdf_path': output_path}
+
+    with patch.object(worker_mod, 'ejecutar_texto', fake), _WorkerEnThread() as w:
+        eventos: dict[str, list] = {'a': [], 'b': []}
+        hilos = [
+            threading.Thread(target=lambda k=k: w.cliente.ejecutar(k, f'/tmp/{k}.pdf', on_evento=eventos[k].append))
+            for k in eventos
+        ]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join(5)
+
+    for k, lista in eventos.items():
+        assert len(lista) == 3
+        assert all(e['detalle']['texto'] == k for e in lista)
+
+
+def test_token_invalido_rechazado():
+    with patch.object(worker_mod.settings, 'worker_token', 'secreto'), _WorkerEnThread() as w:
+        malo = WorkerClient(*w.worker.direccion, token='otro')
+        resultado = malo.ejecutar('texto', '/tmp/x.pdf')
+        w.cliente = WorkerClient(*w.worker.direccion, token='secreto')
+
+    assert resultado == {'success': False, 'error': 'Worker: No autorizado'}
+
+
+def test_sin_token_rechazado():
+    with _WorkerEnThread() as w:
+        anonimo = WorkerClient(*w.worker.direccion, token='')
+        resultado = anonimo.ejecutar('texto', '/tmp/x.pdf')
+
+    assert resultado == {'success': False, 'error': 'Worker: No autorizado'}
+
+
+def test_token_generado_por_instalacion(tmp_path):
+    ruta = tmp_path / 'worker.token'
+    with patch.object(worker_mod.settings, 'worker_token', None), \
+            patch.object(worker_mod.settings, 'worker_token_path', str(ruta)):
+        primero = token_worker()
+        segundo = token_worker()
+
+    assert primero and primero == segundo
+    assert ruta.read_text() == primero
+    assert list(tmp_path.iterdir()) == [ruta]
+    if os.name != 'nt':
+        assert ruta.stat().st_mode & 0o777 == 0o600
+
+
+def test_sin_worker_lanza_no_disponible():
+    cliente = WorkerClient('127.0.0.1', 1)
+    assert cliente.disponible() is False
+    with pytest.raises(WorkerNoDisponibleError):
+        cliente.ejecutar('texto', '/tmp/x.pdf')
+
+
+def test_ejecutar_texto_reporta_errores_de_validacion():
+    with patch.object(worker_mod, 'validar_credenciales', return_value=(True, '')):
+        resultado = asyncio.run(worker_mod.ejecutar_texto('texto sin formato', '/tmp/x.pdf'))
+
+    assert resultado['success'] is False
+    assert resultado['error'] == 'Validation errors'
+    assert resultado['validation_errors']
+
+
+def test_corte_con_trabajo_enviado_es_resultado_desconocido():
+    async def colgado(texto, output_path, dry_run=False, tasacion=None, venta=None, on_stage=None):
+        on_stage(EventoEtapa('login', 'inicio', 0.0))
+        await asyncio.sleep(0.5)
+        return {'success': True}
+
+    with patch.object(worker_mod, 'ejecutar_texto', colgado), _WorkerEnThread() as w:
+        with pytest.raises(WorkerResultadoDesconocidoError) as excinfo:
+            w.cliente.ejecutar('texto', '/tmp/x.pdf', timeout=0.1, correlation_id='cid-1')
+
+    assert not isinstance(excinfo.value, WorkerNoDisponibleError)
+    resultado = excinfo.value.a_resultado()
+    assert resultado['resultado_desconocido'] is True and resultado['correlation_id'] == 'cid-1'
+    assert 'cid-1' in resultado['error']